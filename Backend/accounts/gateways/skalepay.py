@@ -8,13 +8,151 @@ from urllib3.util.retry import Retry
 from requests.auth import HTTPBasicAuth
 from django.conf import settings
 from typing import Dict, Any, Optional, Union
+from urllib.parse import urlsplit
+
+from core.metricas import SKALEPAY_LATENCIA, SKALEPAY_RETENTATIVAS, rotulo_status
+from core.tracing import rastrear
 
 # Configuração de Logger específico
 logger = logging.getLogger('skalepay_integration')
 
 class SkalePayError(Exception):
     """Exceção base para erros da integração SkalePay."""
-    pass
+
+    def __init__(self, mensagem: str = '', status_code: Optional[int] = None, incerto: bool = False):
+        super().__init__(mensagem)
+        # Status HTTP da SkalePay (None: sem resposta) e se o pedido pode ter sido processado
+        self.status_code = status_code
+        self.incerto = incerto
+
+
+def operacao_metrica(metodo: Optional[str], caminho: Optional[str]) -> str:
+    """Rótulo de métrica: método + recurso, sem IDs ("/v1/transfers/123" -> "GET /transfers")."""
+    partes = [p for p in urlsplit(caminho or '').path.split('/') if p and p != 'v1']
+    return f"{metodo or ''} /{partes[0] if partes else ''}".strip()
+
+
+def para_centavos(value: Union[Decimal, str, float]) -> int:
+    """
+    Converte valor monetário para centavos de forma segura.
+    Elimina o problema do ponto flutuante.
+    """
+    if isinstance(value, float):
+        logger.warning(f"Uso de float detectado na conversão monetária: {value}. Prefira Decimal.")
+        value = str(value)
+
+    if not isinstance(value, Decimal):
+        value = Decimal(value)
+
+    # Arredondamento bancário padrão
+    cents = int(value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100)
+    return cents
+
+
+# =================================================================
+# PAYLOADS (compartilhados pelos clientes síncrono e assíncrono)
+# =================================================================
+
+def payload_recebedor(razao_social: str, cnpj: str, banco_cod: str, agencia: str, conta: str, digito: str, tipo_conta: str = 'conta_corrente') -> Dict:
+    return {
+        "legalName": razao_social,
+        "document": {
+            "number": cnpj.replace('.', '').replace('/', '').replace('-', ''),
+            "type": "CNPJ" # Ou CPF logica
+        },
+        "transferSettings": {
+            "transferEnabled": True,
+            "automaticAnticipationEnabled": True,
+            "anticipatableVolumePercentage": 100
+        },
+        "bankAccount": {
+            "bankCode": banco_cod,
+            "agencyNumber": agencia,
+            "accountNumber": conta,
+            "accountDigit": digito,
+            "type": tipo_conta # ajustar conforme enum da API
+        }
+    }
+
+
+def payload_pix_deposito(valor: Decimal, customer_data: Dict, usuario_id: Optional[int] = None) -> Dict:
+    cents = para_centavos(valor)
+
+    payload = {
+        "amount": cents,
+        "paymentMethod": "pix",  # Corrigido para 'pix' minúsculo conforme documentação
+        "customer": {
+            "name": customer_data.get('nome'),
+            "document": {
+                "number": customer_data.get('cpf'),
+                "type": "cpf"
+            },
+            "email": customer_data.get('email')
+        },
+        "items": [
+            {
+                "title": "Deposito Pix",
+                "unitPrice": cents,
+                "quantity": 1,
+                "tangible": False,
+            }
+        ],
+        "postbackUrl": getattr(settings, 'SKALEPAY_WEBHOOK_URL', None)
+    }
+
+    # Adiciona metadata com usuario_id para identificação no webhook
+    if usuario_id:
+        payload["metadata"] = {"usuario_id": usuario_id}
+    return payload
+
+
+def payload_saque(pix_key: str, valor: Decimal, external_ref: Optional[str] = None, recipient_id: Optional[int] = None) -> Dict:
+    payload = {
+        "amount": para_centavos(valor),
+        "pixKey": pix_key,
+        "description": "Saque Plataforma",
+        "postbackUrl": f"{getattr(settings, 'WEBHOOK_URL_BASE', '')}/api/accounts/webhook/skalepay/"
+    }
+
+    # Adiciona campos opcionais se fornecidos
+    if external_ref:
+        payload["externalRef"] = str(external_ref)
+
+    if recipient_id:
+        payload["recipientId"] = recipient_id
+    return payload
+
+
+def cabecalho_autorizacao(api_key: str) -> str:
+    # Conforme documentação: Manual Basic Auth header to avoid library fingerprinting
+    return f"Basic {__import__('base64').b64encode(f'{api_key}:x'.encode()).decode()}"
+
+
+def carregar_api_key() -> str:
+    # Carrega a chave das variáveis de ambiente (Segurança)
+    api_key = os.getenv('SKALEPAY_SECRET_KEY')
+    if not api_key:
+        # Fallback para settings do Django se não estiver no ENV direto
+        api_key = getattr(settings, 'SKALEPAY_SECRET_KEY', None)
+
+    if not api_key:
+        logger.critical("SKALEPAY_SECRET_KEY não configurada!")
+        raise SkalePayError("Credenciais da SkalePay não encontradas.")
+    return api_key
+
+
+class RetryInstrumentado(Retry):
+    """Retry do urllib3 que conta cada retentativa efetivamente agendada."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        # Levanta MaxRetryError quando esgota: só conta o que de fato será retentado
+        novo = super().increment(method, url, response, error, _pool, _stacktrace)
+        if response is not None and response.status:
+            motivo = str(response.status)
+        else:
+            motivo = type(error).__name__ if error else 'desconhecido'
+        SKALEPAY_RETENTATIVAS.inc(operacao=operacao_metrica(method, url), motivo=motivo)
+        return novo
 
 class SkalePayClient:
     """
@@ -47,15 +185,7 @@ class SkalePayClient:
     _shared_session_api_key: Optional[str] = None
     
     def __init__(self):
-        # Carrega a chave das variáveis de ambiente (Segurança)
-        self.api_key = os.getenv('SKALEPAY_SECRET_KEY')
-        if not self.api_key:
-            # Fallback para settings do Django se não estiver no ENV direto
-            self.api_key = getattr(settings, 'SKALEPAY_SECRET_KEY', None)
-            
-        if not self.api_key:
-            logger.critical("SKALEPAY_SECRET_KEY não configurada!")
-            raise SkalePayError("Credenciais da SkalePay não encontradas.")
+        self.api_key = carregar_api_key()
 
         # Configura a sessão HTTP com Retry Strategy (singleton-like)
         if SkalePayClient._shared_session is None or SkalePayClient._shared_session_api_key != self.api_key:
@@ -64,11 +194,9 @@ class SkalePayClient:
             # Headers robustos para reduzir bloqueios por WAF
             session.headers.update(self.DEFAULT_HEADERS)
 
-            # Conforme documentação: Manual Basic Auth header to avoid library fingerprinting
-            auth_header = f"Basic {__import__('base64').b64encode(f'{self.api_key}:x'.encode()).decode()}"
-            session.headers['Authorization'] = auth_header
+            session.headers['Authorization'] = cabecalho_autorizacao(self.api_key)
 
-            retry_strategy = Retry(
+            retry_strategy = RetryInstrumentado(
                 total=3,
                 backoff_factor=1, # Espera 1s, 2s, 4s
                 status_forcelist=[429, 500, 502, 503, 504],
@@ -88,16 +216,7 @@ class SkalePayClient:
         Converte valor monetário para centavos de forma segura.
         Elimina o problema do ponto flutuante.
         """
-        if isinstance(value, float):
-            logger.warning(f"Uso de float detectado na conversão monetária: {value}. Prefira Decimal.")
-            value = str(value)
-            
-        if not isinstance(value, Decimal):
-            value = Decimal(value)
-            
-        # Arredondamento bancário padrão
-        cents = int(value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100)
-        return cents
+        return para_centavos(value)
 
     def _request(self, method: str, endpoint: str, payload: Optional[Dict] = None) -> Dict:
         """
@@ -113,12 +232,15 @@ class SkalePayClient:
         logger.info(f"SkalePay Request [{method}] {endpoint}", extra={'payload': log_payload})
 
         try:
-            response = self.session.request(
-                method=method,
-                url=url,
-                json=payload,
-                timeout=self.TIMEOUT,
-            )
+            operacao = operacao_metrica(method, endpoint)
+            with SKALEPAY_LATENCIA.medir(operacao=operacao) as rotulos, rastrear('skalepay', operacao=operacao):
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    json=payload,
+                    timeout=self.TIMEOUT,
+                )
+                rotulos['status'] = rotulo_status(response.status_code)
             
             response.raise_for_status()
             
@@ -166,11 +288,13 @@ class SkalePayClient:
         # Nota: requests aceita params no método, mas nossa _request usa json.
         # Pequena adaptação para GET com query params
         try:
-            response = self.session.get(
-                f"{self.BASE_URL}{endpoint}", 
-                params=params, 
-                timeout=self.TIMEOUT
-            )
+            with SKALEPAY_LATENCIA.medir(operacao=operacao_metrica("GET", endpoint)) as rotulos:
+                response = self.session.get(
+                    f"{self.BASE_URL}{endpoint}", 
+                    params=params, 
+                    timeout=self.TIMEOUT
+                )
+                rotulos['status'] = rotulo_status(response.status_code)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -182,25 +306,7 @@ class SkalePayClient:
         Cria um recebedor para saques.
         Endpoint: POST /recipients
         """
-        payload = {
-            "legalName": razao_social,
-            "document": {
-                "number": cnpj.replace('.', '').replace('/', '').replace('-', ''),
-                "type": "CNPJ" # Ou CPF logica
-            },
-            "transferSettings": {
-                "transferEnabled": True,
-                "automaticAnticipationEnabled": True,
-                "anticipatableVolumePercentage": 100
-            },
-            "bankAccount": {
-                "bankCode": banco_cod,
-                "agencyNumber": agencia,
-                "accountNumber": conta,
-                "accountDigit": digito,
-                "type": tipo_conta # ajustar conforme enum da API
-            }
-        }
+        payload = payload_recebedor(razao_social, cnpj, banco_cod, agencia, conta, digito, tipo_conta)
         return self._request("POST", "/recipients", payload)
 
     def gerar_pix_deposito(self, valor: Decimal, customer_data: Dict, usuario_id: Optional[int] = None) -> Dict:
@@ -213,36 +319,16 @@ class SkalePayClient:
         :param customer_data: Dict com dados do cliente (nome, cpf)
         :param usuario_id: ID do usuário para incluir no metadata (webhook identification)
         """
-        cents = self._to_cents(valor)
-        
-        payload = {
-            "amount": cents,
-            "paymentMethod": "pix",  # Corrigido para 'pix' minúsculo conforme documentação
-            "customer": {
-                "name": customer_data.get('nome'),
-                "document": {
-                    "number": customer_data.get('cpf'),
-                    "type": "cpf"
-                },
-                "email": customer_data.get('email')
-            },
-            "items": [
-                {
-                    "title": "Deposito Pix",
-                    "unitPrice": cents,
-                    "quantity": 1,
-                    "tangible": False,
-                }
-            ],
-            "postbackUrl": getattr(settings, 'SKALEPAY_WEBHOOK_URL', None)
-        }
-        
-        # Adiciona metadata com usuario_id para identificação no webhook
-        if usuario_id:
-            payload["metadata"] = {"usuario_id": usuario_id}
-        
+        payload = payload_pix_deposito(valor, customer_data, usuario_id)
         return self._request("POST", "/transactions", payload)
 
+    def consultar_transacao(self, id_transacao: str) -> Dict:
+        """
+        Consulta uma transação (status do depósito Pix).
+        Endpoint: GET /transactions/{id}
+        """
+        return self._request("GET", f"/transactions/{id_transacao}")
+
     def solicitar_saque(self, pix_key: str, valor: Decimal, external_ref: Optional[str] = None, recipient_id: Optional[int] = None) -> Dict:
         """
         Realiza uma transferência/saque (Cash-out) via PIX.
@@ -253,20 +339,12 @@ class SkalePayClient:
         :param external_ref: Referência externa para rastreamento
         :param recipient_id: ID do recebedor (opcional, usa principal se não informado)
         """
-        cents = self._to_cents(valor)
-        
-        payload = {
-            "amount": cents,
-            "pixKey": pix_key,
-            "description": "Saque Plataforma",
-            "postbackUrl": f"{getattr(settings, 'WEBHOOK_URL_BASE', '')}/api/accounts/webhook/skalepay/"
-        }
-        
-        # Adiciona campos opcionais se fornecidos
-        if external_ref:
-            payload["externalRef"] = str(external_ref)
-            
-        if recipient_id:
-            payload["recipientId"] = recipient_id
-        
-        return self._request("POST", "/transfers", payload)
\ No newline at end of file
+        payload = payload_saque(pix_key, valor, external_ref, recipient_id)
+        return self._request("POST", "/transfers", payload)
+
+    def consultar_transferencia(self, id_transferencia: str) -> Dict:
+        """
+        Consulta uma transferência (status do saque).
+        Endpoint: GET /transfers/{id}
+        """
+        return self._request("GET", f"/transfers/{id_transferencia}")
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+Cliente assíncrono da SkalePay (httpx + asyncio).
+
+Mesma superfície do `SkalePayClient` (consultar_saldo, criar_recebedor,
+gerar_pix_deposito, consultar_transacao, solicitar_saque,
+consultar_transferencia, _request), mas cada método é uma corrotina: um
+único processo despacha dezenas de saques em paralelo sem prender um worker
+síncrono por chamada (no cliente bloqueante, até 3 retentativas x 10s de
+leitura).
+
+    - Pool HTTP/1.1 keep-alive por instância, reaproveitado entre chamadas.
+    - Semáforo limita as chamadas simultâneas (SKALEPAY_MAX_CONCORRENCIA).
+    - Timeouts por endpoint (TIMEOUTS): saldo responde rápido, transferência demora.
+    - Retentativas com backoff exponencial e jitter cheio: clientes que falharam
+      juntos não voltam todos no mesmo instante.
+
+POST não é idempotente: só é retentado quando a SkalePay certamente não
+processou o pedido (falha de conexão, 429, 503). Timeout de leitura ou 5xx num
+POST vira SkalePayError com `incerto=True`: quem chamou não deve reenviar, a
+auditoria decide.
+
+Uso:
+    async with AsyncSkalePayClient() as client:
+        respostas = await asyncio.gather(*(client.solicitar_saque(...) for ...))
+"""
+
+import asyncio
+import logging
+import random
+from decimal import Decimal
+from typing import Dict, Optional
+
+import httpx
+from django.conf import settings
+
+from core.metricas import SKALEPAY_LATENCIA, SKALEPAY_RETENTATIVAS, rotulo_status
+from core.tracing import rastrear
+
+from .skalepay import (
+    SkalePayClient, SkalePayError, cabecalho_autorizacao, carregar_api_key, operacao_metrica,
+    para_centavos, payload_pix_deposito, payload_recebedor, payload_saque,
+)
+
+logger = logging.getLogger('skalepay_integration')
+
+
+class AsyncSkalePayClient:
+    """Variante asyncio do SkalePayClient; uma instância por event loop."""
+
+    BASE_URL = SkalePayClient.BASE_URL
+    DEFAULT_HEADERS = SkalePayClient.DEFAULT_HEADERS
+
+    MAX_CONCORRENCIA = 20
+    MAX_RETENTATIVAS = 3  # Além da primeira chamada (total=3 no cliente síncrono)
+    BACKOFF_BASE = 0.5    # Teto da espera: 0.5s, 1s, 2s... (sorteada entre 0 e o teto)
+    BACKOFF_MAXIMO = 8.0
+    KEEPALIVE_EXPIRA = 30.0
+
+    STATUS_RETENTAVEIS = frozenset({429, 500, 502, 503, 504})
+    STATUS_RETENTAVEIS_POST = frozenset({429, 503})
+
+    TIMEOUT_PADRAO = httpx.Timeout(10.0, connect=3.05)
+    TIMEOUTS = {
+        "/balance": httpx.Timeout(5.0, connect=3.05),
+        "/transfers": httpx.Timeout(15.0, connect=3.05),
+        "/transactions": httpx.Timeout(10.0, connect=3.05),
+    }
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 max_concorrencia: Optional[int] = None, backoff_base: Optional[float] = None):
+        self.api_key = api_key or carregar_api_key()
+        self.base_url = (base_url or getattr(settings, 'SKALEPAY_BASE_URL', None) or self.BASE_URL).rstrip('/')
+        self.max_concorrencia = max_concorrencia or getattr(settings, 'SKALEPAY_MAX_CONCORRENCIA', self.MAX_CONCORRENCIA)
+        self.backoff_base = self.BACKOFF_BASE if backoff_base is None else backoff_base
+        # Criados no primeiro uso, dentro do event loop que vai usá-los
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaforo: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> 'AsyncSkalePayClient':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _obter_cliente(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={**self.DEFAULT_HEADERS, 'Authorization': cabecalho_autorizacao(self.api_key)},
+                limits=httpx.Limits(
+                    max_connections=self.max_concorrencia,
+                    max_keepalive_connections=self.max_concorrencia,
+                    keepalive_expiry=self.KEEPALIVE_EXPIRA,
+                ),
+                timeout=self.TIMEOUT_PADRAO,
+            )
+            self._semaforo = asyncio.Semaphore(self.max_concorrencia)
+        return self._client
+
+    def _to_cents(self, value) -> int:
+        return para_centavos(value)
+
+    def _timeout(self, endpoint: str) -> httpx.Timeout:
+        recurso = '/' + endpoint.strip('/').split('/')[0]
+        return self.TIMEOUTS.get(recurso, self.TIMEOUT_PADRAO)
+
+    def _espera(self, retentativa: int) -> float:
+        """Backoff exponencial com jitter cheio."""
+        teto = min(self.BACKOFF_MAXIMO, self.backoff_base * 2 ** (retentativa - 1))
+        return random.uniform(0, teto)
+
+    def _motivo_retentativa(self, method: str, response: Optional[httpx.Response],
+                            erro: Optional[Exception]) -> Optional[str]:
+        """Motivo (rótulo da métrica) se a chamada pode ser repetida; None se não."""
+        if erro is not None:
+            # Não chegou à SkalePay: seguro para qualquer método
+            if isinstance(erro, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+                return type(erro).__name__
+            return type(erro).__name__ if method == 'GET' else None
+        permitidos = self.STATUS_RETENTAVEIS if method == 'GET' else self.STATUS_RETENTAVEIS_POST
+        return str(response.status_code) if response.status_code in permitidos else None
+
+    async def _request(self, method: str, endpoint: str, payload: Optional[Dict] = None,
+                       params: Optional[Dict] = None) -> Dict:
+        """
+        Método centralizador de requisições com tratamento de erro e logging seguro.
+        """
+        url = f"{self.base_url}{endpoint}"
+
+        # Log seguro (Sanitização básica)
+        log_payload = payload.copy() if payload else {}
+        if 'credit_card' in log_payload:
+            log_payload['credit_card'] = '***REDACTED***'
+
+        logger.info(f"SkalePay Request [{method}] {endpoint}", extra={'payload': log_payload})
+
+        cliente = self._obter_cliente()
+        operacao = operacao_metrica(method, endpoint)
+        retentativas = 0
+        with SKALEPAY_LATENCIA.medir(operacao=operacao) as rotulos, rastrear('skalepay', operacao=operacao):
+            while True:
+                response, erro = None, None
+                try:
+                    async with self._semaforo:
+                        response = await cliente.request(
+                            method, url, json=payload, params=params, timeout=self._timeout(endpoint),
+                        )
+                except httpx.HTTPError as e:
+                    erro = e
+
+                motivo = self._motivo_retentativa(method, response, erro)
+                if motivo is None or retentativas >= self.MAX_RETENTATIVAS:
+                    break
+                retentativas += 1
+                SKALEPAY_RETENTATIVAS.inc(operacao=operacao, motivo=motivo)
+                # Espera fora do semáforo: não ocupa vaga de quem pode chamar agora
+                await asyncio.sleep(self._espera(retentativas))
+            rotulos['status'] = rotulo_status(response.status_code) if response is not None else 'erro'
+
+        if erro is not None:
+            # Sem resposta: só é certo que nada foi processado se a conexão nem abriu
+            incerto = method != 'GET' and not isinstance(
+                erro, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+            )
+            if isinstance(erro, httpx.TimeoutException):
+                msg = "Timeout ao conectar com SkalePay. A operação pode ter sido processada ou não."
+            else:
+                msg = f"Erro de conexão com SkalePay: {str(erro)}"
+            logger.error(msg)
+            raise SkalePayError(msg, incerto=incerto)
+
+        if response.is_error:
+            error_msg = f"Erro HTTP SkalePay: {response.status_code} - {response.text}"
+            logger.error(error_msg)
+            # Tenta extrair mensagem de erro amigável da API se existir
+            try:
+                mensagem = response.json().get('message', error_msg)
+            except (ValueError, AttributeError):
+                mensagem = error_msg
+            incerto = method != 'GET' and response.status_code >= 500 and response.status_code != 503
+            raise SkalePayError(mensagem, status_code=response.status_code, incerto=incerto)
+
+        try:
+            return response.json()
+        except ValueError:
+            return {"status": "success", "raw_content": response.text}
+
+    # =================================================================
+    # MÉTODOS DE NEGÓCIO (mesmos do SkalePayClient)
+    # =================================================================
+
+    async def consultar_saldo(self, recipient_id: Optional[int] = None) -> Dict:
+        """
+        Consulta o saldo disponível.
+        Endpoint: GET /balance/available
+        """
+        params = {'recipientId': recipient_id} if recipient_id else None
+        try:
+            return await self._request("GET", "/balance/available", params=params)
+        except SkalePayError as e:
+            logger.error(f"Erro ao consultar saldo: {e}")
+            raise SkalePayError(f"Falha ao consultar saldo: {e}")
+
+    async def criar_recebedor(self, razao_social: str, cnpj: str, banco_cod: str, agencia: str, conta: str, digito: str, tipo_conta: str = 'conta_corrente') -> Dict:
+        """
+        Cria um recebedor para saques.
+        Endpoint: POST /recipients
+        """
+        payload = payload_recebedor(razao_social, cnpj, banco_cod, agencia, conta, digito, tipo_conta)
+        return await self._request("POST", "/recipients", payload)
+
+    async def gerar_pix_deposito(self, valor: Decimal, customer_data: Dict, usuario_id: Optional[int] = None) -> Dict:
+        """
+        Gera um PIX para depósito (Cash-in).
+        Endpoint: POST /transactions
+        """
+        payload = payload_pix_deposito(valor, customer_data, usuario_id)
+        return await self._request("POST", "/transactions", payload)
+
+    async def consultar_transacao(self, id_transacao: str) -> Dict:
+        """
+        Consulta uma transação (status do depósito Pix).
+        Endpoint: GET /transactions/{id}
+        """
+        return await self._request("GET", f"/transactions/{id_transacao}")
+
+    async def solicitar_saque(self, pix_key: str, valor: Decimal, external_ref: Optional[str] = None, recipient_id: Optional[int] = None) -> Dict:
+        """
+        Realiza uma transferência/saque (Cash-out) via PIX.
+        Endpoint: POST /transfers
+        """
+        payload = payload_saque(pix_key, valor, external_ref, recipient_id)
+        return await self._request("POST", "/transfers", payload)
+
+    async def consultar_transferencia(self, id_transferencia: str) -> Dict:
+        """
+        Consulta uma transferência (status do saque).
+        Endpoint: GET /transfers/{id}
+        """
+        return await self._request("GET", f"/transfers/{id_transferencia}")
@@ -0,0 +1,102 @@
+import asyncio
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.gateways.skalepay_async import AsyncSkalePayClient
+from accounts.models import SolicitacaoPagamento
+from accounts.services.pagamentos import AuditoriaDepositosService
+
+# Configuração de Logs
+logger = logging.getLogger('auditoria_financeira')
+
+
+class Command(BaseCommand):
+    help = 'Audita depósitos parados em PENDENTE (webhook perdido) e reconcilia com a SkalePay (lotes por keyset, consultas em paralelo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=200, help='Depósitos por lote (uma transação por lote)')
+        parser.add_argument('--concorrencia', type=int, help='Consultas simultâneas à SkalePay (padrão: SKALEPAY_MAX_CONCORRENCIA)')
+        parser.add_argument('--orcamento', type=float, default=240.0, help='Segundos máximos de execução (o restante fica para a próxima)')
+        parser.add_argument('--minutos', type=int, default=30, help='Só audita depósitos criados há mais de N minutos (validade do Pix)')
+        parser.add_argument('--abandono-horas', type=int, default=72, help='Ainda aguardando pagamento após N horas: cancela')
+        parser.add_argument('--limpar-placeholders', action='store_true',
+                            help='Apaga também os lançamentos "Aguardando Pagamento Pix" de depósitos já encerrados')
+
+    def handle(self, *args, **options):
+        # Antes da validade do Pix o usuário ainda pode pagar: nem consulta
+        agora = timezone.now()
+        corte = agora - datetime.timedelta(minutes=options['minutos'])
+        abandono = agora - datetime.timedelta(hours=options['abandono_horas'])
+        lote = max(options['lote'], 1)
+        concorrencia = options['concorrencia'] or getattr(settings, 'SKALEPAY_MAX_CONCORRENCIA', 20)
+
+        if options['limpar_placeholders']:
+            self._limpar_placeholders(lote)
+
+        self.stdout.write(f"🔄 Auditando depósitos em PENDENTE (lotes de {lote}, {concorrencia} consultas simultâneas)...")
+        inicio = time.monotonic()
+        totais = {"depositos": 0, "aprovados": 0, "recusados": 0, "cancelados": 0, "aguardando": 0, "erros": 0,
+                  "ignorados": 0, "placeholders": 0}
+        ultimo_id = 0
+        esgotou_orcamento = False
+
+        # Um event loop para o comando todo: o pool keep-alive do cliente sobrevive entre lotes
+        loop = asyncio.new_event_loop()
+        client = AsyncSkalePayClient(max_concorrencia=concorrencia)
+        try:
+            while True:
+                if time.monotonic() - inicio >= options['orcamento']:
+                    esgotou_orcamento = True
+                    break
+                depositos = AuditoriaDepositosService.pendentes(ultimo_id, lote, corte)
+                if not depositos:
+                    break
+                ultimo_id = depositos[-1].pk
+                totais["depositos"] += len(depositos)
+
+                status = loop.run_until_complete(AuditoriaDepositosService.consultar_status(depositos, client))
+                for chave, valor in AuditoriaDepositosService.aplicar(status, abandono).items():
+                    totais[chave] += valor
+
+                decorrido = time.monotonic() - inicio
+                self.stdout.write(f"   ... {totais['depositos']} depósitos ({totais['depositos'] / max(decorrido, 1e-6):.1f}/s)")
+        finally:
+            loop.run_until_complete(client.aclose())
+            loop.close()
+
+        duracao = time.monotonic() - inicio
+        self.stdout.write(
+            f"📊 {totais['depositos']} depósitos em {duracao:.1f}s ({totais['depositos'] / max(duracao, 1e-6):.1f}/s): "
+            f"{totais['aprovados']} pagos, {totais['recusados']} recusados, {totais['cancelados']} expirados, "
+            f"{totais['aguardando']} ainda aguardando pagamento, {totais['ignorados']} ignorados (travados/alterados), "
+            f"{totais['placeholders']} lançamentos provisórios apagados"
+        )
+        if totais['erros']:
+            logger.warning(f"Auditoria de depósitos: {totais['erros']} consultas sem resposta da SkalePay")
+            self.stdout.write(self.style.WARNING(f"⚠️ {totais['erros']} consultas falharam (API SkalePay indisponível). Tentaremos depois."))
+        if esgotou_orcamento:
+            self.stdout.write(self.style.WARNING(
+                f"⏱️ Orçamento de {options['orcamento']:g}s esgotado: o restante fica para a próxima execução."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Auditoria de depósitos finalizada."))
+
+    def _limpar_placeholders(self, lote):
+        """Passada única (keyset) pelos depósitos já encerrados, anteriores à correção da view."""
+        self.stdout.write("🔄 Limpando lançamentos provisórios de depósitos encerrados...")
+        ultimo_id, apagados = 0, 0
+        while True:
+            ids = list(
+                SolicitacaoPagamento.objects.filter(tipo='DEPOSITO', pk__gt=ultimo_id)
+                .exclude(status='PENDENTE').order_by('pk').values_list('pk', flat=True)[:lote]
+            )
+            if not ids:
+                break
+            ultimo_id = ids[-1]
+            apagados += AuditoriaDepositosService.limpar_placeholders(ids)
+        self.stdout.write(self.style.SUCCESS(f"✅ {apagados} lançamentos provisórios apagados."))
@@ -0,0 +1,83 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from accounts.models import CustomUser
+from accounts.services.auditoria import AuditoriaLedgerService
+
+
+def _auditar_lote(usuario_ids, usar_checkpoint):
+    try:
+        return AuditoriaLedgerService.verificar_lote(usuario_ids, usar_checkpoint=usar_checkpoint)
+    finally:
+        # Cada thread abre a própria conexão; fecha ao terminar o lote
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Confere CustomUser.saldo contra o extrato, a partir do último checkpoint de cada usuário (lotes em paralelo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Lotes auditados em paralelo (1 = sequencial)')
+        parser.add_argument('--lote', type=int, default=500, help='Usuários por lote')
+        parser.add_argument('--usuario', type=int, help='Audita apenas este usuário (ID)')
+        parser.add_argument('--completo', action='store_true', help='Ignora os checkpoints e reaplica o extrato inteiro')
+
+    def handle(self, *args, **options):
+        usar_checkpoint = not options['completo']
+        if options.get('usuario'):
+            ids = [options['usuario']]
+        else:
+            ids = list(CustomUser.objects.order_by('pk').values_list('pk', flat=True))
+        lote = max(options['lote'], 1)
+        lotes = [ids[i:i + lote] for i in range(0, len(ids), lote)]
+
+        modo = "completa" if options['completo'] else "incremental"
+        self.stdout.write(f"🔄 Auditoria {modo}: {len(ids)} usuários em {len(lotes)} lotes ({options['workers']} workers)...")
+        inicio = time.monotonic()
+
+        totais = {"usuarios": 0, "transacoes": 0, "checkpoints": 0}
+        suspeitos = {}
+        concluidos = [0]
+
+        def acumular(resultado):
+            for chave in totais:
+                totais[chave] += resultado[chave]
+            for divergencia in resultado['divergencias']:
+                suspeitos.setdefault(divergencia['usuario_id'], []).append(divergencia)
+            concluidos[0] += 1
+            if concluidos[0] % 20 == 0:
+                self.stdout.write(f"   ... {totais['usuarios']} usuários, {totais['transacoes']} lançamentos")
+
+        if options['workers'] <= 1:
+            for usuario_ids in lotes:
+                acumular(AuditoriaLedgerService.verificar_lote(usuario_ids, usar_checkpoint=usar_checkpoint))
+        else:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                futuros = [executor.submit(_auditar_lote, usuario_ids, usar_checkpoint) for usuario_ids in lotes]
+                for futuro in as_completed(futuros):
+                    acumular(futuro.result())
+
+        # Reconfere os suspeitos com a carteira travada (descarta corridas com apostas/depósitos em andamento)
+        divergencias = []
+        for usuario_id in sorted(suspeitos):
+            divergencias.extend(AuditoriaLedgerService.verificar_usuario(usuario_id, usar_checkpoint=usar_checkpoint))
+
+        duracao = time.monotonic() - inicio
+        self.stdout.write(
+            f"📊 {totais['usuarios']} usuários, {totais['transacoes']} lançamentos reaplicados, "
+            f"{totais['checkpoints']} checkpoints avançados em {duracao:.1f}s"
+        )
+        for d in divergencias:
+            self.stdout.write(self.style.ERROR(
+                f"   ❌ Usuário {d['usuario_id']} - {d['tipo']} (transação {d['transacao_id']}): "
+                f"esperado {d['esperado']}, encontrado {d['encontrado']}"
+            ))
+
+        if divergencias:
+            usuarios = len({d['usuario_id'] for d in divergencias})
+            self.stdout.write(self.style.ERROR(f"🚨 {len(divergencias)} divergências em {usuarios} usuários."))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Extrato confere com o saldo de todos os usuários."))
@@ -0,0 +1,86 @@
+import asyncio
+import signal
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from accounts.gateways.skalepay_async import AsyncSkalePayClient
+from accounts.services.saques import LOTE_PADRAO, TAXA_PADRAO, LimitadorTaxa, SaqueOutboxService
+
+
+class Command(BaseCommand):
+    help = 'Envia à SkalePay os saques da outbox (chamadas concorrentes, com limite de taxa)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=LOTE_PADRAO, help='Saques reivindicados por vez')
+        parser.add_argument('--concorrencia', type=int, help='Chamadas simultâneas à SkalePay (padrão: SKALEPAY_MAX_CONCORRENCIA)')
+        parser.add_argument('--taxa', type=float, default=TAXA_PADRAO, help='Máximo de saques enviados por segundo')
+        parser.add_argument('--continuo', action='store_true', help='Não termina com a fila vazia: aguarda novos saques')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera com a fila vazia (--continuo)')
+
+    def handle(self, *args, **options):
+        parar = threading.Event()
+        if options['continuo']:
+            # Deploy/restart: termina o lote em andamento e sai
+            signal.signal(signal.SIGTERM, lambda *_: parar.set())
+
+        lote = max(options['lote'], 1)
+        concorrencia = options['concorrencia'] or getattr(settings, 'SKALEPAY_MAX_CONCORRENCIA', 20)
+        totais = Counter()
+
+        modo = "contínuo" if options['continuo'] else "até esvaziar a fila"
+        self.stdout.write(
+            f"🔄 Despachando saques (lotes de {lote}, {concorrencia} simultâneos, até {options['taxa']:g}/s, {modo})..."
+        )
+        inicio = time.monotonic()
+
+        # Um event loop para o comando todo: o pool keep-alive do cliente sobrevive entre lotes.
+        # O ORM roda fora dele (entre os lotes), na thread principal.
+        loop = asyncio.new_event_loop()
+        client = AsyncSkalePayClient(max_concorrencia=concorrencia)
+        limitador = LimitadorTaxa(options['taxa'])
+        try:
+            while not parar.is_set():
+                if options['continuo']:
+                    close_old_connections()
+                try:
+                    totais['travados'] += SaqueOutboxService.reconciliar_travados()
+                    itens = SaqueOutboxService.reivindicar(lote)
+                except DatabaseError as e:
+                    self.stdout.write(self.style.ERROR(f"❌ Erro de banco no despachante: {e}"))
+                    if not options['continuo']:
+                        break
+                    itens = []
+
+                if itens:
+                    resultados = loop.run_until_complete(SaqueOutboxService.enviar(itens, client, limitador))
+                    totais.update(SaqueOutboxService.registrar_lote(resultados))
+                    totais['saques'] += len(itens)
+
+                if len(itens) < lote:
+                    if not options['continuo']:
+                        break
+                    parar.wait(options['intervalo'])
+        except KeyboardInterrupt:
+            # Itens já em ENVIANDO sem desfecho viram INCERTO na próxima reconciliação
+            parar.set()
+        finally:
+            loop.run_until_complete(client.aclose())
+            loop.close()
+
+        duracao = time.monotonic() - inicio
+        self.stdout.write(
+            f"📊 {totais['saques']} saques em {duracao:.1f}s: {totais['enviado']} enviados, "
+            f"{totais['recusado']} recusados (estornados), {totais['retentativa']} voltam à fila, "
+            f"{totais['incerto'] + totais['travados']} incertos"
+        )
+        if totais['incerto'] or totais['travados']:
+            self.stdout.write(self.style.WARNING(
+                "⚠️ Saques com desfecho incerto seguem PROCESSANDO: o auditar_saques confere com o banco."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Outbox de saques processada."))
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.particionamento import (
+    TABELAS_PARTICIONADAS, arquivar_particao, criar_particoes_futuras, desanexar_particao,
+    eh_postgres, esta_particionada, inicio_do_mes, listar_particoes, particoes_anteriores_a, somar_meses,
+)
+
+
+class Command(BaseCommand):
+    help = 'Manutenção das partições mensais: cria meses futuros e desanexa/arquiva meses antigos (cron diário)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tabela', choices=sorted(TABELAS_PARTICIONADAS), help='Só esta tabela (padrão: todas)')
+        parser.add_argument('--meses-futuros', type=int, default=3, help='Partições criadas à frente do mês atual')
+        parser.add_argument('--reter-meses', type=int, help='Desanexa partições mais antigas que N meses')
+        parser.add_argument('--schema-arquivo', help='Move as partições desanexadas para este schema')
+        parser.add_argument('--tablespace', help='Move as partições desanexadas para este tablespace (disco frio)')
+        parser.add_argument('--concorrente', action='store_true', help='DETACH ... CONCURRENTLY (PG 14+, sem lock exclusivo)')
+        parser.add_argument('--listar', action='store_true', help='Só lista as partições atuais')
+
+    def handle(self, *args, **options):
+        if not eh_postgres(connection):
+            self.stdout.write("⚠️ Particionamento só existe no PostgreSQL. Nada a fazer.")
+            return
+
+        if options['reter_meses'] is not None and options['reter_meses'] < 1:
+            raise CommandError("--reter-meses deve ser >= 1")
+
+        tabelas = [options['tabela']] if options.get('tabela') else sorted(TABELAS_PARTICIONADAS)
+        for tabela in tabelas:
+            self._processar(tabela, options)
+
+    def _processar(self, tabela, options):
+        with connection.cursor() as cursor:
+            if not esta_particionada(cursor, tabela):
+                self.stdout.write(self.style.WARNING(f"⚠️ {tabela} não está particionada (rode as migrations)."))
+                return
+
+            if options['listar']:
+                self.stdout.write(f"📊 {tabela}:")
+                for particao in listar_particoes(cursor, tabela):
+                    self.stdout.write(f"   {particao['nome']:<36} {particao['bytes'] / 1024 / 1024:10.1f} MB   {particao['tablespace'] or 'padrão':<12} {particao['faixa']}")
+                return
+
+            self.stdout.write(f"🔄 {tabela}: garantindo {options['meses_futuros']} meses à frente...")
+            with transaction.atomic():
+                criadas = criar_particoes_futuras(cursor, tabela, options['meses_futuros'])
+            for nome in criadas:
+                self.stdout.write(f"   + {nome}")
+
+            if options['reter_meses'] is None:
+                self.stdout.write(self.style.SUCCESS(f"✅ {len(criadas)} partições criadas."))
+                return
+
+            limite = somar_meses(inicio_do_mes(timezone.localdate()), -options['reter_meses'])
+            antigas = particoes_anteriores_a(cursor, tabela, limite)
+            for nome in antigas:
+                # CONCURRENTLY não roda dentro de transação; o modo normal é atômico por partição
+                if options['concorrente']:
+                    desanexar_particao(cursor, tabela, nome, concorrente=True)
+                    arquivar_particao(cursor, nome, options.get('schema_arquivo'), options.get('tablespace'))
+                else:
+                    with transaction.atomic():
+                        desanexar_particao(cursor, tabela, nome)
+                        arquivar_particao(cursor, nome, options.get('schema_arquivo'), options.get('tablespace'))
+                self.stdout.write(f"   - {nome} desanexada")
+
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {len(criadas)} partições criadas, {len(antigas)} desanexadas (anteriores a {limite:%m/%Y})."
+            ))
@@ -1,24 +1,47 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.db.models import Sum, Count, Q
-from django.db.models.functions import ExtractHour
 from datetime import timedelta
+from core.particionamento import faixa_do_dia
 from decimal import Decimal
 from accounts.models import MetricasDiarias, Transacao, CustomUser
+from accounts.services.metricas import MetricasModalidadeService
+from accounts.services.atividade import AtividadeService
+from accounts.services.previsao import PrevisaoReceitaService
 from games.models import Aposta
 
 class Command(BaseCommand):
     help = 'ETL Completo: Financeiro, Operacional, Churn e Mapa de Calor.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--data', type=str, help='Dia a processar (AAAA-MM-DD). Padrão: ontem.')
+        parser.add_argument('--dias', type=int, default=1, help='Reprocessa N dias terminando em --data (backfill).')
+
     def handle(self, *args, **options):
-        # Para testes imediatos use: ontem = timezone.localdate()
-        # Para produção: ontem = timezone.localdate() - timedelta(days=1)
-        ontem = timezone.localdate() - timedelta(days=1)
-        
+        # Para testes imediatos use: --data com a data de hoje
+        # Para produção (cron): sem argumentos, processa ontem
+        if options.get('data'):
+            dia_final = timezone.datetime.strptime(options['data'], '%Y-%m-%d').date()
+        else:
+            dia_final = timezone.localdate() - timedelta(days=1)
+
+        for delta in range(max(options.get('dias') or 1, 1) - 1, -1, -1):
+            self._processar_dia(dia_final - timedelta(days=delta))
+
+        # Reajuste noturno da previsão de receita (o dashboard só lê o resultado)
+        previsao = PrevisaoReceitaService.ajustar(referencia=dia_final + timedelta(days=1))
+        if previsao:
+            self.stdout.write(f"🔮 Previsão reajustada ({previsao.dias_base} dias base). Projeção 30d: {previsao.projecao_30d}")
+        else:
+            self.stdout.write("🔮 Histórico insuficiente para previsão.")
+
+    def _processar_dia(self, ontem):
         self.stdout.write(f"📊 Processando métricas para: {ontem}")
 
         # --- 1. FINANCEIRO ---
-        transacoes_dia = Transacao.objects.filter(data__date=ontem)
+        # Faixa na coluna `data` (e não data__date) para podar as partições mensais
+        inicio_dia, fim_dia = faixa_do_dia(ontem)
+        transacoes_dia = Transacao.objects.filter(data__gte=inicio_dia, data__lt=fim_dia)
         
         resumo_dep = transacoes_dia.filter(tipo='DEPOSITO').aggregate(total=Sum('valor'), qtd=Count('id'))
         dep_val = resumo_dep['total'] or Decimal('0.00')
@@ -31,7 +54,7 @@ class Command(BaseCommand):
         bonus_val = transacoes_dia.filter(tipo='BONUS').aggregate(Sum('valor'))['valor__sum'] or Decimal('0.00')
 
         # --- 2. OPERACIONAL & MODALIDADES ---
-        apostas_dia = Aposta.objects.filter(criado_em__date=ontem)
+        apostas_dia = Aposta.objects.filter(criado_em__gte=inicio_dia, criado_em__lt=fim_dia)
         
         resumo_game = apostas_dia.aggregate(
             apostado=Sum('valor'),
@@ -41,55 +64,31 @@ class Command(BaseCommand):
         total_premios = resumo_game['premios'] or Decimal('0.00')
         house_edge = total_apostado - total_premios
 
-        # JSON Modalidades
-        stats_modalidades = apostas_dia.values('tipo_jogo').annotate(
-            total_vol=Sum('valor'),
-            total_pay=Sum('valor_premio', filter=Q(ganhou=True)),
-            qtd=Count('id')
-        ).order_by('-total_vol')
-
-        perf_dict = {}
-        for item in stats_modalidades:
-            modalidade = item['tipo_jogo'] or "Outros"
-            vol = float(item['total_vol'] or 0)
-            pay = float(item['total_pay'] or 0)
-            perf_dict[modalidade] = {
-                "apostado": vol, "premios": pay, "lucro": vol - pay, "qtd": item['qtd']
-            }
-
-        # --- 3. GAP RESOLVIDO: MAPA DE CALOR (HORÁRIOS DE PICO) ---
-        # Agrupa apostas por hora (0 a 23)
-        apostas_por_hora = apostas_dia.annotate(hora=ExtractHour('criado_em')).values('hora').annotate(
-            vol=Sum('valor'),
-            qtd=Count('id')
-        ).order_by('hora')
-
-        mapa_horas = {f"{h:02d}h": {"vol": 0.0, "qtd": 0} for h in range(24)}
-        for item in apostas_por_hora:
-            h_key = f"{item['hora']:02d}h"
-            mapa_horas[h_key] = {"vol": float(item['vol']), "qtd": item['qtd']}
+        # --- 3. CUBO MODALIDADE/COLOCAÇÃO/JOGO (1 query agrupada) ---
+        # O JSON de modalidades e o mapa de calor (horários de pico) saem do cubo,
+        # sem novas varreduras em palpite_aposta.
+        celulas = MetricasModalidadeService.consolidar_dia(ontem)
+        perf_dict = MetricasModalidadeService.resumo_por_modalidade(ontem)
+        mapa_horas = MetricasModalidadeService.resumo_por_hora(ontem)
+        self.stdout.write(f"   Cubo de modalidades: {celulas} células.")
 
         # --- 4. GAP RESOLVIDO: CHURN & ENGAGEMENT ---
         # Novos: entraram ontem
         novos = CustomUser.objects.filter(date_joined__date=ontem).count()
         
-        # Ativos: apostaram ontem
-        ids_ativos_ontem = set(apostas_dia.values_list('usuario_id', flat=True))
-        ativos_count = len(ids_ativos_ontem)
+        # Ativos: apostaram ontem (bitmap diário, também usado por DAU/WAU/MAU e cohorts)
+        bitmaps = AtividadeService.registrar_dia(ontem)
+        ativos_count = bitmaps['ATIVIDADE'].bit_count()
         
         # Lógica de Churn (Simplificada para MVP):
-        # Usuários que apostaram há 7 dias atrás, mas NÃO apostaram nos últimos 3 dias (incluindo ontem)
+        # Usuários que apostaram há 7 dias atrás, mas NÃO apostaram ontem (AND NOT entre bitmaps)
         sete_dias_atras = ontem - timedelta(days=7)
-        ids_ativos_semana_passada = set(Aposta.objects.filter(criado_em__date=sete_dias_atras).values_list('usuario_id', flat=True))
-        
-        # Quem estava lá e sumiu?
-        ids_perda = ids_ativos_semana_passada - ids_ativos_ontem
-        churn_count = len(ids_perda) # Usuários que "churnaram" ontem
+        churn_count = AtividadeService.churn_entre(sete_dias_atras, ontem) # Usuários que "churnaram" ontem
 
         # FTDs
         ftds_qs = CustomUser.objects.filter(data_primeiro_deposito__date=ontem)
         ftds_qtd = ftds_qs.count()
-        ftds_val = Transacao.objects.filter(tipo='DEPOSITO', data__date=ontem, usuario__in=ftds_qs).aggregate(Sum('valor'))['valor__sum'] or Decimal('0.00')
+        ftds_val = transacoes_dia.filter(tipo='DEPOSITO', usuario__in=ftds_qs).aggregate(Sum('valor'))['valor__sum'] or Decimal('0.00')
 
         # --- 5. GRAVAÇÃO ---
         MetricasDiarias.objects.update_or_create(
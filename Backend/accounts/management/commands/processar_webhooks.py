@@ -0,0 +1,102 @@
+import signal
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connections
+from django.utils import timezone
+
+from accounts.services.pagamentos import LOTE_PADRAO, WebhookService
+
+
+class Command(BaseCommand):
+    help = 'Consome a caixa de entrada dos webhooks da SkalePay (lotes com SKIP LOCKED) ou devolve eventos à fila'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Consumidores em paralelo (threads)')
+        parser.add_argument('--lote', type=int, default=LOTE_PADRAO, help='Eventos por transação')
+        parser.add_argument('--continuo', action='store_true', help='Não termina com a fila vazia: aguarda novos eventos')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera com a fila vazia (--continuo)')
+        parser.add_argument('--reprocessar', action='store_true', help='Devolve eventos à fila em vez de consumir')
+        parser.add_argument('--ids', type=str, help='Com --reprocessar: IDs de WebhookEvento separados por vírgula')
+        parser.add_argument('--status', type=str, default='FALHOU', help='Com --reprocessar: status a devolver (ex: FALHOU,PROCESSADO)')
+        parser.add_argument('--horas', type=int, help='Com --reprocessar: só eventos recebidos nas últimas N horas')
+
+    def handle(self, *args, **options):
+        if options['reprocessar']:
+            return self._reprocessar(options)
+
+        parar = threading.Event()
+        if options['continuo']:
+            # Deploy/restart: termina o lote em andamento e sai
+            signal.signal(signal.SIGTERM, lambda *_: parar.set())
+
+        totais = {"eventos": 0, "processados": 0, "erros": 0, "falhas": 0}
+        lock_totais = threading.Lock()
+        lote = max(options['lote'], 1)
+
+        def consumir():
+            while not parar.is_set():
+                if options['continuo']:
+                    close_old_connections()
+                try:
+                    resultado = WebhookService.processar_lote(lote)
+                except DatabaseError as e:
+                    self.stdout.write(self.style.ERROR(f"❌ Erro de banco no consumidor: {e}"))
+                    resultado = {"eventos": 0}
+                    if not options['continuo']:
+                        return
+                with lock_totais:
+                    for chave, valor in resultado.items():
+                        totais[chave] += valor
+                if resultado["eventos"] < lote:
+                    # Fila vazia (ou só eventos travados por outro consumidor)
+                    if not options['continuo']:
+                        return
+                    parar.wait(options['intervalo'])
+
+        def consumir_em_thread():
+            try:
+                consumir()
+            finally:
+                # Cada thread abre a própria conexão; fecha ao terminar
+                connections.close_all()
+
+        modo = "contínuo" if options['continuo'] else "até esvaziar a fila"
+        self.stdout.write(f"🔄 Consumindo webhooks ({options['workers']} workers, lotes de {lote}, {modo})...")
+        inicio = time.monotonic()
+
+        try:
+            if options['workers'] <= 1:
+                consumir()
+            else:
+                threads = [threading.Thread(target=consumir_em_thread, daemon=True) for _ in range(options['workers'])]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    while thread.is_alive():
+                        thread.join(timeout=1)
+        except KeyboardInterrupt:
+            # Threads são daemon: o lote em andamento termina ou sofre rollback por inteiro
+            parar.set()
+
+        duracao = time.monotonic() - inicio
+        self.stdout.write(
+            f"📊 {totais['eventos']} eventos em {duracao:.1f}s: {totais['processados']} processados, "
+            f"{totais['erros']} com erro (voltam à fila), {totais['falhas']} falharam"
+        )
+        if totais['falhas']:
+            self.stdout.write(self.style.WARNING(
+                "⚠️ Eventos com tentativas esgotadas: revise e use --reprocessar para devolvê-los à fila."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Caixa de entrada processada."))
+
+    def _reprocessar(self, options):
+        status = [s.strip().upper() for s in options['status'].split(',') if s.strip()]
+        ids = [int(i) for i in options['ids'].split(',')] if options.get('ids') else None
+        desde = timezone.now() - timedelta(hours=options['horas']) if options.get('horas') else None
+
+        total = WebhookService.reprocessar(ids=ids, status=status, desde=desde)
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} eventos ({', '.join(status)}) devolvidos à fila."))
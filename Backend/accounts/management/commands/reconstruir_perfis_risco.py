@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Transacao
+from accounts.services.risco import PerfilRiscoService
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói PerfilRisco a partir do extrato (backfill após deploy ou auditoria)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', type=int, help='Reconstrói apenas este usuário (ID)')
+
+    def handle(self, *args, **options):
+        if options.get('usuario'):
+            usuarios = [options['usuario']]
+        else:
+            usuarios = Transacao.objects.values_list('usuario_id', flat=True).distinct().order_by('usuario_id')
+
+        self.stdout.write("🔄 Reconstruindo perfis de risco...")
+        total = 0
+        for usuario_id in usuarios:
+            PerfilRiscoService.reconstruir(usuario_id)
+            total += 1
+            if total % 1000 == 0:
+                self.stdout.write(f"   ... {total} perfis")
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} perfis de risco reconstruídos."))
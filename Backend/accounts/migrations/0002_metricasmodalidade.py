@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('games', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricasModalidade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('hora', models.PositiveSmallIntegerField(verbose_name='Hora (0-23)')),
+                ('total_apostado', models.BigIntegerField(default=0, verbose_name='Total Apostado (Centavos)')),
+                ('total_premios', models.BigIntegerField(default=0, verbose_name='Total Prêmios (Centavos)')),
+                ('qtd_apostas', models.IntegerField(default=0)),
+                ('apostadores_unicos', models.IntegerField(default=0)),
+                ('colocacao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='games.colocacao')),
+                ('jogo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='games.jogo')),
+                ('modalidade', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='games.modalidade')),
+                ('sorteio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metricas_modalidade', to='games.sorteio')),
+            ],
+            options={
+                'verbose_name': 'Métrica por Modalidade',
+                'verbose_name_plural': 'Métricas por Modalidade',
+                'indexes': [models.Index(fields=['data', 'modalidade'], name='accounts_me_data_1a4c2b_idx'), models.Index(fields=['sorteio'], name='accounts_me_sorteio_c31477_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_metricasmodalidade'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BitmapUsuarios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('tipo', models.CharField(choices=[('ATIVIDADE', 'Apostou no dia'), ('CADASTRO', 'Cadastrou no dia'), ('FTD', 'Primeiro depósito no dia')], max_length=10)),
+                ('bitmap', models.BinaryField()),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Bitmap de Usuários',
+                'verbose_name_plural': 'Bitmaps de Usuários',
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'data'), name='uniq_bitmap_tipo_data')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_bitmapusuarios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrevisaoReceita',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serie', models.CharField(default='house_edge_valor', max_length=30, unique=True)),
+                ('gerado_em', models.DateTimeField(auto_now=True)),
+                ('base_inicio', models.DateField(blank=True, null=True)),
+                ('base_fim', models.DateField(blank=True, null=True)),
+                ('dias_base', models.IntegerField(default=0)),
+                ('coeficientes', models.JSONField(blank=True, default=dict)),
+                ('desvio_residuo', models.FloatField(default=0.0)),
+                ('projecao_7d', models.BigIntegerField(default=0)),
+                ('projecao_30d', models.BigIntegerField(default=0)),
+                ('projecao_30d_inferior', models.BigIntegerField(default=0)),
+                ('projecao_30d_superior', models.BigIntegerField(default=0)),
+                ('previsao_diaria', models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                'verbose_name': 'Previsão de Receita',
+                'verbose_name_plural': 'Previsões de Receita',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_previsaoreceita'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['usuario', 'tipo', 'data'], name='accounts_tr_usuario_24bab4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['tipo', 'data'], name='accounts_tr_tipo_f66bf6_idx'),
+        ),
+    ]
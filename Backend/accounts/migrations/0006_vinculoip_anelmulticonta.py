@@ -0,0 +1,116 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def popular_vinculos_e_aneis(apps, schema_editor):
+    """
+    Backfill: gera VinculoIP a partir de ip_registro/ultimo_ip e calcula os anéis
+    com union-find em memória (uma passada sobre os pares usuário-IP).
+    """
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    VinculoIP = apps.get_model('accounts', 'VinculoIP')
+    AnelMulticonta = apps.get_model('accounts', 'AnelMulticonta')
+
+    pares = {}
+    for usuario_id, ip_registro, ultimo_ip in CustomUser.objects.values_list(
+        'id', 'ip_registro', 'ultimo_ip'
+    ).iterator(chunk_size=5000):
+        if ip_registro:
+            pares[(ip_registro, usuario_id)] = 'REGISTRO'
+        if ultimo_ip:
+            pares.setdefault((ultimo_ip, usuario_id), 'LOGIN')
+
+    VinculoIP.objects.bulk_create(
+        [VinculoIP(ip=ip, usuario_id=usuario_id, origem=origem) for (ip, usuario_id), origem in pares.items()],
+        batch_size=2000,
+        ignore_conflicts=True,
+    )
+
+    pai = {}
+
+    def raiz(x):
+        while pai.setdefault(x, x) != x:
+            pai[x] = pai[pai[x]]
+            x = pai[x]
+        return x
+
+    primeiro_do_ip = {}
+    for ip, usuario_id in pares:
+        if ip in primeiro_do_ip:
+            pai[raiz(usuario_id)] = raiz(primeiro_do_ip[ip])
+        else:
+            primeiro_do_ip[ip] = usuario_id
+
+    componentes = {}
+    for usuario_id in pai:
+        componentes.setdefault(raiz(usuario_id), []).append(usuario_id)
+
+    contas_por_ip = {}
+    for ip, _ in pares:
+        contas_por_ip[ip] = contas_por_ip.get(ip, 0) + 1
+
+    ips_por_raiz = {}
+    for ip, usuario_id in pares:
+        if contas_por_ip[ip] > 1:
+            ips_por_raiz.setdefault(raiz(usuario_id), set()).add(ip)
+
+    for chave, membros in componentes.items():
+        if len(membros) < 2:
+            continue
+        anel = AnelMulticonta.objects.create(
+            total_usuarios=len(membros), total_ips=len(ips_por_raiz.get(chave, ()))
+        )
+        CustomUser.objects.filter(pk__in=membros).update(anel_multiconta=anel)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_transacao_indices_risco'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnelMulticonta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_usuarios', models.IntegerField(default=0)),
+                ('total_ips', models.IntegerField(default=0, help_text='IPs compartilhados por 2+ membros')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Anel de Multicontas',
+                'verbose_name_plural': 'Anéis de Multicontas',
+                'indexes': [models.Index(fields=['-total_usuarios'], name='accounts_an_total_u_3052ff_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='anel_multiconta',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='membros', to='accounts.anelmulticonta'),
+        ),
+        migrations.CreateModel(
+            name='VinculoIP',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip', models.GenericIPAddressField()),
+                ('origem', models.CharField(choices=[('REGISTRO', 'Cadastro'), ('LOGIN', 'Login')], default='LOGIN', max_length=10)),
+                ('primeiro_acesso', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_acesso', models.DateTimeField(auto_now=True)),
+                ('qtd_acessos', models.IntegerField(default=1)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vinculos_ip', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Vínculo de IP',
+                'verbose_name_plural': 'Vínculos de IP',
+                'indexes': [models.Index(fields=['usuario'], name='accounts_vi_usuario_60c224_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ip', 'usuario'), name='uniq_vinculo_ip_usuario')],
+            },
+        ),
+        migrations.RunPython(popular_vinculos_e_aneis, migrations.RunPython.noop),
+    ]
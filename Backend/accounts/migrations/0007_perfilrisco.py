@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_vinculoip_anelmulticonta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilRisco',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='perfil_risco', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('vel_deposito', models.FloatField(default=0)),
+                ('vel_saque', models.FloatField(default=0)),
+                ('vel_aposta', models.FloatField(default=0)),
+                ('vel_premio', models.FloatField(default=0)),
+                ('velocidades_em', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_deposito_em', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_saque_em', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_bonus_em', models.DateTimeField(blank=True, null=True)),
+                ('total_depositado', models.BigIntegerField(default=0)),
+                ('total_apostado', models.BigIntegerField(default=0)),
+                ('total_premios', models.BigIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Perfil de Risco',
+                'verbose_name_plural': 'Perfis de Risco',
+            },
+        ),
+    ]
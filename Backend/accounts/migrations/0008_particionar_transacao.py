@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from core.particionamento import desfazer_particionamento, particionar_tabela
+
+
+def particionar(apps, schema_editor):
+    # No-op fora do PostgreSQL (SQLite de testes/dev segue com tabela comum)
+    particionar_tabela(schema_editor.connection, 'accounts_transacao', 'data')
+
+
+def desparticionar(apps, schema_editor):
+    desfazer_particionamento(schema_editor.connection, 'accounts_transacao')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_perfilrisco'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_particionar_transacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointSaldo',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='checkpoint_saldo', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('saldo', models.BigIntegerField(default=0, verbose_name='Saldo no Checkpoint (Centavos)')),
+                ('ultima_transacao_id', models.BigIntegerField(default=0)),
+                ('ultima_transacao_em', models.DateTimeField(blank=True, null=True)),
+                ('qtd_transacoes', models.BigIntegerField(default=0)),
+                ('verificado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Saldo',
+                'verbose_name_plural': 'Checkpoints de Saldo',
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def popular_contadores(apps, schema_editor):
+    ContadorUsuario = apps.get_model('accounts', 'ContadorUsuario')
+    fontes = {
+        'apostas': apps.get_model('games', 'Aposta'),
+        'solicitacoes': apps.get_model('accounts', 'SolicitacaoPagamento'),
+        'transacoes': apps.get_model('accounts', 'Transacao'),
+    }
+    totais = {}
+    for campo, modelo in fontes.items():
+        for usuario_id, qtd in modelo.objects.values_list('usuario_id').annotate(qtd=Count('id')).order_by():
+            totais.setdefault(usuario_id, {})[campo] = qtd
+
+    ContadorUsuario.objects.bulk_create(
+        [ContadorUsuario(usuario_id=usuario_id, **campos) for usuario_id, campos in totais.items()],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_checkpointsaldo'),
+        ('games', '0005_particionar_aposta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorUsuario',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='contadores', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('apostas', models.BigIntegerField(default=0)),
+                ('solicitacoes', models.BigIntegerField(default=0)),
+                ('transacoes', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador do Usuário',
+                'verbose_name_plural': 'Contadores dos Usuários',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='solicitacaopagamento',
+            index=models.Index(fields=['usuario', 'criado_em'], name='accounts_so_usuario_45fbfb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['usuario', 'data'], name='accounts_tr_usuario_afbe01_idx'),
+        ),
+        migrations.RunPython(popular_contadores, migrations.RunPython.noop),
+    ]
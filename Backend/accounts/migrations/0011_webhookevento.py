@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_contadorusuario_indices_keyset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_externo', models.CharField(max_length=100, verbose_name='ID da Transação na SkalePay')),
+                ('tipo_evento', models.CharField(help_text='Status informado pela SkalePay (paid, failed...)', max_length=30)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSADO', 'Processado'), ('ERRO', 'Erro (aguardando nova tentativa)'), ('FALHOU', 'Falhou (tentativas esgotadas)')], default='PENDENTE', max_length=12)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('ultimo_erro', models.TextField(blank=True, null=True)),
+                ('disponivel_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('recebido_em', models.DateTimeField(auto_now_add=True)),
+                ('processado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Evento de Webhook',
+                'verbose_name_plural': 'Eventos de Webhook',
+                'indexes': [models.Index(fields=['status', 'disponivel_em'], name='accounts_we_status_cf5bf9_idx')],
+                'constraints': [models.UniqueConstraint(fields=('id_externo', 'tipo_evento'), name='webhook_evento_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_webhookevento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaqueOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('ENVIANDO', 'Enviando'), ('ENVIADO', 'Enviado (aceito pela SkalePay)'), ('RECUSADO', 'Recusado (estornado)'), ('INCERTO', 'Incerto (auditoria)')], default='PENDENTE', max_length=10)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('ultimo_erro', models.TextField(blank=True, null=True)),
+                ('disponivel_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('enviado_em', models.DateTimeField(blank=True, null=True)),
+                ('processado_em', models.DateTimeField(blank=True, null=True)),
+                ('solicitacao', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='outbox', to='accounts.solicitacaopagamento')),
+            ],
+            options={
+                'verbose_name': 'Saque na Outbox',
+                'verbose_name_plural': 'Outbox de Saques',
+                'indexes': [models.Index(fields=['status', 'disponivel_em'], name='accounts_sa_status_a42e5d_idx')],
+            },
+        ),
+    ]
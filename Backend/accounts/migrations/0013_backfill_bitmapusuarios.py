@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:02
+
+import zlib
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import migrations
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Cobre o ativos_30d do dashboard e a janela padrão de cohorts (12 semanas)
+DIAS_BACKFILL = 90
+
+
+def _ids_para_bitmap(ids):
+    buffer = bytearray((max(ids) >> 3) + 1)
+    for usuario_id in ids:
+        buffer[usuario_id >> 3] |= 1 << (usuario_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def popular_bitmaps(apps, schema_editor):
+    """Bitmaps dos últimos DIAS_BACKFILL dias (até ontem) que o processar_metricas ainda não gravou."""
+    BitmapUsuarios = apps.get_model('accounts', 'BitmapUsuarios')
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Aposta = apps.get_model('games', 'Aposta')
+
+    ontem = timezone.localdate() - timedelta(days=1)
+    inicio = ontem - timedelta(days=DIAS_BACKFILL - 1)
+    de = timezone.make_aware(datetime.combine(inicio, time.min))
+    ate = timezone.make_aware(datetime.combine(ontem + timedelta(days=1), time.min))
+    fontes = {
+        'ATIVIDADE': Aposta.objects.filter(criado_em__gte=de, criado_em__lt=ate).annotate(
+            dia=TruncDate('criado_em')).values_list('dia', 'usuario_id').distinct(),
+        'CADASTRO': CustomUser.objects.filter(date_joined__gte=de, date_joined__lt=ate).annotate(
+            dia=TruncDate('date_joined')).values_list('dia', 'id'),
+        'FTD': CustomUser.objects.filter(data_primeiro_deposito__gte=de, data_primeiro_deposito__lt=ate).annotate(
+            dia=TruncDate('data_primeiro_deposito')).values_list('dia', 'id'),
+    }
+    for tipo, qs in fontes.items():
+        gravados = set(BitmapUsuarios.objects.filter(tipo=tipo, data__gte=inicio).values_list('data', flat=True))
+        ids = defaultdict(list)
+        for dia, usuario_id in qs.order_by():
+            ids[dia].append(usuario_id)
+
+        novos = []
+        for delta in range(DIAS_BACKFILL):
+            dia = inicio + timedelta(days=delta)
+            if dia in gravados:
+                continue
+            bitmap = _ids_para_bitmap(ids[dia]) if ids.get(dia) else 0
+            novos.append(BitmapUsuarios(
+                data=dia, tipo=tipo, total=bitmap.bit_count(),
+                bitmap=zlib.compress(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')),
+            ))
+        BitmapUsuarios.objects.bulk_create(novos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_saqueoutbox'),
+        ('games', '0005_particionar_aposta'),
+    ]
+
+    operations = [
+        migrations.RunPython(popular_bitmaps, migrations.RunPython.noop),
+    ]
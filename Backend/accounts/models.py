@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.utils import timezone
 from decimal import Decimal 
 
 class CustomUserManager(BaseUserManager):
@@ -62,6 +63,10 @@ class CustomUser(AbstractUser):
     # Risco: Marcação para usuários perigosos (fraudadores/bônus abusers)
     conta_suspeita = models.BooleanField(default=False)
     motivo_suspeita = models.TextField(blank=True, null=True)
+    # Componente conexa de contas que compartilham IP (ver VinculoIP / MulticontaService)
+    anel_multiconta = models.ForeignKey(
+        'AnelMulticonta', on_delete=models.SET_NULL, null=True, blank=True, related_name='membros'
+    )
 
     TIPOS_USUARIO = (
         ('JOGADOR', 'Jogador Comum'),
@@ -229,6 +234,12 @@ class SolicitacaoPagamento(models.Model):
     atualizado_em = models.DateTimeField(auto_now=True)
     aprovado_por = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='aprovacoes_financeiras')
 
+    class Meta:
+        indexes = [
+            # Histórico do usuário paginado por keyset (criado_em, id)
+            models.Index(fields=['usuario', 'criado_em']),
+        ]
+
     def __str__(self):
         return f"{self.tipo} - {self.usuario} - {self.get_status_display()} - R$ {self.valor}"
 
@@ -277,6 +288,100 @@ class MetricasDiarias(models.Model):
             models.Index(fields=['data']),
         ]
 
+
+class MetricasModalidade(models.Model):
+    """
+    Cubo de performance por Jogo/Modalidade/Colocação.
+    Cada linha é uma célula (dia, hora, sorteio, jogo, modalidade, colocação)
+    com medidas inteiras em centavos. Gerado 1x por dia pelo `processar_metricas`
+    com uma única query agrupada sobre `palpite_aposta`.
+    """
+    data = models.DateField()
+    hora = models.PositiveSmallIntegerField(verbose_name="Hora (0-23)")
+
+    sorteio = models.ForeignKey('games.Sorteio', on_delete=models.CASCADE, related_name='metricas_modalidade')
+    jogo = models.ForeignKey('games.Jogo', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    modalidade = models.ForeignKey('games.Modalidade', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    colocacao = models.ForeignKey('games.Colocacao', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    # Medidas (Integer Money)
+    total_apostado = models.BigIntegerField(default=0, verbose_name="Total Apostado (Centavos)")
+    total_premios = models.BigIntegerField(default=0, verbose_name="Total Prêmios (Centavos)")
+    qtd_apostas = models.IntegerField(default=0)
+    # Atenção: não é aditivo entre células (o mesmo apostador pode aparecer em várias horas)
+    apostadores_unicos = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Métrica por Modalidade"
+        verbose_name_plural = "Métricas por Modalidade"
+        indexes = [
+            models.Index(fields=['data', 'modalidade']),
+            models.Index(fields=['sorteio']),
+        ]
+
+    def __str__(self):
+        return f"{self.data} {self.hora:02d}h - Modalidade {self.modalidade_id}"
+
+
+class BitmapUsuarios(models.Model):
+    """
+    Bitmap diário sobre os IDs de usuário (bit N ligado = usuário N).
+    Guardado comprimido (zlib). DAU/WAU/MAU, cohorts e churn saem de OR/AND/popcount,
+    sem montar sets gigantes em Python.
+    """
+    TIPO_CHOICES = [
+        ('ATIVIDADE', 'Apostou no dia'),
+        ('CADASTRO', 'Cadastrou no dia'),
+        ('FTD', 'Primeiro depósito no dia'),
+    ]
+
+    data = models.DateField()
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    bitmap = models.BinaryField()
+    # Popcount já calculado (evita descomprimir só para contar)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Bitmap de Usuários"
+        verbose_name_plural = "Bitmaps de Usuários"
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'data'], name='uniq_bitmap_tipo_data'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} {self.data} ({self.total})"
+
+
+class PrevisaoReceita(models.Model):
+    """
+    Cache do modelo de previsão de GGR (1 linha por série).
+    Reajustado toda noite pelo `processar_metricas`; o dashboard apenas lê esta linha.
+    """
+    serie = models.CharField(max_length=30, unique=True, default='house_edge_valor')
+    gerado_em = models.DateTimeField(auto_now=True)
+    base_inicio = models.DateField(null=True, blank=True)
+    base_fim = models.DateField(null=True, blank=True)
+    dias_base = models.IntegerField(default=0)
+
+    # {"intercepto": .., "tendencia": .., "dia_semana": [7], "perfil_horario": [24]}
+    coeficientes = models.JSONField(default=dict, blank=True)
+    desvio_residuo = models.FloatField(default=0.0)
+
+    # Projeções já calculadas (Centavos)
+    projecao_7d = models.BigIntegerField(default=0)
+    projecao_30d = models.BigIntegerField(default=0)
+    projecao_30d_inferior = models.BigIntegerField(default=0)
+    projecao_30d_superior = models.BigIntegerField(default=0)
+    # [{"data": "2026-01-01", "valor": .., "inferior": .., "superior": ..}, ...]
+    previsao_diaria = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        verbose_name = "Previsão de Receita"
+        verbose_name_plural = "Previsões de Receita"
+
+    def __str__(self):
+        return f"Previsão {self.serie} ({self.gerado_em:%d/%m/%Y %H:%M})"
+
 class Transacao(models.Model):
     TIPO_CHOICES = [
         ('APOSTA', 'Débito - Aposta'),
@@ -307,6 +412,16 @@ class Transacao(models.Model):
     data = models.DateTimeField(auto_now_add=True)
     descricao = models.CharField(max_length=255, blank=True, null=True) # Ex: "Aposta #123 (Milhar)"
 
+    class Meta:
+        indexes = [
+            # Detectores de risco: "crédito do tipo X do usuário antes de Y" (EXISTS correlacionado)
+            models.Index(fields=['usuario', 'tipo', 'data']),
+            # Varredura dos saques da janela, mais recentes primeiro
+            models.Index(fields=['tipo', 'data']),
+            # Extrato do usuário paginado por keyset (data, id)
+            models.Index(fields=['usuario', 'data']),
+        ]
+
     def __str__(self):
         return f"{self.data} - {self.usuario} - {self.tipo} - R$ {self.valor}"
     
@@ -316,4 +431,209 @@ class Transacao(models.Model):
         
     @property
     def cpf_cnpj(self):
-        return self.usuario.cpf_cnpj
\ No newline at end of file
+        return self.usuario.cpf_cnpj
+
+
+class AnelMulticonta(models.Model):
+    """
+    Anel de multicontas: componente conexa do grafo usuário <-> IP.
+    Dois usuários caem no mesmo anel se compartilharam algum IP, direta ou
+    indiretamente (A e B no IP1, B e C no IP2 -> A, B, C no mesmo anel).
+    Mantido incrementalmente por `MulticontaService.registrar_acesso`.
+    """
+    total_usuarios = models.IntegerField(default=0)
+    total_ips = models.IntegerField(default=0, help_text="IPs compartilhados por 2+ membros")
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Anel de Multicontas"
+        verbose_name_plural = "Anéis de Multicontas"
+        indexes = [models.Index(fields=['-total_usuarios'])]
+
+    def __str__(self):
+        return f"Anel #{self.pk} ({self.total_usuarios} contas)"
+
+
+class VinculoIP(models.Model):
+    """
+    Índice IP -> usuários. Uma linha por par (ip, usuario), gravada no cadastro
+    (ip_registro) e a cada login (ultimo_ip).
+    """
+    ORIGEM_CHOICES = [
+        ('REGISTRO', 'Cadastro'),
+        ('LOGIN', 'Login'),
+    ]
+
+    ip = models.GenericIPAddressField()
+    usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='vinculos_ip')
+    origem = models.CharField(max_length=10, choices=ORIGEM_CHOICES, default='LOGIN')
+    primeiro_acesso = models.DateTimeField(auto_now_add=True)
+    ultimo_acesso = models.DateTimeField(auto_now=True)
+    qtd_acessos = models.IntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Vínculo de IP"
+        verbose_name_plural = "Vínculos de IP"
+        constraints = [
+            models.UniqueConstraint(fields=['ip', 'usuario'], name='uniq_vinculo_ip_usuario'),
+        ]
+        indexes = [models.Index(fields=['usuario'])]
+
+    def __str__(self):
+        return f"{self.ip} - {self.usuario_id}"
+
+
+class PerfilRisco(models.Model):
+    """
+    Features de risco por usuário, atualizadas a cada lançamento no extrato
+    (signal de `Transacao`). Velocidades são somas com decaimento exponencial
+    (meia-vida em `accounts.services.risco`), então o score de um saque lê
+    uma única linha em vez de varrer o histórico.
+    """
+    usuario = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='perfil_risco')
+
+    # Velocidades (centavos, decaídas até `velocidades_em`)
+    vel_deposito = models.FloatField(default=0)
+    vel_saque = models.FloatField(default=0)
+    vel_aposta = models.FloatField(default=0)
+    vel_premio = models.FloatField(default=0)
+    velocidades_em = models.DateTimeField(null=True, blank=True)
+
+    # Recência
+    ultimo_deposito_em = models.DateTimeField(null=True, blank=True)
+    ultimo_saque_em = models.DateTimeField(null=True, blank=True)
+    ultimo_bonus_em = models.DateTimeField(null=True, blank=True)
+
+    # Acumulados (taxa de acerto de longo prazo)
+    total_depositado = models.BigIntegerField(default=0)
+    total_apostado = models.BigIntegerField(default=0)
+    total_premios = models.BigIntegerField(default=0)
+
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Perfil de Risco"
+        verbose_name_plural = "Perfis de Risco"
+
+    def __str__(self):
+        return f"Perfil de Risco - {self.usuario_id}"
+
+
+class CheckpointSaldo(models.Model):
+    """
+    Último ponto do extrato de um usuário já conferido pela auditoria
+    (`auditar_ledger`). A próxima auditoria reaplica só os lançamentos com
+    id > `ultima_transacao_id`, partindo de `saldo`.
+
+    Sem FK para `Transacao`: a tabela é particionada e sua PK é (id, data).
+    """
+    usuario = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='checkpoint_saldo')
+    saldo = models.BigIntegerField(default=0, verbose_name="Saldo no Checkpoint (Centavos)")
+    ultima_transacao_id = models.BigIntegerField(default=0)
+    # Data do último lançamento conferido: limita a releitura às partições recentes
+    ultima_transacao_em = models.DateTimeField(null=True, blank=True)
+    qtd_transacoes = models.BigIntegerField(default=0)
+    verificado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Checkpoint de Saldo"
+        verbose_name_plural = "Checkpoints de Saldo"
+
+    def __str__(self):
+        return f"Checkpoint {self.usuario_id} - {self.ultima_transacao_id}"
+
+
+class ContadorUsuario(models.Model):
+    """
+    Totais por usuário mantidos pelos signals de criação/remoção. Os históricos
+    paginados por keyset leem o total daqui em vez de COUNT(*) por página.
+    """
+    usuario = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='contadores')
+    apostas = models.BigIntegerField(default=0)
+    solicitacoes = models.BigIntegerField(default=0)
+    transacoes = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Contador do Usuário"
+        verbose_name_plural = "Contadores dos Usuários"
+
+    def __str__(self):
+        return f"Contadores - {self.usuario_id}"
+
+
+class WebhookEvento(models.Model):
+    """
+    Caixa de entrada dos webhooks da SkalePay. O endpoint só valida a assinatura
+    e grava o evento bruto aqui; os consumidores (`processar_webhooks`) aplicam
+    os efeitos em lotes. A unicidade (id_externo, tipo_evento) descarta as
+    reentregas da SkalePay antes de qualquer efeito.
+    """
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('PROCESSADO', 'Processado'),
+        ('ERRO', 'Erro (aguardando nova tentativa)'),
+        ('FALHOU', 'Falhou (tentativas esgotadas)'),
+    ]
+
+    id_externo = models.CharField(max_length=100, verbose_name="ID da Transação na SkalePay")
+    tipo_evento = models.CharField(max_length=30, help_text="Status informado pela SkalePay (paid, failed...)")
+    payload = models.JSONField()
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='PENDENTE')
+    tentativas = models.PositiveIntegerField(default=0)
+    ultimo_erro = models.TextField(blank=True, null=True)
+    # Backoff: eventos com erro só voltam à fila a partir deste instante
+    disponivel_em = models.DateTimeField(default=timezone.now)
+    recebido_em = models.DateTimeField(auto_now_add=True)
+    processado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Evento de Webhook"
+        verbose_name_plural = "Eventos de Webhook"
+        constraints = [
+            models.UniqueConstraint(fields=['id_externo', 'tipo_evento'], name='webhook_evento_unico'),
+        ]
+        indexes = [
+            # Fila dos consumidores: WHERE status IN (...) AND disponivel_em <= now ORDER BY id
+            models.Index(fields=['status', 'disponivel_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo_evento} - {self.id_externo} - {self.get_status_display()}"
+
+
+class SaqueOutbox(models.Model):
+    """
+    Outbox de saques. Gravada na mesma transação do débito e da solicitação;
+    o despachante (`despachar_saques`) envia à SkalePay fora dos workers web.
+    ENVIANDO é gravado antes da chamada: uma linha nunca é enviada duas vezes,
+    e um envio sem desfecho (queda do processo) vira INCERTO, não reenvio.
+    """
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('ENVIANDO', 'Enviando'),
+        ('ENVIADO', 'Enviado (aceito pela SkalePay)'),
+        ('RECUSADO', 'Recusado (estornado)'),
+        ('INCERTO', 'Incerto (auditoria)'),
+    ]
+
+    solicitacao = models.OneToOneField(SolicitacaoPagamento, on_delete=models.PROTECT, related_name='outbox')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDENTE')
+    tentativas = models.PositiveIntegerField(default=0)
+    ultimo_erro = models.TextField(blank=True, null=True)
+    # Backoff: só volta a ser enviado a partir deste instante
+    disponivel_em = models.DateTimeField(default=timezone.now)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+    processado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Saque na Outbox"
+        verbose_name_plural = "Outbox de Saques"
+        indexes = [
+            # Fila do despachante: WHERE status = 'PENDENTE' AND disponivel_em <= now ORDER BY id
+            models.Index(fields=['status', 'disponivel_em']),
+        ]
+
+    def __str__(self):
+        return f"Saque {self.solicitacao_id} - {self.get_status_display()}"
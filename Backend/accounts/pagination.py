@@ -0,0 +1,121 @@
+"""
+Paginação por keyset (seek) para os históricos do usuário.
+
+Em vez de OFFSET (que faz o banco percorrer todas as linhas das páginas
+anteriores) e COUNT(*) a cada página, a página seguinte é pedida a partir do
+último item visto: WHERE (campo, id) < (valor, id) ORDER BY campo DESC, id DESC.
+O custo de qualquer página é o mesmo da primeira, usando o índice (usuario, campo).
+
+O cursor é opaco (base64 de "<iso datetime>|<id>"). O total vem do contador por
+usuário (`ContadorUsuario`) que a view informa em `total_keyset()`; com filtros
+ativos o total não é conhecido sem COUNT e volta como null.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Mais recentes primeiro, ordenados por (`campo`, id) decrescentes.
+    Subclasses trocam `campo` (ex: `data` no extrato).
+    """
+    campo = 'criado_em'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        self.page_size = self._tamanho_pagina(request)
+
+        queryset = queryset.order_by(f'-{self.campo}', '-id')
+        posicao = self._decodificar(request.query_params.get(self.cursor_query_param))
+        if posicao:
+            valor, ultimo_id = posicao
+            queryset = queryset.filter(
+                Q(**{f'{self.campo}__lt': valor}) | Q(**{self.campo: valor, 'id__lt': ultimo_id})
+            )
+
+        # Um item a mais só para saber se existe próxima página
+        itens = list(queryset[:self.page_size + 1])
+        self.tem_proxima = len(itens) > self.page_size
+        itens = itens[:self.page_size]
+        self.proximo = itens[-1] if self.tem_proxima else None
+        return itens
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self._total()),
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True, 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.proximo:
+            return None
+        url = self.request.build_absolute_uri()
+        valor = getattr(self.proximo, self.campo)
+        cursor = base64.urlsafe_b64encode(f"{valor.isoformat()}|{self.proximo.pk}".encode()).decode()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        return None
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'description': 'Cursor opaco devolvido em `next`.', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query',
+             'description': f'Itens por página (máx. {self.max_page_size}).', 'schema': {'type': 'integer'}},
+        ]
+
+    def _tamanho_pagina(self, request):
+        try:
+            tamanho = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(tamanho, self.max_page_size))
+
+    def _decodificar(self, cursor):
+        if not cursor:
+            return None
+        try:
+            valor, ultimo_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            data = parse_datetime(valor)
+            if data is None:
+                raise ValueError(valor)
+            return data, int(ultimo_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound("Cursor inválido.")
+
+    def _total(self):
+        total_keyset = getattr(self.view, 'total_keyset', None)
+        return total_keyset() if total_keyset else None
+
+
+class ExtratoPagination(KeysetPagination):
+    campo = 'data'
@@ -129,6 +129,21 @@ class SolicitacaoPagamentoAdminSerializer(serializers.ModelSerializer):
             data['valor'] = float(data['valor']) / 100.0
         return data
 
+# 2.1 Extrato do próprio usuário (lançamentos do ledger)
+class TransacaoExtratoSerializer(serializers.ModelSerializer):
+    tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
+
+    class Meta:
+        model = Transacao
+        fields = ['id', 'tipo', 'tipo_display', 'valor', 'saldo_anterior', 'saldo_posterior', 'data', 'descricao']
+
+    def to_representation(self, instance):
+        """Convert stored cents to Decimal for display."""
+        data = super().to_representation(instance)
+        for campo in ('valor', 'saldo_anterior', 'saldo_posterior'):
+            data[campo] = float(data[campo]) / 100.0
+        return data
+
 # 3. Serializer para Ação de Aprovar/Recusar
 class AnaliseSolicitacaoSerializer(serializers.Serializer):
     acao = serializers.ChoiceField(choices=['APROVAR', 'RECUSAR'])
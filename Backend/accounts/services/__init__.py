@@ -88,7 +88,7 @@ class SkalePayService:
         """
         client = SkalePayClient()
         try:
-            response = client._request("GET", f"/transfers/{id_transferencia_externo}")
+            response = client.consultar_transferencia(id_transferencia_externo)
             return response.get('status')
         except SkalePayError:
             return "ERRO_COMUNICACAO"
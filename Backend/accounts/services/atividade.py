@@ -0,0 +1,243 @@
+"""
+Analytics de engajamento sobre bitmaps diários de usuários.
+
+Cada dia tem um bitmap por tipo (ATIVIDADE, CADASTRO, FTD) onde o bit N representa
+o usuário de ID N. Os bitmaps são inteiros Python: união = |, interseção = &,
+contagem = int.bit_count(). Um ano de retenção custa ~365 descompressões + operações
+bit a bit, em vez de sets com milhões de IDs.
+
+Os bitmaps são gravados pelo `processar_metricas` (ontem, toda noite). Dia sem
+bitmap gravado (o de hoje, ou anterior à implantação antes do backfill da
+migração 0013 / `processar_metricas --dias N`) é montado direto das tabelas de
+origem, com uma query por tipo para todos os dias que faltam.
+"""
+
+from __future__ import annotations
+
+import zlib
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List
+
+from django.contrib.auth import get_user_model
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from accounts.models import BitmapUsuarios
+from core.particionamento import faixa_do_dia
+from games.models import Aposta
+
+
+def ids_para_bitmap(ids: Iterable[int]) -> int:
+    """Monta o bitmap (int) a partir de IDs, via bytearray (O(n), sem realocar o int)."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray((max(ids) >> 3) + 1)
+    for usuario_id in ids:
+        buffer[usuario_id >> 3] |= 1 << (usuario_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def comprimir_bitmap(bitmap: int) -> bytes:
+    return zlib.compress(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little'))
+
+
+def descomprimir_bitmap(blob) -> int:
+    return int.from_bytes(zlib.decompress(bytes(blob)), 'little') if blob else 0
+
+
+def _trechos_continuos(dias: List[date]) -> List[List[date]]:
+    """Agrupa dias em ordem crescente em sequências sem buraco."""
+    trechos = []
+    for dia in dias:
+        if trechos and dia - trechos[-1][-1] == timedelta(days=1):
+            trechos[-1].append(dia)
+        else:
+            trechos.append([dia])
+    return trechos
+
+
+class AtividadeService:
+    """
+    Registro diário e consultas (DAU/WAU/MAU, cohorts, churn) sobre `BitmapUsuarios`.
+    """
+
+    @staticmethod
+    def bitmap_ao_vivo(dia: date) -> int:
+        """Bitmap de quem apostou no dia, direto da tabela de apostas."""
+        inicio, fim = faixa_do_dia(dia)
+        ids = Aposta.objects.filter(criado_em__gte=inicio, criado_em__lt=fim).values_list('usuario_id', flat=True).distinct()
+        return ids_para_bitmap(ids)
+
+    @staticmethod
+    def registrar_dia(dia: date) -> Dict[str, int]:
+        """
+        Gera (ou regrava) os bitmaps ATIVIDADE, CADASTRO e FTD do dia.
+
+        Returns:
+            Dict tipo -> bitmap (int), para reaproveitamento pelo chamador
+        """
+        User = get_user_model()
+        bitmaps = {
+            'ATIVIDADE': AtividadeService.bitmap_ao_vivo(dia),
+            'CADASTRO': ids_para_bitmap(
+                User.objects.filter(date_joined__date=dia).values_list('id', flat=True)
+            ),
+            'FTD': ids_para_bitmap(
+                User.objects.filter(data_primeiro_deposito__date=dia).values_list('id', flat=True)
+            ),
+        }
+        for tipo, bitmap in bitmaps.items():
+            BitmapUsuarios.objects.update_or_create(
+                data=dia, tipo=tipo,
+                defaults={'bitmap': comprimir_bitmap(bitmap), 'total': bitmap.bit_count()}
+            )
+        return bitmaps
+
+    @staticmethod
+    def ao_vivo(tipo: str, inicio: date, fim: date) -> Dict[date, int]:
+        """Bitmaps de [inicio, fim] direto das tabelas de origem (uma query agrupada por dia)."""
+        User = get_user_model()
+        faixa_inicio, _ = faixa_do_dia(inicio)
+        _, faixa_fim = faixa_do_dia(fim)
+        if tipo == 'ATIVIDADE':
+            qs = Aposta.objects.filter(criado_em__gte=faixa_inicio, criado_em__lt=faixa_fim).annotate(
+                dia=TruncDate('criado_em')
+            ).values_list('dia', 'usuario_id').distinct()
+        elif tipo == 'CADASTRO':
+            qs = User.objects.filter(date_joined__gte=faixa_inicio, date_joined__lt=faixa_fim).annotate(
+                dia=TruncDate('date_joined')
+            ).values_list('dia', 'id')
+        else:
+            qs = User.objects.filter(
+                data_primeiro_deposito__gte=faixa_inicio, data_primeiro_deposito__lt=faixa_fim
+            ).annotate(dia=TruncDate('data_primeiro_deposito')).values_list('dia', 'id')
+
+        ids = defaultdict(list)
+        for dia, usuario_id in qs.order_by():
+            ids[dia].append(usuario_id)
+        return {dia: ids_para_bitmap(lista) for dia, lista in ids.items()}
+
+    @staticmethod
+    def carregar(tipo: str, inicio: date, fim: date) -> Dict[date, int]:
+        """
+        Bitmaps de [inicio, fim] (até hoje) com uma query na tabela de bitmaps.
+        Hoje e os dias ainda não gravados vêm de `ao_vivo`, uma query por trecho
+        contínuo de dias faltando: um buraco antigo não faz a consulta ao vivo
+        varrer todos os dias gravados entre ele e hoje.
+        """
+        qs = BitmapUsuarios.objects.filter(tipo=tipo, data__gte=inicio, data__lte=fim).values_list('data', 'bitmap')
+        bitmaps = {dia: descomprimir_bitmap(blob) for dia, blob in qs.iterator()}
+
+        hoje = timezone.localdate()
+        bitmaps.pop(hoje, None)  # Gravado antes do fim do dia: incompleto
+        faltando = [
+            inicio + timedelta(days=delta) for delta in range((min(fim, hoje) - inicio).days + 1)
+            if inicio + timedelta(days=delta) not in bitmaps
+        ]
+        for trecho in _trechos_continuos(faltando):
+            ao_vivo = AtividadeService.ao_vivo(tipo, trecho[0], trecho[-1])
+            for dia in trecho:
+                bitmaps[dia] = ao_vivo.get(dia, 0)
+        return bitmaps
+
+    @staticmethod
+    def uniao(tipo: str, inicio: date, fim: date) -> int:
+        """OR de todos os bitmaps do período (hoje e dias não gravados vêm ao vivo)."""
+        resultado = 0
+        for bitmap in AtividadeService.carregar(tipo, inicio, fim).values():
+            resultado |= bitmap
+        return resultado
+
+    @staticmethod
+    def ativos(inicio: date, fim: date) -> int:
+        """Quantidade de usuários distintos que apostaram no período."""
+        return AtividadeService.uniao('ATIVIDADE', inicio, fim).bit_count()
+
+    @staticmethod
+    def dau_wau_mau(referencia: date) -> Dict[str, int]:
+        """DAU/WAU/MAU terminando em `referencia`, a partir de uma única carga de 30 dias."""
+        bitmaps = AtividadeService.carregar('ATIVIDADE', referencia - timedelta(days=29), referencia)
+
+        semana = mes = 0
+        for dia, bitmap in bitmaps.items():
+            mes |= bitmap
+            if dia > referencia - timedelta(days=7):
+                semana |= bitmap
+
+        dau = bitmaps.get(referencia, 0).bit_count()
+        mau = mes.bit_count()
+        return {
+            "dau": dau,
+            "wau": semana.bit_count(),
+            "mau": mau,
+            "stickiness_percent": round(dau / mau * 100, 2) if mau else 0.0,
+        }
+
+    @staticmethod
+    def churn_entre(dia_anterior: date, dia_atual: date) -> int:
+        """Usuários ativos em `dia_anterior` que NÃO estavam ativos em `dia_atual`."""
+        bitmaps = AtividadeService.carregar('ATIVIDADE', dia_anterior, dia_atual)
+        anterior = bitmaps.get(dia_anterior, 0)
+        atual = bitmaps.get(dia_atual, 0)
+        return (anterior & ~atual).bit_count()
+
+    @staticmethod
+    def retencao_cohorts(inicio: date, fim: date, base: str = 'CADASTRO',
+                         granularidade_dias: int = 7, periodos: int = 8) -> List[Dict]:
+        """
+        Matriz de retenção: cohorts agrupados pela data de `base` (CADASTRO ou FTD),
+        e em cada período k a fração do cohort que apostou naquela janela.
+
+        Args:
+            inicio / fim: Intervalo das datas de entrada dos cohorts
+            base: 'CADASTRO' (date_joined) ou 'FTD' (data_primeiro_deposito)
+            granularidade_dias: Tamanho do bucket (7 = semanal, 30 = mensal)
+            periodos: Quantidade de períodos acompanhados por cohort
+
+        Returns:
+            Lista de cohorts com tamanho, retidos[k], retencao_percent[k] e churn_percent[k]
+        """
+        if base not in ('CADASTRO', 'FTD'):
+            raise ValueError("Base de cohort inválida. Use CADASTRO ou FTD.")
+        if granularidade_dias <= 0 or periodos <= 0:
+            raise ValueError("Granularidade e períodos devem ser positivos.")
+
+        def bucket(dia: date) -> int:
+            return (dia - inicio).days // granularidade_dias
+
+        # 1. Cohorts: OR dos bitmaps de entrada por bucket
+        cohorts = defaultdict(int)
+        for dia, bitmap in AtividadeService.carregar(base, inicio, fim).items():
+            cohorts[bucket(dia)] |= bitmap
+
+        # 2. Atividade: OR por bucket, cobrindo até o último período do último cohort
+        fim_atividade = min(
+            inicio + timedelta(days=(bucket(fim) + periodos) * granularidade_dias - 1),
+            timezone.localdate(),
+        )
+        atividade = defaultdict(int)
+        for dia, bitmap in AtividadeService.carregar('ATIVIDADE', inicio, fim_atividade).items():
+            atividade[bucket(dia)] |= bitmap
+
+        ultimo_bucket = bucket(fim_atividade)
+        resultado = []
+        for indice in range(bucket(fim) + 1):
+            cohort = cohorts.get(indice, 0)
+            tamanho = cohort.bit_count()
+            retidos, retencao = [], []
+            for k in range(periodos):
+                if indice + k > ultimo_bucket:
+                    break  # Período ainda não aconteceu
+                qtd = (cohort & atividade.get(indice + k, 0)).bit_count()
+                retidos.append(qtd)
+                retencao.append(round(qtd / tamanho * 100, 2) if tamanho else 0.0)
+            resultado.append({
+                "inicio": inicio + timedelta(days=indice * granularidade_dias),
+                "tamanho": tamanho,
+                "retidos": retidos,
+                "retencao_percent": retencao,
+                "churn_percent": [round(100.0 - r, 2) if tamanho else 0.0 for r in retencao],
+            })
+        return resultado
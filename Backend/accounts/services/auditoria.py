@@ -0,0 +1,170 @@
+"""
+Auditoria do extrato (ledger) contra `CustomUser.saldo`.
+
+Para cada usuário reaplica os lançamentos em ordem de id, partindo do último
+`CheckpointSaldo` (ou de zero), e confere:
+    1. Encadeamento: saldo_anterior == saldo corrente reconstruído
+    2. Valor: saldo_posterior - saldo_anterior == +valor (crédito) / -valor (débito)
+       (placeholders legados "Aguardando Pagamento Pix", que não mexem no saldo, são ignorados)
+    3. Saldo final: saldo reconstruído == CustomUser.saldo
+
+Usuários sem divergência têm o checkpoint avançado até o último lançamento com
+mais de `MARGEM_CHECKPOINT` de idade: ids vêm de uma sequence e uma transação
+mais lenta pode gravar um id menor depois de outra já confirmada; a margem
+garante que nenhum lançamento "atrasado" fique para trás do checkpoint.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import CheckpointSaldo, Transacao
+from accounts.services.pagamentos import DESCRICAO_PLACEHOLDER
+
+TIPOS_DEBITO = {'APOSTA', 'SAQUE'}
+MARGEM_CHECKPOINT = timedelta(minutes=10)
+
+
+def _divergencia(usuario_id: int, tipo: str, transacao_id: Optional[int], esperado: int, encontrado: int) -> Dict:
+    return {
+        "usuario_id": usuario_id,
+        "tipo": tipo,
+        "transacao_id": transacao_id,
+        "esperado": esperado,
+        "encontrado": encontrado,
+    }
+
+
+class AuditoriaLedgerService:
+    """
+    Reconciliação incremental do extrato, por lotes de usuários.
+    Valores em centavos.
+    """
+
+    @staticmethod
+    def reaplicar(usuario_id: int, saldo_inicial: int, lancamentos: Iterable[Sequence], limite_checkpoint) -> Dict:
+        """
+        Reaplica os lançamentos (id, tipo, valor, saldo_anterior, saldo_posterior, data, descricao)
+        de um usuário, já ordenados por id.
+
+        Returns:
+            Dict com saldo final, divergências, qtd de lançamentos e o ponto
+            (id, data, saldo) até onde o checkpoint pode avançar
+        """
+        saldo = saldo_inicial
+        divergencias = []
+        qtd = 0
+        checkpoint = None
+
+        for tx_id, tipo, valor, anterior, posterior, data, descricao in lancamentos:
+            qtd += 1
+            if anterior != saldo:
+                divergencias.append(_divergencia(usuario_id, 'ENCADEAMENTO', tx_id, saldo, anterior))
+            if descricao == DESCRICAO_PLACEHOLDER and anterior == posterior:
+                delta = 0  # Depósito ainda não pago gravado no extrato por versões antigas
+            else:
+                delta = -valor if tipo in TIPOS_DEBITO else valor
+            if posterior - anterior != delta:
+                divergencias.append(_divergencia(usuario_id, 'VALOR', tx_id, anterior + delta, posterior))
+            # Segue pelo saldo gravado: uma divergência não contamina o resto do extrato
+            saldo = posterior
+            if not divergencias and data <= limite_checkpoint:
+                checkpoint = (tx_id, data, posterior, qtd)
+
+        return {"saldo": saldo, "divergencias": divergencias, "qtd": qtd, "checkpoint": checkpoint}
+
+    @staticmethod
+    def verificar_lote(usuario_ids: Sequence[int], usar_checkpoint: bool = True,
+                       margem: timedelta = MARGEM_CHECKPOINT) -> Dict:
+        """
+        Audita um lote de usuários com 3 leituras (checkpoints, lançamentos, saldos)
+        e 1 escrita (upsert dos checkpoints).
+
+        Returns:
+            Dict com usuarios, transacoes, checkpoints (avançados) e divergencias
+        """
+        User = get_user_model()
+        limite_checkpoint = timezone.now() - margem
+
+        checkpoints = {}
+        if usar_checkpoint:
+            checkpoints = {cp.usuario_id: cp for cp in CheckpointSaldo.objects.filter(usuario_id__in=usuario_ids)}
+
+        # Quem tem checkpoint só relê a cauda do extrato: o filtro por `data` poda as
+        # partições antigas, e a margem cobre lançamentos gravados fora de ordem
+        com_checkpoint = [uid for uid in usuario_ids if uid in checkpoints and checkpoints[uid].ultima_transacao_em]
+        sem_checkpoint = [uid for uid in usuario_ids if uid not in com_checkpoint]
+
+        campos = ('usuario_id', 'id', 'tipo', 'valor', 'saldo_anterior', 'saldo_posterior', 'data', 'descricao')
+        consultas = []
+        if sem_checkpoint:
+            consultas.append(Transacao.objects.filter(usuario_id__in=sem_checkpoint))
+        if com_checkpoint:
+            piso = min(checkpoints[uid].ultima_transacao_em for uid in com_checkpoint) - margem
+            menor_id = min(checkpoints[uid].ultima_transacao_id for uid in com_checkpoint)
+            consultas.append(Transacao.objects.filter(usuario_id__in=com_checkpoint, data__gte=piso, id__gt=menor_id))
+
+        por_usuario: Dict[int, List] = {uid: [] for uid in usuario_ids}
+        for qs in consultas:
+            for usuario_id, *lancamento in qs.order_by('usuario_id', 'id').values_list(*campos).iterator(chunk_size=5000):
+                cp = checkpoints.get(usuario_id)
+                if cp and lancamento[0] <= cp.ultima_transacao_id:
+                    continue
+                por_usuario[usuario_id].append(lancamento)
+
+        # Saldos lidos depois do extrato: um lançamento concorrente aparece como
+        # divergência de SALDO_FINAL e é reconferido sob lock em `verificar_usuario`
+        saldos = dict(User.objects.filter(pk__in=usuario_ids).values_list('pk', 'saldo'))
+
+        divergencias = []
+        novos_checkpoints = []
+        total_transacoes = 0
+        for usuario_id in usuario_ids:
+            cp = checkpoints.get(usuario_id)
+            resultado = AuditoriaLedgerService.reaplicar(
+                usuario_id, cp.saldo if cp else 0, por_usuario[usuario_id], limite_checkpoint
+            )
+            total_transacoes += resultado['qtd']
+            erros = resultado['divergencias']
+            if resultado['saldo'] != saldos.get(usuario_id, 0):
+                erros.append(_divergencia(usuario_id, 'SALDO_FINAL', None, resultado['saldo'], saldos.get(usuario_id, 0)))
+
+            if erros:
+                divergencias.extend(erros)
+            elif resultado['checkpoint']:
+                tx_id, data, saldo, qtd = resultado['checkpoint']
+                novos_checkpoints.append(CheckpointSaldo(
+                    usuario_id=usuario_id, saldo=saldo, ultima_transacao_id=tx_id, ultima_transacao_em=data,
+                    qtd_transacoes=(cp.qtd_transacoes if cp else 0) + qtd, verificado_em=timezone.now(),
+                ))
+
+        if novos_checkpoints:
+            CheckpointSaldo.objects.bulk_create(
+                novos_checkpoints, update_conflicts=True, unique_fields=['usuario'],
+                update_fields=['saldo', 'ultima_transacao_id', 'ultima_transacao_em', 'qtd_transacoes', 'verificado_em'],
+            )
+
+        return {
+            "usuarios": len(usuario_ids),
+            "transacoes": total_transacoes,
+            "checkpoints": len(novos_checkpoints),
+            "divergencias": divergencias,
+        }
+
+    @staticmethod
+    def verificar_usuario(usuario_id: int, usar_checkpoint: bool = True) -> List[Dict]:
+        """
+        Reconferência de um usuário com a carteira travada (select_for_update):
+        elimina falsos positivos de lançamentos concorrentes ao lote.
+        """
+        User = get_user_model()
+        with transaction.atomic():
+            User.objects.select_for_update().filter(pk=usuario_id).first()
+            return AuditoriaLedgerService.verificar_lote(
+                [usuario_id], usar_checkpoint=usar_checkpoint
+            )['divergencias']
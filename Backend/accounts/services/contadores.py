@@ -0,0 +1,53 @@
+"""
+Contadores por usuário (`ContadorUsuario`): total de apostas, solicitações de
+pagamento e lançamentos no extrato, usados como `count` dos históricos paginados.
+"""
+
+from __future__ import annotations
+
+from typing import Dict
+
+from django.db.models import BigIntegerField, Case, F, Value, When
+
+from accounts.models import ContadorUsuario, SolicitacaoPagamento, Transacao
+from games.models import Aposta
+
+CAMPOS = ('apostas', 'solicitacoes', 'transacoes')
+
+
+class ContadorService:
+
+    @staticmethod
+    def incrementar(usuario_id: int, campo: str, delta: int = 1) -> None:
+        """UPDATE atômico (F); cria a linha na primeira vez."""
+        atualizados = ContadorUsuario.objects.filter(pk=usuario_id).update(**{campo: F(campo) + delta})
+        if not atualizados:
+            _, criado = ContadorUsuario.objects.get_or_create(pk=usuario_id, defaults={campo: max(delta, 0)})
+            if not criado:
+                ContadorUsuario.objects.filter(pk=usuario_id).update(**{campo: F(campo) + delta})
+
+    @staticmethod
+    def incrementar_lote(campo: str, deltas: Dict[int, int]) -> None:
+        """Vários usuários em 1 INSERT (linhas faltantes) + 1 UPDATE (CASE por usuário)."""
+        if not deltas:
+            return
+        ContadorUsuario.objects.bulk_create([ContadorUsuario(pk=uid) for uid in deltas], ignore_conflicts=True)
+        incremento = Case(
+            *[When(pk=uid, then=Value(delta)) for uid, delta in deltas.items()],
+            default=Value(0), output_field=BigIntegerField(),
+        )
+        ContadorUsuario.objects.filter(pk__in=list(deltas)).update(**{campo: F(campo) + incremento})
+
+    @staticmethod
+    def total(usuario_id: int, campo: str) -> int:
+        return ContadorUsuario.objects.filter(pk=usuario_id).values_list(campo, flat=True).first() or 0
+
+    @staticmethod
+    def reconstruir(usuario_id: int) -> ContadorUsuario:
+        """Recontagem completa de um usuário (correção manual / auditoria)."""
+        contador, _ = ContadorUsuario.objects.update_or_create(pk=usuario_id, defaults={
+            'apostas': Aposta.objects.filter(usuario_id=usuario_id).count(),
+            'solicitacoes': SolicitacaoPagamento.objects.filter(usuario_id=usuario_id).count(),
+            'transacoes': Transacao.objects.filter(usuario_id=usuario_id).count(),
+        })
+        return contador
@@ -0,0 +1,191 @@
+"""
+Liquidez da banca (saldo disponível na SkalePay) em memória do processo.
+
+O saque consultava `GET /balance/available` antes de cada pagamento: centenas
+de ms e uma dependência externa no caminho de todo saque. Agora o saldo vem
+desta cache, em centavos:
+
+    - Fresco (até `LIQUIDEZ_TTL` s): responde da memória.
+    - Velho (até `LIQUIDEZ_TTL_MAXIMO` s): responde da memória e dispara uma
+      atualização em segundo plano (stale-while-revalidate, uma por vez).
+    - Vencido ou nunca carregado: consulta a SkalePay na hora.
+    - Entre consultas, saques enfileirados e depósitos aprovados neste processo
+      ajustam o valor localmente (`ajustar`), sem esperar a próxima consulta.
+
+Para nenhum saque pagar a consulta síncrona (worker recém-criado, ou o
+primeiro saque depois do TTL), cada worker web roda um atualizador periódico
+(`iniciar_atualizador`, chamado em core/wsgi.py e core/asgi.py) que revalida o
+saldo a cada `LIQUIDEZ_ATUALIZAR_A_CADA` s, menos que o TTL.
+
+O estado é por processo. `ajustar` só muda o saldo do processo que o chamou:
+depósitos aprovados pelo `processar_webhooks` (outro contêiner) não chegam aos
+workers web, que só enxergam o dinheiro novo na próxima revalidação do
+atualizador. Como o erro é para menos, no pior caso um saque é barrado por
+alguns segundos a mais.
+
+Circuit breaker: `FALHAS_PARA_ABRIR` consultas seguidas com erro abrem o
+circuito por `CIRCUITO_ABERTO_POR` s; nesse intervalo ninguém chama a SkalePay
+e vale o último saldo conhecido (enquanto não vencer). Sem saldo confiável,
+`saldo_disponivel` devolve None e o saque segue, como antes: a trava é só um
+fail-fast, a SkalePay recusa a transferência sem fundos de qualquer forma.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+
+from ..gateways.skalepay import SkalePayClient, SkalePayError
+
+logger = logging.getLogger(__name__)
+
+FALHAS_PARA_ABRIR = 3
+CIRCUITO_ABERTO_POR = 60.0
+
+
+class _EstadoLiquidez:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.saldo: Optional[int] = None
+        self.consultado_em = 0.0
+        self.atualizando = False
+        # Ajustes locais feitos durante a consulta em voo (somados ao valor remoto)
+        self.ajustes_em_voo = 0
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        # Atualizador periódico: thread e pid do processo que a subiu (threads não sobrevivem ao fork)
+        self.atualizador: Optional[threading.Thread] = None
+        self.atualizador_pid: Optional[int] = None
+        self.parar = threading.Event()
+
+
+_estado = _EstadoLiquidez()
+
+
+def _saldo_valido(agora: float) -> Optional[int]:
+    """Último saldo conhecido, se ainda não venceu (chamar com o lock)."""
+    if agora - _estado.consultado_em > LiquidezService._ttl_maximo():
+        return None
+    return _estado.saldo
+
+
+class LiquidezService:
+    # Testes trocam para False: a atualização em segundo plano roda na hora
+    ATUALIZAR_EM_THREAD = True
+
+    @staticmethod
+    def _ttl() -> float:
+        return getattr(settings, 'LIQUIDEZ_TTL', 30)
+
+    @staticmethod
+    def _ttl_maximo() -> float:
+        return getattr(settings, 'LIQUIDEZ_TTL_MAXIMO', 300)
+
+    @staticmethod
+    def _intervalo_atualizador() -> float:
+        return getattr(settings, 'LIQUIDEZ_ATUALIZAR_A_CADA', 20)
+
+    @staticmethod
+    def iniciar_atualizador(intervalo: Optional[float] = None) -> None:
+        """
+        Sobe (uma vez por processo) a thread daemon que revalida o saldo a cada
+        `intervalo` s. Idempotente; num processo filho de fork sobe uma nova.
+        """
+        estado = _estado
+        with estado.lock:
+            if estado.atualizador_pid == os.getpid():
+                return
+            estado.atualizador_pid = os.getpid()
+            estado.atualizador = threading.Thread(
+                target=_atualizar_periodicamente,
+                args=(estado.parar, intervalo or LiquidezService._intervalo_atualizador()),
+                name='liquidez-atualizador', daemon=True,
+            )
+            estado.atualizador.start()
+
+    @staticmethod
+    def saldo_disponivel() -> Optional[int]:
+        """Saldo da banca em centavos, ou None se não há valor confiável."""
+        agora = time.monotonic()
+        with _estado.lock:
+            saldo, idade = _estado.saldo, agora - _estado.consultado_em
+            circuito_aberto = agora < _estado.aberto_ate
+
+        if saldo is not None and idade <= LiquidezService._ttl():
+            return saldo
+        if saldo is not None and idade <= LiquidezService._ttl_maximo():
+            if not circuito_aberto:
+                LiquidezService._disparar_atualizacao()
+            return saldo
+        if circuito_aberto:
+            return None
+        return LiquidezService.atualizar()
+
+    @staticmethod
+    def _disparar_atualizacao() -> None:
+        if LiquidezService.ATUALIZAR_EM_THREAD:
+            threading.Thread(target=LiquidezService.atualizar, daemon=True).start()
+        else:
+            LiquidezService.atualizar()
+
+    @staticmethod
+    def atualizar() -> Optional[int]:
+        """Consulta a SkalePay (uma consulta por processo por vez) e devolve o saldo atual."""
+        with _estado.lock:
+            if _estado.atualizando or time.monotonic() < _estado.aberto_ate:
+                return _saldo_valido(time.monotonic())
+            _estado.atualizando = True
+            _estado.ajustes_em_voo = 0
+
+        try:
+            resposta = SkalePayClient().consultar_saldo()
+            remoto = int(resposta.get('availableAmount', 0))
+        except (SkalePayError, TypeError, ValueError) as e:
+            with _estado.lock:
+                _estado.atualizando = False
+                _estado.falhas += 1
+                if _estado.falhas >= FALHAS_PARA_ABRIR:
+                    _estado.aberto_ate = time.monotonic() + CIRCUITO_ABERTO_POR
+                    logger.warning(f"Liquidez: {_estado.falhas} falhas seguidas na SkalePay, circuito aberto por {CIRCUITO_ABERTO_POR:.0f}s ({e})")
+                # Sem dado novo: o valor antigo continua valendo até vencer
+                return _saldo_valido(time.monotonic())
+
+        with _estado.lock:
+            _estado.saldo = remoto + _estado.ajustes_em_voo
+            _estado.consultado_em = time.monotonic()
+            _estado.atualizando = False
+            _estado.falhas = 0
+            _estado.aberto_ate = 0.0
+            return _estado.saldo
+
+    @staticmethod
+    def ajustar(delta_centavos: int) -> None:
+        """Pagamento (negativo) ou depósito (positivo) aprovado neste processo."""
+        with _estado.lock:
+            if _estado.saldo is not None:
+                _estado.saldo += delta_centavos
+            if _estado.atualizando:
+                _estado.ajustes_em_voo += delta_centavos
+
+    @staticmethod
+    def limpar() -> None:
+        global _estado
+        anterior, _estado = _estado, _EstadoLiquidez()
+        anterior.parar.set()
+        if anterior.atualizador is not None and anterior.atualizador_pid == os.getpid():
+            anterior.atualizador.join(timeout=5)
+
+
+def _atualizar_periodicamente(parar: threading.Event, intervalo: float) -> None:
+    while not parar.is_set():
+        try:
+            LiquidezService.atualizar()
+        except Exception:
+            # A thread não pode morrer: sem ela, o próximo saque volta a consultar na hora
+            logger.exception("Liquidez: erro inesperado na atualização periódica")
+        parar.wait(intervalo)
@@ -0,0 +1,163 @@
+"""
+Cubo de performance por Modalidade/Colocação/Jogo.
+
+A consolidação roda 1x por dia (management command `processar_metricas`) e grava
+células compactas em `MetricasModalidade`. Relatórios fazem rollup apenas sobre
+essa tabela, sem varrer `palpite_aposta`.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Dict, List, Sequence
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractHour
+
+from accounts.models import MetricasModalidade
+from core.particionamento import faixa_do_dia
+from games.models import Aposta
+
+
+class MetricasModalidadeService:
+    """
+    Consolidação e consulta do cubo de performance por modalidade.
+    Todos os valores monetários são inteiros em centavos.
+    """
+
+    # Dimensões aceitas no rollup -> campos do values() (id + rótulo legível)
+    DIMENSOES = {
+        'data': ('data',),
+        'hora': ('hora',),
+        'sorteio': ('sorteio_id', 'sorteio__data', 'sorteio__horario'),
+        'jogo': ('jogo_id', 'jogo__nome'),
+        'modalidade': ('modalidade_id', 'modalidade__nome'),
+        'colocacao': ('colocacao_id', 'colocacao__nome'),
+    }
+
+    @staticmethod
+    def consolidar_dia(dia: date) -> int:
+        """
+        Recalcula as células do dia com UMA query agrupada sobre as apostas.
+        Idempotente: apaga e regrava as células daquele dia.
+
+        Returns:
+            Quantidade de células gravadas
+        """
+        inicio, fim = faixa_do_dia(dia)
+        celulas = (
+            Aposta.objects.filter(criado_em__gte=inicio, criado_em__lt=fim)
+            .annotate(hora=ExtractHour('criado_em'))
+            .values('hora', 'sorteio_id', 'jogo_id', 'modalidade_id', 'colocacao_id')
+            .annotate(
+                apostado=Sum('valor'),
+                premios=Sum('valor_premio', filter=Q(ganhou=True)),
+                qtd=Count('id'),
+                unicos=Count('usuario_id', distinct=True),
+            )
+            .order_by()
+        )
+
+        objetos = [
+            MetricasModalidade(
+                data=dia,
+                hora=item['hora'],
+                sorteio_id=item['sorteio_id'],
+                jogo_id=item['jogo_id'],
+                modalidade_id=item['modalidade_id'],
+                colocacao_id=item['colocacao_id'],
+                total_apostado=item['apostado'] or 0,
+                total_premios=item['premios'] or 0,
+                qtd_apostas=item['qtd'],
+                apostadores_unicos=item['unicos'],
+            )
+            for item in celulas
+        ]
+
+        with transaction.atomic():
+            MetricasModalidade.objects.filter(data=dia).delete()
+            MetricasModalidade.objects.bulk_create(objetos, batch_size=1000)
+
+        return len(objetos)
+
+    @staticmethod
+    def rollup(inicio: date, fim: date, agrupar_por: Sequence[str] = ('modalidade',)) -> List[Dict]:
+        """
+        Agrega o cubo no intervalo [inicio, fim] pelas dimensões pedidas.
+
+        Args:
+            inicio: Data inicial (inclusive)
+            fim: Data final (inclusive)
+            agrupar_por: Dimensões de `DIMENSOES` (ex: ['jogo', 'modalidade'])
+
+        Returns:
+            Lista de dicts com apostado, premios, lucro, margem_percent, qtd e
+            apostadores_unicos (soma por célula: limite superior, não é distinct).
+
+        Raises:
+            ValueError: Se alguma dimensão for desconhecida
+        """
+        campos = []
+        for dimensao in agrupar_por:
+            if dimensao not in MetricasModalidadeService.DIMENSOES:
+                raise ValueError(f"Dimensão inválida: '{dimensao}'")
+            campos.extend(MetricasModalidadeService.DIMENSOES[dimensao])
+
+        linhas = (
+            MetricasModalidade.objects.filter(data__gte=inicio, data__lte=fim)
+            .values(*campos)
+            .annotate(
+                apostado=Sum('total_apostado'),
+                premios=Sum('total_premios'),
+                qtd=Sum('qtd_apostas'),
+                apostadores=Sum('apostadores_unicos'),
+            )
+            .order_by('-apostado')
+        )
+
+        resultado = []
+        for linha in linhas:
+            apostado = linha.pop('apostado') or 0
+            premios = linha.pop('premios') or 0
+            qtd = linha.pop('qtd') or 0
+            apostadores = linha.pop('apostadores') or 0
+            lucro = apostado - premios
+            resultado.append({
+                **linha,
+                "apostado": apostado,
+                "premios": premios,
+                "lucro": lucro,
+                "margem_percent": round(lucro / apostado * 100, 2) if apostado else 0.0,
+                "qtd": qtd,
+                "apostadores_unicos": apostadores,
+            })
+        return resultado
+
+    @staticmethod
+    def resumo_por_modalidade(dia: date) -> Dict[str, Dict]:
+        """
+        JSON legado de `MetricasDiarias.performance_modalidades`, derivado do cubo.
+        Formato: {"Milhar": {"apostado": .., "premios": .., "lucro": .., "qtd": ..}}
+        """
+        perf_dict = {}
+        for item in MetricasModalidadeService.rollup(dia, dia, ['modalidade']):
+            nome = item['modalidade__nome'] or "Outros"
+            perf_dict[nome] = {
+                "apostado": float(item['apostado']),
+                "premios": float(item['premios']),
+                "lucro": float(item['lucro']),
+                "qtd": item['qtd'],
+            }
+        return perf_dict
+
+    @staticmethod
+    def resumo_por_hora(dia: date) -> Dict[str, Dict]:
+        """
+        JSON legado de `MetricasDiarias.mapa_calor_horas`, derivado do cubo.
+        Formato: {"00h": {"vol": .., "qtd": ..}, ..., "23h": {...}}
+        """
+        mapa_horas = {f"{h:02d}h": {"vol": 0.0, "qtd": 0} for h in range(24)}
+        for item in MetricasModalidadeService.rollup(dia, dia, ['hora']):
+            mapa_horas[f"{item['hora']:02d}h"] = {"vol": float(item['apostado']), "qtd": item['qtd']}
+        return mapa_horas
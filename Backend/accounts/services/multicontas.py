@@ -0,0 +1,200 @@
+"""
+Detecção de multicontas por IP.
+
+`VinculoIP` é o índice IP -> usuários (cadastro + logins). Os anéis
+(`AnelMulticonta`) são as componentes conexas do grafo usuário <-> IP e são
+mantidos de forma incremental: um vínculo novo só olha os outros usuários daquele
+IP e funde os anéis envolvidos (união por tamanho: o anel maior absorve os menores).
+Vínculos novos do mesmo IP são serializados (advisory lock por IP), para que o
+segundo de dois acessos simultâneos enxergue o primeiro.
+Nenhuma leitura do painel de compliance precisa recalcular o agrupamento.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from accounts.models import AnelMulticonta, CustomUser, VinculoIP
+
+
+def ip_da_requisicao(request) -> Optional[str]:
+    """IP do cliente (primeiro da cadeia X-Forwarded-For, senão REMOTE_ADDR)."""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def _agrupar(chave: str, valores: str, linhas: Iterable[Dict]) -> Dict:
+    agrupado: Dict = {}
+    for linha in linhas:
+        agrupado.setdefault(linha[chave], []).append(linha[valores])
+    return agrupado
+
+
+class MulticontaService:
+    """
+    Manutenção do índice IP -> usuários e dos anéis de multicontas.
+    """
+
+    @staticmethod
+    def registrar_acesso(usuario_id: int, ip: Optional[str], origem: str = 'LOGIN') -> Optional[int]:
+        """
+        Registra (ou renova) o vínculo usuário-IP e, se o vínculo for novo,
+        funde os anéis dos usuários que já usaram esse IP.
+
+        Returns:
+            ID do anel do usuário (None se ele não compartilha IP com ninguém)
+        """
+        if not ip:
+            return None
+
+        with transaction.atomic():
+            # Caminho comum (login de um IP já conhecido do usuário): sem trava
+            if VinculoIP.objects.filter(ip=ip, usuario_id=usuario_id).update(
+                qtd_acessos=F('qtd_acessos') + 1, ultimo_acesso=timezone.now()
+            ):
+                return CustomUser.objects.filter(pk=usuario_id).values_list('anel_multiconta_id', flat=True).first()
+
+            # Vínculo novo: serializa por IP até o commit. Sem isso, dois primeiros
+            # acessos simultâneos do mesmo IP inserem cada um a sua linha sem ver a
+            # do outro (READ COMMITTED) e os anéis nunca são fundidos.
+            MulticontaService._travar_ip(ip)
+            vinculo, criado = VinculoIP.objects.get_or_create(
+                ip=ip, usuario_id=usuario_id, defaults={'origem': origem}
+            )
+            if not criado:
+                VinculoIP.objects.filter(pk=vinculo.pk).update(
+                    qtd_acessos=F('qtd_acessos') + 1, ultimo_acesso=timezone.now()
+                )
+                return CustomUser.objects.filter(pk=usuario_id).values_list('anel_multiconta_id', flat=True).first()
+
+            vizinhos = list(
+                VinculoIP.objects.filter(ip=ip).exclude(usuario_id=usuario_id).values_list('usuario_id', flat=True)
+            )
+            if not vizinhos:
+                return CustomUser.objects.filter(pk=usuario_id).values_list('anel_multiconta_id', flat=True).first()
+
+            return MulticontaService._unir([usuario_id, *vizinhos])
+
+    @staticmethod
+    def _travar_ip(ip: str) -> None:
+        """Advisory lock do IP na transação atual (PostgreSQL; o SQLite já serializa as escritas)."""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f'vinculo_ip:{ip}'])
+
+    @staticmethod
+    def _unir(usuario_ids: List[int]) -> int:
+        """Coloca todos os usuários (e os anéis a que pertencem) em um único anel."""
+        # Lock em ordem de ID: dois merges concorrentes nunca se travam mutuamente
+        envolvidos = list(
+            CustomUser.objects.select_for_update()
+            .filter(pk__in=usuario_ids).order_by('pk')
+            .values_list('pk', 'anel_multiconta_id')
+        )
+        aneis = {anel_id for _, anel_id in envolvidos if anel_id}
+
+        if aneis:
+            tamanhos = dict(
+                AnelMulticonta.objects.select_for_update()
+                .filter(pk__in=aneis).order_by('pk').values_list('pk', 'total_usuarios')
+            )
+            destino = max(aneis, key=lambda pk: (tamanhos.get(pk, 0), -pk))
+            absorvidos = aneis - {destino}
+            if absorvidos:
+                CustomUser.objects.filter(anel_multiconta_id__in=absorvidos).update(anel_multiconta_id=destino)
+                AnelMulticonta.objects.filter(pk__in=absorvidos).delete()
+        else:
+            destino = AnelMulticonta.objects.create().pk
+
+        CustomUser.objects.filter(pk__in=usuario_ids, anel_multiconta__isnull=True).update(anel_multiconta_id=destino)
+        MulticontaService.atualizar_totais(destino)
+        return destino
+
+    @staticmethod
+    def atualizar_totais(anel_id: int) -> None:
+        """Recalcula os contadores de um anel (só as linhas dos seus membros)."""
+        total_usuarios = CustomUser.objects.filter(anel_multiconta_id=anel_id).count()
+        total_ips = (
+            VinculoIP.objects.filter(usuario__anel_multiconta_id=anel_id)
+            .values('ip').annotate(contas=Count('usuario_id')).filter(contas__gt=1).count()
+        )
+        AnelMulticonta.objects.filter(pk=anel_id).update(
+            total_usuarios=total_usuarios, total_ips=total_ips, atualizado_em=timezone.now()
+        )
+
+    @staticmethod
+    def ips_compartilhados():
+        """
+        IPs com mais de 1 usuário, via índice `VinculoIP`. No PostgreSQL os e-mails
+        e o anel vêm na mesma query (ArrayAgg); nos demais bancos, `detalhar_ips`
+        completa a página com uma query extra.
+        """
+        qs = (
+            VinculoIP.objects.values('ip')
+            .annotate(total_contas=Count('usuario_id'), anel_id=Max('usuario__anel_multiconta_id'))
+            .filter(total_contas__gt=1)
+            .order_by('-total_contas', 'ip')
+        )
+        if connection.vendor == 'postgresql':
+            from django.contrib.postgres.aggregates import ArrayAgg
+            qs = qs.annotate(usuarios=ArrayAgg('usuario__email'))
+        return qs
+
+    @staticmethod
+    def detalhar_ips(pagina: List[Dict]) -> List[Dict]:
+        """Formata uma página de `ips_compartilhados` para a API."""
+        if pagina and 'usuarios' not in pagina[0]:
+            emails = _agrupar('ip', 'usuario__email', VinculoIP.objects.filter(
+                ip__in=[item['ip'] for item in pagina]
+            ).values('ip', 'usuario__email'))
+            for item in pagina:
+                item['usuarios'] = emails.get(item['ip'], [])
+
+        return [{
+            "ip": item['ip'],
+            "total": item['total_contas'],
+            "anel_id": item['anel_id'],
+            "usuarios": item['usuarios'],
+        } for item in pagina]
+
+    @staticmethod
+    def aneis():
+        """QuerySet dos anéis, maiores primeiro (com membros agregados em array no PostgreSQL)."""
+        qs = AnelMulticonta.objects.order_by('-total_usuarios', '-atualizado_em')
+        if connection.vendor == 'postgresql':
+            from django.contrib.postgres.aggregates import ArrayAgg
+            qs = qs.annotate(emails=ArrayAgg('membros__email', distinct=True))
+        return qs
+
+    @staticmethod
+    def detalhar_aneis(pagina) -> List[Dict]:
+        """
+        Serializa uma página de `aneis()`. Fora do PostgreSQL os membros vêm de
+        uma única query extra para a página toda.
+        """
+        pagina = list(pagina)
+        if pagina and not hasattr(pagina[0], 'emails'):
+            membros = _agrupar('anel_multiconta_id', 'email', CustomUser.objects.filter(
+                anel_multiconta_id__in=[anel.pk for anel in pagina]
+            ).values('anel_multiconta_id', 'email'))
+            for anel in pagina:
+                anel.emails = membros.get(anel.pk, [])
+
+        ips = _agrupar('usuario__anel_multiconta_id', 'ip', VinculoIP.objects.filter(
+            usuario__anel_multiconta_id__in=[anel.pk for anel in pagina]
+        ).values('usuario__anel_multiconta_id', 'ip').distinct())
+
+        return [{
+            "anel_id": anel.pk,
+            "total_usuarios": anel.total_usuarios,
+            "total_ips_compartilhados": anel.total_ips,
+            "usuarios": anel.emails,
+            "ips": ips.get(anel.pk, []),
+            "atualizado_em": anel.atualizado_em,
+        } for anel in pagina]
@@ -0,0 +1,430 @@
+"""
+Webhooks da SkalePay: recepção (caixa de entrada) e aplicação dos efeitos.
+
+O endpoint só confere a assinatura e grava o evento bruto em `WebhookEvento`
+(a chave única (id_externo, tipo_evento) descarta reentregas), respondendo
+200 em poucos milissegundos mesmo em rajadas de confirmações Pix.
+
+Os consumidores (`processar_webhooks`) pegam lotes com SELECT ... FOR UPDATE
+SKIP LOCKED: vários processos/threads dividem a fila sem disputar as mesmas
+linhas. Efeito e baixa do evento são gravados na mesma transação, e a
+solicitação é travada e conferida antes do efeito; por isso cada evento tem
+efeito exatamente uma vez, mesmo com reentregas e reprocessamentos.
+
+Os depósitos pagos de um lote são aprovados juntos (`aprovar_depositos`): saldo,
+bônus, FTD, extrato e comissões com um punhado de comandos em lote, em vez de
+várias escritas (e a trava do padrinho) por depósito.
+
+Eventos com erro voltam à fila com backoff exponencial; após `MAX_TENTATIVAS`
+ficam como FALHOU até alguém reprocessar (`processar_webhooks --reprocessar`).
+
+Depósitos cujo webhook nunca chegou são conciliados por `auditar_depositos`
+(`AuditoriaDepositosService`): consulta o status na SkalePay em paralelo e
+aprova pelo mesmo `aprovar_depositos`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.gateways.skalepay import SkalePayError
+from accounts.models import CustomUser, SolicitacaoPagamento, Transacao, WebhookEvento
+from accounts.services.contadores import ContadorService
+from accounts.services.liquidez import LiquidezService
+from accounts.services.risco import PerfilRiscoService
+from core.metricas import WEBHOOK_LATENCIA
+
+logger = logging.getLogger(__name__)
+
+LOTE_PADRAO = 200
+MAX_TENTATIVAS = 8
+BACKOFF_BASE = timedelta(seconds=5)
+BACKOFF_MAXIMO = timedelta(minutes=10)
+STATUS_FINAIS = ('APROVADO', 'RECUSADO', 'CANCELADO')
+CAMPOS_USUARIO_DEPOSITO = ['saldo', 'recebeu_bonus', 'meta_rollover', 'data_primeiro_deposito']
+# Valores fora desta lista (payload externo) viram 'outro' nas métricas: cardinalidade fechada
+EVENTOS_METRICA = ('paid', 'failed', 'canceled', 'refunded', 'pending', 'waiting_payment')
+# Auditoria de depósitos: status da transação na SkalePay -> status final da solicitação
+STATUS_DEPOSITO_RECUSADO = ('failed', 'canceled', 'refused')
+STATUS_DEPOSITO_EXPIRADO = ('expired', 'nao_encontrado')
+# Lançamento "Aguardando Pagamento Pix" (saldo inalterado) que o GerarDepositoPixView gravava
+DESCRICAO_PLACEHOLDER = "Aguardando Pagamento Pix"
+
+
+class WebhookService:
+    """Caixa de entrada dos webhooks da SkalePay. Valores em centavos."""
+
+    # --- 1. RECEPÇÃO (endpoint) ---
+
+    @staticmethod
+    def assinatura_valida(corpo: bytes, assinatura: str) -> bool:
+        """HMAC SHA-256 do corpo bruto com a SKALEPAY_SECRET_KEY (sem chave = dev, aceita)."""
+        segredo = getattr(settings, 'SKALEPAY_SECRET_KEY', '') or ''
+        if not segredo:
+            return True
+        esperada = hmac.new(segredo.encode('utf-8'), corpo, hashlib.sha256).hexdigest()
+        # Comparação em tempo constante contra 'timing attacks'
+        return hmac.compare_digest(assinatura or '', esperada)
+
+    @staticmethod
+    def extrair(dados) -> Tuple[Optional[str], Optional[str], Optional[int]]:
+        """(id_externo, tipo_evento, usuario_id) do payload (campos em `data`)."""
+        data = dados.get('data') if isinstance(dados, dict) else None
+        if not isinstance(data, dict):
+            return None, None, None
+        metadata = data.get('metadata') or {}
+        return data.get('id'), data.get('status'), metadata.get('usuario_id')
+
+    @staticmethod
+    def evento_metrica(tipo_evento: Optional[str]) -> str:
+        return tipo_evento if tipo_evento in EVENTOS_METRICA else 'outro'
+
+    @staticmethod
+    def enfileirar(id_externo: str, tipo_evento: str, dados: Dict) -> bool:
+        """Grava o evento; False se for reentrega de um evento já recebido."""
+        try:
+            with transaction.atomic():
+                WebhookEvento.objects.create(id_externo=str(id_externo), tipo_evento=str(tipo_evento)[:30], payload=dados)
+        except IntegrityError:
+            # Reentrega: a chave única (id_externo, tipo_evento) já existe
+            return False
+        return True
+
+    # --- 2. CONSUMO (processar_webhooks) ---
+
+    @staticmethod
+    def processar_lote(limite: int = LOTE_PADRAO) -> Dict[str, int]:
+        """
+        Processa até `limite` eventos disponíveis de uma vez (`aplicar_lote`). Se o
+        lote falhar, refaz evento a evento, cada um num savepoint: um evento com
+        erro volta sozinho para a fila.
+
+        Returns:
+            Dict com eventos, processados, erros e falhas (tentativas esgotadas)
+        """
+        resultado = {"eventos": 0, "processados": 0, "erros": 0, "falhas": 0}
+        agora = timezone.now()
+        with transaction.atomic():
+            eventos = list(
+                WebhookEvento.objects.select_for_update(skip_locked=True)
+                .filter(status__in=['PENDENTE', 'ERRO'], disponivel_em__lte=agora)
+                .order_by('id')[:limite]
+            )
+            if not eventos:
+                return resultado
+
+            falhos = {}
+            try:
+                with transaction.atomic():
+                    WebhookService.aplicar_lote(eventos)
+            except Exception:
+                logger.warning(f"Lote de {len(eventos)} webhooks falhou; reprocessando evento a evento", exc_info=True)
+                for evento in eventos:
+                    try:
+                        with transaction.atomic():
+                            WebhookService.aplicar_lote([evento])
+                    except Exception as e:
+                        logger.exception(f"Erro ao processar webhook {evento.pk} ({evento.id_externo})")
+                        falhos[evento.pk] = e
+
+            processado_em = timezone.now()
+            for evento in eventos:
+                if evento.pk in falhos:
+                    WebhookService._registrar_erro(evento, falhos[evento.pk], agora)
+                    resultado["falhas" if evento.status == 'FALHOU' else "erros"] += 1
+                    continue
+                evento.status = 'PROCESSADO'
+                evento.processado_em = processado_em
+                evento.ultimo_erro = None
+                resultado["processados"] += 1
+                WEBHOOK_LATENCIA.observe(
+                    (processado_em - evento.recebido_em).total_seconds(), etapa='processamento',
+                    evento=WebhookService.evento_metrica(evento.tipo_evento), resultado='processado',
+                )
+
+            WebhookEvento.objects.bulk_update(
+                eventos, ['status', 'tentativas', 'ultimo_erro', 'disponivel_em', 'processado_em']
+            )
+        resultado["eventos"] = len(eventos)
+        return resultado
+
+    @staticmethod
+    def _registrar_erro(evento: WebhookEvento, erro: Exception, agora) -> None:
+        evento.tentativas += 1
+        evento.ultimo_erro = f"{type(erro).__name__}: {erro}"[:2000]
+        if evento.tentativas >= MAX_TENTATIVAS:
+            evento.status = 'FALHOU'
+            return
+        evento.status = 'ERRO'
+        evento.disponivel_em = agora + min(BACKOFF_BASE * 2 ** (evento.tentativas - 1), BACKOFF_MAXIMO)
+
+    @staticmethod
+    def aplicar_lote(eventos: List[WebhookEvento]) -> None:
+        """
+        Efeitos de um lote de eventos. As solicitações são travadas em ordem de id
+        e conferidas antes do efeito (idempotência); os depósitos pagos seguem
+        juntos para `aprovar_depositos`.
+        """
+        ids_externos = sorted({evento.id_externo for evento in eventos})
+        solicitacoes = {
+            s.id_externo: s
+            for s in SolicitacaoPagamento.objects.select_for_update().filter(id_externo__in=ids_externos).order_by('pk')
+        }
+
+        aprovar, recusar = [], []
+        for evento in eventos:
+            _, status_pagamento, usuario_id = WebhookService.extrair(evento.payload)
+            solicitacao = solicitacoes.get(evento.id_externo)
+            if solicitacao is None:
+                # Depósito direto sem pedido no site: cria agora (valor do gateway em centavos)
+                solicitacao, _ = SolicitacaoPagamento.objects.select_for_update().get_or_create(
+                    id_externo=evento.id_externo,
+                    defaults={
+                        'valor': int(float(evento.payload['data'].get('amount', '0.00')) * 100),
+                        'tipo': 'DEPOSITO',
+                        'usuario_id': usuario_id,
+                        'status': 'PENDENTE',
+                    }
+                )
+                solicitacoes[evento.id_externo] = solicitacao
+
+            # IDEMPOTÊNCIA: solicitação já resolvida (antes ou por outro evento deste lote)
+            if solicitacao.status in STATUS_FINAIS:
+                continue
+
+            if status_pagamento == 'paid':
+                solicitacao.status = 'APROVADO'
+                aprovar.append(solicitacao)
+            elif status_pagamento in ['failed', 'canceled']:
+                solicitacao.status = 'RECUSADO'
+                recusar.append(solicitacao)
+
+        WebhookService.aprovar_depositos(aprovar)
+        if recusar:
+            agora = timezone.now()
+            for solicitacao in recusar:
+                solicitacao.atualizado_em = agora
+            SolicitacaoPagamento.objects.bulk_update(recusar, ['status', 'atualizado_em'])
+
+    @staticmethod
+    def aprovar_depositos(solicitacoes: List[SolicitacaoPagamento]) -> None:
+        """
+        Aprova depósitos em lote: libera saldo + bônus, marca FTD e paga a comissão
+        dos padrinhos que ganham por DEPÓSITO, somada por padrinho.
+
+        Depositantes e padrinhos são travados juntos, em ordem de id (sem deadlock
+        entre consumidores). As contas ficam em memória e vão ao banco em poucos
+        comandos: 1 UPDATE de usuários, 1 INSERT de lançamentos, 1 UPDATE de
+        solicitações (+ contadores e perfis de risco, também em lote).
+        """
+        if not solicitacoes:
+            return
+        solicitacoes = sorted(solicitacoes, key=lambda s: s.pk)
+        agora = timezone.now()
+
+        depositantes = {s.usuario_id for s in solicitacoes}
+        padrinhos = set(
+            CustomUser.objects.filter(pk__in=depositantes, afiliado__isnull=False).values_list('afiliado_id', flat=True)
+        )
+        usuarios = {
+            u.pk: u for u in CustomUser.objects.select_for_update().filter(pk__in=depositantes | padrinhos).order_by('pk')
+        }
+
+        transacoes = []
+        comissoes = defaultdict(lambda: [0, 0, None])  # padrinho -> [centavos, depósitos, último indicado]
+        for solicitacao in solicitacoes:
+            usuario = usuarios[solicitacao.usuario_id]
+            valor = solicitacao.valor
+
+            # --- FTD (First Time Deposit) ---
+            if usuario.data_primeiro_deposito is None:
+                usuario.data_primeiro_deposito = agora
+
+            # Bônus (regra do model; marca recebeu_bonus e a meta de rollover)
+            bonus = int(usuario.aplicar_bonus_deposito(valor))
+
+            # Extrato: depósito e, separado, o bônus
+            saldo_anterior = usuario.saldo
+            usuario.saldo = saldo_anterior + valor + bonus
+            transacoes.append(Transacao(
+                usuario=usuario, tipo='DEPOSITO', valor=valor,
+                saldo_anterior=saldo_anterior, saldo_posterior=saldo_anterior + valor,
+                descricao=f"Depósito Pix (ID: {solicitacao.id_externo})", origem_solicitacao=solicitacao,
+            ))
+            if bonus > 0:
+                transacoes.append(Transacao(
+                    usuario=usuario, tipo='BONUS', valor=bonus,
+                    saldo_anterior=saldo_anterior + valor, saldo_posterior=usuario.saldo,
+                    descricao="Bônus de Boas-vindas",
+                ))
+
+            # Comissão por DEPÓSITO (base = valor sem bônus), mesma regra de `processar_comissao`
+            padrinho = usuarios.get(usuario.afiliado_id)
+            if padrinho and padrinho.modo_comissao == 'DEPOSITO' and padrinho.comissao_percentual > 0:
+                comissao = int(Decimal(valor) * padrinho.comissao_percentual / Decimal('100'))  # Trunca (ROUND_DOWN)
+                if comissao > 0:
+                    acumulado = comissoes[padrinho.pk]
+                    acumulado[0] += comissao
+                    acumulado[1] += 1
+                    acumulado[2] = usuario
+
+            solicitacao.status = 'APROVADO'
+            solicitacao.data_aprovacao = agora
+            solicitacao.atualizado_em = agora
+
+        # Um crédito por padrinho no lote
+        for padrinho_id, (comissao, quantidade, indicado) in comissoes.items():
+            padrinho = usuarios[padrinho_id]
+            saldo_anterior = padrinho.saldo
+            padrinho.saldo += comissao
+            if quantidade == 1:
+                descricao = f"Comissão sobre DEPOSITO de {indicado.nome_completo or indicado.cpf_cnpj}"
+            else:
+                descricao = f"Comissão sobre DEPOSITO ({quantidade} depósitos de indicados)"
+            transacoes.append(Transacao(
+                usuario=padrinho, tipo='COMISSAO', valor=comissao,
+                saldo_anterior=saldo_anterior, saldo_posterior=padrinho.saldo, descricao=descricao,
+            ))
+
+        alterados = [usuarios[uid] for uid in sorted(depositantes | set(comissoes))]
+        CustomUser.objects.bulk_update(alterados, CAMPOS_USUARIO_DEPOSITO)
+        Transacao.objects.bulk_create(transacoes)
+        SolicitacaoPagamento.objects.bulk_update(solicitacoes, ['status', 'data_aprovacao', 'atualizado_em'])
+
+        # bulk_create não dispara post_save: contadores e perfis de risco em lote
+        ContadorService.incrementar_lote('transacoes', Counter(t.usuario_id for t in transacoes))
+        PerfilRiscoService.registrar_lote(transacoes)
+
+        # O dinheiro entrou na conta da SkalePay: liquidez DESTE processo ajustada após o commit
+        # (os workers web só veem o depósito na próxima revalidação do atualizador periódico)
+        total = sum(solicitacao.valor for solicitacao in solicitacoes)
+        transaction.on_commit(lambda: LiquidezService.ajustar(total))
+
+    # --- 3. REPROCESSAMENTO ---
+
+    @staticmethod
+    def reprocessar(ids: Optional[Iterable[int]] = None, status: Iterable[str] = ('FALHOU',),
+                    desde=None) -> int:
+        """
+        Devolve eventos à fila (zera tentativas). Seguro para PROCESSADO também:
+        a aplicação confere o status da solicitação antes de qualquer efeito.
+        """
+        eventos = WebhookEvento.objects.filter(status__in=list(status))
+        if ids:
+            eventos = eventos.filter(pk__in=list(ids))
+        if desde:
+            eventos = eventos.filter(recebido_em__gte=desde)
+        return eventos.update(status='PENDENTE', tentativas=0, disponivel_em=timezone.now(), processado_em=None)
+
+
+class AuditoriaDepositosService:
+    """Depósitos PENDENTE cujo webhook não chegou, conciliados com a SkalePay. Valores em centavos."""
+
+    @staticmethod
+    def pendentes(apos_id: int, limite: int, corte) -> List[SolicitacaoPagamento]:
+        """Próximo lote por keyset (id > apos_id), só depósitos criados antes de `corte`."""
+        return list(
+            SolicitacaoPagamento.objects.filter(
+                tipo='DEPOSITO', status='PENDENTE', criado_em__lt=corte, pk__gt=apos_id,
+            ).only('pk', 'id_externo').order_by('pk')[:limite]
+        )
+
+    @staticmethod
+    async def consultar_status(depositos: List[SolicitacaoPagamento], client) -> Dict[int, Optional[str]]:
+        """Status das transações em paralelo; None = sem resposta da SkalePay."""
+
+        async def consultar(deposito: SolicitacaoPagamento) -> Tuple[int, Optional[str]]:
+            if not deposito.id_externo:
+                return deposito.pk, 'nao_encontrado'
+            try:
+                resposta = await client.consultar_transacao(deposito.id_externo)
+                return deposito.pk, str(resposta.get('status') or '').lower()
+            except SkalePayError as e:
+                return deposito.pk, 'nao_encontrado' if e.status_code == 404 else None
+
+        return dict(await asyncio.gather(*(consultar(deposito) for deposito in depositos)))
+
+    @staticmethod
+    def aplicar(status_por_deposito: Dict[int, Optional[str]], abandono) -> Dict[str, int]:
+        """
+        Decisões de um lote numa transação. Pagos seguem o caminho normal
+        (`aprovar_depositos`); recusados/expirados são encerrados; ainda
+        aguardando pagamento depois de `abandono` (o Pix já expirou) viram
+        CANCELADO. Os placeholders do extrato dos depósitos do lote são apagados.
+        """
+        resultado = {"aprovados": 0, "recusados": 0, "cancelados": 0, "aguardando": 0, "erros": 0,
+                     "ignorados": 0, "placeholders": 0}
+        if not status_por_deposito:
+            return resultado
+
+        agora = timezone.now()
+        with transaction.atomic():
+            depositos = list(
+                SolicitacaoPagamento.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=sorted(status_por_deposito), status='PENDENTE').order_by('pk')
+            )
+            resultado["ignorados"] = len(status_por_deposito) - len(depositos)
+
+            aprovar, encerrar = [], []
+            for deposito in depositos:
+                status_real = status_por_deposito[deposito.pk]
+                if status_real is None:
+                    resultado["erros"] += 1
+                elif status_real == 'paid':
+                    deposito.status = 'APROVADO'
+                    aprovar.append(deposito)
+                elif status_real in STATUS_DEPOSITO_RECUSADO:
+                    deposito.status = 'RECUSADO'
+                    deposito.analise_motivo = f"Auditoria: SkalePay retornou {status_real}"
+                    encerrar.append(deposito)
+                elif status_real in STATUS_DEPOSITO_EXPIRADO or deposito.criado_em < abandono:
+                    deposito.status = 'CANCELADO'
+                    deposito.analise_motivo = f"Auditoria: Pix expirado sem pagamento ({status_real})"
+                    encerrar.append(deposito)
+                else:
+                    resultado["aguardando"] += 1
+
+            WebhookService.aprovar_depositos(aprovar)
+            for deposito in encerrar:
+                deposito.atualizado_em = agora
+            SolicitacaoPagamento.objects.bulk_update(encerrar, ['status', 'analise_motivo', 'atualizado_em'])
+            resultado["placeholders"] = AuditoriaDepositosService.limpar_placeholders([d.pk for d in depositos])
+
+        resultado["aprovados"] = len(aprovar)
+        resultado["recusados"] = sum(1 for d in encerrar if d.status == 'RECUSADO')
+        resultado["cancelados"] = len(encerrar) - resultado["recusados"]
+        return resultado
+
+    @staticmethod
+    def limpar_placeholders(solicitacao_ids: List[int]) -> int:
+        """
+        Apaga os lançamentos "Aguardando Pagamento Pix" (valor sem mexer no saldo):
+        quebravam a auditoria do extrato e contavam como depósito no perfil de risco,
+        que é refeito para os usuários afetados.
+        """
+        if not solicitacao_ids:
+            return 0
+        placeholders = Transacao.objects.filter(
+            origem_solicitacao_id__in=solicitacao_ids, tipo='DEPOSITO',
+            descricao=DESCRICAO_PLACEHOLDER, saldo_anterior=F('saldo_posterior'),
+        )
+        usuarios = set(placeholders.values_list('usuario_id', flat=True))
+        if not usuarios:
+            return 0
+        with transaction.atomic():
+            apagados = placeholders.delete()[1].get(Transacao._meta.label, 0)
+            for usuario_id in sorted(usuarios):
+                PerfilRiscoService.reconstruir(usuario_id)
+        return apagados
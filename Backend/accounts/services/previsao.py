@@ -0,0 +1,132 @@
+"""
+Previsão de receita (GGR) com sazonalidade semanal e perfil horário.
+
+Modelo: mínimos quadrados (NumPy) sobre `MetricasDiarias.house_edge_valor`
+    y(t) = intercepto + tendencia * t + efeito_dia_semana(t) + erro
+O perfil horário é a participação média de cada hora no volume diário
+(`mapa_calor_horas`). O ajuste roda 1x por noite e o resultado fica em `PrevisaoReceita`.
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+from django.utils import timezone
+
+from accounts.models import MetricasDiarias, PrevisaoReceita
+
+Z_95 = 1.96
+HORIZONTE_DIAS = 30
+# Abaixo disso o modelo completo (tendência + 6 dummies) fica instável: usa só a média
+MIN_DIAS_MODELO_COMPLETO = 14
+
+
+def _matriz_design(t: np.ndarray, dia_semana: np.ndarray, completo: bool) -> np.ndarray:
+    """Colunas: [1, t, dummies seg..dom sem a segunda (base)]."""
+    if not completo:
+        return np.ones((len(t), 1))
+    dummies = np.eye(7)[dia_semana][:, 1:]
+    return np.column_stack([np.ones(len(t)), t, dummies])
+
+
+def _perfil_horario(mapas) -> list:
+    """Participação média de cada hora (0-23) no volume do dia. Soma = 1."""
+    if not mapas:
+        return [round(1 / 24, 6)] * 24
+    volumes = np.array([
+        [float((mapa or {}).get(f"{h:02d}h", {}).get('vol', 0) or 0) for h in range(24)]
+        for mapa in mapas
+    ])
+    totais = volumes.sum(axis=1, keepdims=True)
+    validos = totais[:, 0] > 0
+    if not validos.any():
+        return [round(1 / 24, 6)] * 24
+    perfil = (volumes[validos] / totais[validos]).mean(axis=0)
+    return [round(float(p), 6) for p in perfil]
+
+
+class PrevisaoReceitaService:
+    """
+    Ajuste noturno e leitura da previsão de GGR.
+    """
+
+    @staticmethod
+    def ajustar(referencia: Optional[date] = None, janela_dias: int = 180) -> Optional[PrevisaoReceita]:
+        """
+        Reajusta o modelo com os dias fechados em (referencia - janela, referencia)
+        e grava coeficientes + projeções.
+
+        Returns:
+            A linha atualizada, ou None se não há histórico suficiente (< 2 dias)
+        """
+        referencia = referencia or timezone.localdate()
+        historico = list(
+            MetricasDiarias.objects.filter(
+                data__gte=referencia - timedelta(days=janela_dias), data__lt=referencia
+            ).order_by('data').values_list('data', 'house_edge_valor', 'mapa_calor_horas')
+        )
+        if len(historico) < 2:
+            return None
+
+        datas = [d for d, _, _ in historico]
+        origem = datas[0]
+        t = np.array([(d - origem).days for d in datas], dtype=float)
+        dia_semana = np.array([d.weekday() for d in datas])
+        y = np.array([float(v) for _, v, _ in historico])
+
+        completo = len(historico) >= MIN_DIAS_MODELO_COMPLETO
+        X = _matriz_design(t, dia_semana, completo)
+        beta, *_ = np.linalg.lstsq(X, y, rcond=None)
+
+        residuos = y - X @ beta
+        graus_liberdade = max(len(y) - X.shape[1], 1)
+        desvio = float(np.sqrt((residuos ** 2).sum() / graus_liberdade))
+
+        # Projeção vetorizada para os próximos HORIZONTE_DIAS dias (a partir da referência)
+        futuras = [referencia + timedelta(days=i) for i in range(HORIZONTE_DIAS)]
+        t_futuro = np.array([(d - origem).days for d in futuras], dtype=float)
+        dow_futuro = np.array([d.weekday() for d in futuras])
+        previsto = _matriz_design(t_futuro, dow_futuro, completo) @ beta
+
+        margem_dia = Z_95 * desvio
+        # Erros diários independentes: a banda da soma cresce com sqrt(n)
+        margem_30d = Z_95 * desvio * np.sqrt(HORIZONTE_DIAS)
+
+        coeficientes = {
+            "intercepto": float(beta[0]),
+            "tendencia": float(beta[1]) if completo else 0.0,
+            "dia_semana": [0.0] + [float(b) for b in beta[2:]] if completo else [0.0] * 7,
+            "perfil_horario": _perfil_horario([m for _, _, m in historico]),
+        }
+
+        previsao, _ = PrevisaoReceita.objects.update_or_create(
+            serie='house_edge_valor',
+            defaults={
+                'base_inicio': datas[0],
+                'base_fim': datas[-1],
+                'dias_base': len(historico),
+                'coeficientes': coeficientes,
+                'desvio_residuo': desvio,
+                'projecao_7d': int(round(previsto[:7].sum())),
+                'projecao_30d': int(round(previsto.sum())),
+                'projecao_30d_inferior': int(round(previsto.sum() - margem_30d)),
+                'projecao_30d_superior': int(round(previsto.sum() + margem_30d)),
+                'previsao_diaria': [
+                    {
+                        "data": d.isoformat(),
+                        "valor": int(round(v)),
+                        "inferior": int(round(v - margem_dia)),
+                        "superior": int(round(v + margem_dia)),
+                    }
+                    for d, v in zip(futuras, previsto)
+                ],
+            }
+        )
+        return previsao
+
+    @staticmethod
+    def atual() -> Optional[PrevisaoReceita]:
+        """Última previsão gravada (leitura de 1 linha, sem recalcular nada)."""
+        return PrevisaoReceita.objects.filter(serie='house_edge_valor').first()
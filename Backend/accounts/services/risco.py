@@ -0,0 +1,281 @@
+"""
+Risco e compliance sobre o extrato (`Transacao`).
+
+1. Detectores (relatórios): cada detector é UMA query: saques da janela filtrados
+   por um EXISTS correlacionado ("houve um crédito do tipo X do mesmo usuário nas
+   N horas anteriores?"), resolvido pelo índice (usuario, tipo, data) e paginado no SQL.
+2. Motor de score (tempo real): `PerfilRisco` guarda features por usuário
+   atualizadas a cada lançamento (1 UPDATE, com o decaimento calculado no
+   banco); o score de um saque é calculado só com elas.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, DateTimeField, Exists, F, FloatField, Func, OuterRef, Q, QuerySet, Subquery, Value, When,
+)
+from django.db.models.functions import Power
+from django.utils import timezone
+
+from accounts.models import PerfilRisco, Transacao
+
+
+class RiscoService:
+    """
+    Consultas de compliance usadas pelo `RiscoComplianceViewSet`.
+    """
+
+    @staticmethod
+    def saques_apos_credito(tipo_credito: str, janela: timedelta, dias: int = 7) -> QuerySet:
+        """
+        Saques dos últimos `dias` precedidos (em até `janela`) por um crédito `tipo_credito`.
+
+        Returns:
+            QuerySet de Transacao (SAQUE), mais recentes primeiro, anotado com
+            `data_credito` / `valor_credito` do crédito mais recente da janela
+        """
+        creditos = Transacao.objects.filter(
+            usuario_id=OuterRef('usuario_id'),
+            tipo=tipo_credito,
+            data__lt=OuterRef('data'),
+            data__gte=OuterRef('data') - janela,
+        )
+        ultimo_credito = creditos.order_by('-data')
+
+        return (
+            Transacao.objects.filter(tipo='SAQUE', data__gte=timezone.now() - timedelta(days=dias))
+            .filter(Exists(creditos))
+            .annotate(
+                data_credito=Subquery(ultimo_credito.values('data')[:1]),
+                valor_credito=Subquery(ultimo_credito.values('valor')[:1]),
+            )
+            .select_related('usuario')
+            .only('id', 'data', 'valor', 'usuario__email')
+            .order_by('-data', '-id')
+        )
+
+
+# --- MOTOR DE SCORE (tempo real) ---
+
+MEIA_VIDA_VELOCIDADE = timedelta(hours=24)
+TRAVA_POS_DEPOSITO = timedelta(seconds=60)
+JANELA_DEPOSITO_RAPIDO = timedelta(hours=2)
+JANELA_BONUS = timedelta(hours=24)
+VALOR_SAQUE_ALTO = 50000  # R$ 500,00 em centavos (regra antiga da análise manual)
+APOSTADO_MINIMO_TAXA_ACERTO = 10000  # Só avalia taxa de acerto após R$ 100,00 apostados
+TAXA_ACERTO_ANOMALA = 1.5  # Prêmios / apostado acima disso é fora da curva para a banca
+
+CAMPO_VELOCIDADE = {
+    'DEPOSITO': 'vel_deposito',
+    'SAQUE': 'vel_saque',
+    'APOSTA': 'vel_aposta',
+    'PREMIO': 'vel_premio',
+}
+# Campos gravados por `registrar_lote` (bulk_update)
+CAMPOS_PERFIL = (
+    *CAMPO_VELOCIDADE.values(), 'velocidades_em', 'ultimo_deposito_em', 'ultimo_saque_em', 'ultimo_bonus_em',
+    'total_depositado', 'total_apostado', 'total_premios', 'atualizado_em',
+)
+
+
+def score_minimo_analise() -> int:
+    """Score a partir do qual o saque vai para EM_ANALISE (settings.RISCO_SCORE_ANALISE)."""
+    return getattr(settings, 'RISCO_SCORE_ANALISE', 80)
+
+
+def _decaimento(desde, agora) -> float:
+    if not desde or agora <= desde:
+        return 1.0
+    return 0.5 ** ((agora - desde) / MEIA_VIDA_VELOCIDADE)
+
+
+class _SegundosEntre(Func):
+    """`fim - inicio` em segundos (float), no PostgreSQL e no SQLite."""
+    arity = 2
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template="EXTRACT(EPOCH FROM (%(expressions)s))::double precision",
+            arg_joiner=' - ', **extra_context,
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template="((julianday(%(expressions)s)) * 86400.0)",
+            arg_joiner=') - julianday(', **extra_context,
+        )
+
+
+def _campos_update(tipo: str, valor: int, quando) -> dict:
+    """O mesmo que `PerfilRiscoService.aplicar`, como expressões de um UPDATE (lê os valores antigos da linha)."""
+    momento = Value(quando, output_field=DateTimeField())
+    posterior = Q(velocidades_em__lt=quando)
+    fator = Case(
+        When(posterior, then=Power(
+            Value(0.5), _SegundosEntre(momento, F('velocidades_em')) / MEIA_VIDA_VELOCIDADE.total_seconds()
+        )),
+        default=Value(1.0), output_field=FloatField(),
+    )
+    campos = {campo: F(campo) * fator for campo in CAMPO_VELOCIDADE.values()}
+    campos['velocidades_em'] = Case(
+        When(Q(velocidades_em__isnull=True) | posterior, then=momento), default=F('velocidades_em'),
+    )
+
+    campo = CAMPO_VELOCIDADE.get(tipo)
+    if campo:
+        campos[campo] = campos[campo] + valor
+
+    if tipo == 'DEPOSITO':
+        campos['ultimo_deposito_em'] = quando
+        campos['total_depositado'] = F('total_depositado') + valor
+    elif tipo == 'SAQUE':
+        campos['ultimo_saque_em'] = quando
+    elif tipo == 'BONUS':
+        campos['ultimo_bonus_em'] = quando
+    elif tipo == 'APOSTA':
+        campos['total_apostado'] = F('total_apostado') + valor
+    elif tipo == 'PREMIO':
+        campos['total_premios'] = F('total_premios') + valor
+
+    campos['atualizado_em'] = timezone.now()
+    return campos
+
+
+class PerfilRiscoService:
+    """
+    Mantém `PerfilRisco` a cada lançamento e calcula o score de saques.
+    """
+
+    @staticmethod
+    def registrar_transacao(transacao) -> None:
+        """
+        Atualiza as features com um lançamento novo. Chamado pelo post_save de Transacao,
+        dentro da mesma transação do lançamento: 1 UPDATE atômico, sem lock nem leitura
+        (decaimento das velocidades calculado no banco); cria o perfil na primeira vez.
+        """
+        campos = _campos_update(transacao.tipo, transacao.valor, transacao.data or timezone.now())
+        perfis = PerfilRisco.objects.filter(usuario_id=transacao.usuario_id)
+        if not perfis.update(**campos):
+            PerfilRisco.objects.bulk_create([PerfilRisco(usuario_id=transacao.usuario_id)], ignore_conflicts=True)
+            perfis.update(**campos)
+
+    @staticmethod
+    def registrar_lote(transacoes) -> None:
+        """
+        `registrar_transacao` para lançamentos gravados com bulk_create (que não
+        dispara post_save): perfis travados em ordem de usuário e 1 UPDATE em lote.
+        """
+        if not transacoes:
+            return
+        agora = timezone.now()
+        usuario_ids = sorted({t.usuario_id for t in transacoes})
+        with transaction.atomic():
+            PerfilRisco.objects.bulk_create([PerfilRisco(usuario_id=uid) for uid in usuario_ids], ignore_conflicts=True)
+            perfis = {
+                perfil.usuario_id: perfil
+                for perfil in PerfilRisco.objects.select_for_update().filter(usuario_id__in=usuario_ids).order_by('usuario_id')
+            }
+            for t in transacoes:
+                PerfilRiscoService.aplicar(perfis[t.usuario_id], t.tipo, t.valor, t.data or agora)
+            for perfil in perfis.values():
+                perfil.atualizado_em = agora
+            PerfilRisco.objects.bulk_update(list(perfis.values()), CAMPOS_PERFIL)
+
+    @staticmethod
+    def aplicar(perfil, tipo: str, valor: int, quando) -> None:
+        """Aplica um lançamento em memória (usado pelo signal e pela reconstrução)."""
+        fator = _decaimento(perfil.velocidades_em, quando)
+        if fator != 1.0:
+            for campo in CAMPO_VELOCIDADE.values():
+                setattr(perfil, campo, getattr(perfil, campo) * fator)
+        if not perfil.velocidades_em or quando > perfil.velocidades_em:
+            perfil.velocidades_em = quando
+
+        campo = CAMPO_VELOCIDADE.get(tipo)
+        if campo:
+            setattr(perfil, campo, getattr(perfil, campo) + valor)
+
+        if tipo == 'DEPOSITO':
+            perfil.ultimo_deposito_em = quando
+            perfil.total_depositado += valor
+        elif tipo == 'SAQUE':
+            perfil.ultimo_saque_em = quando
+        elif tipo == 'BONUS':
+            perfil.ultimo_bonus_em = quando
+        elif tipo == 'APOSTA':
+            perfil.total_apostado += valor
+        elif tipo == 'PREMIO':
+            perfil.total_premios += valor
+
+    @staticmethod
+    def carregar(usuario_id: int) -> PerfilRisco:
+        """Lê o perfil por PK (perfil vazio, não salvo, se o usuário nunca movimentou)."""
+        return PerfilRisco.objects.filter(usuario_id=usuario_id).first() or PerfilRisco(usuario_id=usuario_id)
+
+    @staticmethod
+    def em_trava_pos_deposito(perfil, agora=None) -> bool:
+        agora = agora or timezone.now()
+        return bool(perfil.ultimo_deposito_em and agora - perfil.ultimo_deposito_em < TRAVA_POS_DEPOSITO)
+
+    @staticmethod
+    def avaliar_saque(perfil, usuario, valor: int, agora=None):
+        """
+        Score 0-100 de um pedido de saque, só com as features em memória
+        (o anel de multicontas é lido por PK apenas se o usuário estiver em um).
+
+        Returns:
+            (score, motivos) - motivos é a lista de regras que pontuaram
+        """
+        agora = agora or timezone.now()
+        fator = _decaimento(perfil.velocidades_em, agora)
+        score = 0
+        motivos = []
+
+        def pontuar(pontos, motivo):
+            nonlocal score
+            score += pontos
+            motivos.append(f"{motivo} (+{pontos})")
+
+        if usuario.conta_suspeita:
+            pontuar(100, "Conta marcada como suspeita")
+
+        if valor >= VALOR_SAQUE_ALTO:
+            pontuar(80, "Valor alto")
+
+        if perfil.ultimo_deposito_em and agora - perfil.ultimo_deposito_em < JANELA_DEPOSITO_RAPIDO:
+            pontuar(30, "Saque < 2h após depósito")
+
+        if perfil.ultimo_bonus_em and agora - perfil.ultimo_bonus_em < JANELA_BONUS:
+            pontuar(25, "Saque < 24h após bônus")
+
+        # Velocidade: saques (com este) muito acima do que entrou por depósito no período
+        vel_deposito = perfil.vel_deposito * fator
+        vel_saque = perfil.vel_saque * fator + valor
+        if vel_saque > 3 * max(vel_deposito, 1):
+            pontuar(15, "Velocidade de saque acima dos depósitos")
+
+        anel = usuario.anel_multiconta if usuario.anel_multiconta_id else None
+        if anel and anel.total_usuarios > 1:
+            pontuar(min(20, 5 * (anel.total_usuarios - 1)), f"IP compartilhado com {anel.total_usuarios - 1} conta(s)")
+
+        if perfil.total_apostado >= APOSTADO_MINIMO_TAXA_ACERTO:
+            taxa = perfil.total_premios / perfil.total_apostado
+            if taxa > TAXA_ACERTO_ANOMALA:
+                pontuar(20, f"Taxa de acerto anômala ({taxa:.1f}x)")
+
+        return min(score, 100), motivos
+
+    @staticmethod
+    def reconstruir(usuario_id: int):
+        """Refaz o perfil do zero a partir do extrato (backfill / auditoria)."""
+        perfil = PerfilRisco(usuario_id=usuario_id)
+        lancamentos = Transacao.objects.filter(usuario_id=usuario_id).order_by('data', 'id').values_list('tipo', 'valor', 'data')
+        for tipo, valor, data in lancamentos.iterator(chunk_size=2000):
+            PerfilRiscoService.aplicar(perfil, tipo, valor, data)
+        perfil.save()
+        return perfil
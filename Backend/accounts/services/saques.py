@@ -0,0 +1,310 @@
+"""
+Outbox de saques: débito, `SolicitacaoPagamento` e `SaqueOutbox` são gravados
+na mesma transação e o endpoint responde na hora (202). O envio à SkalePay
+fica com o despachante (`despachar_saques`), fora dos workers web:
+
+    1. `reivindicar`: pega um lote com SELECT ... FOR UPDATE SKIP LOCKED e marca
+       ENVIANDO (commit antes da chamada HTTP); vários despachantes dividem a fila.
+    2. `enviar`: chamadas concorrentes pelo AsyncSkalePayClient (pool keep-alive,
+       semáforo), limitadas a `taxa` saques por segundo. `externalRef` é sempre o
+       ID da solicitação, o mesmo em qualquer tentativa.
+    3. `registrar`: aplica o desfecho de cada saque na própria transação.
+
+Desfechos:
+    - Aceito: solicitação APROVADO com o ID da transferência.
+    - Recusado pela SkalePay (4xx): estorno na carteira, solicitação RECUSADO.
+    - Certamente não processado (conexão, 429, 503): volta à fila com backoff;
+      esgotadas as `MAX_TENTATIVAS`, estorno.
+    - Talvez processado (timeout de leitura, 5xx): INCERTO, nunca reenviado; a
+      solicitação segue PROCESSANDO para a auditoria (`auditar_saques`).
+
+Reconciliação: linhas em ENVIANDO há mais de `ENVIO_EXPIRA` (despachante que
+caiu no meio do envio) viram INCERTO pelo mesmo caminho.
+
+Auditoria (`AuditoriaSaquesService`, comando `auditar_saques`): saques parados
+em PROCESSANDO são lidos em lotes por keyset (id), o status de cada
+transferência é consultado em paralelo e as aprovações/estornos do lote são
+gravados numa transação, com escritas em lote.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.gateways.skalepay import SkalePayError
+from accounts.models import CustomUser, SaqueOutbox, SolicitacaoPagamento, Transacao
+from accounts.services.contadores import ContadorService
+from accounts.services.risco import PerfilRiscoService
+from accounts.services.wallet import WalletService
+from core.metricas import SAQUES_DESPACHADOS
+
+logger = logging.getLogger(__name__)
+
+LOTE_PADRAO = 50
+TAXA_PADRAO = 10.0
+MAX_TENTATIVAS = 5
+BACKOFF_BASE = timedelta(seconds=10)
+BACKOFF_MAXIMO = timedelta(minutes=10)
+ENVIO_EXPIRA = timedelta(minutes=5)
+MOTIVO_INCERTO = "Timeout Banco. Auditoria pendente."
+# Auditoria: status da transferência na SkalePay -> decisão
+STATUS_PAGO = ('PAID',)
+STATUS_ESTORNO = ('FAILED', 'CANCELED', 'REJECTED', 'NAO_ENCONTRADO')
+ERRO_COMUNICACAO = 'ERRO_COMUNICACAO'
+
+Resultado = Tuple[SaqueOutbox, Optional[Dict], Optional[SkalePayError]]
+
+
+class LimitadorTaxa:
+    """Token bucket assíncrono: no máximo `taxa` envios por segundo, rajada de até `taxa`."""
+
+    def __init__(self, taxa: float):
+        self.taxa = taxa
+        self.capacidade = max(1.0, taxa)
+        self.fichas = self.capacidade
+        self.atualizado_em = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def aguardar(self) -> None:
+        async with self.lock:
+            while True:
+                agora = time.monotonic()
+                self.fichas = min(self.capacidade, self.fichas + (agora - self.atualizado_em) * self.taxa)
+                self.atualizado_em = agora
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return
+                await asyncio.sleep((1 - self.fichas) / self.taxa)
+
+
+class SaqueOutboxService:
+    """Envio dos saques gravados na outbox. Valores em centavos."""
+
+    @staticmethod
+    def enfileirar(solicitacao: SolicitacaoPagamento) -> SaqueOutbox:
+        """Chamar dentro da transação que debitou a carteira e criou a solicitação."""
+        return SaqueOutbox.objects.create(solicitacao=solicitacao)
+
+    @staticmethod
+    def reivindicar(limite: int = LOTE_PADRAO) -> List[SaqueOutbox]:
+        """Lote de saques disponíveis, já marcados ENVIANDO (e commitados) antes do envio."""
+        agora = timezone.now()
+        with transaction.atomic():
+            itens = list(
+                SaqueOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('solicitacao')
+                .filter(status='PENDENTE', disponivel_em__lte=agora)
+                .order_by('id')[:limite]
+            )
+            for item in itens:
+                item.status = 'ENVIANDO'
+                item.tentativas += 1
+                item.enviado_em = agora
+            SaqueOutbox.objects.bulk_update(itens, ['status', 'tentativas', 'enviado_em'])
+        return itens
+
+    @staticmethod
+    async def enviar(itens: List[SaqueOutbox], client, limitador: LimitadorTaxa) -> List[Resultado]:
+        """Envia o lote em paralelo (AsyncSkalePayClient); nunca levanta, devolve o erro por item."""
+
+        async def enviar_um(item: SaqueOutbox) -> Resultado:
+            await limitador.aguardar()
+            solicitacao = item.solicitacao
+            try:
+                resposta = await client.solicitar_saque(
+                    pix_key=str(solicitacao.chave_pix),
+                    valor=Decimal(solicitacao.valor) / 100,
+                    external_ref=str(solicitacao.id),
+                )
+                return item, resposta, None
+            except SkalePayError as e:
+                return item, None, e
+            except Exception as e:
+                logger.exception(f"Erro inesperado enviando saque {solicitacao.id}")
+                return item, None, SkalePayError(str(e), incerto=True)
+
+        return await asyncio.gather(*(enviar_um(item) for item in itens))
+
+    @staticmethod
+    def registrar_lote(resultados: List[Resultado]) -> Dict[str, int]:
+        desfechos: Dict[str, int] = {}
+        for item, resposta, erro in resultados:
+            desfecho = SaqueOutboxService.registrar(item, resposta, erro)
+            desfechos[desfecho] = desfechos.get(desfecho, 0) + 1
+        return desfechos
+
+    @staticmethod
+    def registrar(item: SaqueOutbox, resposta: Optional[Dict], erro: Optional[SkalePayError]) -> str:
+        """Aplica o desfecho de um envio: 'enviado', 'recusado', 'retentativa' ou 'incerto'."""
+        agora = timezone.now()
+        with transaction.atomic():
+            solicitacao = SolicitacaoPagamento.objects.select_for_update().get(pk=item.solicitacao_id)
+            item.ultimo_erro = f"{erro} (HTTP {erro.status_code})"[:2000] if erro else None
+
+            if erro is None:
+                desfecho = 'enviado'
+                solicitacao.status = 'APROVADO'
+                solicitacao.id_externo = (resposta or {}).get('id')
+            elif erro.incerto:
+                # O dinheiro pode ter saído: não reenvia nem estorna
+                desfecho = 'incerto'
+                solicitacao.analise_motivo = MOTIVO_INCERTO
+            elif (erro.status_code is None or erro.status_code in (429, 503)) and item.tentativas < MAX_TENTATIVAS:
+                desfecho = 'retentativa'
+                item.disponivel_em = agora + min(BACKOFF_BASE * 2 ** (item.tentativas - 1), BACKOFF_MAXIMO)
+            else:
+                desfecho = 'recusado'
+                WalletService.credit(
+                    solicitacao.usuario_id, solicitacao.valor, "Estorno (Falha Envio)",
+                    related_object=solicitacao, tipo='ESTORNO',
+                )
+                solicitacao.status = 'RECUSADO'
+                solicitacao.analise_motivo = str(erro)
+
+            item.status = {'enviado': 'ENVIADO', 'incerto': 'INCERTO', 'retentativa': 'PENDENTE'}.get(desfecho, 'RECUSADO')
+            item.processado_em = agora
+            item.save(update_fields=['status', 'ultimo_erro', 'disponivel_em', 'processado_em'])
+            solicitacao.save(update_fields=['status', 'id_externo', 'analise_motivo', 'atualizado_em'])
+
+        SAQUES_DESPACHADOS.inc(resultado=desfecho)
+        if desfecho != 'enviado':
+            logger.warning(f"Saque {solicitacao.id}: {desfecho} ({item.ultimo_erro})")
+        return desfecho
+
+    @staticmethod
+    def reconciliar_travados(limite: timedelta = ENVIO_EXPIRA) -> int:
+        """ENVIANDO há mais de `limite`: o despachante caiu sem desfecho; vira INCERTO."""
+        corte = timezone.now() - limite
+        with transaction.atomic():
+            itens = list(
+                SaqueOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status='ENVIANDO', enviado_em__lt=corte)
+            )
+            if not itens:
+                return 0
+            ids = [item.solicitacao_id for item in itens]
+            SolicitacaoPagamento.objects.filter(pk__in=ids, status='PROCESSANDO').update(
+                analise_motivo=MOTIVO_INCERTO, atualizado_em=timezone.now()
+            )
+            SaqueOutbox.objects.filter(pk__in=[item.pk for item in itens]).update(
+                status='INCERTO', ultimo_erro="Envio sem desfecho (despachante interrompido)", processado_em=timezone.now()
+            )
+        SAQUES_DESPACHADOS.inc(len(itens), resultado='incerto')
+        return len(itens)
+
+
+class AuditoriaSaquesService:
+    """Reconciliação dos saques parados em PROCESSANDO com a SkalePay. Valores em centavos."""
+
+    @staticmethod
+    def pendentes(apos_id: int, limite: int, corte) -> List[SolicitacaoPagamento]:
+        """Próximo lote por keyset (id > apos_id), só saques criados antes de `corte`."""
+        return list(
+            SolicitacaoPagamento.objects.filter(
+                tipo='SAQUE', status='PROCESSANDO', criado_em__lt=corte, pk__gt=apos_id,
+            ).exclude(
+                # Ainda na fila do despachante (despachar_saques): não é saque travado
+                outbox__status__in=['PENDENTE', 'ENVIANDO']
+            ).only('pk', 'id_externo').order_by('pk')[:limite]
+        )
+
+    @staticmethod
+    def enviar_para_analise(ids: List[int]) -> int:
+        """Sem ID externo o dinheiro pode ter saído sem registro: não estorna, vai para humano."""
+        if not ids:
+            return 0
+        return SolicitacaoPagamento.objects.filter(pk__in=ids, status='PROCESSANDO', id_externo__isnull=True).update(
+            status='EM_ANALISE', atualizado_em=timezone.now(),
+            analise_motivo="Auditoria: Sem ID Externo. Verificar manualmente na SkalePay.",
+        )
+
+    @staticmethod
+    async def consultar_status(saques: List[SolicitacaoPagamento], client) -> Dict[int, str]:
+        """Status das transferências em paralelo (limitado pelo semáforo do AsyncSkalePayClient)."""
+
+        async def consultar(saque: SolicitacaoPagamento) -> Tuple[int, str]:
+            try:
+                resposta = await client.consultar_transferencia(saque.id_externo)
+                return saque.pk, str(resposta.get('status') or '').upper()
+            except SkalePayError as e:
+                return saque.pk, 'NAO_ENCONTRADO' if e.status_code == 404 else ERRO_COMUNICACAO
+
+        return dict(await asyncio.gather(*(consultar(saque) for saque in saques)))
+
+    @staticmethod
+    def aplicar(status_por_saque: Dict[int, str]) -> Dict[str, int]:
+        """
+        Aprovações e estornos de um lote numa transação. Saques travados por
+        outro processo ou que já saíram de PROCESSANDO ficam de fora (ignorados).
+        """
+        resultado = {"aprovados": 0, "estornados": 0, "aguardando": 0, "erros": 0, "ignorados": 0}
+        if not status_por_saque:
+            return resultado
+
+        agora = timezone.now()
+        with transaction.atomic():
+            saques = list(
+                SolicitacaoPagamento.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=sorted(status_por_saque), status='PROCESSANDO').order_by('pk')
+            )
+            resultado["ignorados"] = len(status_por_saque) - len(saques)
+
+            aprovar, estornar = [], []
+            for saque in saques:
+                status_real = status_por_saque[saque.pk]
+                if status_real == ERRO_COMUNICACAO:
+                    resultado["erros"] += 1
+                elif status_real in STATUS_PAGO:
+                    saque.status = 'APROVADO'
+                    saque.data_aprovacao = agora
+                    saque.analise_motivo = "Aprovado via Auditoria Automática"
+                    aprovar.append(saque)
+                elif status_real in STATUS_ESTORNO:
+                    saque.status = 'RECUSADO'
+                    saque.analise_motivo = f"Auditoria: Banco retornou {status_real}"
+                    estornar.append(saque)
+                else:
+                    # PROCESSING, SCHEDULED ou status desconhecido: próxima execução
+                    resultado["aguardando"] += 1
+
+            if estornar:
+                AuditoriaSaquesService._estornar(estornar, status_por_saque)
+            for saque in aprovar + estornar:
+                saque.atualizado_em = agora
+            SolicitacaoPagamento.objects.bulk_update(
+                aprovar + estornar, ['status', 'data_aprovacao', 'analise_motivo', 'atualizado_em']
+            )
+        resultado["aprovados"], resultado["estornados"] = len(aprovar), len(estornar)
+        return resultado
+
+    @staticmethod
+    def _estornar(saques: List[SolicitacaoPagamento], status_por_saque: Dict[int, str]) -> None:
+        usuarios = {
+            u.pk: u for u in
+            CustomUser.objects.select_for_update().filter(pk__in={s.usuario_id for s in saques}).order_by('pk')
+        }
+        transacoes = []
+        for saque in saques:
+            usuario = usuarios[saque.usuario_id]
+            saldo_anterior = usuario.saldo
+            usuario.saldo += saque.valor
+            transacoes.append(Transacao(
+                usuario=usuario, tipo='ESTORNO', valor=saque.valor,
+                saldo_anterior=saldo_anterior, saldo_posterior=usuario.saldo,
+                descricao=f"Estorno Automático ({status_por_saque[saque.pk]})", origem_solicitacao=saque,
+            ))
+        CustomUser.objects.bulk_update(list(usuarios.values()), ['saldo'])
+        Transacao.objects.bulk_create(transacoes)
+
+        # bulk_create não dispara post_save: contadores e perfis de risco em lote
+        ContadorService.incrementar_lote('transacoes', Counter(t.usuario_id for t in transacoes))
+        PerfilRiscoService.registrar_lote(transacoes)
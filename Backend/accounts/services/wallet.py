@@ -13,6 +13,8 @@ from django.db import transaction
 from django.core.exceptions import ValidationError
 
 from accounts.models import Transacao, SolicitacaoPagamento
+from core.metricas import CARTEIRA_LATENCIA, LOCK_ESPERA
+from core.tracing import rastrear
 
 
 class WalletService:
@@ -95,8 +97,9 @@ class WalletService:
 
         User = get_user_model()
 
-        with transaction.atomic():
-            user = User.objects.select_for_update().get(pk=user_id)
+        with CARTEIRA_LATENCIA.medir(operacao='debito', tipo=tipo), rastrear('carteira.debito', tipo=tipo), transaction.atomic():
+            with LOCK_ESPERA.medir(recurso='carteira'), rastrear('lock.carteira'):
+                user = User.objects.select_for_update().get(pk=user_id)
             saldo_anterior_cents = user.saldo
 
             if saldo_anterior_cents < amount_cents:
@@ -152,8 +155,9 @@ class WalletService:
 
         User = get_user_model()
 
-        with transaction.atomic():
-            user = User.objects.select_for_update().get(pk=user_id)
+        with CARTEIRA_LATENCIA.medir(operacao='credito', tipo=tipo), rastrear('carteira.credito', tipo=tipo), transaction.atomic():
+            with LOCK_ESPERA.medir(recurso='carteira'), rastrear('lock.carteira'):
+                user = User.objects.select_for_update().get(pk=user_id)
             saldo_anterior_cents = user.saldo
 
             user.saldo = saldo_anterior_cents + amount_cents
@@ -238,7 +242,7 @@ class WalletService:
 
         User = get_user_model()
 
-        with transaction.atomic():
+        with rastrear('carteira.transferencia'), transaction.atomic():
             # Lock both users to prevent race conditions
             from_user = User.objects.select_for_update().get(pk=from_user_id)
             to_user = User.objects.select_for_update().get(pk=to_user_id)
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from games.models import Aposta
+
+from .models import SolicitacaoPagamento, Transacao
+from .services.contadores import ContadorService
+from .services.risco import PerfilRiscoService
+
+# Modelo -> campo de `ContadorUsuario`
+CONTADORES = {
+    Aposta: 'apostas',
+    SolicitacaoPagamento: 'solicitacoes',
+    Transacao: 'transacoes',
+}
+
+
+@receiver(post_save, sender=Transacao)
+def atualizar_perfil_risco(sender, instance, created, raw=False, **kwargs):
+    """Cada lançamento novo no extrato alimenta as features de risco do usuário."""
+    if created and not raw:
+        PerfilRiscoService.registrar_transacao(instance)
+
+
+def contar_criacao(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ContadorService.incrementar(instance.usuario_id, CONTADORES[sender])
+
+
+def contar_remocao(sender, instance, **kwargs):
+    ContadorService.incrementar(instance.usuario_id, CONTADORES[sender], -1)
+
+
+for modelo in CONTADORES:
+    post_save.connect(contar_criacao, sender=modelo, dispatch_uid=f'contador_criacao_{modelo.__name__}')
+    post_delete.connect(contar_remocao, sender=modelo, dispatch_uid=f'contador_remocao_{modelo.__name__}')
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -9,6 +9,8 @@ import json
 import hmac
 import hashlib
 from django.test import override_settings
+from django.core.management import call_command
+from io import StringIO
 
 class AccountsTests(TestCase):
     def test_criar_usuario_com_cpf(self):
@@ -108,10 +110,13 @@ class FluxoPagamentoTests(TestCase):
 
         # 2. AÇÃO: Monta o Payload (JSON) que a SkalePay enviaria
         payload = {
-            "transaction_id": "transacao_pix_real",
-            "status": "PAID",
-            "amount": 100.00,
-            "customer_custom_id": self.user.id
+            "type": "transaction",
+            "data": {
+                "id": "transacao_pix_real",
+                "status": "paid",
+                "amount": 1.00,
+                "metadata": {"usuario_id": self.user.id},
+            },
         }
         payload_json = json.dumps(payload)
 
@@ -123,10 +128,12 @@ class FluxoPagamentoTests(TestCase):
         # 4. EXECUÇÃO: Dispara o Webhook contra a nossa API
         response = self.client.post(
             '/api/accounts/webhook/skalepay/', 
-            data=payload, 
+            data=payload_json, 
             content_type='application/json',
             headers={'X-SkalePay-Signature': signature}
         )
+        # O webhook só enfileira: os efeitos vêm do consumidor da caixa de entrada
+        call_command('processar_webhooks', stdout=StringIO())
 
         # 5. VERIFICAÇÃO: Ocorreu tudo bem?
         self.assertEqual(response.status_code, 200) 
@@ -214,4 +221,1106 @@ class FluxoPagamentoTests(TestCase):
         
         # Ficou registrado no histórico?
         saque = SolicitacaoPagamento.objects.get(id_externo="saque_sucesso_123")
-        self.assertEqual(saque.status, 'APROVADO')
\ No newline at end of file
+        self.assertEqual(saque.status, 'APROVADO')
+
+class MetricasModalidadeTests(TestCase):
+    def setUp(self):
+        from games.models import Jogo, Modalidade, Sorteio, Aposta
+        from django.utils import timezone
+
+        self.hoje = timezone.localdate()
+        jogo = Jogo.objects.create(nome="Bicho")
+        self.milhar = Modalidade.objects.create(jogo=jogo, nome="Milhar", cotacao=Decimal('4000'))
+        self.grupo = Modalidade.objects.create(jogo=jogo, nome="Grupo", cotacao=Decimal('18'))
+        sorteio = Sorteio.objects.create(data=self.hoje)
+
+        self.u1 = CustomUser.objects.create_user(cpf_cnpj="10000000001", password="x", nome_completo="A")
+        self.u2 = CustomUser.objects.create_user(cpf_cnpj="10000000002", password="x", nome_completo="B")
+
+        def apostar(usuario, modalidade, valor, premio=0):
+            Aposta.objects.create(
+                usuario=usuario, jogo=jogo, modalidade=modalidade, sorteio=sorteio,
+                valor=valor, palpites=["1234"], ganhou=premio > 0, valor_premio=premio
+            )
+
+        apostar(self.u1, self.milhar, 1000)
+        apostar(self.u2, self.milhar, 500, premio=200)
+        apostar(self.u1, self.grupo, 300)
+
+    def test_consolidacao_e_rollup_por_modalidade(self):
+        from accounts.services.metricas import MetricasModalidadeService
+
+        MetricasModalidadeService.consolidar_dia(self.hoje)
+        # Reprocessar o mesmo dia não duplica células
+        MetricasModalidadeService.consolidar_dia(self.hoje)
+
+        linhas = {l['modalidade__nome']: l for l in MetricasModalidadeService.rollup(self.hoje, self.hoje, ['modalidade'])}
+        self.assertEqual(linhas['Milhar']['apostado'], 1500)
+        self.assertEqual(linhas['Milhar']['premios'], 200)
+        self.assertEqual(linhas['Milhar']['lucro'], 1300)
+        self.assertEqual(linhas['Milhar']['qtd'], 2)
+        self.assertEqual(linhas['Grupo']['apostado'], 300)
+        self.assertNotIn('apostadores', linhas['Milhar'])
+
+        with self.assertRaises(ValueError):
+            MetricasModalidadeService.rollup(self.hoje, self.hoje, ['tipo_jogo'])
+
+    def test_endpoint_admin(self):
+        from accounts.services.metricas import MetricasModalidadeService
+
+        MetricasModalidadeService.consolidar_dia(self.hoje)
+        admin = CustomUser.objects.create_superuser(cpf_cnpj="99999999998", password="x", nome_completo="Admin")
+        client = APIClient()
+        client.force_authenticate(user=admin)
+
+        dia = self.hoje.isoformat()
+        response = client.get(f'/api/accounts/relatorios/modalidades/?inicio={dia}&fim={dia}&agrupar=jogo')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['resultados'][0]['apostado'], 1800)
+
+        response = client.get(f'/api/accounts/relatorios/modalidades/?agrupar=tipo_jogo')
+        self.assertEqual(response.status_code, 400)
+
+
+class AtividadeBitmapTests(TestCase):
+    def setUp(self):
+        from games.models import Jogo, Modalidade, Sorteio, Aposta
+        from django.utils import timezone
+
+        self.hoje = timezone.localdate()
+        self.inicio = self.hoje - timezone.timedelta(days=14)
+        jogo = Jogo.objects.create(nome="Bicho")
+        modalidade = Modalidade.objects.create(jogo=jogo, nome="Milhar", cotacao=Decimal('4000'))
+        sorteio = Sorteio.objects.create(data=self.hoje)
+
+        self.usuarios = [
+            CustomUser.objects.create_user(cpf_cnpj=f"2000000000{i}", password="x", nome_completo=f"U{i}")
+            for i in range(3)
+        ]
+        # Todos entram no cohort do dia `inicio`
+        CustomUser.objects.filter(id__in=[u.id for u in self.usuarios]).update(
+            date_joined=timezone.now() - timezone.timedelta(days=14)
+        )
+
+        def apostar(usuario, dias_atras):
+            aposta = Aposta.objects.create(
+                usuario=usuario, jogo=jogo, modalidade=modalidade, sorteio=sorteio,
+                valor=100, palpites=["1234"], valor_premio=0
+            )
+            Aposta.objects.filter(pk=aposta.pk).update(criado_em=timezone.now() - timezone.timedelta(days=dias_atras))
+
+        # Semana 0: os 3 apostam; semana 1: só 1 volta
+        for usuario in self.usuarios:
+            apostar(usuario, 14)
+        apostar(self.usuarios[0], 7)
+
+        from accounts.services.atividade import AtividadeService
+        for delta in range(15):
+            AtividadeService.registrar_dia(self.inicio + timezone.timedelta(days=delta))
+
+    def test_bitmap_roundtrip(self):
+        from accounts.services.atividade import ids_para_bitmap, comprimir_bitmap, descomprimir_bitmap
+
+        bitmap = ids_para_bitmap([1, 8, 1000000])
+        self.assertEqual(bitmap.bit_count(), 3)
+        self.assertEqual(descomprimir_bitmap(comprimir_bitmap(bitmap)), bitmap)
+        self.assertEqual(ids_para_bitmap([]), 0)
+
+    def test_retencao_e_churn(self):
+        from accounts.services.atividade import AtividadeService
+        from django.utils import timezone
+
+        cohorts = AtividadeService.retencao_cohorts(self.inicio, self.inicio, periodos=3)
+        self.assertEqual(cohorts[0]['tamanho'], 3)
+        self.assertEqual(cohorts[0]['retidos'][:2], [3, 1])
+
+        self.assertEqual(AtividadeService.ativos(self.inicio, self.hoje), 3)
+        self.assertEqual(
+            AtividadeService.churn_entre(self.inicio, self.inicio + timezone.timedelta(days=7)), 2
+        )
+
+    def test_dias_sem_bitmap_vem_ao_vivo(self):
+        from accounts.models import BitmapUsuarios
+        from accounts.services.atividade import AtividadeService
+
+        # Logo após o deploy: nada gravado ainda (e o cadastro de hoje nunca é gravado)
+        BitmapUsuarios.objects.all().delete()
+        novo = CustomUser.objects.create_user(cpf_cnpj="20000000009", password="x", nome_completo="Novo")
+
+        self.assertEqual(AtividadeService.ativos(self.inicio, self.hoje), 3)
+        cohorts = AtividadeService.retencao_cohorts(self.inicio, self.hoje, periodos=2)
+        self.assertEqual(cohorts[0]['retidos'], [3, 1])
+        self.assertEqual(cohorts[2]['tamanho'], 1)  # Cohort atual: cadastro de hoje
+        self.assertTrue(AtividadeService.carregar('CADASTRO', self.hoje, self.hoje)[self.hoje] >> novo.id & 1)
+
+
+    def test_buraco_antigo_consultado_so_no_proprio_trecho(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from accounts.models import BitmapUsuarios
+        from accounts.services.atividade import AtividadeService
+
+        BitmapUsuarios.objects.filter(tipo='ATIVIDADE', data=self.inicio).delete()
+        with CaptureQueriesContext(connection) as consultas:
+            bitmaps = AtividadeService.carregar('ATIVIDADE', self.inicio, self.hoje)
+        # Tabela de bitmaps + o dia do buraco + hoje (não os 13 dias gravados no meio)
+        self.assertEqual(len(consultas), 3)
+        self.assertEqual(bitmaps[self.inicio].bit_count(), 3)
+        self.assertEqual(len(bitmaps), 15)
+
+
+class PrevisaoReceitaTests(TestCase):
+    def test_ajuste_recupera_sazonalidade_semanal(self):
+        from datetime import date, timedelta
+        from accounts.models import MetricasDiarias
+        from accounts.services.previsao import PrevisaoReceitaService
+
+        referencia = date(2026, 3, 2)  # Segunda-feira
+        for i in range(1, 57):
+            dia = referencia - timedelta(days=i)
+            # Fim de semana rende o dobro
+            ggr = 20000 if dia.weekday() >= 5 else 10000
+            MetricasDiarias.objects.create(
+                data=dia, house_edge_valor=ggr,
+                mapa_calor_horas={"20h": {"vol": 3.0, "qtd": 1}, "21h": {"vol": 1.0, "qtd": 1}}
+            )
+
+        previsao = PrevisaoReceitaService.ajustar(referencia=referencia)
+
+        self.assertEqual(previsao.dias_base, 56)
+        self.assertEqual(previsao.projecao_7d, 5 * 10000 + 2 * 20000)
+        self.assertEqual(previsao.previsao_diaria[5]['valor'], 20000)  # Sábado
+        self.assertLessEqual(previsao.projecao_30d_inferior, previsao.projecao_30d)
+        self.assertAlmostEqual(previsao.coeficientes['perfil_horario'][20], 0.75, places=4)
+        self.assertEqual(PrevisaoReceitaService.atual().pk, previsao.pk)
+
+    def test_sem_historico(self):
+        from accounts.services.previsao import PrevisaoReceitaService
+        self.assertIsNone(PrevisaoReceitaService.ajustar())
+
+
+class PadroesRiscoTests(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        from .models import Transacao
+
+        self.agora = timezone.now()
+
+        def lancar(usuario, tipo, horas_atras, valor=1000):
+            t = Transacao.objects.create(usuario=usuario, tipo=tipo, valor=valor, saldo_anterior=0, saldo_posterior=0)
+            # `data` é auto_now_add: reposiciona no tempo via update
+            Transacao.objects.filter(pk=t.pk).update(data=self.agora - timezone.timedelta(hours=horas_atras))
+
+        rapido = CustomUser.objects.create_user(cpf_cnpj="30000000001", password="x", nome_completo="Rapido", email="rapido@x.com")
+        lento = CustomUser.objects.create_user(cpf_cnpj="30000000002", password="x", nome_completo="Lento", email="lento@x.com")
+        bonus = CustomUser.objects.create_user(cpf_cnpj="30000000003", password="x", nome_completo="Bonus", email="bonus@x.com")
+
+        lancar(rapido, 'DEPOSITO', 3, valor=5000)
+        lancar(rapido, 'SAQUE', 2)
+        lancar(lento, 'DEPOSITO', 10)
+        lancar(lento, 'SAQUE', 1)
+        lancar(bonus, 'BONUS', 20, valor=700)
+        lancar(bonus, 'SAQUE', 1)
+
+        admin = CustomUser.objects.create_superuser(cpf_cnpj="99999999996", password="x", nome_completo="Admin")
+        self.client = APIClient()
+        self.client.force_authenticate(user=admin)
+
+    def test_deposito_seguido_de_saque(self):
+        # COUNT + página: número de queries não depende do volume de saques
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/accounts/backoffice/risco/padrao_deposito_saque/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['usuario'], "rapido@x.com")
+        self.assertEqual(response.data['results'][0]['valor_deposito'], 5000)
+
+    def test_bonus_seguido_de_saque(self):
+        response = self.client.get('/api/accounts/backoffice/risco/padrao_bonus_saque/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['usuario'] for r in response.data['results']], ["bonus@x.com"])
+        self.assertEqual(response.data['results'][0]['valor_bonus'], 700)
+
+
+class MulticontaTests(TestCase):
+    def setUp(self):
+        self.usuarios = [
+            CustomUser.objects.create_user(cpf_cnpj=f"4000000000{i}", password="x", nome_completo=f"U{i}", email=f"u{i}@x.com")
+            for i in range(4)
+        ]
+
+    def test_aneis_incrementais(self):
+        from .models import AnelMulticonta
+        from .services.multicontas import MulticontaService
+
+        a, b, c, d = [u.pk for u in self.usuarios]
+        self.assertIsNone(MulticontaService.registrar_acesso(a, '10.0.0.1', 'REGISTRO'))
+        anel_ab = MulticontaService.registrar_acesso(b, '10.0.0.1')
+        self.assertIsNotNone(anel_ab)
+        # C e D formam outro anel; depois B aparece no IP de C e une tudo
+        anel_cd = MulticontaService.registrar_acesso(d, '10.0.0.2') or MulticontaService.registrar_acesso(c, '10.0.0.2')
+        self.assertNotEqual(anel_ab, anel_cd)
+        MulticontaService.registrar_acesso(b, '10.0.0.2')
+
+        self.assertEqual(AnelMulticonta.objects.count(), 1)
+        anel = AnelMulticonta.objects.get()
+        self.assertEqual(anel.total_usuarios, 4)
+        self.assertEqual(anel.total_ips, 2)
+        # Login repetido só incrementa o contador do vínculo (sem travar o IP)
+        with patch.object(MulticontaService, '_travar_ip') as travar:
+            MulticontaService.registrar_acesso(a, '10.0.0.1')
+            travar.assert_not_called()
+            MulticontaService.registrar_acesso(a, '10.0.0.3')
+            travar.assert_called_once_with('10.0.0.3')
+        self.assertEqual(self.usuarios[0].vinculos_ip.get(ip='10.0.0.1').qtd_acessos, 2)
+
+    def test_endpoints_compliance(self):
+        from .services.multicontas import MulticontaService
+
+        for usuario in self.usuarios[:3]:
+            MulticontaService.registrar_acesso(usuario.pk, '10.0.0.9')
+
+        admin = CustomUser.objects.create_superuser(cpf_cnpj="99999999995", password="x", nome_completo="Admin")
+        client = APIClient()
+        client.force_authenticate(user=admin)
+
+        response = client.get('/api/accounts/backoffice/risco/multiconstas_ip/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['total'], 3)
+        self.assertEqual(sorted(response.data['results'][0]['usuarios']), ["u0@x.com", "u1@x.com", "u2@x.com"])
+
+        response = client.get('/api/accounts/backoffice/risco/aneis_multiconta/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['ips'], ['10.0.0.9'])
+
+
+class PerfilRiscoTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(cpf_cnpj="50000000001", password="x", nome_completo="Risco")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _envelhecer_deposito(self, minutos):
+        from django.utils import timezone
+        from .models import PerfilRisco
+        PerfilRisco.objects.filter(usuario=self.user).update(
+            ultimo_deposito_em=timezone.now() - timezone.timedelta(minutes=minutos)
+        )
+
+    def test_perfil_atualizado_pelo_extrato(self):
+        from .services.wallet import WalletService
+        from .services.risco import PerfilRiscoService
+
+        WalletService.credit(self.user.pk, 20000, "Depósito", tipo='DEPOSITO')
+        WalletService.debit(self.user.pk, 12000, "Aposta", tipo='APOSTA')
+        WalletService.credit(self.user.pk, 30000, "Prêmio", tipo='PREMIO')
+
+        perfil = PerfilRiscoService.carregar(self.user.pk)
+        self.assertEqual(perfil.total_depositado, 20000)
+        self.assertEqual(perfil.total_apostado, 12000)
+        self.assertAlmostEqual(perfil.vel_deposito, 20000, delta=1)
+        self.assertIsNotNone(perfil.ultimo_deposito_em)
+
+        self.user.refresh_from_db()
+        score, motivos = PerfilRiscoService.avaliar_saque(perfil, self.user, 5000)
+        # Depósito recente + taxa de acerto 2.5x
+        self.assertEqual(score, 50)
+        self.assertEqual(len(motivos), 2)
+
+        # Reconstrução a partir do extrato chega no mesmo estado
+        reconstruido = PerfilRiscoService.reconstruir(self.user.pk)
+        self.assertEqual(reconstruido.total_premios, 30000)
+
+    def test_update_no_banco_bate_com_aplicar(self):
+        from datetime import timedelta
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+        from .models import PerfilRisco, Transacao
+        from .services.risco import PerfilRiscoService
+
+        agora = timezone.now()
+        lancamentos = [('DEPOSITO', 20000, 30), ('APOSTA', 5000, 20), ('PREMIO', 9000, 6), ('SAQUE', 3000, 1)]
+        for tipo, valor, horas in lancamentos:
+            transacao = Transacao(usuario=self.user, tipo=tipo, valor=valor, data=agora - timedelta(hours=horas))
+            with CaptureQueriesContext(connection) as consultas:
+                PerfilRiscoService.registrar_transacao(transacao)
+        self.assertEqual(len(consultas), 1)  # Perfil já existe: só o UPDATE
+
+        esperado = PerfilRisco(usuario_id=self.user.pk)
+        for tipo, valor, horas in lancamentos:
+            PerfilRiscoService.aplicar(esperado, tipo, valor, agora - timedelta(hours=horas))
+        perfil = PerfilRiscoService.carregar(self.user.pk)
+        for campo in ('vel_deposito', 'vel_aposta', 'vel_premio', 'vel_saque'):
+            self.assertAlmostEqual(getattr(perfil, campo), getattr(esperado, campo), places=3)
+        self.assertEqual(perfil.velocidades_em, esperado.velocidades_em)
+        self.assertEqual((perfil.total_depositado, perfil.total_apostado, perfil.total_premios), (20000, 5000, 9000))
+
+    @patch('accounts.views.LiquidezService.saldo_disponivel', return_value=None)
+    def test_saque_roteado_por_score(self, _saldo):
+        from .services.wallet import WalletService
+
+        WalletService.credit(self.user.pk, 100000, "Depósito", tipo='DEPOSITO')
+
+        # Dentro da trava pós-depósito
+        response = self.client.post('/api/accounts/saque/', {"valor": 60000, "chave_pix": "a@b.com"}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        # Valor alto + depósito recente -> análise, com score e motivo gravados
+        self._envelhecer_deposito(30)
+        response = self.client.post('/api/accounts/saque/', {"valor": 60000, "chave_pix": "a@b.com"}, format='json')
+        self.assertEqual(response.status_code, 202)
+        solicitacao = SolicitacaoPagamento.objects.get(tipo='SAQUE')
+        self.assertEqual(solicitacao.status, 'EM_ANALISE')
+        self.assertEqual(solicitacao.risco_score, 100)
+        self.assertIn("Valor alto", solicitacao.analise_motivo)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.saldo, 40000)
+
+
+class ParticionamentoTests(TestCase):
+    def test_faixas_mensais(self):
+        from datetime import date
+        from core.particionamento import nome_particao, somar_meses
+
+        self.assertEqual(somar_meses(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(somar_meses(date(2025, 1, 1), -1), date(2024, 12, 1))
+        self.assertEqual(nome_particao('accounts_transacao', date(2026, 2, 1)), 'accounts_transacao_p202602')
+
+    def test_faixa_do_dia_substitui_filtro_por_date(self):
+        from django.utils import timezone
+        from core.particionamento import faixa_do_dia
+        from .models import Transacao
+
+        user = CustomUser.objects.create_user(cpf_cnpj="30000000001", password="x", nome_completo="Extrato")
+        Transacao.objects.create(usuario=user, tipo='DEPOSITO', valor=500, saldo_anterior=0, saldo_posterior=500)
+        inicio, fim = faixa_do_dia(timezone.localdate())
+        self.assertEqual(Transacao.objects.filter(data__gte=inicio, data__lt=fim).count(), 1)
+
+    def test_comando_nao_faz_nada_fora_do_postgres(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        saida = StringIO()
+        call_command('gerenciar_particoes', '--reter-meses', '12', stdout=saida)
+        self.assertIn("PostgreSQL", saida.getvalue())
+
+
+class AuditoriaLedgerTests(TestCase):
+    def setUp(self):
+        from .services.wallet import WalletService
+
+        self.user = CustomUser.objects.create_user(cpf_cnpj="30000000002", password="x", nome_completo="Auditado")
+        WalletService.credit(self.user.pk, 10000, "Depósito", tipo='DEPOSITO')
+        WalletService.debit(self.user.pk, 3000, "Aposta", tipo='APOSTA')
+        WalletService.credit(self.user.pk, 500, "Prêmio", tipo='PREMIO')
+        self._envelhecer()
+
+    def _envelhecer(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Transacao
+
+        Transacao.objects.filter(usuario=self.user).update(data=timezone.now() - timedelta(hours=1))
+
+    def test_checkpoint_e_releitura_incremental(self):
+        from .models import CheckpointSaldo
+        from .services.auditoria import AuditoriaLedgerService
+        from .services.wallet import WalletService
+
+        resultado = AuditoriaLedgerService.verificar_lote([self.user.pk])
+        self.assertEqual(resultado['divergencias'], [])
+        self.assertEqual(resultado['transacoes'], 3)
+        checkpoint = CheckpointSaldo.objects.get(usuario=self.user)
+        self.assertEqual(checkpoint.saldo, 7500)
+
+        # Só o lançamento novo é reaplicado; recente demais para avançar o checkpoint
+        WalletService.debit(self.user.pk, 1000, "Aposta", tipo='APOSTA')
+        resultado = AuditoriaLedgerService.verificar_lote([self.user.pk])
+        self.assertEqual((resultado['transacoes'], resultado['divergencias']), (1, []))
+        self.assertEqual(CheckpointSaldo.objects.get(usuario=self.user).qtd_transacoes, 3)
+
+    def test_detecta_saldo_alterado_fora_do_extrato(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import CheckpointSaldo
+
+        CustomUser.objects.filter(pk=self.user.pk).update(saldo=9999)
+        saida = StringIO()
+        call_command('auditar_ledger', '--workers', '1', stdout=saida)
+        self.assertIn("SALDO_FINAL", saida.getvalue())
+        self.assertFalse(CheckpointSaldo.objects.filter(usuario=self.user).exists())
+
+    def test_detecta_lancamento_adulterado(self):
+        from .models import Transacao
+        from .services.auditoria import AuditoriaLedgerService
+
+        aposta = Transacao.objects.get(usuario=self.user, tipo='APOSTA')
+        Transacao.objects.filter(pk=aposta.pk).update(valor=2000)
+        tipos = {d['tipo'] for d in AuditoriaLedgerService.verificar_lote([self.user.pk])['divergencias']}
+        self.assertEqual(tipos, {'VALOR'})
+
+    def test_placeholder_legado_nao_e_divergencia(self):
+        from .models import Transacao
+        from .services.auditoria import AuditoriaLedgerService
+        from .services.pagamentos import DESCRICAO_PLACEHOLDER
+
+        Transacao.objects.create(
+            usuario=self.user, tipo='DEPOSITO', valor=5000, descricao=DESCRICAO_PLACEHOLDER,
+            saldo_anterior=7500, saldo_posterior=7500,
+        )
+        self._envelhecer()
+        resultado = AuditoriaLedgerService.verificar_lote([self.user.pk])
+        self.assertEqual(resultado['divergencias'], [])
+        self.assertEqual(resultado['checkpoints'], 1)
+
+
+class ExtratoUsuarioTests(TestCase):
+    def test_extrato_paginado_e_contador(self):
+        from .services.wallet import WalletService
+
+        user = CustomUser.objects.create_user(cpf_cnpj="30000000003", password="x", nome_completo="Extrato")
+        for _ in range(3):
+            WalletService.credit(user.pk, 1000, "Depósito", tipo='DEPOSITO')
+        WalletService.debit(user.pk, 500, "Aposta", tipo='APOSTA')
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get('/api/accounts/meu-extrato/?page_size=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(response.data['results'][0]['tipo'], 'APOSTA')
+        self.assertEqual(response.data['results'][0]['saldo_posterior'], 25.0)
+
+        response = client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+        # Com filtro o total não é conhecido sem COUNT
+        self.assertIsNone(client.get('/api/accounts/meu-extrato/?tipo=DEPOSITO').data['count'])
+        self.assertEqual(client.get('/api/accounts/meu-extrato/?cursor=lixo').status_code, 404)
+
+
+@override_settings(SKALEPAY_SECRET_KEY='chave_teste_123')
+class WebhookCaixaEntradaTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(cpf_cnpj="50000000001", password="x", nome_completo="Depositante")
+        self.solicitacao = SolicitacaoPagamento.objects.create(
+            usuario=self.user, tipo='DEPOSITO', valor=5000, status='PENDENTE', id_externo='pix_caixa'
+        )
+        self.client = APIClient()
+
+    def _enviar(self, status_pagamento='paid', assinatura=None):
+        corpo = json.dumps({"data": {
+            "id": "pix_caixa", "status": status_pagamento, "amount": 50.0, "metadata": {"usuario_id": self.user.id},
+        }})
+        if assinatura is None:
+            assinatura = hmac.new(b'chave_teste_123', corpo.encode(), hashlib.sha256).hexdigest()
+        return self.client.post('/api/accounts/webhook/skalepay/', data=corpo, content_type='application/json',
+                                headers={'X-SkalePay-Signature': assinatura})
+
+    def test_reentregas_tem_efeito_uma_vez(self):
+        from .models import WebhookEvento
+        from .services.pagamentos import WebhookService
+
+        self.assertEqual(self._enviar(assinatura='forjada').status_code, 403)
+        for _ in range(3):
+            self.assertEqual(self._enviar().status_code, 200)
+        self.assertEqual(WebhookEvento.objects.count(), 1)
+
+        # Nada muda até o consumidor rodar
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.saldo, 0)
+
+        self.assertEqual(WebhookService.processar_lote()['processados'], 1)
+        self.user.refresh_from_db()
+        saldo = self.user.saldo
+        self.assertGreaterEqual(saldo, 5000)  # Depósito (+ bônus de boas-vindas)
+
+        # Replay de um evento já aplicado não duplica o crédito
+        self.assertEqual(WebhookService.reprocessar(status=['PROCESSADO']), 1)
+        self.assertEqual(WebhookService.processar_lote()['processados'], 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.saldo, saldo)
+        self.assertEqual(self.user.extrato.filter(tipo='DEPOSITO').count(), 1)
+
+    def test_erro_volta_a_fila_com_backoff_ate_falhar(self):
+        from .models import WebhookEvento
+        from .services import pagamentos
+        from .services.pagamentos import WebhookService
+
+        self._enviar()
+        with patch.object(WebhookService, 'aprovar_depositos', side_effect=RuntimeError("gateway fora")):
+            self.assertEqual(WebhookService.processar_lote()['erros'], 1)
+            evento = WebhookEvento.objects.get()
+            self.assertEqual((evento.status, evento.tentativas), ('ERRO', 1))
+            self.assertGreater(evento.disponivel_em, evento.recebido_em)
+            # Ainda no backoff: não é reprocessado
+            self.assertEqual(WebhookService.processar_lote()['eventos'], 0)
+
+            WebhookEvento.objects.update(tentativas=pagamentos.MAX_TENTATIVAS - 1, disponivel_em=evento.recebido_em)
+            self.assertEqual(WebhookService.processar_lote()['falhas'], 1)
+            self.assertEqual(WebhookEvento.objects.get().status, 'FALHOU')
+
+        saida = StringIO()
+        call_command('processar_webhooks', '--reprocessar', stdout=saida)
+        self.assertIn("1 eventos", saida.getvalue())
+        call_command('processar_webhooks', stdout=StringIO())
+        self.solicitacao.refresh_from_db()
+        self.assertEqual(self.solicitacao.status, 'APROVADO')
+
+
+class AprovacaoDepositosLoteTests(TestCase):
+    def setUp(self):
+        self.padrinho = CustomUser.objects.create_user(
+            cpf_cnpj="60000000001", password="x", nome_completo="Padrinho",
+            modo_comissao='DEPOSITO', comissao_percentual=Decimal('10.00'),
+        )
+
+    def _lote(self, quantidade, prefixo):
+        from .models import WebhookEvento
+
+        for i in range(quantidade):
+            usuario = CustomUser.objects.create_user(
+                cpf_cnpj=f"6{prefixo}{i:08d}", password="x", nome_completo=f"Indicado {i}", afiliado=self.padrinho,
+            )
+            for n in range(2):  # Dois depósitos do mesmo usuário no mesmo lote
+                id_externo = f"pix_{prefixo}_{i}_{n}"
+                SolicitacaoPagamento.objects.create(
+                    usuario=usuario, tipo='DEPOSITO', valor=1000, status='PENDENTE', id_externo=id_externo,
+                )
+                WebhookEvento.objects.create(id_externo=id_externo, tipo_evento='paid', payload={"data": {
+                    "id": id_externo, "status": "paid", "metadata": {"usuario_id": usuario.pk},
+                }})
+
+    def test_lote_aprova_com_extrato_consistente_e_comissao_agregada(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import ContadorUsuario, PerfilRisco, Transacao
+        from .services.auditoria import AuditoriaLedgerService
+        from .services.pagamentos import WebhookService
+
+        self._lote(3, '1')
+        with CaptureQueriesContext(connection) as pequeno:
+            self.assertEqual(WebhookService.processar_lote()['processados'], 6)
+        self._lote(30, '2')
+        with CaptureQueriesContext(connection) as grande:
+            self.assertEqual(WebhookService.processar_lote()['processados'], 60)
+        # Custo do lote não cresce com o número de depósitos
+        self.assertEqual(len(pequeno.captured_queries), len(grande.captured_queries))
+
+        self.assertEqual(SolicitacaoPagamento.objects.exclude(status='APROVADO').count(), 0)
+        indicado = CustomUser.objects.get(cpf_cnpj="6100000000")
+        self.assertIsNotNone(indicado.data_primeiro_deposito)
+        self.assertTrue(indicado.recebeu_bonus)
+        self.assertEqual(indicado.extrato.filter(tipo='DEPOSITO').count(), 2)
+        self.assertEqual(indicado.extrato.filter(tipo='BONUS').count(), 1)
+
+        # Uma comissão por padrinho por lote: 10% de 6 e de 60 depósitos de R$ 10,00
+        comissoes = Transacao.objects.filter(usuario=self.padrinho, tipo='COMISSAO').order_by('id')
+        self.assertEqual([c.valor for c in comissoes], [600, 6000])
+        self.padrinho.refresh_from_db()
+        self.assertEqual(self.padrinho.saldo, 6600)
+
+        # Extrato encadeado, contadores e perfis de risco atualizados apesar do bulk_create
+        ids = list(CustomUser.objects.values_list('pk', flat=True))
+        self.assertEqual(AuditoriaLedgerService.verificar_lote(ids)['divergencias'], [])
+        self.assertEqual(ContadorUsuario.objects.get(pk=indicado.pk).transacoes, 3)
+        self.assertEqual(PerfilRisco.objects.get(pk=indicado.pk).total_depositado, 2000)
+
+
+class ServidorSkalePayFalso:
+    """
+    SkalePay falsa num servidor HTTP local (127.0.0.1, porta livre).
+    Respostas roteirizadas por "METODO /recurso" ou "METODO /recurso/id"; a
+    última da lista se repete.
+    """
+
+    def __init__(self, atraso=0.0):
+        import threading
+
+        self.atraso = atraso
+        self.roteiro = {}
+        self.requisicoes = []
+        self.portas_cliente = set()
+        self.simultaneas = 0
+        self.pico = 0
+        self.lock = threading.Lock()
+
+    def responder(self, chave, *respostas):
+        self.roteiro[chave] = list(respostas)
+
+    def _proxima(self, metodo, caminho):
+        partes = caminho.split('?')[0].strip('/').split('/')[1:]  # Ignora o /v1
+        # Rota exata ("GET /transfers/tr_1") antes da rota do recurso ("GET /transfers")
+        respostas = self.roteiro.get(f"{metodo} /{'/'.join(partes)}") or self.roteiro.get(f"{metodo} /{partes[0]}", [(200, {})])
+        return respostas.pop(0) if len(respostas) > 1 else respostas[0]
+
+    def __enter__(self):
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive
+
+            def _atender(self):
+                tamanho = int(self.headers.get('Content-Length') or 0)
+                corpo = json.loads(self.rfile.read(tamanho)) if tamanho else None
+                with servidor.lock:
+                    servidor.requisicoes.append((self.command, self.path, corpo, dict(self.headers)))
+                    servidor.portas_cliente.add(self.client_address[1])
+                    servidor.simultaneas += 1
+                    servidor.pico = max(servidor.pico, servidor.simultaneas)
+                    status, resposta = servidor._proxima(self.command, self.path)
+                time.sleep(servidor.atraso)
+                with servidor.lock:
+                    servidor.simultaneas -= 1
+                dados = json.dumps(resposta).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(dados)))
+                    self.end_headers()
+                    self.wfile.write(dados)
+                except OSError:
+                    pass  # Cliente desistiu (timeout)
+
+            do_GET = do_POST = _atender
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class AsyncSkalePayClientTests(SimpleTestCase):
+    def _executar(self, servidor, corrotina, **kwargs):
+        import asyncio
+        from .gateways.skalepay_async import AsyncSkalePayClient
+
+        async def rodar():
+            async with AsyncSkalePayClient(api_key='chave', base_url=servidor.url, backoff_base=0, **kwargs) as client:
+                return await corrotina(client)
+        return asyncio.run(rodar())
+
+    def test_saques_reutilizam_conexao(self):
+        with ServidorSkalePayFalso() as servidor:
+            servidor.responder("POST /transfers", (200, {"id": "tr_1", "status": "pending"}))
+
+            async def sacar(client):
+                return [await client.solicitar_saque("chave@pix", Decimal("10.50"), external_ref=i) for i in range(1, 6)]
+
+            respostas = self._executar(servidor, sacar)
+
+        self.assertEqual([r["id"] for r in respostas], ["tr_1"] * 5)
+        metodo, caminho, corpo, headers = servidor.requisicoes[0]
+        self.assertEqual((metodo, caminho), ("POST", "/v1/transfers"))
+        self.assertEqual((corpo["amount"], corpo["externalRef"]), (1050, "1"))
+        self.assertTrue(headers["Authorization"].startswith("Basic "))
+        # Pool keep-alive: 5 chamadas sequenciais na mesma conexão TCP
+        self.assertEqual(len(servidor.portas_cliente), 1)
+
+    def test_concorrencia_limitada_pelo_semaforo(self):
+        import asyncio
+
+        with ServidorSkalePayFalso(atraso=0.05) as servidor:
+            servidor.responder("GET /balance", (200, {"availableAmount": 100000}))
+
+            async def consultar(client):
+                return await asyncio.gather(*(client.consultar_saldo() for _ in range(12)))
+
+            respostas = self._executar(servidor, consultar, max_concorrencia=3)
+
+        self.assertEqual(len(respostas), 12)
+        self.assertEqual(len(servidor.requisicoes), 12)
+        self.assertLessEqual(servidor.pico, 3)
+
+    def test_retentativas_so_quando_seguro(self):
+        from core.metricas import SKALEPAY_RETENTATIVAS
+        from .gateways.skalepay import SkalePayError
+
+        chave_metrica = ('GET /balance', '503')
+        antes = SKALEPAY_RETENTATIVAS.series.get(chave_metrica, 0)
+        with ServidorSkalePayFalso() as servidor:
+            servidor.responder("GET /balance", (503, {}), (503, {}), (200, {"availableAmount": 500}))
+            servidor.responder("POST /transfers", (500, {"message": "falha interna"}))
+            servidor.responder("POST /transactions", (429, {}), (200, {"id": "pix_1"}))
+
+            saldo = self._executar(servidor, lambda client: client.consultar_saldo())
+            self.assertEqual(saldo, {"availableAmount": 500})
+            self.assertEqual(SKALEPAY_RETENTATIVAS.series[chave_metrica] - antes, 2)
+
+            # 500 num POST: a transferência pode ter saído, não repete
+            with self.assertRaisesMessage(SkalePayError, "falha interna"):
+                self._executar(servidor, lambda client: client.solicitar_saque("chave@pix", Decimal("1.00")))
+            self.assertEqual(sum(1 for r in servidor.requisicoes if r[1] == '/v1/transfers'), 1)
+
+            # 429: rejeitado antes de processar, repete
+            pix = self._executar(servidor, lambda client: client.gerar_pix_deposito(Decimal("20"), {"nome": "A"}, 7))
+            self.assertEqual(pix["id"], "pix_1")
+
+    def test_timeout_por_endpoint_sem_repetir_saque(self):
+        import httpx
+        from .gateways.skalepay import SkalePayError
+        from .gateways.skalepay_async import AsyncSkalePayClient
+
+        with ServidorSkalePayFalso(atraso=0.3) as servidor, \
+                patch.dict(AsyncSkalePayClient.TIMEOUTS, {"/transfers": httpx.Timeout(0.1)}):
+            with self.assertRaisesMessage(SkalePayError, "Timeout"):
+                self._executar(servidor, lambda client: client.solicitar_saque("chave@pix", Decimal("1.00")))
+            # Saldo tem timeout próprio (maior): responde normalmente
+            self.assertEqual(self._executar(servidor, lambda client: client.consultar_saldo()), {})
+        self.assertEqual(sum(1 for r in servidor.requisicoes if r[1] == '/v1/transfers'), 1)
+
+
+class LiquidezTests(TestCase):
+    def setUp(self):
+        from .services.liquidez import LiquidezService
+
+        LiquidezService.limpar()
+        self.addCleanup(LiquidezService.limpar)
+        patcher = patch.object(LiquidezService, 'ATUALIZAR_EM_THREAD', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('accounts.services.liquidez.SkalePayClient')
+        self.gateway = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def _envelhecer(self, segundos):
+        from .services import liquidez
+        liquidez._estado.consultado_em -= segundos
+
+    def test_memoria_ajustes_e_revalidacao(self):
+        from .services.liquidez import LiquidezService
+
+        self.gateway.consultar_saldo.return_value = {"availableAmount": 100000}
+        self.assertEqual(LiquidezService.saldo_disponivel(), 100000)
+        self.assertEqual(LiquidezService.saldo_disponivel(), 100000)
+        self.assertEqual(self.gateway.consultar_saldo.call_count, 1)
+
+        LiquidezService.ajustar(-30000)
+        LiquidezService.ajustar(5000)
+        self.assertEqual(LiquidezService.saldo_disponivel(), 75000)
+
+        # Velho: responde o valor em memória e revalida em segundo plano
+        self.gateway.consultar_saldo.return_value = {"availableAmount": 90000}
+        self._envelhecer(60)
+        self.assertEqual(LiquidezService.saldo_disponivel(), 75000)
+        self.assertEqual(LiquidezService.saldo_disponivel(), 90000)
+        self.assertEqual(self.gateway.consultar_saldo.call_count, 2)
+
+    def test_circuito_abre_com_gateway_fora(self):
+        from .gateways.skalepay import SkalePayError
+        from .services.liquidez import FALHAS_PARA_ABRIR, LiquidezService
+
+        self.gateway.consultar_saldo.return_value = {"availableAmount": 50000}
+        LiquidezService.saldo_disponivel()
+        self.gateway.consultar_saldo.side_effect = SkalePayError("fora do ar")
+
+        # Falhas na revalidação: continua valendo o último saldo até vencer
+        for _ in range(FALHAS_PARA_ABRIR):
+            self._envelhecer(60)
+            self.assertEqual(LiquidezService.saldo_disponivel(), 50000)
+        chamadas = self.gateway.consultar_saldo.call_count
+
+        # Circuito aberto: ninguém chama a SkalePay; vencido, não há saldo confiável
+        self._envelhecer(600)
+        self.assertIsNone(LiquidezService.saldo_disponivel())
+        self.assertEqual(self.gateway.consultar_saldo.call_count, chamadas)
+
+    def test_atualizador_periodico_mantem_saldo_fresco(self):
+        import threading
+        import time
+        from .services.liquidez import LiquidezService
+
+        self.gateway.consultar_saldo.return_value = {"availableAmount": 40000}
+        LiquidezService.iniciar_atualizador(intervalo=0.01)
+        self.addCleanup(LiquidezService.limpar)  # Para a thread antes de desfazer o mock do gateway
+        LiquidezService.iniciar_atualizador(intervalo=0.01)
+        self.assertEqual(sum(1 for t in threading.enumerate() if t.name == 'liquidez-atualizador'), 1)
+
+        limite = time.monotonic() + 5
+        while self.gateway.consultar_saldo.call_count < 3 and time.monotonic() < limite:
+            time.sleep(0.01)
+        self.assertGreaterEqual(self.gateway.consultar_saldo.call_count, 3)
+
+        # O saque lê o valor que o atualizador já trouxe
+        self.gateway.consultar_saldo.return_value = {"availableAmount": 45000}
+        time.sleep(0.05)
+        self.assertEqual(LiquidezService.saldo_disponivel(), 45000)
+
+    def test_saque_barrado_sem_chamar_gateway(self):
+        from .services.liquidez import LiquidezService
+        from .services.wallet import WalletService
+
+        user = CustomUser.objects.create_user(cpf_cnpj="70000000001", password="x", nome_completo="Sacador")
+        WalletService.credit(user.pk, 20000, "Prêmio", tipo='PREMIO')
+        self.gateway.consultar_saldo.return_value = {"availableAmount": 5000}
+        LiquidezService.saldo_disponivel()
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post('/api/accounts/saque/', {"valor": 10000, "chave_pix": "a@b.com"}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.gateway.consultar_saldo.call_count, 1)
+        user.refresh_from_db()
+        self.assertEqual(user.saldo, 20000)
+
+
+class SaqueOutboxTests(TestCase):
+    def setUp(self):
+        from .gateways.skalepay_async import AsyncSkalePayClient
+
+        self.user = CustomUser.objects.create_user(cpf_cnpj="80000000001", password="x", nome_completo="Sacador")
+        for patcher in (
+            patch('accounts.views.LiquidezService.saldo_disponivel', return_value=None),
+            patch.object(AsyncSkalePayClient, 'BACKOFF_BASE', 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _despachar(self, servidor):
+        saida = StringIO()
+        with override_settings(SKALEPAY_BASE_URL=servidor.url):
+            call_command('despachar_saques', '--taxa', '1000', stdout=saida)
+        return saida.getvalue()
+
+    def _saque_na_outbox(self, valor):
+        from django.db import transaction
+        from .services.saques import SaqueOutboxService
+        from .services.wallet import WalletService
+
+        with transaction.atomic():
+            WalletService.debit(self.user.pk, valor, "Solicitação de Saque", tipo='SAQUE')
+            solicitacao = SolicitacaoPagamento.objects.create(
+                usuario=self.user, tipo='SAQUE', valor=valor, status='PROCESSANDO', chave_pix='a@b.com'
+            )
+            SaqueOutboxService.enfileirar(solicitacao)
+        return solicitacao
+
+    def test_pedido_responde_na_hora_e_despachante_envia(self):
+        from .services.wallet import WalletService
+
+        WalletService.credit(self.user.pk, 20000, "Prêmio", tipo='PREMIO')
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        with ServidorSkalePayFalso() as servidor:
+            servidor.responder("POST /transfers", (200, {"id": "tr_outbox", "status": "pending"}))
+            response = client.post('/api/accounts/saque/', {"valor": 5000, "chave_pix": "a@b.com"}, format='json')
+            self.assertEqual(response.status_code, 202)
+            solicitacao = SolicitacaoPagamento.objects.get(pk=response.data["id"])
+            self.assertEqual((solicitacao.status, solicitacao.outbox.status), ('PROCESSANDO', 'PENDENTE'))
+            self.assertEqual(servidor.requisicoes, [])  # Nada sai do worker web
+            self.user.refresh_from_db()
+            self.assertEqual(self.user.saldo, 15000)
+
+            self.assertIn("1 enviados", self._despachar(servidor))
+            self._despachar(servidor)  # Nada pendente: não reenvia
+
+        self.assertEqual(len(servidor.requisicoes), 1)
+        self.assertEqual(servidor.requisicoes[0][2]["externalRef"], str(solicitacao.id))
+        solicitacao.refresh_from_db()
+        self.assertEqual((solicitacao.status, solicitacao.id_externo), ('APROVADO', 'tr_outbox'))
+        self.assertEqual(solicitacao.outbox.status, 'ENVIADO')
+
+    def test_recusa_estorna_e_indisponibilidade_volta_a_fila(self):
+        from .models import SaqueOutbox
+        from .services.wallet import WalletService
+
+        WalletService.credit(self.user.pk, 20000, "Prêmio", tipo='PREMIO')
+        recusado = self._saque_na_outbox(3000)
+        with ServidorSkalePayFalso() as servidor:
+            servidor.responder("POST /transfers", (400, {"message": "chave pix inválida"}))
+            self._despachar(servidor)
+
+        recusado.refresh_from_db()
+        self.assertEqual((recusado.status, recusado.outbox.status), ('RECUSADO', 'RECUSADO'))
+        self.assertIn("chave pix inválida", recusado.analise_motivo)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.saldo, 20000)
+        self.assertEqual(self.user.extrato.filter(tipo='ESTORNO', origem_solicitacao=recusado).count(), 1)
+
+        # 503: a SkalePay não processou; volta à fila com backoff, sem estorno
+        na_fila = self._saque_na_outbox(4000)
+        with ServidorSkalePayFalso() as servidor:
+            servidor.responder("POST /transfers", (503, {}))
+            self.assertIn("1 voltam à fila", self._despachar(servidor))
+        outbox = SaqueOutbox.objects.get(solicitacao=na_fila)
+        self.assertEqual((outbox.status, outbox.tentativas), ('PENDENTE', 1))
+        self.assertGreater(outbox.disponivel_em, outbox.processado_em)
+        na_fila.refresh_from_db()
+        self.assertEqual(na_fila.status, 'PROCESSANDO')
+
+    def test_desfecho_incerto_nunca_reenvia(self):
+        import httpx
+        from datetime import timedelta
+        from django.utils import timezone
+        from .gateways.skalepay_async import AsyncSkalePayClient
+        from .models import SaqueOutbox
+        from .services.wallet import WalletService
+
+        WalletService.credit(self.user.pk, 20000, "Prêmio", tipo='PREMIO')
+        lento = self._saque_na_outbox(1000)
+        with ServidorSkalePayFalso(atraso=0.3) as servidor, \
+                patch.dict(AsyncSkalePayClient.TIMEOUTS, {"/transfers": httpx.Timeout(0.1)}):
+            self.assertIn("1 incertos", self._despachar(servidor))
+            self._despachar(servidor)
+        self.assertEqual(len(servidor.requisicoes), 1)
+        lento.refresh_from_db()
+        self.assertEqual((lento.status, lento.outbox.status), ('PROCESSANDO', 'INCERTO'))
+        self.assertIn("Auditoria pendente", lento.analise_motivo)
+
+        # Despachante caiu depois de marcar ENVIANDO: reconciliação, sem reenvio
+        travado = self._saque_na_outbox(1000)
+        SaqueOutbox.objects.filter(solicitacao=travado).update(
+            status='ENVIANDO', enviado_em=timezone.now() - timedelta(minutes=10)
+        )
+        with ServidorSkalePayFalso() as servidor:
+            self._despachar(servidor)
+        self.assertEqual(servidor.requisicoes, [])
+        self.assertEqual(SaqueOutbox.objects.get(solicitacao=travado).status, 'INCERTO')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.saldo, 18000)
+
+
+class AuditoriaSaquesTests(TestCase):
+    def setUp(self):
+        from .gateways.skalepay_async import AsyncSkalePayClient
+
+        patcher = patch.object(AsyncSkalePayClient, 'BACKOFF_BASE', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create_user(cpf_cnpj="81000000001", password="x", nome_completo="Auditado")
+
+    def _saque(self, valor, id_externo=None):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .services.wallet import WalletService
+
+        WalletService.credit(self.user.pk, valor, "Prêmio", tipo='PREMIO')
+        WalletService.debit(self.user.pk, valor, "Solicitação de Saque", tipo='SAQUE')
+        saque = SolicitacaoPagamento.objects.create(
+            usuario=self.user, tipo='SAQUE', valor=valor, status='PROCESSANDO', id_externo=id_externo,
+        )
+        SolicitacaoPagamento.objects.filter(pk=saque.pk).update(criado_em=timezone.now() - timedelta(minutes=30))
+        return saque
+
+    def _auditar(self, servidor, *args):
+        saida = StringIO()
+        with override_settings(SKALEPAY_BASE_URL=servidor.url):
+            call_command('auditar_saques', *args, stdout=saida)
+        return saida.getvalue()
+
+    def test_reconcilia_backlog_em_lotes(self):
+        from .services.auditoria import AuditoriaLedgerService
+        from .services.saques import SaqueOutboxService
+
+        pagos = [self._saque(1000, f"tr_pago_{i}") for i in range(3)]
+        falhou = self._saque(2000, "tr_falhou")
+        sumiu = self._saque(3000, "tr_sumiu")
+        processando = self._saque(4000, "tr_proc")
+        sem_id = self._saque(5000)
+        na_fila = self._saque(6000)
+        SaqueOutboxService.enfileirar(na_fila)
+
+        with ServidorSkalePayFalso() as servidor:
+            servidor.responder("GET /transfers", (200, {"status": "PAID"}))
+            servidor.responder("GET /transfers/tr_falhou", (200, {"status": "FAILED"}))
+            servidor.responder("GET /transfers/tr_sumiu", (404, {"message": "not found"}))
+            servidor.responder("GET /transfers/tr_proc", (200, {"status": "PROCESSING"}))
+
+            # Sem orçamento: nada é tocado
+            self.assertIn("Orçamento", self._auditar(servidor, '--orcamento', '0'))
+            self.assertEqual(servidor.requisicoes, [])
+
+            saida = self._auditar(servidor, '--lote', '2')
+
+        self.assertIn("/s)", saida)
+        self.assertEqual(len(servidor.requisicoes), 6)
+        estados = dict(SolicitacaoPagamento.objects.values_list('pk', 'status'))
+        self.assertEqual({estados[s.pk] for s in pagos}, {'APROVADO'})
+        self.assertEqual((estados[falhou.pk], estados[sumiu.pk]), ('RECUSADO', 'RECUSADO'))
+        self.assertEqual(estados[processando.pk], 'PROCESSANDO')
+        self.assertEqual(estados[sem_id.pk], 'EM_ANALISE')
+        self.assertEqual(estados[na_fila.pk], 'PROCESSANDO')  # Do despachante
+
+        # Estornos em lote: saldo devolvido, extrato encadeado
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.saldo, 5000)
+        self.assertEqual(self.user.extrato.filter(tipo='ESTORNO').count(), 2)
+        self.assertEqual(AuditoriaLedgerService.verificar_lote([self.user.pk])['divergencias'], [])
+
+
+class AuditoriaDepositosTests(TestCase):
+    def setUp(self):
+        from .gateways.skalepay_async import AsyncSkalePayClient
+
+        patcher = patch.object(AsyncSkalePayClient, 'BACKOFF_BASE', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create_user(cpf_cnpj="82000000001", password="x", nome_completo="Depositante")
+
+    def _deposito(self, valor, id_externo, horas=1, placeholder=True):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Transacao
+
+        deposito = SolicitacaoPagamento.objects.create(
+            usuario=self.user, tipo='DEPOSITO', valor=valor, status='PENDENTE', id_externo=id_externo,
+        )
+        SolicitacaoPagamento.objects.filter(pk=deposito.pk).update(criado_em=timezone.now() - timedelta(hours=horas))
+        if placeholder:
+            # Lançamento provisório que o GerarDepositoPixView gravava
+            Transacao.objects.create(
+                usuario=self.user, tipo='DEPOSITO', valor=valor, saldo_anterior=0, saldo_posterior=0,
+                descricao="Aguardando Pagamento Pix", origem_solicitacao=deposito,
+            )
+        return deposito
+
+    def test_reconcilia_pendentes_e_apaga_placeholders(self):
+        from .models import PerfilRisco, Transacao
+        from .services.auditoria import AuditoriaLedgerService
+
+        pago = self._deposito(5000, "tx_pago")
+        expirado = self._deposito(2000, "tx_exp")
+        recusado = self._deposito(3000, "tx_rec")
+        aguardando = self._deposito(4000, "tx_esp")
+        abandonado = self._deposito(6000, "tx_aband", horas=100)
+        recente = self._deposito(7000, "tx_novo", horas=0, placeholder=False)
+
+        saida = StringIO()
+        with ServidorSkalePayFalso() as servidor:
+            servidor.responder("GET /transactions", (200, {"status": "waiting_payment"}))
+            servidor.responder("GET /transactions/tx_pago", (200, {"status": "paid"}))
+            servidor.responder("GET /transactions/tx_exp", (404, {"message": "not found"}))
+            servidor.responder("GET /transactions/tx_rec", (200, {"status": "refused"}))
+            with override_settings(SKALEPAY_BASE_URL=servidor.url):
+                call_command('auditar_depositos', '--lote', '2', stdout=saida)
+
+        self.assertIn("/s)", saida.getvalue())
+        self.assertEqual(len(servidor.requisicoes), 5)  # O recente ainda está na validade do Pix
+        estados = dict(SolicitacaoPagamento.objects.values_list('pk', 'status'))
+        self.assertEqual(estados[pago.pk], 'APROVADO')
+        self.assertEqual((estados[expirado.pk], estados[abandonado.pk]), ('CANCELADO', 'CANCELADO'))
+        self.assertEqual(estados[recusado.pk], 'RECUSADO')
+        self.assertEqual((estados[aguardando.pk], estados[recente.pk]), ('PENDENTE', 'PENDENTE'))
+
+        # Só o pago entra no saldo e no perfil; os lançamentos provisórios somem
+        self.user.refresh_from_db()
+        self.assertGreaterEqual(self.user.saldo, 5000)
+        self.assertFalse(Transacao.objects.filter(descricao="Aguardando Pagamento Pix").exists())
+        self.assertEqual(PerfilRisco.objects.get(usuario=self.user).total_depositado, 5000)
+        self.assertEqual(AuditoriaLedgerService.verificar_lote([self.user.pk])['divergencias'], [])
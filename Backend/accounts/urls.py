@@ -12,10 +12,13 @@ from .views import (
     BackofficeSolicitacaoViewSet, 
     RiscoComplianceViewSet, 
     HistoricoUsuarioView, 
+    ExtratoUsuarioView,
     PasswordResetView, 
     PasswordResetConfirmView,
     RelatoriosOperacionaisView,
     RelatorioFinanceiroView,
+    PerformanceModalidadesView,
+    RetencaoCohortsView,
     testar_conexao_skalepay,
 )
 
@@ -25,6 +28,7 @@ router = DefaultRouter()
 router.register(r'backoffice/solicitacoes', BackofficeSolicitacaoViewSet, basename='admin-solicitacoes')
 router.register(r'backoffice/risco', RiscoComplianceViewSet, basename='admin-risco')
 router.register(r'meus-movimentos', HistoricoUsuarioView, basename='user-historico')
+router.register(r'meu-extrato', ExtratoUsuarioView, basename='user-extrato')
 
 urlpatterns = [
     # Autenticação
@@ -44,6 +48,8 @@ urlpatterns = [
     path('dashboard/', DashboardFinanceiroView.as_view(), name='dashboard-admin'),
     path('relatorios/operacional/', RelatoriosOperacionaisView.as_view(), name='relatorios-ops'),
     path('relatorios/financeiro/csv/', RelatorioFinanceiroView.as_view(), name='relatorio_csv'),
+    path('relatorios/modalidades/', PerformanceModalidadesView.as_view(), name='relatorios-modalidades'),
+    path('relatorios/retencao/', RetencaoCohortsView.as_view(), name='relatorios-retencao'),
 
     # Financeiro (Usuário)
     path('depositar/', GerarDepositoPixView.as_view(), name='gerar-deposito'),
@@ -1,7 +1,5 @@
 # Python / infra
 import csv
-import hmac
-import hashlib
 from decimal import Decimal
 
 
@@ -31,8 +29,19 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 # Local
-from .models import SolicitacaoPagamento, Transacao, CustomUser, MetricasDiarias
+from .models import SolicitacaoPagamento, Transacao, CustomUser, MetricasDiarias, AnelMulticonta
 from .services import SkalePayService
+from .services.pagamentos import WebhookService
+from .services.liquidez import LiquidezService
+from .services.saques import SaqueOutboxService
+from .services.metricas import MetricasModalidadeService
+from .services.wallet import WalletService
+from .services.atividade import AtividadeService
+from .services.previsao import PrevisaoReceitaService
+from .services.risco import PerfilRiscoService, RiscoService, score_minimo_analise
+from .services.multicontas import MulticontaService, ip_da_requisicao
+from .services.contadores import ContadorService
+from .pagination import ExtratoPagination, KeysetPagination
 from .saque_serializer import SolicitacaoSaqueSerializer
 from .serializer import (
     UserSerializer,
@@ -42,10 +51,14 @@ from .serializer import (
     SolicitacaoPagamentoAdminSerializer,
     AnaliseSolicitacaoSerializer,
     RiscoIPSerializer,
-    DepositoSerializer 
+    DepositoSerializer,
+    TransacaoExtratoSerializer,
 )
 
 from games.models import Aposta, ParametrosDoJogo
+from core.metricas import WEBHOOK_LATENCIA, rotulo_status
+from core.tracing import rastrear
+from core.particionamento import faixa_do_dia
 
 # Diagnostic imports
 import requests
@@ -182,15 +195,12 @@ class RegisterView(APIView):
             user = serializer.save()
             
             # --- NOVO: Captura de IP para Segurança ---
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                ip = x_forwarded_for.split(',')[0]
-            else:
-                ip = request.META.get('REMOTE_ADDR')
+            ip = ip_da_requisicao(request)
             
             user.ip_registro = ip
             user.ultimo_ip = ip
             user.save()
+            MulticontaService.registrar_acesso(user.pk, ip, origem='REGISTRO')
             # ------------------------------------------
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -207,13 +217,10 @@ class CustomLoginView(TokenObtainPairView):
         if response.status_code == 200:
             try:
                 user = CustomUser.objects.get(cpf_cnpj=request.data.get('cpf_cnpj'))
-                x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-                if x_forwarded_for:
-                    ip = x_forwarded_for.split(',')[0]
-                else:
-                    ip = request.META.get('REMOTE_ADDR')
+                ip = ip_da_requisicao(request)
                 user.ultimo_ip = ip
                 user.save()
+                MulticontaService.registrar_acesso(user.pk, ip, origem='LOGIN')
             except Exception:
                 pass # Não trava o login se der erro no IP
                 
@@ -274,13 +281,24 @@ class DashboardFinanceiroView(APIView):
         incluir_hoje = (data_inicio <= hoje <= data_fim)
         
         if incluir_hoje:
-            dep_hoje = Transacao.objects.filter(tipo='DEPOSITO', data__date=hoje).aggregate(Sum('valor'))['valor__sum'] or Decimal(0)
-            dep_qtd_hoje = Transacao.objects.filter(tipo='DEPOSITO', data__date=hoje).count()
-            saq_hoje = Transacao.objects.filter(tipo='SAQUE', data__date=hoje).aggregate(Sum('valor'))['valor__sum'] or Decimal(0)
-            bonus_hoje = Transacao.objects.filter(tipo='BONUS', data__date=hoje).aggregate(Sum('valor'))['valor__sum'] or Decimal(0)
+            # Faixa [hoje, amanhã) na coluna `data`: só a partição do mês corrente é lida
+            inicio_hoje, fim_hoje = faixa_do_dia(hoje)
+            extrato_hoje = Transacao.objects.filter(data__gte=inicio_hoje, data__lt=fim_hoje).aggregate(
+                dep=Sum('valor', filter=Q(tipo='DEPOSITO')),
+                dep_qtd=Count('id', filter=Q(tipo='DEPOSITO')),
+                saq=Sum('valor', filter=Q(tipo='SAQUE')),
+                bonus=Sum('valor', filter=Q(tipo='BONUS')),
+            )
+            dep_hoje = extrato_hoje['dep'] or Decimal(0)
+            dep_qtd_hoje = extrato_hoje['dep_qtd']
+            saq_hoje = extrato_hoje['saq'] or Decimal(0)
+            bonus_hoje = extrato_hoje['bonus'] or Decimal(0)
             
-            apostas_hoje = Aposta.objects.filter(criado_em__date=hoje).aggregate(Sum('valor'))['valor__sum'] or Decimal(0)
-            premios_hoje = Aposta.objects.filter(ganhou=True, criado_em__date=hoje).aggregate(Sum('valor_premio'))['valor_premio__sum'] or Decimal(0)
+            apostas_dia = Aposta.objects.filter(criado_em__gte=inicio_hoje, criado_em__lt=fim_hoje).aggregate(
+                apostado=Sum('valor'), premios=Sum('valor_premio', filter=Q(ganhou=True))
+            )
+            apostas_hoje = apostas_dia['apostado'] or Decimal(0)
+            premios_hoje = apostas_dia['premios'] or Decimal(0)
             lucro_hoje = apostas_hoje - premios_hoje
             
             ftd_hoje = CustomUser.objects.filter(data_primeiro_deposito__date=hoje).count()
@@ -311,33 +329,34 @@ class DashboardFinanceiroView(APIView):
         fila_saques = SolicitacaoPagamento.objects.filter(tipo='SAQUE', status='PENDENTE').count()
         
         # GAP RESOLVIDO: ALERTA DE RISCO (Multi-contas IP)
-        # Conta quantos IPs tem mais de 1 usuário associado
-        ips_duplicados = CustomUser.objects.values('ultimo_ip').annotate(
-            total_contas=Count('id')
-        ).filter(total_contas__gt=1).count()
-        
-        alertas_risco = ips_duplicados
-
-        # GAP 3: Projeção de Receita (Forecast Simples)
-        # Lógica: Pegamos a média de GGR (Lucro) dos últimos 7 dias e projetamos para os próximos 7.
-        
-        # 1. Busca os últimos 7 dias fechados
-        data_limite_projecao = hoje - timezone.timedelta(days=7)
-        qs_projecao = MetricasDiarias.objects.filter(data__gte=data_limite_projecao, data__lt=hoje)
-        
-        qtd_dias_base = qs_projecao.count()
-        soma_ggr_7dias = qs_projecao.aggregate(Sum('house_edge_valor'))['house_edge_valor__sum'] or Decimal(0)
-        
-        # Adicionamos o dia de HOJE na média para ser mais preciso (se tiver dados)
-        if incluir_hoje:
-            soma_ggr_7dias += lucro_hoje
-            qtd_dias_base += 1
-            
-        media_diaria_ggr = soma_ggr_7dias / qtd_dias_base if qtd_dias_base > 0 else Decimal(0)
-        
-        # Projeção para os próximos 7 e 30 dias
-        projecao_7d = media_diaria_ggr * 7
-        projecao_30d = media_diaria_ggr * 30
+        # Anéis de contas que compartilham IP (mantidos no login/cadastro, aqui só contamos)
+        alertas_risco = AnelMulticonta.objects.count()
+
+        # GAP 3: Projeção de Receita (Forecast)
+        # Modelo com sazonalidade semanal/horária reajustado toda noite pelo processar_metricas.
+        # Aqui apenas lemos a linha cacheada (nenhum cálculo por request).
+        previsao = PrevisaoReceitaService.atual()
+        if previsao:
+            projecao_7d = previsao.projecao_7d
+            projecao_30d = previsao.projecao_30d
+            inteligencia_previsao = {
+                "intervalo_30d": {
+                    "inferior": previsao.projecao_30d_inferior,
+                    "superior": previsao.projecao_30d_superior,
+                },
+                "previsao_diaria": previsao.previsao_diaria,
+                "perfil_horario": previsao.coeficientes.get('perfil_horario', []),
+                "modelo_atualizado_em": previsao.gerado_em,
+            }
+        else:
+            # Sem modelo ajustado ainda (instalação nova): média simples dos últimos 7 dias
+            qs_projecao = MetricasDiarias.objects.filter(data__gte=hoje - timezone.timedelta(days=7), data__lt=hoje)
+            qtd_dias_base = qs_projecao.count()
+            soma_ggr_7dias = qs_projecao.aggregate(Sum('house_edge_valor'))['house_edge_valor__sum'] or Decimal(0)
+            media_diaria_ggr = soma_ggr_7dias / qtd_dias_base if qtd_dias_base > 0 else Decimal(0)
+            projecao_7d = media_diaria_ggr * 7
+            projecao_30d = media_diaria_ggr * 30
+            inteligencia_previsao = {"modelo_atualizado_em": None}
 
         # --- NOVOS CÁLCULOS (Onde a mágica acontece) ---
 
@@ -357,8 +376,8 @@ class DashboardFinanceiroView(APIView):
         corte_30d = timezone.now() - timezone.timedelta(days=30)
         total_users_base = CustomUser.objects.count()
         
-        # Query otimizada para contar IDs únicos na tabela de Apostas
-        ativos_30d = Aposta.objects.filter(criado_em__gte=corte_30d).values('usuario').distinct().count()
+        # Bitmaps diários de atividade (OR de 30 dias + hoje ao vivo)
+        ativos_30d = AtividadeService.ativos(hoje - timezone.timedelta(days=30), hoje)
         
         taxa_retencao = (ativos_30d / total_users_base * 100) if total_users_base > 0 else 0.0
         taxa_churn = 100.0 - taxa_retencao
@@ -398,8 +417,10 @@ class DashboardFinanceiroView(APIView):
                 "crescimento_mensal_percent": round(float(crescimento_percent), 2)
             },
             "inteligencia": {
+                "projecao_lucro_7d": round(float(projecao_7d), 2),
                 "projecao_lucro_30d": round(float(projecao_30d), 2),
-                "tendencia": "Alta" if crescimento_percent > 0 else "Baixa"
+                "tendencia": "Alta" if crescimento_percent > 0 else "Baixa",
+                **inteligencia_previsao
             },
             "operacional": {
                 "mapa_calor": mapa_calor,
@@ -438,16 +459,7 @@ class GerarDepositoPixView(APIView):
                     qr_code_url=resposta_gateway.get('qr_code_url')
                 )
 
-                # Cria o registro financeiro (Extrato)
-                Transacao.objects.create(
-                    usuario=request.user,
-                    tipo='DEPOSITO',
-                    valor=valor,
-                    saldo_anterior=request.user.saldo,
-                    saldo_posterior=request.user.saldo,
-                    descricao=f"Aguardando Pagamento Pix",
-                    origem_solicitacao=solicitacao
-                )
+                # O extrato só recebe o depósito quando ele é pago (webhook ou auditar_depositos)
 
                 return Response({
                     "sucesso": True,
@@ -470,11 +482,10 @@ class SolicitarSaqueView(APIView):
 
     @extend_schema(
         summary="Solicitar Saque Pix",
-        description="Solicita um saque. Verifica saldo, rollover, travas de tempo e risco. Tenta pagar automático ou envia para análise.",
+        description="Solicita um saque. Verifica saldo, rollover, travas de tempo e risco. Debita e enfileira o pagamento automático (outbox) ou envia para análise.",
         request=SolicitacaoSaqueSerializer,
         responses={
-            200: {'description': 'Saque realizado com sucesso (Automático)'},
-            202: {'description': 'Saque em análise (Valor alto ou Risco)'},
+            202: {'description': 'Saque na fila de envio (Automático) ou em análise (Valor alto ou Risco)'},
             400: {'description': 'Saldo insuficiente ou Rollover pendente'},
             403: {'description': 'Travamento de segurança (Tempo pós-depósito)'}
         }
@@ -482,21 +493,24 @@ class SolicitarSaqueView(APIView):
     def post(self, request):
         # 1. Validação com Serializer
         serializer = SolicitacaoSaqueSerializer(data=request.data)
-        if not serializer.is_valid():
+        with rastrear('serializer.validacao'):
+            valido = serializer.is_valid()
+        if not valido:
             return Response(serializer.errors, status=400)
         
         valor_cents = serializer.validated_data['valor']
         chave_pix = serializer.validated_data['chave_pix']
         
-        # 2. Proteção de Liquidez (Fail Fast)
-        saldo_banca = SkalePayService.consultar_saldo_banca()
-        if saldo_banca is not None and saldo_banca < (valor_cents / 100.0):
+        # 2. Proteção de Liquidez (Fail Fast): saldo da banca em memória, revalidado em segundo plano
+        saldo_banca = LiquidezService.saldo_disponivel()
+        if saldo_banca is not None and saldo_banca < valor_cents:
             return Response({"detail": "Saque indisponível momentaneamente."}, status=503)
 
         # 3. Transação Atômica: Regras, Bloqueio e Débito
         try:
             with transaction.atomic():
-                user = CustomUser.objects.select_for_update().get(id=request.user.id)
+                with rastrear('lock.usuario'):
+                    user = CustomUser.objects.select_for_update().get(id=request.user.id)
 
                 # --- REGRA A: Saldo ---
                 if user.saldo < valor_cents:
@@ -507,79 +521,58 @@ class SolicitarSaqueView(APIView):
                     return Response({"detail": "Rollover pendente."}, status=400)
 
                 # --- REGRA C: Trava de Tempo (GAP 1) ---
-                ultimo_deposito = Transacao.objects.filter(usuario=user, tipo='DEPOSITO').order_by('-data').first()
-                if ultimo_deposito:
-                    delta = timezone.now() - ultimo_deposito.data
-                    if delta.total_seconds() < 60:
-                        return Response({"detail": "Aguarde processamento do depósito."}, status=403)
-
-                # --- REGRA D: Valor Alto (GAP 2) ---
-                if valor > 500:
-                    SolicitacaoPagamento.objects.create(
-                        usuario=user, tipo='SAQUE', valor=valor,
-                        status='EM_ANALISE', chave_pix=chave_pix
+                # Features de risco mantidas a cada lançamento: leitura de 1 linha, sem varrer o extrato
+                perfil = PerfilRiscoService.carregar(user.pk)
+                if PerfilRiscoService.em_trava_pos_deposito(perfil):
+                    return Response({"detail": "Aguarde processamento do depósito."}, status=403)
+
+                # --- REGRA D: Score de Risco (GAP 2) ---
+                risco_score, motivos = PerfilRiscoService.avaliar_saque(perfil, user, valor_cents)
+                if risco_score >= score_minimo_analise():
+                    solicitacao = SolicitacaoPagamento.objects.create(
+                        usuario=user, tipo='SAQUE', valor=valor_cents,
+                        status='EM_ANALISE', chave_pix=chave_pix,
+                        risco_score=risco_score, analise_motivo="; ".join(motivos)
                     )
-                    user.saldo -= valor
+                    user.saldo -= valor_cents
                     user.save()
+
+                    Transacao.objects.create(
+                        usuario=user, tipo='SAQUE', valor=valor_cents,
+                        saldo_anterior=user.saldo + valor_cents, saldo_posterior=user.saldo,
+                        descricao="Solicitação de Saque (Em Análise)", origem_solicitacao=solicitacao
+                    )
                     return Response({"detail": "Saque em análise de segurança."}, status=202)
 
-                # --- FLUXO AUTOMÁTICO ---
+                # --- FLUXO AUTOMÁTICO: débito + outbox na mesma transação ---
                 solicitacao = SolicitacaoPagamento.objects.create(
-                    usuario=user, tipo='SAQUE', valor=valor,
-                    status='PROCESSANDO', chave_pix=chave_pix
+                    usuario=user, tipo='SAQUE', valor=valor_cents,
+                    status='PROCESSANDO', chave_pix=chave_pix,
+                    risco_score=risco_score, analise_motivo="; ".join(motivos) or None
                 )
-                user.saldo -= valor
+                user.saldo -= valor_cents
                 user.save()
                 
                 Transacao.objects.create(
-                    usuario=user, tipo='SAQUE', valor=valor,
-                    saldo_anterior=user.saldo + valor, saldo_posterior=user.saldo,
+                    usuario=user, tipo='SAQUE', valor=valor_cents,
+                    saldo_anterior=user.saldo + valor_cents, saldo_posterior=user.saldo,
                     descricao="Solicitação de Saque", origem_solicitacao=solicitacao
                 )
+                # Envio à SkalePay pelo despachante (despachar_saques), fora deste worker
+                SaqueOutboxService.enfileirar(solicitacao)
+                transaction.on_commit(lambda: LiquidezService.ajustar(-valor_cents))
 
         except DatabaseError:
             return Response({"detail": "Erro de concorrência. Tente novamente."}, status=409)
 
-        # 4. Comunicação Externa (Fora da Transação do Banco)
-        import requests
-        try:
-            dados_api = SkalePayService.solicitar_saque_pix(
-                usuario=request.user, valor_reais=valor,
-                chave_pix=chave_pix, referencia_interna=solicitacao.id
-            )
-            # Sucesso
-            solicitacao.status = 'APROVADO'
-            solicitacao.id_externo = dados_api.get('id')
-            solicitacao.save()
-            return Response({"detail": "Saque enviado!"})
-
-        except requests.exceptions.ReadTimeout:
-            # CRÍTICO: Se der timeout, NÃO estornamos. O dinheiro pode ter saído.
-            solicitacao.analise_motivo = "Timeout Banco. Auditoria pendente."
-            solicitacao.save()
-            return Response({"detail": "Processando confirmação bancária."}, status=202)
-
-        except Exception as e:
-            # Erro definitivo (400, 401, etc) -> Estorno Seguro
-            with transaction.atomic():
-                user = CustomUser.objects.select_for_update().get(id=request.user.id)
-                user.saldo += valor
-                user.save()
-                
-                solicitacao.status = 'RECUSADO'
-                solicitacao.analise_motivo = str(e)
-                solicitacao.save()
-                
-                Transacao.objects.create(
-                    usuario=user, tipo='ESTORNO', valor=valor,
-                    saldo_anterior=user.saldo - valor, saldo_posterior=user.saldo,
-                    descricao="Estorno (Falha Envio)", origem_solicitacao=solicitacao
-                )
-            return Response({"detail": "Falha no envio. Valor estornado."}, status=502)
+        return Response({"detail": "Saque em processamento.", "id": solicitacao.id}, status=202)
     
 class SkalePayWebhookView(APIView):
     """
     Recebe notificações (Callback) da SkalePay quando um Pix é pago.
+    Só confere a assinatura e grava o evento na caixa de entrada (`WebhookEvento`);
+    os efeitos (saldo, bônus, comissão, extrato) são aplicados pelo
+    `processar_webhooks` (accounts.services.pagamentos).
     """
     authentication_classes = [] # Webhooks são públicos (mas assinados)
     permission_classes = [AllowAny]
@@ -589,123 +582,35 @@ class SkalePayWebhookView(APIView):
         responses={200: OpenApiTypes.OBJECT}
     )
     def post(self, request):
-        # 1. SEGURANÇA: Verificar Assinatura (HMAC SHA-256)
-        #skalepay_signature = request.headers.get('X-SkalePay-Signature', '')
-        #secret = getattr(settings, 'SKALEPAY_SECRET_KEY', '').encode('utf-8')
-        
-        # Só valida se tiver chave configurada (Evita erro em dev sem chave)
-        #if secret:
-        payload_body = request.body
-        expected_signature = hmac.new(secret, payload_body, hashlib.sha256).hexdigest()
-            
-        # Comparação segura contra 'timing attacks'
-        if not hmac.compare_digest(skalepay_signature, expected_signature):
+        # Corpo bruto lido antes de request.data: a assinatura é sobre estes bytes
+        corpo = request.body
+        _, tipo_evento, _ = WebhookService.extrair(request.data)
+        rotulos_iniciais = {'etapa': 'recepcao', 'evento': WebhookService.evento_metrica(tipo_evento)}
+        with WEBHOOK_LATENCIA.medir(**rotulos_iniciais) as rotulos:
+            response = self._receber(request, corpo)
+            rotulos['resultado'] = rotulo_status(response.status_code)
+        return response
+
+    def _receber(self, request, corpo):
+        # 1. SEGURANÇA: Verificar Assinatura (HMAC SHA-256) sobre o corpo bruto
+        assinatura = request.headers.get('X-SkalePay-Signature', '')
+        if not WebhookService.assinatura_valida(corpo, assinatura):
             return Response({"erro": "Assinatura inválida/Forjada"}, status=403)
 
         # 2. LER DADOS
         dados = request.data
-        data = dados.get('data', {})  # Webhook payload has nested 'data' field
-        id_externo = data.get('id') # ID da transação na SkalePay
-        status_pagamento = data.get('status')   # ex: 'paid', 'failed'
-        metadata = data.get('metadata', {})
-        usuario_id = metadata.get('usuario_id')  # Get user ID from metadata
+        id_externo, tipo_evento, usuario_id = WebhookService.extrair(dados)
 
         if usuario_id is None:
             logger.error("Usuario nao identificado no metadata", extra={"payload": dados})
             return Response({"erro": "Usuario nao identificado no metadata"}, status=400)
-        
+
         if not id_externo:
             return Response({"erro": "Payload sem ID"}, status=400)
 
-        try:
-            with transaction.atomic():
-                # Busca a solicitação no banco travando a linha (Lock)
-                solicitacao, created = SolicitacaoPagamento.objects.select_for_update().get_or_create(
-                    id_externo=id_externo,
-                    defaults={
-                        # Se não existir (Depósito direto sem pedir no site), cria agora
-                        # FIXED: Convert gateway amount to cents properly
-                        'valor': int(float(data.get('amount', '0.00')) * 100),  # Convert to cents
-                        'tipo': 'DEPOSITO',
-                        'usuario_id': usuario_id,
-                        'status': 'PENDENTE'
-                    }
-                )
-
-                # IDEMPOTÊNCIA: Se já foi processado, retorna OK e não faz nada
-                if solicitacao.status in ['APROVADO', 'RECUSADO', 'CANCELADO']:
-                    return Response({"msg": "Já processado anteriormente"}, status=200)
-
-                # 3. DECISÃO
-                if status_pagamento == 'paid':
-                    self._efetivar_aprovacao(solicitacao)
-                elif status_pagamento in ['failed', 'canceled']:
-                    solicitacao.status = 'RECUSADO'
-                    solicitacao.save()
-
-            return Response({"status": "received"}, status=200)
-
-        except Exception as e:
-            # Em produção, use logging.error(str(e))
-            return Response({"erro": "Erro interno ao processar"}, status=500)
-
-    def _efetivar_aprovacao(self, solicitacao):
-        """
-        Libera o saldo e marca métricas (FTD).
-        Agora dispara comissão se o promotor ganhar por DEPÓSITO.
-        """
-        usuario = solicitacao.usuario
-        valor = solicitacao.valor
-        
-        # --- LÓGICA DE FTD (First Time Deposit) ---
-        # Se for o primeiro depósito da vida dele, marcamos a data agora.
-        if usuario.data_primeiro_deposito is None:
-            usuario.data_primeiro_deposito = timezone.now()
-            # (Futuro: Disparar evento de Pixel do Facebook/Google Ads aqui)
-        
-        # Aplica Bônus (Regra definida no model)
-        bonus = usuario.aplicar_bonus_deposito(valor)
-        
-        # Atualiza Saldo
-        saldo_anterior = usuario.saldo
-        # Soma o valor depositado + bônus
-        usuario.saldo += valor + bonus
-        usuario.save()
-        
-        # ================= AQUI ENTRA A MUDANÇA (GATILHO) =================
-        # Se o usuário tem um padrinho que ganha comissão por 'DEPOSITO', pagamos agora.
-        # Passamos o valor ORIGINAL (sem bônus) como base de cálculo.
-        usuario.processar_comissao(valor, 'DEPOSITO')
-        # ==================================================================
-
-        # Gera Extrato (Transação de Depósito)
-        tx_deposito = Transacao.objects.create(
-            usuario=usuario,
-            tipo='DEPOSITO',
-            valor=valor,
-            # O saldo posterior aqui considera apenas o depósito para ficar claro no extrato
-            # O bônus entra como uma transação separada logo abaixo
-            saldo_anterior=saldo_anterior, 
-            saldo_posterior=saldo_anterior + valor,
-            descricao=f"Depósito Pix (ID: {solicitacao.id_externo})",
-            origem_solicitacao=solicitacao 
-        )
-        
-        # Gera Extrato (Transação de Bônus, se houver)
-        if bonus > 0:
-            Transacao.objects.create(
-                usuario=usuario,
-                tipo='BONUS',
-                valor=bonus,
-                saldo_anterior=tx_deposito.saldo_posterior,
-                saldo_posterior=usuario.saldo, # Saldo final com bônus
-                descricao="Bônus de Boas-vindas"
-            )
-
-        # Finaliza a solicitação
-        solicitacao.status = 'APROVADO'
-        solicitacao.data_aprovacao = timezone.now()
-        solicitacao.save()
+        # 3. ENFILEIRA: reentregas (mesmo id + evento) são descartadas pela chave única
+        WebhookService.enfileirar(id_externo, tipo_evento, dados)
+        return Response({"status": "received"}, status=200)
 
 # --- 0. PAGINAÇÃO PADRÃO ---
 class StandardResultsSetPagination(PageNumberPagination):
@@ -823,12 +728,17 @@ class BackofficeSolicitacaoViewSet(viewsets.ModelViewSet):
                 solicitacao.reprovado_por = request.user
                 solicitacao.data_reprovacao = timezone.now()
                 
-                # Se for saque, estorna o saldo
-                if solicitacao.tipo == 'SAQUE':
-                    solicitacao.usuario.saldo += solicitacao.valor
-                    solicitacao.usuario.save()
-                
-                solicitacao.save()
+                # Se for saque, estorna o saldo (com lançamento no extrato)
+                with transaction.atomic():
+                    if solicitacao.tipo == 'SAQUE':
+                        WalletService.credit(
+                            user_id=solicitacao.usuario_id,
+                            amount=solicitacao.valor,
+                            description="Estorno (Saque recusado na análise)",
+                            related_object=solicitacao,
+                            tipo='ESTORNO',
+                        )
+                    solicitacao.save()
                 return Response({"msg": "Recusado e saldo estornado (se saque)."})
 
         return Response(serializer.errors, status=400)
@@ -869,56 +779,41 @@ class RiscoComplianceViewSet(viewsets.ViewSet):
     @extend_schema(summary="Listar Multi-Contas por IP", responses={200: OpenApiTypes.OBJECT})
     @action(detail=False, methods=['get'])
     def multiconstas_ip(self, request):
-        """Lista IPs com mais de 1 cadastro"""
-        qs = CustomUser.objects.values('ultimo_ip').annotate(
-            total_contas=Count('id')
-        ).filter(total_contas__gt=1).order_by('-total_contas')
+        """Lista IPs com mais de 1 cadastro (cadastro ou login, via índice VinculoIP)"""
+        qs = MulticontaService.ips_compartilhados()
         
         # Paginação manual para ViewSet simples
         paginator = StandardResultsSetPagination()
         page = paginator.paginate_queryset(qs, request)
-        
-        resultado = []
-        for item in page:
-            users = CustomUser.objects.filter(ultimo_ip=item['ultimo_ip']).values_list('email', flat=True)
-            resultado.append({
-                "ip": item['ultimo_ip'],
-                "total": item['total_contas'],
-                "usuarios": list(users)
-            })
-            
-        return paginator.get_paginated_response(resultado)
+        return paginator.get_paginated_response(MulticontaService.detalhar_ips(page))
+
+    @extend_schema(summary="Anéis de Multicontas", responses={200: OpenApiTypes.OBJECT})
+    @action(detail=False, methods=['get'])
+    def aneis_multiconta(self, request):
+        """Grupos de contas ligadas por IPs compartilhados (direta ou indiretamente), maiores primeiro"""
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(MulticontaService.aneis(), request)
+        return paginator.get_paginated_response(MulticontaService.detalhar_aneis(page))
 
     @extend_schema(summary="Padrão Depósito-Saque", responses={200: OpenApiTypes.OBJECT})
     @action(detail=False, methods=['get'])
     def padrao_deposito_saque(self, request):
         """Lista usuários que depositaram e sacaram rápido (GAP 1)"""
-        suspeitos = []
-        saques_recentes = Transacao.objects.filter(
-            tipo='SAQUE', 
-            data__gte=timezone.now() - timezone.timedelta(days=7)
-        ).select_related('usuario')
-
-        for saque in saques_recentes:
-            deposito_recente = Transacao.objects.filter(
-                usuario=saque.usuario,
-                tipo='DEPOSITO',
-                data__lt=saque.data,
-                data__gte=saque.data - timezone.timedelta(hours=2)
-            ).exists()
-            
-            if deposito_recente:
-                suspeitos.append({
-                    "usuario": saque.usuario.email,
-                    "data_saque": saque.data,
-                    "valor_saque": saque.valor,
-                    "motivo": "Saque < 2h após depósito (Lavagem?)"
-                })
-        
-        # --- [CORREÇÃO] APLICAÇÃO DA PAGINAÇÃO ---
+        saques = RiscoService.saques_apos_credito('DEPOSITO', timezone.timedelta(hours=2))
+
+        # Paginação no banco (COUNT + LIMIT/OFFSET), sem materializar a lista
         paginator = StandardResultsSetPagination()
-        page = paginator.paginate_queryset(suspeitos, request)
-        return paginator.get_paginated_response(page)
+        page = paginator.paginate_queryset(saques, request)
+        suspeitos = [{
+            "usuario": saque.usuario.email,
+            "data_deposito": saque.data_credito,
+            "valor_deposito": saque.valor_credito,
+            "data_saque": saque.data,
+            "valor_saque": saque.valor,
+            "motivo": "Saque < 2h após depósito (Lavagem?)"
+        } for saque in page]
+        return paginator.get_paginated_response(suspeitos)
+
     @extend_schema(summary="Abuso de Bônus", responses={200: OpenApiTypes.OBJECT})
     @action(detail=False, methods=['get'])
     def padrao_bonus_saque(self, request):
@@ -926,54 +821,72 @@ class RiscoComplianceViewSet(viewsets.ViewSet):
         Lista usuários que receberam bônus e tentaram sacar logo depois.
         Filtra: Transação 'BONUS' seguida de 'SAQUE' (Tentativa ou Sucesso) em < 24h.
         """
-        suspeitos = []
-        saques = Transacao.objects.filter(
-            tipo='SAQUE',
-            data__gte=timezone.now() - timezone.timedelta(days=7)
-        ).select_related('usuario')
-
-        for saque in saques:
-            teve_bonus = Transacao.objects.filter(
-                usuario=saque.usuario,
-                tipo='BONUS',
-                data__lt=saque.data,
-                data__gte=saque.data - timezone.timedelta(hours=24)
-            ).exists()
-            
-            if teve_bonus:
-                suspeitos.append({
-                    "usuario": saque.usuario.email,
-                    "data_bonus": "Detectado < 24h antes",
-                    "data_saque": saque.data,
-                    "valor_saque": saque.valor,
-                    "risco": "Abuso de Bônus (Saque rápido após bônus)"
-                })
-        
+        saques = RiscoService.saques_apos_credito('BONUS', timezone.timedelta(hours=24))
+
         paginator = StandardResultsSetPagination()
-        page = paginator.paginate_queryset(suspeitos, request)
-        return paginator.get_paginated_response(page)
+        page = paginator.paginate_queryset(saques, request)
+        suspeitos = [{
+            "usuario": saque.usuario.email,
+            "data_bonus": saque.data_credito,
+            "valor_bonus": saque.valor_credito,
+            "data_saque": saque.data,
+            "valor_saque": saque.valor,
+            "risco": "Abuso de Bônus (Saque rápido após bônus)"
+        } for saque in page]
+        return paginator.get_paginated_response(suspeitos)
 
 # --- 4. ÁREA DO USUÁRIO (Meus Dados) ---
 
 class HistoricoUsuarioView(viewsets.ReadOnlyModelViewSet):
     """
     Histórico financeiro do próprio usuário logado.
+    Paginação por keyset (criado_em, id), mais recentes primeiro: siga o `next`.
     """
     serializer_class = SolicitacaoPagamentoAdminSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
-    
+    pagination_class = KeysetPagination
+    orcamento_queries = {'list': 3, 'retrieve': 2}
+
     # --- ADICIONADO AGORA: FILTROS PARA O USUÁRIO ---
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend]
     filterset_fields = ['tipo', 'status'] # Usuário pode filtrar por Saque/Deposito e Status
-    ordering_fields = ['valor', 'criado_em']
-    ordering = ['-criado_em'] # Padrão: mais recentes primeiro
     # ------------------------------------------------
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return SolicitacaoPagamento.objects.none()
-        return SolicitacaoPagamento.objects.filter(usuario=self.request.user).order_by('-criado_em')
+        return SolicitacaoPagamento.objects.filter(usuario=self.request.user).select_related('usuario')
+
+    def total_keyset(self):
+        # Com filtro ativo o contador não se aplica (evita COUNT por página)
+        if any(self.request.query_params.get(campo) for campo in self.filterset_fields):
+            return None
+        return ContadorService.total(self.request.user.pk, 'solicitacoes')
+
+
+class ExtratoUsuarioView(viewsets.ReadOnlyModelViewSet):
+    """
+    Extrato (lançamentos do ledger) do próprio usuário logado.
+    Paginação por keyset (data, id), mais recentes primeiro: siga o `next`.
+    """
+    serializer_class = TransacaoExtratoSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ExtratoPagination
+    orcamento_queries = {'list': 3, 'retrieve': 2}
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['tipo']
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Transacao.objects.none()
+        return Transacao.objects.filter(usuario=self.request.user).only(
+            'id', 'tipo', 'valor', 'saldo_anterior', 'saldo_posterior', 'data', 'descricao'
+        )
+
+    def total_keyset(self):
+        if self.request.query_params.get('tipo'):
+            return None
+        return ContadorService.total(self.request.user.pk, 'transacoes')
 
 # --- 5. OPERACIONAL (Listas de Modalidades e Picos) ---
 class RelatoriosOperacionaisView(APIView):
@@ -1003,6 +916,96 @@ class RelatoriosOperacionaisView(APIView):
             }
         })
     
+class PerformanceModalidadesView(APIView):
+    """
+    Rollup do cubo Modalidade/Colocação/Jogo (House Edge por tipo de jogo).
+    Query params: ?inicio=YYYY-MM-DD&fim=YYYY-MM-DD&agrupar=jogo,modalidade
+    Dimensões: data, hora, sorteio, jogo, modalidade, colocacao.
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Performance por Modalidade",
+        parameters=[
+            OpenApiParameter("inicio", OpenApiTypes.DATE, description="Data inicial (padrão: 30 dias atrás)"),
+            OpenApiParameter("fim", OpenApiTypes.DATE, description="Data final (padrão: ontem)"),
+            OpenApiParameter("agrupar", OpenApiTypes.STR, description="Dimensões separadas por vírgula (padrão: modalidade)"),
+        ],
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    def get(self, request):
+        hoje = timezone.localdate()
+        try:
+            inicio_str = request.query_params.get('inicio')
+            fim_str = request.query_params.get('fim')
+            data_inicio = timezone.datetime.strptime(inicio_str, '%Y-%m-%d').date() if inicio_str else hoje - timezone.timedelta(days=30)
+            data_fim = timezone.datetime.strptime(fim_str, '%Y-%m-%d').date() if fim_str else hoje - timezone.timedelta(days=1)
+        except ValueError:
+            return Response({"erro": "Formato de data inválido. Use AAAA-MM-DD"}, status=400)
+
+        agrupar = [d.strip() for d in request.query_params.get('agrupar', 'modalidade').split(',') if d.strip()]
+        try:
+            linhas = MetricasModalidadeService.rollup(data_inicio, data_fim, agrupar)
+        except ValueError as e:
+            return Response({"erro": str(e), "dimensoes_validas": list(MetricasModalidadeService.DIMENSOES)}, status=400)
+
+        return Response({
+            "periodo": {"inicio": data_inicio, "fim": data_fim},
+            "agrupado_por": agrupar,
+            "resultados": linhas
+        })
+
+class RetencaoCohortsView(APIView):
+    """
+    Engajamento (DAU/WAU/MAU) e matriz de retenção/churn por cohort, calculados
+    sobre os bitmaps diários de usuários (operações bit a bit, sem varrer apostas).
+    Query params: ?inicio=YYYY-MM-DD&fim=YYYY-MM-DD&base=cadastro|ftd&granularidade=semana|mes|dia&periodos=8
+    """
+    permission_classes = [IsAdminUser]
+    GRANULARIDADES = {'dia': 1, 'semana': 7, 'mes': 30}
+
+    @extend_schema(
+        summary="Retenção por Cohort",
+        parameters=[
+            OpenApiParameter("inicio", OpenApiTypes.DATE, description="Início dos cohorts (padrão: 12 semanas atrás)"),
+            OpenApiParameter("fim", OpenApiTypes.DATE, description="Fim dos cohorts (padrão: hoje)"),
+            OpenApiParameter("base", OpenApiTypes.STR, description="cadastro (date_joined) ou ftd (primeiro depósito)"),
+            OpenApiParameter("granularidade", OpenApiTypes.STR, description="dia, semana ou mes"),
+            OpenApiParameter("periodos", OpenApiTypes.INT, description="Períodos acompanhados por cohort (padrão: 8)"),
+        ],
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    def get(self, request):
+        hoje = timezone.localdate()
+        try:
+            inicio_str = request.query_params.get('inicio')
+            fim_str = request.query_params.get('fim')
+            data_inicio = timezone.datetime.strptime(inicio_str, '%Y-%m-%d').date() if inicio_str else hoje - timezone.timedelta(weeks=12)
+            data_fim = timezone.datetime.strptime(fim_str, '%Y-%m-%d').date() if fim_str else hoje
+            periodos = int(request.query_params.get('periodos', 8))
+        except ValueError:
+            return Response({"erro": "Parâmetros inválidos. Datas em AAAA-MM-DD e periodos inteiro."}, status=400)
+
+        granularidade = request.query_params.get('granularidade', 'semana')
+        if granularidade not in self.GRANULARIDADES:
+            return Response({"erro": "Granularidade inválida. Use dia, semana ou mes."}, status=400)
+
+        try:
+            cohorts = AtividadeService.retencao_cohorts(
+                data_inicio, data_fim,
+                base=request.query_params.get('base', 'cadastro').upper(),
+                granularidade_dias=self.GRANULARIDADES[granularidade],
+                periodos=periodos,
+            )
+        except ValueError as e:
+            return Response({"erro": str(e)}, status=400)
+
+        return Response({
+            "engajamento": AtividadeService.dau_wau_mau(hoje),
+            "granularidade": granularidade,
+            "cohorts": cohorts
+        })
+
 class RelatorioFinanceiroView(APIView):
     permission_classes = [IsAdminUser] # Apenas Admin/Staff
     @extend_schema(summary="Relatório Transações", responses={200: SolicitacaoPagamentoAdminSerializer(many=True)}) 
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Saldo da banca revalidado em segundo plano em cada worker (accounts.services.liquidez)
+from accounts.services.liquidez import LiquidezService  # noqa: E402
+
+LiquidezService.iniciar_atualizador()
@@ -0,0 +1,118 @@
+"""
+Contexto da requisição em contextvars (vale para threads e para asyncio).
+
+`ContextoRequisicaoMiddleware` abre o contexto no início da requisição:
+    - request_id: o `X-Request-ID` recebido (proxy/nginx) ou um novo, devolvido
+      no cabeçalho da resposta
+    - view: a mesma chave da instrumentação ("ApostaViewSet.create")
+    - início, para a duração até o momento de cada log
+    - usuário: resolvido só quando o log é emitido (o JWT do DRF autentica
+      dentro da view) e só como hash, nunca o id puro (LGPD)
+
+Ao final registra uma linha por requisição no logger `requisicoes` (método,
+rota, status, duração). Fora de requisições (comandos, threads de apoio) o
+contexto fica vazio.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
+
+from .instrumentacao import identificar_view
+
+logger = logging.getLogger('requisicoes')
+
+CABECALHO_REQUEST_ID = 'X-Request-ID'
+# Id vindo de fora só é aceito se for curto e sem caracteres estranhos (vai para o log)
+_RE_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Campos que `campos_contexto` acrescenta aos logs
+CAMPOS_CONTEXTO = frozenset({'request_id', 'duracao_ms', 'view', 'usuario'})
+
+
+class _Contexto:
+    __slots__ = ('request_id', 'request', 'view', 'inicio')
+
+    def __init__(self, request_id: str, request=None):
+        self.request_id = request_id
+        self.request = request
+        self.view: Optional[str] = None
+        self.inicio = time.perf_counter()
+
+
+_contexto: ContextVar[Optional[_Contexto]] = ContextVar('contexto_requisicao', default=None)
+
+
+def request_id_atual() -> Optional[str]:
+    contexto = _contexto.get()
+    return contexto.request_id if contexto else None
+
+
+def hash_usuario(usuario_id) -> str:
+    """Pseudônimo estável do usuário para logs: HMAC com a SECRET_KEY, 12 hex."""
+    return hmac.new(settings.SECRET_KEY.encode(), str(usuario_id).encode(), hashlib.sha256).hexdigest()[:12]
+
+
+def _usuario_autenticado(request):
+    # Não força o SimpleLazyObject do Django: avaliar aqui consultaria a sessão no banco
+    usuario = request.__dict__.get('user')
+    if isinstance(usuario, SimpleLazyObject):
+        usuario = usuario._wrapped if usuario._wrapped is not empty else None
+    if usuario is None or not getattr(usuario, 'is_authenticated', False):
+        return None
+    return usuario
+
+
+def campos_contexto() -> Dict:
+    """Campos do contexto atual para o log estruturado ({} fora de requisição)."""
+    contexto = _contexto.get()
+    if contexto is None:
+        return {}
+    campos = {
+        "request_id": contexto.request_id,
+        "duracao_ms": round((time.perf_counter() - contexto.inicio) * 1000, 3),
+    }
+    if contexto.view:
+        campos["view"] = contexto.view
+    usuario = _usuario_autenticado(contexto.request) if contexto.request is not None else None
+    if usuario is not None:
+        campos["usuario"] = hash_usuario(usuario.pk)
+    return campos
+
+
+class ContextoRequisicaoMiddleware:
+    """Deve ficar no topo do MIDDLEWARE: logs dos demais middlewares já saem com o request_id."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recebido = request.headers.get(CABECALHO_REQUEST_ID, '')
+        request_id = recebido if _RE_REQUEST_ID.match(recebido) else uuid.uuid4().hex
+        contexto = _Contexto(request_id, request)
+        token = _contexto.set(contexto)
+        try:
+            response = self.get_response(request)
+            response[CABECALHO_REQUEST_ID] = request_id
+            logger.info(
+                f"{request.method} {request.path} {response.status_code}",
+                extra={"metodo": request.method, "rota": request.path, "status": response.status_code},
+            )
+            return response
+        finally:
+            _contexto.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        contexto = _contexto.get()
+        if contexto is not None:
+            contexto.view = identificar_view(view_func, request.method)[0]
+        return None
@@ -0,0 +1,308 @@
+"""
+Instrumentação de SQL por endpoint.
+
+`InstrumentacaoMiddleware` mede, para cada view DRF/ação (ex: "ApostaViewSet.list"):
+    - quantidade de queries e tempo total no banco (execute_wrapper)
+    - a query mais lenta (fingerprint: parâmetros e listas IN colapsados)
+    - tempo de serialização: acessos a `serializer.data` durante a view, onde o
+      DRF monta a representação (e onde moram os N+1); inclui as queries feitas ali
+    - tempo de renderização da resposta (JSON) e tamanho em bytes
+    - tempo total da requisição
+
+Cada worker agrega em memória e, se `INSTRUMENTACAO_DIR` estiver configurado,
+grava periodicamente um JSON próprio (<dir>/<host>/instrumentacao-<pid>.json,
+ver core.multiprocesso). O endpoint admin consolida os arquivos de todos os
+workers do gunicorn.
+
+Orçamento de queries: views declaram `orcamento_queries` (int para todas as
+ações ou dict por ação). Estourar o orçamento gera warning no log e conta na
+estatística; com `INSTRUMENTACAO_ORCAMENTO_ESTRITO` (ligado pelo runner de
+testes) levanta `OrcamentoQueriesExcedido`, fazendo o teste falhar.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import re
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+
+from . import multiprocesso
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_GRAVACAO = 10.0
+PREFIXO_ARQUIVO = 'instrumentacao'
+TAMANHO_FINGERPRINT = 300
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+_RE_ESPACOS = re.compile(r"\s+")
+# Controle de transação (atomic aninhado): não conta como query de dados
+_PREFIXOS_CONTROLE = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class OrcamentoQueriesExcedido(AssertionError):
+    """O endpoint executou mais queries do que o orçamento declarado."""
+
+
+def fingerprint(sql: str) -> str:
+    """SQL normalizado: literais viram ?, listas IN viram (...), espaços colapsados."""
+    sql = _RE_STRING.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_LISTA.sub('(...)', sql)
+    return _RE_ESPACOS.sub(' ', sql).strip()[:TAMANHO_FINGERPRINT]
+
+
+class ColetorSQL:
+    """execute_wrapper: conta e cronometra as queries de uma requisição."""
+
+    def __init__(self):
+        self.queries = 0
+        self.tempo = 0.0
+        self.mais_lenta_sql = None
+        self.mais_lenta_tempo = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao = time.perf_counter() - inicio
+            if not sql.startswith(_PREFIXOS_CONTROLE):
+                self.queries += 1
+            self.tempo += duracao
+            if duracao > self.mais_lenta_tempo:
+                # Fingerprint só no fim: aqui guarda a string crua (barato)
+                self.mais_lenta_sql, self.mais_lenta_tempo = sql, duracao
+
+
+def _estatistica_vazia() -> Dict:
+    return {
+        "requisicoes": 0,
+        "queries_total": 0,
+        "queries_max": 0,
+        "tempo_db_ms": 0.0,
+        "tempo_serializacao_ms": 0.0,
+        "tempo_render_ms": 0.0,
+        "tempo_total_ms": 0.0,
+        "tempo_total_max_ms": 0.0,
+        "bytes_total": 0,
+        "estouros_orcamento": 0,
+        "mais_lenta_ms": 0.0,
+        "mais_lenta_sql": None,
+    }
+
+
+def _somar(destino: Dict, origem: Dict) -> None:
+    for campo in ("requisicoes", "queries_total", "tempo_db_ms", "tempo_serializacao_ms", "tempo_render_ms",
+                  "tempo_total_ms", "bytes_total", "estouros_orcamento"):
+        destino[campo] += origem.get(campo, 0)
+    destino["queries_max"] = max(destino["queries_max"], origem["queries_max"])
+    destino["tempo_total_max_ms"] = max(destino["tempo_total_max_ms"], origem["tempo_total_max_ms"])
+    if origem["mais_lenta_ms"] > destino["mais_lenta_ms"]:
+        destino["mais_lenta_ms"] = origem["mais_lenta_ms"]
+        destino["mais_lenta_sql"] = origem["mais_lenta_sql"]
+
+
+def _acumular(anterior: Dict[str, Dict], dados: Dict[str, Dict]) -> Dict[str, Dict]:
+    for chave, estatistica in dados.items():
+        _somar(anterior.setdefault(chave, _estatistica_vazia()), estatistica)
+    return anterior
+
+
+class Agregador:
+    """Estatísticas do worker atual, com gravação periódica para consolidação entre processos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dados: Dict[str, Dict] = {}
+        self._gravado_em = time.monotonic()
+
+    @staticmethod
+    def diretorio() -> str:
+        return getattr(settings, 'INSTRUMENTACAO_DIR', '') or ''
+
+    def registrar(self, chave: str, amostra: Dict) -> None:
+        with self._lock:
+            _somar(self._dados.setdefault(chave, _estatistica_vazia()), amostra)
+            gravar = self.diretorio() and time.monotonic() - self._gravado_em > INTERVALO_GRAVACAO
+        if gravar:
+            self.gravar()
+
+    def gravar(self) -> None:
+        """Grava o JSON deste worker de forma atômica (tmp + rename)."""
+        diretorio = self.diretorio()
+        if not diretorio:
+            return
+        with self._lock:
+            dados = {chave: dict(estatistica) for chave, estatistica in self._dados.items()}
+            self._gravado_em = time.monotonic()
+        multiprocesso.gravar(diretorio, PREFIXO_ARQUIVO, dados, _acumular)
+
+    def consolidado(self) -> Dict[str, Dict]:
+        """Soma de todos os workers (arquivos) com o estado em memória deste processo."""
+        total: Dict[str, Dict] = {}
+        diretorio = self.diretorio()
+        if diretorio:
+            for dados in multiprocesso.outros_workers(diretorio, PREFIXO_ARQUIVO, _acumular):
+                for chave, estatistica in dados.items():
+                    _somar(total.setdefault(chave, _estatistica_vazia()), estatistica)
+        with self._lock:
+            for chave, estatistica in self._dados.items():
+                _somar(total.setdefault(chave, _estatistica_vazia()), estatistica)
+        return total
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._dados = {}
+        diretorio = self.diretorio()
+        if diretorio:
+            multiprocesso.remover(diretorio, PREFIXO_ARQUIVO)
+
+
+AGREGADOR = Agregador()
+
+
+def relatorio(ordenar_por: str = 'tempo_db_ms', limite: Optional[int] = None) -> List[Dict]:
+    """Endpoints consolidados com médias calculadas, ordenados pelo campo pedido (desc)."""
+    linhas = []
+    for chave, est in AGREGADOR.consolidado().items():
+        n = est["requisicoes"] or 1
+        linhas.append({
+            "endpoint": chave,
+            **est,
+            "queries_media": round(est["queries_total"] / n, 2),
+            "tempo_db_medio_ms": round(est["tempo_db_ms"] / n, 3),
+            "tempo_serializacao_medio_ms": round(est["tempo_serializacao_ms"] / n, 3),
+            "tempo_render_medio_ms": round(est["tempo_render_ms"] / n, 3),
+            "tempo_total_medio_ms": round(est["tempo_total_ms"] / n, 3),
+            "bytes_medio": int(est["bytes_total"] / n),
+        })
+    linhas.sort(key=lambda linha: linha.get(ordenar_por) or 0, reverse=True)
+    return linhas[:limite] if limite else linhas
+
+
+def identificar_view(view_func, metodo: str):
+    """
+    (chave, orçamento) de uma view. DRF: "Classe.acao" (ViewSet) ou "Classe.metodo"
+    (APIView); demais: "modulo.funcao".
+    """
+    classe = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if classe is None:
+        return f"{view_func.__module__}.{view_func.__name__}", None
+
+    acoes = getattr(view_func, 'actions', None)
+    acao = acoes.get(metodo.lower(), metodo.lower()) if acoes else metodo.lower()
+    orcamento = getattr(classe, 'orcamento_queries', None)
+    if isinstance(orcamento, dict):
+        orcamento = orcamento.get(acao)
+    return f"{classe.__name__}.{acao}", orcamento
+
+
+# [segundos acumulados em `serializer.data`, profundidade] da requisição atual
+_serializacao: ContextVar[Optional[list]] = ContextVar('instrumentacao_serializacao', default=None)
+
+
+def _medir_data(original):
+    @functools.wraps(original)
+    def data(self):
+        medicao = _serializacao.get()
+        if medicao is None or medicao[1]:
+            # Fora de requisição instrumentada, ou `.data` aninhado (já contado no de fora)
+            return original(self)
+        medicao[1] += 1
+        inicio = time.perf_counter()
+        try:
+            return original(self)
+        finally:
+            medicao[0] += time.perf_counter() - inicio
+            medicao[1] -= 1
+
+    data.instrumentado = True
+    return property(data)
+
+
+def instalar_medicao_serializacao() -> None:
+    """Envolve `Serializer.data` e `ListSerializer.data` do DRF (uma vez por processo)."""
+    from rest_framework import serializers
+
+    for classe in (serializers.Serializer, serializers.ListSerializer):
+        propriedade = classe.__dict__['data']
+        if not getattr(propriedade.fget, 'instrumentado', False):
+            classe.data = _medir_data(propriedade.fget)
+
+
+class InstrumentacaoMiddleware:
+    """Deve ficar no topo do MIDDLEWARE para enxergar as queries de todos os middlewares."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instalar_medicao_serializacao()
+
+    def __call__(self, request):
+        if not getattr(settings, 'INSTRUMENTACAO_ATIVA', True):
+            return self.get_response(request)
+
+        coletor = ColetorSQL()
+        serializacao = [0.0, 0]
+        token = _serializacao.set(serializacao)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(coletor))
+                response = self.get_response(request)
+        finally:
+            _serializacao.reset(token)
+        tempo_total = time.perf_counter() - inicio
+
+        chave = getattr(request, '_instrumentacao_chave', None)
+        if chave is None:
+            return response
+
+        orcamento = request._instrumentacao_orcamento
+        estourou = orcamento is not None and coletor.queries > orcamento
+        AGREGADOR.registrar(chave, {
+            "requisicoes": 1,
+            "queries_total": coletor.queries,
+            "queries_max": coletor.queries,
+            "tempo_db_ms": coletor.tempo * 1000,
+            "tempo_serializacao_ms": serializacao[0] * 1000,
+            "tempo_render_ms": getattr(request, '_instrumentacao_render', 0.0) * 1000,
+            "tempo_total_ms": tempo_total * 1000,
+            "tempo_total_max_ms": tempo_total * 1000,
+            "bytes_total": 0 if response.streaming else len(response.content),
+            "estouros_orcamento": int(estourou),
+            "mais_lenta_ms": coletor.mais_lenta_tempo * 1000,
+            "mais_lenta_sql": fingerprint(coletor.mais_lenta_sql) if coletor.mais_lenta_sql else None,
+        })
+
+        if estourou:
+            mensagem = f"{chave}: {coletor.queries} queries (orçamento {orcamento})"
+            if getattr(settings, 'INSTRUMENTACAO_ORCAMENTO_ESTRITO', False):
+                raise OrcamentoQueriesExcedido(mensagem)
+            logger.warning(f"Orçamento de queries excedido - {mensagem}")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._instrumentacao_chave, request._instrumentacao_orcamento = identificar_view(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        # Respostas DRF são renderizadas (JSON) depois deste hook
+        inicio = time.perf_counter()
+
+        def fim_render(_response):
+            request._instrumentacao_render = time.perf_counter() - inicio
+
+        response.add_post_render_callback(fim_render)
+        return response
+
@@ -1,39 +1,107 @@
 import logging
 import re
 
+from .contexto import CAMPOS_CONTEXTO
+
+# Regras na ordem em que sempre foram aplicadas: (regex, substituição, o que o
+# texto precisa conter). A ordem importa: cada regra vê a saída das anteriores
+# (ex.: "password=4111 1111 1111 1111" só fica todo oculto porque o cartão é
+# mascarado antes do segredo, que para no primeiro espaço). Por isso não dá
+# para juntar tudo numa alternação única sem mudar o que é mascarado.
+_REGRAS = (
+    # 1. CPF (11 dígitos puro ou com pontuação)
+    (re.compile(r'\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b'), '[CPF-OCULTO-LGPD]', 'digito'),
+    # 2. Cartões de crédito (4111 1111 1111 1111, 4111111111111111)
+    (re.compile(r'\b(?:\d[ -]*?){13,16}\b'), '[CARTAO-OCULTO-LGPD]', 'digito'),
+    # 3. E-mails (preserva domínio para debugging)
+    (re.compile(r'\b([a-zA-Z0-9._%+-]+)@([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b'), r'[EMAIL-OCULTO-LGPD]@\2', '@'),
+    # 4. Telefones brasileiros ((11) 99999-9999, 11999999999, etc.)
+    (re.compile(r'\(?\d{2}\)?\s?\d{4,5}-?\d{4}\b'), '[TELEFONE-OCULTO-LGPD]', 'digito'),
+    # 5. Senhas / tokens em query params ou logs de debug
+    (re.compile(r'(password|senha|token|secret|api_key)=.*?(&|\s|$)', re.IGNORECASE), r'\1=[PROTEGIDO]\2', '='),
+    # 6. Chaves de API longas
+    (re.compile(r'[a-zA-Z0-9]{32,}'), '[CHAVE-OCULTA-LGPD]', 'longo'),
+    # 7. Dados bancários (agência, conta)
+    (re.compile(r'(agencia|conta|agency|account)=\s*[0-9-]+', re.IGNORECASE), r'\1=[PROTEGIDO]', '='),
+)
+
+_DIGITO = re.compile(r'[0-9]')
+
+# Campos de payloads estruturados (extra=...) cujo valor é sempre ocultado
+_CAMPOS_PROTEGIDOS = frozenset({
+    'password', 'senha', 'token', 'secret', 'api_key', 'agencia', 'conta', 'agency', 'account',
+})
+
+# Atributos que todo LogRecord tem: o resto veio de `extra`. Os do contexto
+# (request_id, hash do usuário) são gerados por nós e não passam pelas regras
+_ATRIBUTOS_PADRAO = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+_ATRIBUTOS_IGNORADOS = _ATRIBUTOS_PADRAO | CAMPOS_CONTEXTO
+
+_PROFUNDIDADE_MAXIMA = 5
+
+
+def mascarar(texto: str) -> str:
+    """
+    Aplica as regras LGPD ao texto, na ordem de `_REGRAS`.
+
+    Regra cujo pré-requisito não aparece no texto nem roda (as máscaras não
+    criam dígitos, '@' ou '='): texto sem candidatos volta intacto sem passar
+    por regex nenhuma, e um e-mail sem números só paga a regra de e-mail.
+    """
+    requisitos = set()
+    if '=' in texto:
+        requisitos.add('=')
+    if '@' in texto:
+        requisitos.add('@')
+    if _DIGITO.search(texto):
+        requisitos.add('digito')
+    if len(texto) >= 32:
+        requisitos.add('longo')
+    if not requisitos:
+        return texto
+    for regex, substituicao, requisito in _REGRAS:
+        if requisito in requisitos:
+            texto = regex.sub(substituicao, texto)
+    return texto
+
+
+def _mascarar_valor(valor, profundidade=0):
+    if isinstance(valor, str):
+        return mascarar(valor)
+    if profundidade >= _PROFUNDIDADE_MAXIMA:
+        return valor
+    if isinstance(valor, dict):
+        return {
+            chave: '[PROTEGIDO]' if isinstance(chave, str) and chave.lower() in _CAMPOS_PROTEGIDOS
+            else _mascarar_valor(item, profundidade + 1)
+            for chave, item in valor.items()
+        }
+    if isinstance(valor, (list, tuple)):
+        return type(valor)(_mascarar_valor(item, profundidade + 1) for item in valor)
+    return valor
+
+
 class SensitiveDataFilter(logging.Filter):
     """
     Filtro de Logs para conformidade com LGPD.
-    Intercepta qualquer log do sistema e mascara CPFs, Senhas, Cartões de Crédito, 
-    E-mails e Telefones antes de exibir.
+    Intercepta qualquer log do sistema e mascara CPFs, Senhas, Cartões de Crédito,
+    E-mails e Telefones antes de exibir: na mensagem, nos argumentos (`%s`) e nos
+    payloads estruturados passados em `extra`.
     """
     def filter(self, record):
-        if not isinstance(record.msg, str):
-            return True
-            
-        msg = record.msg
-        
-        # 1. Mascara CPF (Formato 11 dígitos puro ou com pontuação)
-        # Regex busca: 3 digitos + ponto opcional + 3 digitos + ponto opcional + 3 digitos + traço opcional + 2 digitos
-        msg = re.sub(r'\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b', '[CPF-OCULTO-LGPD]', msg)
-        
-        # 2. Mascara Cartões de Crédito (Formatos: 4111 1111 1111 1111, 4111111111111111)
-        msg = re.sub(r'\b(?:\d[ -]*?){13,16}\b', '[CARTAO-OCULTO-LGPD]', msg)
-        
-        # 3. Mascara E-mails (preserva domínio para debugging)
-        msg = re.sub(r'\b([a-zA-Z0-9._%+-]+)@([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b', r'[EMAIL-OCULTO-LGPD]@\2', msg)
-        
-        # 4. Mascara Telefones brasileiros (Formatos: (11) 99999-9999, 11999999999, etc.)
-        msg = re.sub(r'\(?\d{2}\)?\s?\d{4,5}-?\d{4}\b', '[TELEFONE-OCULTO-LGPD]', msg)
-        
-        # 5. Mascara Senhas (se aparecerem em logs de debug ou query params)
-        msg = re.sub(r'(password|senha|token|secret|api_key)=.*?(&|\s|$)', r'\1=[PROTEGIDO]\2', msg, flags=re.IGNORECASE)
-        
-        # 6. Mascara Chaves de API longas
-        msg = re.sub(r'[a-zA-Z0-9]{32,}', '[CHAVE-OCULTA-LGPD]', msg)
-        
-        # 7. Mascara dados bancários (agência, conta)
-        msg = re.sub(r'(agencia|conta|agency|account)=\s*[0-9-]+', r'\1=[PROTEGIDO]', msg, flags=re.IGNORECASE)
-        
-        record.msg = msg
-        return True
\ No newline at end of file
+        if isinstance(record.msg, str):
+            record.msg = mascarar(record.msg)
+
+        # logger.info("CPF %s", cpf): o dado sensível vem nos args, não na mensagem
+        if record.args:
+            if isinstance(record.args, dict):
+                record.args = _mascarar_valor(record.args)
+            else:
+                record.args = tuple(mascarar(a) if isinstance(a, str) else a for a in record.args)
+
+        # extra={'payload': {...}}: vira atributo do record (copiado, não altera o do chamador)
+        for atributo in record.__dict__.keys() - _ATRIBUTOS_IGNORADOS:
+            valor = record.__dict__[atributo]
+            if isinstance(valor, (str, dict, list, tuple)):
+                record.__dict__[atributo] = _mascarar_valor(valor)
+        return True
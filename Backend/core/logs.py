@@ -0,0 +1,221 @@
+"""
+Pipeline de logs sem I/O na thread da requisição.
+
+    logger.info(...) -> ContextoLogFilter + AmostragemFilter + SensitiveDataFilter
+        -> FilaLogHandler (thread da requisição: junta a mensagem e enfileira)
+    fila -> QueueListener (thread própria) -> JsonFormatter
+        -> console e ArquivoRotativoHandler
+
+A amostragem vem antes da máscara: registro descartado não paga o mascaramento.
+A máscara fica na thread que logou porque copia os payloads de `extra` no
+momento do log (o chamador pode alterá-los depois).
+
+A escrita em disco (e um eventual fsync lento) acontece só na thread do
+listener. A fila é limitada: cheia, o registro é descartado e contado em
+`logs_descartados_total`, nunca bloqueia quem logou.
+
+Configuração (settings.LOGGING), handler `fila`:
+    '()': 'core.logs.FilaLogHandler', 'arquivo': caminho ou None,
+    'max_bytes'/'backups': rotação por tamanho, 'console': bool,
+    'formato_json': bool (False = texto, para desenvolvimento), 'tamanho_fila': int.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import zlib
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotação sem trava entre processos
+    fcntl = None
+
+from .contexto import campos_contexto
+from .metricas import LOGS_DESCARTADOS
+
+TAMANHO_FILA_PADRAO = 10000
+
+# Atributos que todo LogRecord tem: o resto veio de `extra` (ou do contexto)
+_ATRIBUTOS_PADRAO = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class ContextoLogFilter(logging.Filter):
+    """Copia request_id, usuário (hash), view e duração para o record, na thread que logou."""
+
+    def filter(self, record):
+        for campo, valor in campos_contexto().items():
+            if not hasattr(record, campo):
+                setattr(record, campo, valor)
+        return True
+
+
+class AmostragemFilter(logging.Filter):
+    """
+    Deixa passar só uma fração (`taxa`) dos registros até `nivel` (DEBUG, por
+    padrão); acima disso tudo passa. Dentro de uma requisição a decisão é pelo
+    request_id: a requisição amostrada leva todas as suas linhas de debug.
+    """
+
+    def __init__(self, taxa: float = 0.01, nivel='DEBUG'):
+        super().__init__()
+        self.taxa = float(taxa)
+        self.nivel = logging._checkLevel(nivel)
+
+    def filter(self, record):
+        if record.levelno > self.nivel or self.taxa >= 1:
+            return True
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            return zlib.crc32(request_id.encode()) % 10000 < self.taxa * 10000
+        return random.random() < self.taxa
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro: campos fixos + contexto + `extra`."""
+
+    def format(self, record):
+        dados = {
+            "ts": self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}",
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage(),
+        }
+        for atributo, valor in record.__dict__.items():
+            if atributo not in _ATRIBUTOS_PADRAO:
+                dados[atributo] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            dados["excecao"] = record.exc_text
+        if record.stack_info:
+            dados["pilha"] = record.stack_info
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class ArquivoRotativoHandler(RotatingFileHandler):
+    """
+    Rotação por tamanho segura com vários workers do gunicorn no mesmo arquivo:
+    o tamanho é o do arquivo em disco (não o que este processo escreveu), e
+    quem chega depois de outro worker já ter rodado só reabre o arquivo novo.
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding='utf-8'):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True)
+
+    def _rodado_por_outro(self) -> bool:
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def shouldRollover(self, record):
+        if self.maxBytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        if self._rodado_por_outro():
+            self.stream.close()
+            self.stream = self._open()
+        return os.fstat(self.stream.fileno()).st_size >= self.maxBytes
+
+    def doRollover(self):
+        if fcntl is None:
+            return super().doRollover()
+        with open(self.baseFilename + '.lock', 'a') as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                # Outro worker pode ter rodado enquanto esperávamos a trava
+                if self._rodado_por_outro():
+                    self.stream.close()
+                    self.stream = self._open()
+                else:
+                    super().doRollover()
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+
+class FilaLogHandler(QueueHandler):
+    """QueueHandler que monta os próprios destinos e o QueueListener (thread por processo)."""
+
+    def __init__(self, arquivo: Optional[str] = None, max_bytes: int = 50 * 1024 * 1024, backups: int = 5,
+                 console: bool = True, formato_json: bool = True, tamanho_fila: int = TAMANHO_FILA_PADRAO):
+        super().__init__(queue.Queue(maxsize=tamanho_fila))
+        formatter = JsonFormatter() if formato_json else logging.Formatter('{asctime} {levelname} {name} {message}', style='{')
+
+        self.destinos = []
+        if console:
+            self.destinos.append(logging.StreamHandler(sys.stderr))
+        if arquivo:
+            self.destinos.append(ArquivoRotativoHandler(arquivo, maxBytes=max_bytes, backupCount=backups))
+        for destino in self.destinos:
+            destino.setFormatter(formatter)
+
+        self.descartados = 0
+        self._listener: Optional[QueueListener] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        atexit.register(self.parar)
+
+    def _garantir_listener(self) -> None:
+        # Threads não sobrevivem ao fork: cada worker do gunicorn sobe o próprio listener
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._listener = QueueListener(self.queue, *self.destinos, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Só o necessário na thread que logou: junta msg + args e guarda a exceção
+        # como texto (o objeto prenderia frames vivos na fila)
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._garantir_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+            LOGS_DESCARTADOS.inc()
+
+    def redirecionar_arquivo(self, caminho: str) -> None:
+        """Troca o arquivo de destino em uso (o runner de testes manda os logs para fora do código)."""
+        for destino in self.destinos:
+            if isinstance(destino, ArquivoRotativoHandler):
+                destino.acquire()
+                try:
+                    if destino.stream is not None:
+                        destino.stream.close()
+                        destino.stream = None
+                    destino.baseFilename = os.path.abspath(caminho)
+                finally:
+                    destino.release()
+
+    def parar(self) -> None:
+        """Esvazia a fila e para o listener (atexit; testes)."""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener, self._pid = None, None
+
+    def close(self):
+        self.parar()
+        for destino in self.destinos:
+            destino.close()
+        super().close()
@@ -0,0 +1,307 @@
+"""
+Métricas operacionais no formato de exposição de texto do Prometheus.
+
+Contadores e histogramas vivem na memória de cada worker (um dict por série,
+atualizado sob lock: custo de microssegundos, seguro para ficar sempre ligado).
+Cada processo grava um snapshot em `METRICAS_DIR` a cada `INTERVALO_GRAVACAO`
+segundos (e ao sair); o endpoint /metrics soma os snapshots de todos os
+processos (workers do gunicorn e os comandos contínuos dos contêineres
+webhooks/saques, pelo volume compartilhado) com o estado do processo que
+atendeu o scrape. Workers que morreram continuam somados (core.multiprocesso).
+Com `METRICAS_DIR` vazio, o scrape enxerga só o próprio worker.
+
+Uso:
+    APOSTAS.inc(modalidade='Milhar', resultado='aceita')
+    with SKALEPAY_LATENCIA.medir(operacao='POST /transfers') as rotulos:
+        ...
+        rotulos['status'] = response.status_code
+
+Rótulos não preenchidos até o fim de `medir` viram 'erro' (exceção no bloco).
+Mantenha os valores de rótulo num conjunto pequeno e fechado: cada combinação
+é uma série nova no Prometheus.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from . import multiprocesso
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_GRAVACAO = 5.0
+PREFIXO_ARQUIVO = 'metricas'
+# Latências de banco/HTTP: de 5ms até o timeout de leitura da SkalePay (10s)
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_APURACAO = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _formatar_numero(valor: float) -> str:
+    if valor == math.inf:
+        return '+Inf'
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _rotulos_texto(nomes: Iterable[str], valores: Iterable[str]) -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+class Registro:
+    """Métricas de um processo, com gravação periódica para o scrape multi-worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metricas: Dict[str, 'Metrica'] = {}
+        self._gravado_em = time.monotonic()
+
+    @staticmethod
+    def diretorio() -> str:
+        return getattr(settings, 'METRICAS_DIR', '') or ''
+
+    def registrar(self, metrica: 'Metrica') -> None:
+        if metrica.nome in self._metricas:
+            raise ValueError(f"Métrica '{metrica.nome}' já registrada.")
+        self._metricas[metrica.nome] = metrica
+
+    def talvez_gravar(self) -> None:
+        """Chamado após cada observação: grava no máximo a cada INTERVALO_GRAVACAO."""
+        if time.monotonic() - self._gravado_em > INTERVALO_GRAVACAO and self.diretorio():
+            self.gravar()
+
+    def snapshot(self) -> Dict[str, List]:
+        with self.lock:
+            return {nome: metrica.serializar() for nome, metrica in self._metricas.items()}
+
+    def gravar(self) -> None:
+        diretorio = self.diretorio()
+        if not diretorio:
+            return
+        self._gravado_em = time.monotonic()
+        try:
+            multiprocesso.gravar(diretorio, PREFIXO_ARQUIVO, self.snapshot(), self.acumular)
+        except OSError:
+            logger.warning("Falha ao gravar snapshot de métricas em %s", diretorio, exc_info=True)
+
+    def acumular(self, anterior: Dict[str, List], snapshot: Dict[str, List]) -> Dict[str, List]:
+        """Soma dois snapshots (worker morto somado ao acumulado dos mortos do host)."""
+        resultado = {}
+        for nome, metrica in self._metricas.items():
+            total = metrica.serializar_vazio()
+            for origem in (anterior, snapshot):
+                if nome in origem:
+                    metrica.somar(total, origem[nome])
+            resultado[nome] = metrica.serializar(total)
+        return resultado
+
+    def exportar(self) -> str:
+        """Texto de exposição com a soma de todos os workers."""
+        total = {nome: metrica.serializar_vazio() for nome, metrica in self._metricas.items()}
+        snapshots = [self.snapshot()]
+        diretorio = self.diretorio()
+        if diretorio:
+            snapshots.extend(multiprocesso.outros_workers(diretorio, PREFIXO_ARQUIVO, self.acumular))
+        for snapshot in snapshots:
+            for nome, series in snapshot.items():
+                if nome in self._metricas:
+                    self._metricas[nome].somar(total[nome], series)
+
+        linhas = []
+        for nome, metrica in sorted(self._metricas.items()):
+            linhas.append(f"# HELP {nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {nome} {metrica.tipo}")
+            linhas.extend(metrica.expor(total[nome]))
+        return '\n'.join(linhas) + '\n'
+
+    def limpar(self) -> None:
+        with self.lock:
+            for metrica in self._metricas.values():
+                metrica.series.clear()
+        diretorio = self.diretorio()
+        if diretorio:
+            multiprocesso.remover(diretorio, PREFIXO_ARQUIVO)
+
+
+REGISTRO = Registro()
+atexit.register(REGISTRO.gravar)
+
+
+class Metrica:
+    tipo = ''
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = (), registro: Registro = REGISTRO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.registro = registro
+        self.series: Dict[Tuple[str, ...], object] = {}
+        registro.registrar(self)
+
+    def _chave(self, valores: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(valores.get(rotulo, '')) for rotulo in self.rotulos)
+
+    def serializar(self, series: Optional[Dict] = None) -> List:
+        series = self.series if series is None else series
+        return [[list(chave), valor] for chave, valor in series.items()]
+
+    def serializar_vazio(self) -> Dict:
+        return {}
+
+
+class Contador(Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor: float = 1, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        with self.registro.lock:
+            self.series[chave] = self.series.get(chave, 0) + valor
+        self.registro.talvez_gravar()
+
+    def somar(self, total: Dict, series: List) -> None:
+        for chave, valor in series:
+            total[tuple(chave)] = total.get(tuple(chave), 0) + valor
+
+    def expor(self, total: Dict) -> List[str]:
+        return [
+            f"{self.nome}{_rotulos_texto(self.rotulos, chave)} {_formatar_numero(valor)}"
+            for chave, valor in sorted(total.items())
+        ]
+
+
+class Histograma(Metrica):
+    """Série = [contagem por bucket (não cumulativa) + 1 para +Inf, soma, quantidade]."""
+    tipo = 'histogram'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = BUCKETS_LATENCIA, registro: Registro = REGISTRO):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(nome, ajuda, rotulos, registro)
+
+    def _vazia(self) -> List:
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observe(self, valor: float, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        indice = bisect_left(self.buckets, valor)  # Primeiro bucket com limite >= valor
+        with self.registro.lock:
+            serie = self.series.get(chave)
+            if serie is None:
+                serie = self.series[chave] = self._vazia()
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+        self.registro.talvez_gravar()
+
+    @contextmanager
+    def medir(self, **rotulos):
+        """Cronometra o bloco; o bloco pode completar/alterar os rótulos no dict recebido."""
+        inicio = time.perf_counter()
+        try:
+            yield rotulos
+        except BaseException:
+            for rotulo in self.rotulos:
+                rotulos.setdefault(rotulo, 'erro')
+            raise
+        finally:
+            self.observe(time.perf_counter() - inicio, **rotulos)
+
+    def serializar(self, series: Optional[Dict] = None) -> List:
+        series = self.series if series is None else series
+        return [[list(chave), [list(serie[0]), serie[1], serie[2]]] for chave, serie in series.items()]
+
+    def somar(self, total: Dict, series: List) -> None:
+        for chave, (contagens, soma, quantidade) in series:
+            if len(contagens) != len(self.buckets) + 1:
+                continue  # Snapshot de um deploy com outros buckets
+            serie = total.setdefault(tuple(chave), self._vazia())
+            serie[0] = [a + b for a, b in zip(serie[0], contagens)]
+            serie[1] += soma
+            serie[2] += quantidade
+
+    def expor(self, total: Dict) -> List[str]:
+        linhas = []
+        nomes_bucket = self.rotulos + ('le',)
+        for chave, (contagens, soma, quantidade) in sorted(total.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (math.inf,), contagens):
+                acumulado += contagem
+                rotulos = _rotulos_texto(nomes_bucket, chave + (_formatar_numero(limite),))
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            rotulos = _rotulos_texto(self.rotulos, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {_formatar_numero(soma)}")
+            linhas.append(f"{self.nome}_count{rotulos} {quantidade}")
+        return linhas
+
+
+def exportar() -> str:
+    return REGISTRO.exportar()
+
+
+def rotulo_status(status_code: Optional[int]) -> str:
+    """Classe do status HTTP ('2xx', '4xx'...): poucas séries, mesmo com códigos variados."""
+    return f"{status_code // 100}xx" if status_code else 'erro'
+
+
+# --- 1. APOSTAS ---
+APOSTAS = Contador(
+    'apostas_total', 'Apostas recebidas por modalidade e resultado (aceita, rejeitada, conflito, suspensa, erro).',
+    ('modalidade', 'resultado'),
+)
+
+# --- 2. CARTEIRA ---
+CARTEIRA_LATENCIA = Histograma(
+    'carteira_operacao_segundos', 'Duração de débitos/créditos na carteira (WalletService), lock incluso.',
+    ('operacao', 'tipo'),
+)
+LOCK_ESPERA = Histograma(
+    'lock_espera_segundos', 'Espera por SELECT ... FOR UPDATE, por recurso travado.',
+    ('recurso',),
+)
+
+# --- 3. APURAÇÃO ---
+APURACAO_APOSTAS = Contador(
+    'apuracao_apostas_total', 'Apostas apuradas (vazão da apuração), por resultado.',
+    ('resultado',),
+)
+APURACAO_DURACAO = Histograma(
+    'apuracao_duracao_segundos', 'Duração da apuração de um sorteio.',
+    ('resultado',), buckets=BUCKETS_APURACAO,
+)
+
+# --- 4. PAGAMENTOS ---
+WEBHOOK_LATENCIA = Histograma(
+    'webhook_processamento_segundos', 'Webhooks da SkalePay: recepção no endpoint e processamento da caixa de entrada.',
+    ('etapa', 'evento', 'resultado'),
+)
+SKALEPAY_LATENCIA = Histograma(
+    'skalepay_requisicao_segundos', 'Chamadas HTTP à SkalePay (retentativas inclusas).',
+    ('operacao', 'status'),
+)
+SKALEPAY_RETENTATIVAS = Contador(
+    'skalepay_retentativas_total', 'Retentativas automáticas de chamadas à SkalePay.',
+    ('operacao', 'motivo'),
+)
+SAQUES_DESPACHADOS = Contador(
+    'saques_despachados_total', 'Saques da outbox enviados à SkalePay, por desfecho (enviado, recusado, retentativa, incerto).',
+    ('resultado',),
+)
+
+# --- 5. LOGS ---
+LOGS_DESCARTADOS = Contador(
+    'logs_descartados_total', 'Registros de log descartados com a fila do FilaLogHandler cheia.',
+)
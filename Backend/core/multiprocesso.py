@@ -0,0 +1,163 @@
+"""
+Estado por worker em arquivos JSON, para consolidação entre processos.
+
+Layout (o diretório é compartilhado entre contêineres, ver docker-compose):
+
+    <dir>/<hostname>/<prefixo>-<pid>.json     snapshot de um processo vivo
+    <dir>/<hostname>/<prefixo>-mortos.json    soma dos processos que já morreram
+
+Cada processo grava o próprio snapshot de forma atômica (tmp + rename); quem
+consolida lê os arquivos dos demais (de todos os hosts) e soma com o estado em
+memória do processo atual. Usado pela instrumentação de SQL
+(core.instrumentacao), pelas métricas (core.metricas) e pelo tracing.
+
+O pid só identifica um processo dentro do próprio host (cada contêiner tem seu
+namespace de pids), daí o subdiretório por hostname. O subdiretório do host é
+apagado na subida do contêiner (entrypoint.sh). Durante a vida do contêiner,
+arquivos de pids que já não existem (worker reciclado pelo gunicorn) são
+podados: com `acumular`, o conteúdo é somado ao `-mortos` antes (contadores não
+andam para trás); sem, o arquivo é só removido. O mesmo vale para o arquivo com
+o pid do próprio processo encontrado antes da primeira gravação (pid reciclado:
+é de um antecessor, não deste processo).
+"""
+
+from __future__ import annotations
+
+import glob
+import json
+import os
+import socket
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: poda sem trava entre processos
+    fcntl = None
+
+SUFIXO_MORTOS = 'mortos'
+
+# (diretório, prefixo, pid) que este processo já gravou: arquivo dele, não de um antecessor
+_reivindicados = set()
+
+
+def _pasta_host(diretorio: str) -> str:
+    return os.path.join(diretorio, socket.gethostname())
+
+
+def _arquivo_proprio(diretorio: str, prefixo: str) -> str:
+    return os.path.join(_pasta_host(diretorio), f"{prefixo}-{os.getpid()}.json")
+
+
+def _pid_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Existe, de outro usuário
+    return True
+
+
+def _ler(caminho: str) -> Optional[Any]:
+    try:
+        with open(caminho) as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None  # Arquivo removido ou corrompido
+
+
+def _escrever(caminho: str, dados: Any) -> None:
+    conteudo = json.dumps(dados)
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix='.tmp')
+    with os.fdopen(descritor, 'w') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+@contextmanager
+def _trava(pasta: str, prefixo: str):
+    # Dois workers podando ao mesmo tempo somariam o mesmo morto duas vezes
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(pasta, f'.{prefixo}.lock'), 'a') as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+
+
+def _aposentar(pasta: str, prefixo: str, caminho: str, acumular: Optional[Callable[[Any, Any], Any]]) -> None:
+    """Remove o snapshot de um processo morto, somando-o antes ao `-mortos` (se houver `acumular`)."""
+    dados = _ler(caminho) if acumular else None
+    if dados is not None:
+        mortos = os.path.join(pasta, f'{prefixo}-{SUFIXO_MORTOS}.json')
+        anterior = _ler(mortos)
+        _escrever(mortos, dados if anterior is None else acumular(anterior, dados))
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+
+def podar(diretorio: str, prefixo: str, acumular: Optional[Callable[[Any, Any], Any]] = None) -> None:
+    """Aposenta os snapshots de processos deste host que já não existem."""
+    pasta = _pasta_host(diretorio)
+    if not os.path.isdir(pasta):
+        return
+    proprio = _arquivo_proprio(diretorio, prefixo)
+    reivindicado = (diretorio, prefixo, os.getpid()) in _reivindicados
+    with _trava(pasta, prefixo):
+        for caminho in glob.glob(os.path.join(pasta, f'{prefixo}-*.json')):
+            pid = os.path.basename(caminho)[len(prefixo) + 1:-len('.json')]
+            if not pid.isdigit():
+                continue  # -mortos
+            if caminho == proprio:
+                if not reivindicado:
+                    _aposentar(pasta, prefixo, caminho, acumular)
+            elif not _pid_vivo(int(pid)):
+                _aposentar(pasta, prefixo, caminho, acumular)
+
+
+def gravar(diretorio: str, prefixo: str, dados: Any, acumular: Optional[Callable[[Any, Any], Any]] = None) -> None:
+    """Grava o snapshot deste processo; leitores nunca veem um arquivo pela metade."""
+    os.makedirs(_pasta_host(diretorio), exist_ok=True)
+    chave = (diretorio, prefixo, os.getpid())
+    if chave not in _reivindicados:
+        # Primeira gravação: um arquivo com o nosso pid é de um antecessor
+        podar(diretorio, prefixo, acumular)
+        _reivindicados.add(chave)
+    _escrever(_arquivo_proprio(diretorio, prefixo), dados)
+
+
+def outros_workers(diretorio: str, prefixo: str, acumular: Optional[Callable[[Any, Any], Any]] = None) -> Iterator[Any]:
+    """Snapshots dos demais processos, de todos os hosts (o deste vem da memória, mais atual)."""
+    podar(diretorio, prefixo, acumular)
+    proprio = _arquivo_proprio(diretorio, prefixo)
+    for caminho in glob.glob(os.path.join(diretorio, '*', f'{prefixo}-*.json')):
+        if caminho == proprio:
+            continue
+        dados = _ler(caminho)
+        if dados is not None:
+            yield dados
+
+
+def remover(diretorio: str, prefixo: str) -> None:
+    for caminho in glob.glob(os.path.join(diretorio, '*', f'{prefixo}-*.json')):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+    for pasta in glob.glob(os.path.join(diretorio, '*', '')):
+        for trava in glob.glob(os.path.join(pasta, f'.{prefixo}.lock')):
+            try:
+                os.remove(trava)
+            except OSError:
+                pass
+        try:
+            os.rmdir(pasta)  # Só se ficou vazia
+        except OSError:
+            pass
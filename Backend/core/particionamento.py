@@ -0,0 +1,288 @@
+"""
+Particionamento declarativo por faixa mensal (PostgreSQL).
+
+Usado pelas migrations que convertem tabelas grandes e append-only em tabelas
+particionadas e pelo comando `gerenciar_particoes` (criação antecipada,
+desanexação e arquivamento de meses antigos).
+
+Convenções:
+    - Partição mensal: <tabela>_pAAAAMM, faixa [1º dia do mês, 1º dia do mês seguinte)
+    - Partição DEFAULT: <tabela>_pdefault (rede de segurança para datas fora das faixas)
+    - A PK passa a ser (id, <coluna>): o PostgreSQL exige a chave de partição em
+      toda constraint única. O `id` continua vindo de uma sequence própria.
+
+Tudo aqui é no-op fora do PostgreSQL (testes rodam em SQLite).
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.utils import timezone
+
+# Tabelas particionadas e sua coluna de partição (registrar aqui ao particionar uma nova)
+TABELAS_PARTICIONADAS: Dict[str, str] = {
+    'accounts_transacao': 'data',
+    'palpite_aposta': 'data_sorteio',
+}
+
+
+def inicio_do_mes(dia: date) -> date:
+    return dia.replace(day=1)
+
+
+def somar_meses(dia: date, meses: int) -> date:
+    indice = dia.year * 12 + (dia.month - 1) + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def faixa_do_dia(dia: date) -> Tuple[datetime, datetime]:
+    """
+    [início, fim) do dia local como datetimes aware. Use `data__gte/data__lt` com
+    esta faixa em vez de `data__date=`: o cast para date esconde a coluna de
+    partição e impede o PostgreSQL de podar as partições.
+    """
+    inicio = timezone.make_aware(datetime.combine(dia, time.min))
+    return inicio, timezone.make_aware(datetime.combine(dia + timedelta(days=1), time.min))
+
+
+def nome_particao(tabela: str, mes: date) -> str:
+    return f"{tabela}_p{mes:%Y%m}"
+
+
+def _q(nome: str) -> str:
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def eh_postgres(connection) -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def esta_particionada(cursor, tabela: str) -> bool:
+    cursor.execute(
+        "SELECT c.relkind = 'p' FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = %s AND n.nspname = current_schema()",
+        [tabela],
+    )
+    linha = cursor.fetchone()
+    return bool(linha and linha[0])
+
+
+def _definicoes_indices(cursor, tabela: str) -> List[str]:
+    """CREATE INDEX de todos os índices da tabela, exceto o da PK."""
+    cursor.execute(
+        "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = %s AND n.nspname = current_schema() AND NOT i.indisprimary",
+        [tabela],
+    )
+    return [linha[0] for linha in cursor.fetchall()]
+
+
+def _definicoes_fks(cursor, tabela: str) -> List[tuple]:
+    """(nome, definição) das FKs de saída da tabela."""
+    cursor.execute(
+        "SELECT con.conname, pg_get_constraintdef(con.oid) FROM pg_constraint con "
+        "JOIN pg_class c ON c.oid = con.conrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = %s AND n.nspname = current_schema() AND con.contype = 'f'",
+        [tabela],
+    )
+    return cursor.fetchall()
+
+
+def _fks_de_entrada(cursor, tabela: str) -> List[str]:
+    cursor.execute(
+        "SELECT con.conname FROM pg_constraint con "
+        "JOIN pg_class c ON c.oid = con.confrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = %s AND n.nspname = current_schema() AND con.contype = 'f'",
+        [tabela],
+    )
+    return [linha[0] for linha in cursor.fetchall()]
+
+
+def _copiar_estrutura(cursor, origem: str, destino: str, particionar_por: Optional[str]) -> None:
+    """
+    Cria `destino` com as colunas/defaults de `origem` e move os dados.
+    O `id` ganha uma sequence própria (colunas IDENTITY não são aceitas em tabela
+    particionada antes do PG 17), posicionada após o maior id existente.
+    """
+    sufixo = f" PARTITION BY RANGE ({_q(particionar_por)})" if particionar_por else ""
+    cursor.execute(f"CREATE TABLE {_q(destino)} (LIKE {_q(origem)} INCLUDING DEFAULTS){sufixo}")
+
+    sequence = f"{destino}_id_seq"
+    cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {_q(sequence)}")
+    cursor.execute(f"ALTER TABLE {_q(destino)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+    cursor.execute(f"ALTER SEQUENCE {_q(sequence)} OWNED BY {_q(destino)}.id")
+
+
+def _finalizar_troca(cursor, tabela: str, antiga: str, indices: List[str], fks: List[tuple]) -> None:
+    """Copia os dados, derruba a tabela antiga e recria índices/FKs na nova."""
+    nova = f"{tabela}__nova"
+    cursor.execute(f"INSERT INTO {_q(nova)} SELECT * FROM {_q(antiga)}")
+    cursor.execute(
+        f"SELECT setval('{nova}_id_seq', COALESCE((SELECT MAX(id) FROM {_q(nova)}), 0) + 1, false)"
+    )
+    cursor.execute(f"DROP TABLE {_q(antiga)}")
+    cursor.execute(f"ALTER TABLE {_q(nova)} RENAME TO {_q(tabela)}")
+    cursor.execute(f"ALTER TABLE {_q(tabela)} RENAME CONSTRAINT {_q(nova + '_pkey')} TO {_q(tabela + '_pkey')}")
+    cursor.execute(f"ALTER SEQUENCE {_q(nova + '_id_seq')} RENAME TO {_q(tabela + '_id_seq')}")
+    cursor.execute(f"ALTER TABLE {_q(tabela)} ALTER COLUMN id SET DEFAULT nextval('{tabela}_id_seq')")
+
+    # Os nomes dos índices/FKs antigos ficaram livres com o DROP: recria com os mesmos nomes
+    for definicao in indices:
+        cursor.execute(definicao.replace(f" ON {antiga} ", f" ON {tabela} ")
+                       .replace(f" ON public.{antiga} ", f" ON public.{tabela} ")
+                       .replace(f" ON ONLY public.{antiga} ", f" ON public.{tabela} "))
+    for nome, definicao in fks:
+        cursor.execute(f"ALTER TABLE {_q(tabela)} ADD CONSTRAINT {_q(nome)} {definicao}")
+
+
+def particionar_tabela(connection, tabela: str, coluna: str, meses_futuros: int = 3) -> bool:
+    """
+    Converte `tabela` (comum) em tabela particionada por mês em `coluna`.
+    Idempotente: retorna False se não for PostgreSQL ou se já estiver particionada.
+
+    Raises:
+        RuntimeError: Se outra tabela tiver FK apontando para esta (o PostgreSQL
+            não aceita FK para tabela particionada sem a chave de partição)
+    """
+    if not eh_postgres(connection):
+        return False
+
+    with connection.cursor() as cursor:
+        if esta_particionada(cursor, tabela):
+            return False
+        entrada = _fks_de_entrada(cursor, tabela)
+        if entrada:
+            raise RuntimeError(f"{tabela} é referenciada por FKs ({', '.join(entrada)}); remova-as antes de particionar.")
+
+        indices = _definicoes_indices(cursor, tabela)
+        fks = _definicoes_fks(cursor, tabela)
+        antiga = f"{tabela}__antiga"
+        nova = f"{tabela}__nova"
+
+        cursor.execute(f"ALTER TABLE {_q(tabela)} RENAME TO {_q(antiga)}")
+        _copiar_estrutura(cursor, antiga, nova, particionar_por=coluna)
+        cursor.execute(f"ALTER TABLE {_q(nova)} ADD PRIMARY KEY (id, {_q(coluna)})")
+
+        # Uma partição por mês do histórico até `meses_futuros` à frente + DEFAULT
+        cursor.execute(f"SELECT MIN({_q(coluna)})::date FROM {_q(antiga)}")
+        primeiro = cursor.fetchone()[0]
+        hoje = timezone.localdate()
+        mes = inicio_do_mes(primeiro or hoje)
+        ultimo = somar_meses(inicio_do_mes(hoje), meses_futuros)
+        while mes <= ultimo:
+            _criar_particao(cursor, nova, mes, nome=nome_particao(tabela, mes))
+            mes = somar_meses(mes, 1)
+        cursor.execute(f"CREATE TABLE {_q(tabela + '_pdefault')} PARTITION OF {_q(nova)} DEFAULT")
+
+        _finalizar_troca(cursor, tabela, antiga, indices, fks)
+    return True
+
+
+def desfazer_particionamento(connection, tabela: str) -> bool:
+    """Reverso de `particionar_tabela`: volta para uma tabela comum com PK (id)."""
+    if not eh_postgres(connection):
+        return False
+
+    with connection.cursor() as cursor:
+        if not esta_particionada(cursor, tabela):
+            return False
+        indices = _definicoes_indices(cursor, tabela)
+        fks = _definicoes_fks(cursor, tabela)
+        antiga = f"{tabela}__antiga"
+        nova = f"{tabela}__nova"
+
+        cursor.execute(f"ALTER TABLE {_q(tabela)} RENAME TO {_q(antiga)}")
+        _copiar_estrutura(cursor, antiga, nova, particionar_por=None)
+        cursor.execute(f"ALTER TABLE {_q(nova)} ADD PRIMARY KEY (id)")
+        _finalizar_troca(cursor, tabela, antiga, indices, fks)
+    return True
+
+
+def _criar_particao(cursor, pai: str, mes: date, nome: str) -> None:
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {_q(nome)} PARTITION OF {_q(pai)} "
+        f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{somar_meses(mes, 1).isoformat()}')"
+    )
+
+
+def listar_particoes(cursor, tabela: str) -> List[Dict]:
+    """Partições anexadas: nome, faixa (expressão do PostgreSQL), tamanho em bytes e tablespace."""
+    cursor.execute(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), pg_total_relation_size(c.oid), t.spcname "
+        "FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "JOIN pg_namespace n ON n.oid = p.relnamespace "
+        "LEFT JOIN pg_tablespace t ON t.oid = c.reltablespace "
+        "WHERE p.relname = %s AND n.nspname = current_schema() ORDER BY c.relname",
+        [tabela],
+    )
+    return [
+        {"nome": nome, "faixa": faixa, "bytes": tamanho, "tablespace": tablespace}
+        for nome, faixa, tamanho, tablespace in cursor.fetchall()
+    ]
+
+
+def mes_da_particao(tabela: str, particao: str) -> Optional[date]:
+    """Mês de uma partição <tabela>_pAAAAMM (None para a DEFAULT ou nomes fora do padrão)."""
+    sufixo = particao[len(tabela) + 2:]
+    if not particao.startswith(f"{tabela}_p") or not sufixo.isdigit() or len(sufixo) != 6:
+        return None
+    return date(int(sufixo[:4]), int(sufixo[4:]), 1)
+
+
+def criar_particoes_futuras(cursor, tabela: str, meses_futuros: int, referencia: Optional[date] = None) -> List[str]:
+    """Garante as partições do mês corrente até `meses_futuros` à frente."""
+    referencia = inicio_do_mes(referencia or timezone.localdate())
+    existentes = {p['nome'] for p in listar_particoes(cursor, tabela)}
+    criadas = []
+    for i in range(meses_futuros + 1):
+        mes = somar_meses(referencia, i)
+        nome = nome_particao(tabela, mes)
+        if nome not in existentes:
+            _criar_particao(cursor, tabela, mes, nome)
+            criadas.append(nome)
+    return criadas
+
+
+def particoes_anteriores_a(cursor, tabela: str, limite: date) -> List[str]:
+    """Partições mensais cujo mês inteiro é anterior a `limite`."""
+    antigas = []
+    for particao in listar_particoes(cursor, tabela):
+        mes = mes_da_particao(tabela, particao['nome'])
+        if mes and somar_meses(mes, 1) <= limite:
+            antigas.append(particao['nome'])
+    return antigas
+
+
+def desanexar_particao(cursor, tabela: str, particao: str, concorrente: bool = False) -> None:
+    """
+    Remove a partição da tabela-mãe (os dados continuam na tabela avulsa).
+    `concorrente` usa DETACH ... CONCURRENTLY (PG 14+, não pode rodar em transação).
+    """
+    modo = " CONCURRENTLY" if concorrente else ""
+    cursor.execute(f"ALTER TABLE {_q(tabela)} DETACH PARTITION {_q(particao)}{modo}")
+
+
+def congelar_particao(cursor, particao: str) -> None:
+    """
+    VACUUM FREEZE numa partição que não recebe mais escrita: o autovacuum
+    anti-wraparound não precisa mais revisitá-la. Não roda dentro de transação.
+    """
+    cursor.execute(f"VACUUM (FREEZE, ANALYZE) {_q(particao)}")
+
+
+def arquivar_particao(cursor, particao: str, schema: Optional[str] = None, tablespace: Optional[str] = None) -> None:
+    """Move uma partição desanexada para um schema e/ou tablespace de armazenamento frio."""
+    if tablespace:
+        cursor.execute(f"ALTER TABLE {_q(particao)} SET TABLESPACE {_q(tablespace)}")
+    if schema:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {_q(schema)}")
+        cursor.execute(f"ALTER TABLE {_q(particao)} SET SCHEMA {_q(schema)}")
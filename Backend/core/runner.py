@@ -0,0 +1,47 @@
+import logging
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+_CONFIGURACOES_DIR = ('ESTADO_WORKERS_DIR', 'METRICAS_DIR', 'INSTRUMENTACAO_DIR', 'TRACING_DIR')
+
+
+class OrcamentoTestRunner(DiscoverRunner):
+    """
+    Runner de testes: orçamento de queries estourado (core.instrumentacao) vira
+    falha, e o estado entre processos (core.multiprocesso) e o arquivo de log vão
+    para um diretório novo a cada execução (snapshots de execuções anteriores
+    somariam nos testes; o LOG_FILE_PATH padrão fica dentro do código-fonte).
+    """
+
+    @staticmethod
+    def _redirecionar_logs(caminho: str) -> None:
+        # O LOGGING já foi aplicado no django.setup(): troca o arquivo dos handlers existentes
+        from .logs import FilaLogHandler
+
+        loggers = [logging.getLogger()] + [
+            logger for logger in logging.root.manager.loggerDict.values() if isinstance(logger, logging.Logger)
+        ]
+        for logger in loggers:
+            for handler in logger.handlers:
+                if isinstance(handler, FilaLogHandler):
+                    handler.redirecionar_arquivo(caminho)
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.INSTRUMENTACAO_ORCAMENTO_ESTRITO = True
+        self.estado_dir = tempfile.mkdtemp(prefix='estado-testes-')
+        for nome in _CONFIGURACOES_DIR:
+            setattr(settings, nome, self.estado_dir)
+        self._redirecionar_logs(os.path.join(self.estado_dir, 'app.log'))
+
+    def teardown_test_environment(self, **kwargs):
+        # Vazio, não o original: o atexit das métricas não deve gravar fora do diretório dos testes
+        for nome in _CONFIGURACOES_DIR:
+            setattr(settings, nome, '')
+        self._redirecionar_logs(os.devnull)
+        shutil.rmtree(self.estado_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
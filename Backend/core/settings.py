@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 from decouple import config, Csv
 from datetime import timedelta 
 import dj_database_url
@@ -44,6 +45,9 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'core.contexto.ContextoRequisicaoMiddleware',  # request_id/usuário/view nos logs de todos os demais
+    'core.tracing.TracingMiddleware',  # Spans da requisição (amostrados)
+    'core.instrumentacao.InstrumentacaoMiddleware',  # Mede as queries de todos os demais
     'corsheaders.middleware.CorsMiddleware',        
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -181,6 +185,8 @@ CORS_ALLOW_CREDENTIALS = config('CORS_ALLOW_CREDENTIALS', default=False, cast=bo
 CSRF_TRUSTED_ORIGINS = config('CSRF_TRUSTED_ORIGINS', default='', cast=Csv())
 
 # --- LOGGING CONFIGURATION (Zero Trust / LGPD Compliance) ---
+# core.logs: a requisição só mascara (LGPD) e enfileira; formatação e escrita
+# (console + arquivo com rotação por tamanho) rodam na thread do QueueListener
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -188,51 +194,79 @@ LOGGING = {
         'mask_sensitive_data': {
             '()': 'core.logging_filters.SensitiveDataFilter',
         },
-    },
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {message}',
-            'style': '{',
+        'contexto': {
+            '()': 'core.logs.ContextoLogFilter',
         },
-        'secure': {
-            'format': '{asctime} {levelname} {message}',
-            'style': '{',
+        'amostragem_debug': {
+            '()': 'core.logs.AmostragemFilter',
+            'taxa': config('LOG_AMOSTRAGEM_DEBUG', default=1.0, cast=float),  # Fração dos DEBUG mantida
         },
     },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'filters': ['mask_sensitive_data'],
-            'formatter': 'verbose',
-        },
-        'file': {
-            'level': config('LOG_LEVEL', default='INFO'),
-            'class': 'logging.FileHandler',
-            'filename': config('LOG_FILE_PATH', default=os.path.join(BASE_DIR, 'app.log')),
-            'formatter': 'secure',
-            'filters': ['mask_sensitive_data'],
+        'fila': {
+            '()': 'core.logs.FilaLogHandler',
+            'arquivo': config('LOG_FILE_PATH', default=os.path.join(BASE_DIR, 'app.log')),
+            'max_bytes': config('LOG_MAX_BYTES', default=10 * 1024 * 1024, cast=int),
+            'backups': config('LOG_BACKUPS', default=3, cast=int),
+            'formato_json': config('LOG_JSON', default=False, cast=bool),
+            'filters': ['contexto', 'amostragem_debug', 'mask_sensitive_data'],
         },
     },
     'root': {
-        'handlers': ['console', 'file'],
+        'handlers': ['fila'],
         'level': config('LOG_LEVEL', default='INFO'),
     },
     'loggers': {
         'skalepay_integration': {
-            'handlers': ['console', 'file'],
+            'handlers': ['fila'],
             'level': 'INFO',
             'propagate': False,  # Don't propagate to root logger
         },
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['fila'],
             'level': config('DJANGO_LOG_LEVEL', default='WARNING'),
             'propagate': False,
         },
+        # Uma linha por requisição (core.contexto): desligada em desenvolvimento
+        'requisicoes': {
+            'level': config('LOG_REQUISICOES_LEVEL', default='WARNING'),
+        },
     },
 }
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# --- ESTADO COMPARTILHADO ENTRE PROCESSOS (core.multiprocesso) ---
+# Snapshots de métricas, instrumentação e tracing de cada processo, somados no
+# scrape/endpoint admin. No docker-compose é um volume comum a backend, webhooks
+# e saques; cada contêiner usa um subdiretório com o próprio hostname, apagado
+# na subida (entrypoint.sh).
+ESTADO_WORKERS_DIR = config('ESTADO_WORKERS_DIR', default=os.path.join(tempfile.gettempdir(), 'maiorbicho-estado'))
+
+# --- INSTRUMENTAÇÃO DE SQL (core.instrumentacao) ---
+INSTRUMENTACAO_ATIVA = config('INSTRUMENTACAO_ATIVA', default=True, cast=bool)
+# Vazio = só memória do processo
+INSTRUMENTACAO_DIR = config('INSTRUMENTACAO_DIR', default=ESTADO_WORKERS_DIR)
+# True: estourar `orcamento_queries` levanta exceção (o runner de testes liga sozinho)
+INSTRUMENTACAO_ORCAMENTO_ESTRITO = config('INSTRUMENTACAO_ORCAMENTO_ESTRITO', default=False, cast=bool)
+TEST_RUNNER = 'core.runner.OrcamentoTestRunner'
+
+# --- TRACING (core.tracing, endpoint /api/tracing/) ---
+TRACING_ATIVO = config('TRACING_ATIVO', default=True, cast=bool)
+TRACING_AMOSTRAGEM = config('TRACING_AMOSTRAGEM', default=1.0, cast=float)  # Fração das requisições rastreadas
+TRACING_LIMIAR_MS = config('TRACING_LIMIAR_MS', default=500, cast=float)  # Só guarda traces acima disso
+TRACING_BUFFER = config('TRACING_BUFFER', default=200, cast=int)  # Traces lentos mantidos por worker
+TRACING_MAX_SPANS = config('TRACING_MAX_SPANS', default=500, cast=int)
+# Vazio = endpoint vê só o worker que atendeu
+TRACING_DIR = config('TRACING_DIR', default=ESTADO_WORKERS_DIR)
+
+# --- MÉTRICAS PROMETHEUS (core.metricas, endpoint /metrics) ---
+# Vazio = scrape vê só o worker que atendeu
+METRICAS_DIR = config('METRICAS_DIR', default=ESTADO_WORKERS_DIR)
+# Scraper manda "Authorization: Bearer <token>" direto em backend:8000 (o nginx
+# bloqueia /metrics). Vazio = só aceita scrape local (127.0.0.1/::1)
+METRICAS_TOKEN = config('METRICAS_TOKEN', default='')
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=config('JWT_ACCESS_TOKEN_MINUTES', default=60, cast=int)),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=config('JWT_REFRESH_TOKEN_DAYS', default=1, cast=int)),
@@ -245,6 +279,10 @@ SIMPLE_JWT = {
 SKALEPAY_SECRET_KEY = config('SKALEPAY_SECRET_KEY')  # No default - fail if missing
 SKALEPAY_PUBLIC_KEY = config('SKALEPAY_PUBLIC_KEY')  # No default - fail if missing
 SKALEPAY_BASE_URL = config('SKALEPAY_BASE_URL', default='https://api.conta.skalepay.com.br/v1')
+SKALEPAY_MAX_CONCORRENCIA = config('SKALEPAY_MAX_CONCORRENCIA', default=20, cast=int)  # Cliente assíncrono: chamadas simultâneas por processo
+LIQUIDEZ_TTL = config('LIQUIDEZ_TTL', default=30, cast=int)  # Saldo da banca em memória: fresco por N s
+LIQUIDEZ_TTL_MAXIMO = config('LIQUIDEZ_TTL_MAXIMO', default=300, cast=int)  # Velho (revalida em 2º plano) até N s
+LIQUIDEZ_ATUALIZAR_A_CADA = config('LIQUIDEZ_ATUALIZAR_A_CADA', default=20, cast=int)  # Atualizador periódico por worker (< LIQUIDEZ_TTL)
 WEBHOOK_URL_BASE = config('WEBHOOK_URL_BASE', default='')
 
 # Zero Trust: Security headers configuration
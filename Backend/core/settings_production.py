@@ -5,6 +5,7 @@ Secure configuration using python-decouple for environment variable management.
 
 from pathlib import Path
 import os
+import tempfile
 from decouple import config, Csv
 from datetime import timedelta
 import dj_database_url
@@ -68,6 +69,15 @@ INSTALLED_APPS = [
 # ==================== MIDDLEWARE CONFIGURATION ====================
 
 MIDDLEWARE = [
+    # request_id/usuário/view nos logs de todos os demais
+    'core.contexto.ContextoRequisicaoMiddleware',
+
+    # Spans da requisição (amostrados; traces lentos em /api/tracing/)
+    'core.tracing.TracingMiddleware',
+
+    # Instrumentação de SQL por endpoint (mede as queries de todos os demais)
+    'core.instrumentacao.InstrumentacaoMiddleware',
+
     # Security middleware should be first
     'django.middleware.security.SecurityMiddleware',
     
@@ -114,6 +124,37 @@ WSGI_APPLICATION = 'core.wsgi.application'
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# --- ESTADO COMPARTILHADO ENTRE PROCESSOS (core.multiprocesso) ---
+# Snapshots de métricas, instrumentação e tracing de cada processo, somados no
+# scrape/endpoint admin. No docker-compose é um volume comum a backend, webhooks
+# e saques; cada contêiner usa um subdiretório com o próprio hostname, apagado
+# na subida (entrypoint.sh).
+ESTADO_WORKERS_DIR = config('ESTADO_WORKERS_DIR', default=os.path.join(tempfile.gettempdir(), 'maiorbicho-estado'))
+
+# --- INSTRUMENTAÇÃO DE SQL (core.instrumentacao) ---
+INSTRUMENTACAO_ATIVA = config('INSTRUMENTACAO_ATIVA', default=True, cast=bool)
+# Vazio = só memória do processo
+INSTRUMENTACAO_DIR = config('INSTRUMENTACAO_DIR', default=ESTADO_WORKERS_DIR)
+# True: estourar `orcamento_queries` levanta exceção (o runner de testes liga sozinho)
+INSTRUMENTACAO_ORCAMENTO_ESTRITO = config('INSTRUMENTACAO_ORCAMENTO_ESTRITO', default=False, cast=bool)
+TEST_RUNNER = 'core.runner.OrcamentoTestRunner'
+
+# --- MÉTRICAS PROMETHEUS (core.metricas, endpoint /metrics) ---
+# Vazio = scrape vê só o worker que atendeu
+METRICAS_DIR = config('METRICAS_DIR', default=ESTADO_WORKERS_DIR)
+# Scraper manda "Authorization: Bearer <token>" direto em backend:8000 (o nginx
+# bloqueia /metrics). Vazio = só aceita scrape local (127.0.0.1/::1)
+METRICAS_TOKEN = config('METRICAS_TOKEN', default='')
+
+# --- TRACING (core.tracing, endpoint /api/tracing/) ---
+TRACING_ATIVO = config('TRACING_ATIVO', default=True, cast=bool)
+TRACING_AMOSTRAGEM = config('TRACING_AMOSTRAGEM', default=0.05, cast=float)  # 5% das requisições rastreadas
+TRACING_LIMIAR_MS = config('TRACING_LIMIAR_MS', default=500, cast=float)  # Só guarda traces acima disso
+TRACING_BUFFER = config('TRACING_BUFFER', default=200, cast=int)  # Traces lentos mantidos por worker
+TRACING_MAX_SPANS = config('TRACING_MAX_SPANS', default=500, cast=int)
+# Vazio = endpoint vê só o worker que atendeu
+TRACING_DIR = config('TRACING_DIR', default=ESTADO_WORKERS_DIR)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -198,6 +239,9 @@ SKALEPAY_SECRET_KEY = config('SKALEPAY_SECRET_KEY', cast=str)
 SKALEPAY_PUBLIC_KEY = config('SKALEPAY_PUBLIC_KEY', cast=str)
 SKALEPAY_BASE_URL = config('SKALEPAY_BASE_URL', 
                            default='https://api.conta.skalepay.com.br/v1', cast=str)
+SKALEPAY_MAX_CONCORRENCIA = config('SKALEPAY_MAX_CONCORRENCIA', default=20, cast=int)
+LIQUIDEZ_TTL = config('LIQUIDEZ_TTL', default=30, cast=int)  # Saldo da banca em memória: fresco por N s
+LIQUIDEZ_TTL_MAXIMO = config('LIQUIDEZ_TTL_MAXIMO', default=300, cast=int)  # Velho (revalida em 2º plano) até N s
 
 # Webhook configuration
 WEBHOOK_URL_BASE = config('RENDER_EXTERNAL_URL', cast=str)
@@ -205,6 +249,8 @@ SKALEPAY_WEBHOOK_URL = f"{WEBHOOK_URL_BASE}/api/accounts/webhook/skalepay/"
 
 # ==================== LOGGING CONFIGURATION ====================
 
+# core.logs: a requisição só mascara (LGPD) e enfileira; JSON e escrita
+# (console + arquivo com rotação por tamanho) rodam na thread do QueueListener
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -212,45 +258,45 @@ LOGGING = {
         'mask_sensitive_data': {
             '()': 'core.logging_filters.SensitiveDataFilter',
         },
-    },
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {message}',
-            'style': '{',
+        'contexto': {
+            '()': 'core.logs.ContextoLogFilter',
         },
-        'production': {
-            'format': '{asctime} {levelname} {message}',
-            'style': '{',
+        'amostragem_debug': {
+            '()': 'core.logs.AmostragemFilter',
+            'taxa': config('LOG_AMOSTRAGEM_DEBUG', default=0.01, cast=float),  # 1% das requisições com DEBUG
         },
     },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'filters': ['mask_sensitive_data'],
-            'formatter': 'production' if not DEBUG else 'verbose',
-        },
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs' / 'django.log',
-            'formatter': 'production',
-            'filters': ['mask_sensitive_data'],
+        'fila': {
+            '()': 'core.logs.FilaLogHandler',
+            'arquivo': None if DEBUG else str(BASE_DIR / 'logs' / 'django.log'),
+            'max_bytes': config('LOG_MAX_BYTES', default=50 * 1024 * 1024, cast=int),
+            'backups': config('LOG_BACKUPS', default=10, cast=int),
+            'formato_json': not DEBUG,
+            'tamanho_fila': config('LOG_TAMANHO_FILA', default=10000, cast=int),
+            'filters': ['contexto', 'amostragem_debug', 'mask_sensitive_data'],
         },
     },
     'root': {
-        'handlers': ['console', 'file'] if not DEBUG else ['console'],
+        'handlers': ['fila'],
         'level': 'WARNING' if not DEBUG else 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'] if not DEBUG else ['console'],
+            'handlers': ['fila'],
             'level': 'INFO',
             'propagate': False,
         },
         'skalepay_integration': {
-            'handlers': ['console', 'file'],
+            'handlers': ['fila'],
             'level': 'INFO',
-            'propagate': True,
+            'propagate': False,
+        },
+        # Uma linha JSON por requisição (core.contexto): método, rota, status, duração
+        'requisicoes': {
+            'handlers': ['fila'],
+            'level': config('LOG_REQUISICOES_LEVEL', default='INFO'),
+            'propagate': False,
         },
     },
 }
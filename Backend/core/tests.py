@@ -0,0 +1,381 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+
+from .instrumentacao import AGREGADOR, OrcamentoQueriesExcedido, fingerprint
+
+
+class InstrumentacaoTests(TestCase):
+    def setUp(self):
+        AGREGADOR.limpar()
+        self.user = CustomUser.objects.create_user(cpf_cnpj="40000000001", password="x", nome_completo="Jogador")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_fingerprint_colapsa_parametros(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND nome = 'x'  LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (...) AND nome = ? LIMIT ?",
+        )
+
+    def test_estatisticas_por_endpoint_no_painel_admin(self):
+        self.client.get('/api/games/apostas/')
+        self.client.get('/api/games/apostas/')
+
+        admin = CustomUser.objects.create_superuser(cpf_cnpj="99999999996", password="x", nome_completo="Admin")
+        self.client.force_authenticate(user=admin)
+        self.assertEqual(self.client.get('/api/instrumentacao/').status_code, 200)
+        response = self.client.get('/api/instrumentacao/?ordenar=requisicoes&limite=5')
+        linha = next(l for l in response.data['endpoints'] if l['endpoint'] == 'ApostaViewSet.list')
+        self.assertEqual(linha['requisicoes'], 2)
+        self.assertEqual(linha['queries_media'], 2)
+        self.assertGreater(linha['bytes_medio'], 0)
+        # `serializer.data` da listagem (onde estariam os N+1), separado do render do JSON
+        self.assertGreater(linha['tempo_serializacao_medio_ms'], 0)
+        self.assertTrue(linha['mais_lenta_sql'].startswith('SELECT'))
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/api/instrumentacao/').status_code, 403)
+
+    def test_orcamento_estourado_falha_nos_testes(self):
+        from games.views import ApostaViewSet
+
+        with patch.object(ApostaViewSet, 'orcamento_queries', {'list': 1}):
+            with self.assertRaises(OrcamentoQueriesExcedido):
+                self.client.get('/api/games/apostas/')
+
+    def test_consolida_arquivos_de_outros_workers(self):
+        import json
+        import os
+        import socket
+        import tempfile
+        from django.test import override_settings
+        from .instrumentacao import _estatistica_vazia, relatorio
+
+        with tempfile.TemporaryDirectory() as diretorio, override_settings(INSTRUMENTACAO_DIR=diretorio):
+            outro = {**_estatistica_vazia(), "requisicoes": 3, "queries_total": 9, "queries_max": 4}
+            pasta = os.path.join(diretorio, 'outro-host')
+            os.makedirs(pasta)
+            with open(os.path.join(pasta, 'instrumentacao-1.json'), 'w') as arquivo:
+                json.dump({"ApostaViewSet.list": outro}, arquivo)
+
+            self.client.get('/api/games/apostas/')
+            AGREGADOR.gravar()
+            self.assertTrue(os.path.exists(os.path.join(diretorio, socket.gethostname(), f'instrumentacao-{os.getpid()}.json')))
+
+            linha = next(l for l in relatorio() if l['endpoint'] == 'ApostaViewSet.list')
+            self.assertEqual(linha['requisicoes'], 4)
+            self.assertEqual(linha['queries_max'], 4)
+            AGREGADOR.limpar()
+            self.assertEqual(os.listdir(diretorio), [])
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        from . import metricas
+        metricas.REGISTRO.limpar()
+
+    def test_formato_de_exposicao(self):
+        from .metricas import Contador, Histograma, Registro
+
+        registro = Registro()
+        contador = Contador('teste_total', 'Ajuda.', ('rotulo',), registro=registro)
+        histograma = Histograma('teste_segundos', 'Ajuda.', ('op',), buckets=(0.1, 1.0), registro=registro)
+        contador.inc(rotulo='a"b')
+        contador.inc(2, rotulo='a"b')
+        histograma.observe(0.05, op='x')
+        histograma.observe(0.5, op='x')
+        histograma.observe(5, op='x')
+
+        texto = registro.exportar()
+        self.assertIn('# TYPE teste_total counter', texto)
+        self.assertIn('teste_total{rotulo="a\\"b"} 3', texto)
+        self.assertIn('teste_segundos_bucket{op="x",le="0.1"} 1', texto)
+        self.assertIn('teste_segundos_bucket{op="x",le="1"} 2', texto)
+        self.assertIn('teste_segundos_bucket{op="x",le="+Inf"} 3', texto)
+        self.assertIn('teste_segundos_sum{op="x"} 5.55', texto)
+        self.assertIn('teste_segundos_count{op="x"} 3', texto)
+
+        with self.assertRaises(ZeroDivisionError), histograma.medir() as rotulos:
+            1 / 0
+        self.assertEqual(rotulos, {'op': 'erro'})
+
+    def test_soma_snapshots_de_outros_workers(self):
+        import json
+        import os
+        import socket
+        import tempfile
+        from django.test import override_settings
+        from .metricas import APOSTAS, REGISTRO
+
+        with tempfile.TemporaryDirectory() as diretorio, override_settings(METRICAS_DIR=diretorio):
+            # Outro contêiner (webhooks) no volume compartilhado
+            os.makedirs(os.path.join(diretorio, 'webhooks'))
+            with open(os.path.join(diretorio, 'webhooks', 'metricas-7.json'), 'w') as arquivo:
+                json.dump({'apostas_total': [[['Milhar', 'aceita'], 4]]}, arquivo)
+            APOSTAS.inc(modalidade='Milhar', resultado='aceita')
+            REGISTRO.gravar()
+            self.assertTrue(os.path.exists(os.path.join(diretorio, socket.gethostname(), f'metricas-{os.getpid()}.json')))
+
+            self.assertIn('apostas_total{modalidade="Milhar",resultado="aceita"} 5', REGISTRO.exportar())
+            REGISTRO.limpar()
+            self.assertEqual(os.listdir(diretorio), [])
+
+    def test_worker_morto_vai_para_o_acumulado_do_host(self):
+        import json
+        import os
+        import socket
+        import subprocess
+        import sys
+        import tempfile
+        from django.test import override_settings
+        from . import multiprocesso
+        from .metricas import APOSTAS, REGISTRO
+
+        morto = subprocess.Popen([sys.executable, '-c', 'pass'])
+        morto.wait()
+        with tempfile.TemporaryDirectory() as diretorio, override_settings(METRICAS_DIR=diretorio):
+            pasta = os.path.join(diretorio, socket.gethostname())
+            os.makedirs(pasta)
+            snapshot = {'apostas_total': [[['Milhar', 'aceita'], 4]]}
+            for pid in (morto.pid, os.getpid()):  # O do próprio pid é de um antecessor (pid reciclado)
+                with open(os.path.join(pasta, f'metricas-{pid}.json'), 'w') as arquivo:
+                    json.dump(snapshot, arquivo)
+            multiprocesso._reivindicados.discard((diretorio, 'metricas', os.getpid()))
+
+            APOSTAS.inc(modalidade='Milhar', resultado='aceita')
+            REGISTRO.gravar()
+            self.assertEqual(
+                set(os.listdir(pasta)), {'.metricas.lock', 'metricas-mortos.json', f'metricas-{os.getpid()}.json'},
+            )
+            self.assertIn('apostas_total{modalidade="Milhar",resultado="aceita"} 9', REGISTRO.exportar())
+            REGISTRO.limpar()
+
+    def test_endpoint_local_com_apostas_rejeitadas(self):
+        user = CustomUser.objects.create_user(cpf_cnpj="40000000002", password="x", nome_completo="Jogador")
+        client = APIClient()
+        client.force_authenticate(user=user)
+        self.assertEqual(client.post('/api/games/apostas/', {}, format='json').status_code, 400)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('apostas_total{modalidade="desconhecida",resultado="rejeitada"} 1', response.content.decode())
+
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.8').status_code, 403)
+
+    @override_settings(METRICAS_TOKEN='s3nha-do-scraper')
+    def test_endpoint_exige_token(self):
+        # Com token, o IP não importa (atrás do nginx todos chegam com o IP do proxy)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer outra').status_code, 403)
+        response = self.client.get('/metrics', REMOTE_ADDR='172.18.0.5', HTTP_AUTHORIZATION='Bearer s3nha-do-scraper')
+        self.assertEqual(response.status_code, 200)
+
+    def test_retentativas_skalepay(self):
+        from urllib3.response import HTTPResponse
+        from urllib3.exceptions import MaxRetryError
+        from accounts.gateways.skalepay import RetryInstrumentado
+        from .metricas import exportar
+
+        retry = RetryInstrumentado(total=1, status_forcelist=[503], backoff_factor=0)
+        retry = retry.increment(method='POST', url='/v1/transfers/abc', response=HTTPResponse(status=503))
+        with self.assertRaises(MaxRetryError):
+            retry.increment(method='POST', url='/v1/transfers/abc', response=HTTPResponse(status=503))
+
+        self.assertIn('skalepay_retentativas_total{operacao="POST /transfers",motivo="503"} 1', exportar())
+
+
+class SensitiveDataFilterTests(SimpleTestCase):
+    def _filtrar(self, msg, args=(), extra=None):
+        import logging
+        from .logging_filters import SensitiveDataFilter
+
+        record = logging.LogRecord('teste', logging.INFO, __file__, 0, msg, args, None)
+        record.__dict__.update(extra or {})
+        SensitiveDataFilter().filter(record)
+        return record
+
+    def test_mascara_numa_passada(self):
+        record = self._filtrar(
+            "Saque de joao@example.com CPF 123.456.789-01 token=abc123xyz conta=12345-6 cartão 4111 1111 1111 1111"
+        )
+        self.assertEqual(
+            record.getMessage(),
+            "Saque de [EMAIL-OCULTO-LGPD]@example.com CPF [CPF-OCULTO-LGPD] token=[PROTEGIDO] "
+            "conta=[PROTEGIDO] cartão [CARTAO-OCULTO-LGPD]",
+        )
+        self.assertEqual(self._filtrar("Lote 42 processado em 0.8s").msg, "Lote 42 processado em 0.8s")
+        self.assertEqual(self._filtrar("x" * 40).msg, "[CHAVE-OCULTA-LGPD]")
+
+    def test_mesma_saida_da_versao_antiga(self):
+        from scripts.bench_filtro_lgpd import corpus, filtro_antigo
+        from .logging_filters import mascarar
+
+        # Cartão depois de segredo e CPF dentro de domínio: as regras compõem em ordem
+        self.assertEqual(mascarar('password=4111 1111 1111 1111 ok'), 'password=[PROTEGIDO] ok')
+        self.assertEqual(mascarar('user@12345678901.com'), 'user@[CPF-OCULTO-LGPD].com')
+        for msg in corpus():
+            self.assertEqual(mascarar(msg), filtro_antigo(msg), msg)
+
+    def test_mascara_args_e_extra(self):
+        payload = {'pix_key': '12345678901', 'senha': 'abc', 'itens': [{'email': 'a@b.com'}], 'valor': 100}
+        record = self._filtrar("Usuário %s, telefone %s, id %d", ('98765432100', '(11) 99999-9999', 7), {'payload': payload})
+
+        self.assertEqual(record.getMessage(), "Usuário [CPF-OCULTO-LGPD], telefone [TELEFONE-OCULTO-LGPD], id 7")
+        self.assertEqual(record.payload, {
+            'pix_key': '[CPF-OCULTO-LGPD]', 'senha': '[PROTEGIDO]',
+            'itens': [{'email': '[EMAIL-OCULTO-LGPD]@b.com'}], 'valor': 100,
+        })
+        self.assertEqual(payload['senha'], 'abc')  # O dict do chamador não é alterado
+        self.assertEqual(self._filtrar("%(cpf)s", ({'cpf': '12345678901'},)).getMessage(), "[CPF-OCULTO-LGPD]")
+
+
+class LogEstruturadoTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(__import__('shutil').rmtree, self.diretorio, True)
+
+    def _handler(self, **kwargs):
+        import os
+        from .logs import ContextoLogFilter, FilaLogHandler
+
+        handler = FilaLogHandler(arquivo=os.path.join(self.diretorio, 'app.log'), console=False, **kwargs)
+        handler.addFilter(ContextoLogFilter())
+        self.addCleanup(handler.close)
+        return handler
+
+    def _linhas(self, handler):
+        import json
+        handler.parar()  # Esvazia a fila
+        with open(handler.destinos[0].baseFilename) as arquivo:
+            return [json.loads(linha) for linha in arquivo]
+
+    def test_requisicao_gera_linha_json_com_contexto(self):
+        import logging
+        from .contexto import hash_usuario
+
+        user = CustomUser.objects.create_user(cpf_cnpj="40000000002", password="x", nome_completo="Jogador")
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        handler = self._handler()
+        registro = logging.getLogger('requisicoes')
+        registro.addHandler(handler)
+        self.addCleanup(registro.removeHandler, handler)
+        self.addCleanup(registro.setLevel, registro.level)
+        registro.setLevel(logging.INFO)
+
+        response = client.get('/api/games/apostas/', HTTP_X_REQUEST_ID='req-123')
+        self.assertEqual(response['X-Request-ID'], 'req-123')
+        self.assertEqual(len(client.get('/api/games/apostas/')['X-Request-ID']), 32)  # Gerado
+
+        linha = self._linhas(handler)[0]
+        self.assertEqual(linha['mensagem'], 'GET /api/games/apostas/ 200')
+        self.assertEqual(
+            (linha['request_id'], linha['view'], linha['usuario'], linha['status']),
+            ('req-123', 'ApostaViewSet.list', hash_usuario(user.pk), 200),
+        )
+        self.assertGreater(linha['duracao_ms'], 0)
+
+    def test_rotacao_e_fila_cheia_sem_bloquear(self):
+        import glob
+        import logging
+        import os
+
+        handler = self._handler(max_bytes=2000, backups=2)
+        registro = logging.LogRecord('teste', logging.INFO, __file__, 0, 'linha %s de log', (1,), None)
+        for _ in range(60):
+            handler.handle(registro)
+        linhas = self._linhas(handler)
+        self.assertEqual(linhas[0]['mensagem'], 'linha 1 de log')
+        self.assertEqual(len(glob.glob(os.path.join(self.diretorio, 'app.log.[0-9]'))), 2)
+
+        # Fila cheia: descarta e conta, quem logou não espera
+        cheio = self._handler(tamanho_fila=2)
+        cheio._pid = os.getpid()  # Finge o listener no ar, sem consumir a fila
+        for _ in range(5):
+            cheio.handle(registro)
+        self.assertEqual(cheio.descartados, 3)
+        cheio._pid = None
+
+    def test_amostragem_de_debug_por_requisicao(self):
+        import logging
+        from .logs import AmostragemFilter
+
+        amostragem = AmostragemFilter(taxa=0.5)
+
+        def registro(nivel, request_id):
+            r = logging.LogRecord('teste', nivel, __file__, 0, 'x', (), None)
+            r.request_id = request_id
+            return r
+
+        self.assertTrue(AmostragemFilter(taxa=0).filter(registro(logging.INFO, 'a')))
+        self.assertFalse(AmostragemFilter(taxa=0).filter(registro(logging.DEBUG, 'a')))
+        decisoes = {amostragem.filter(registro(logging.DEBUG, f'req-{i}')) for i in range(50)}
+        self.assertEqual(decisoes, {True, False})
+        # Mesma requisição, mesma decisão em todas as linhas
+        self.assertEqual(len({amostragem.filter(registro(logging.DEBUG, 'req-7')) for _ in range(10)}), 1)
+
+
+@override_settings(TRACING_AMOSTRAGEM=1.0, TRACING_LIMIAR_MS=0)
+class TracingTests(TestCase):
+    def setUp(self):
+        from .tracing import BUFFER
+
+        BUFFER.limpar()
+        self.addCleanup(BUFFER.limpar)
+        self.user = CustomUser.objects.create_user(cpf_cnpj="40000000003", password="x", nome_completo="Jogador")
+        self.admin = CustomUser.objects.create_superuser(cpf_cnpj="99999999995", password="x", nome_completo="Admin")
+        self.client = APIClient()
+
+    def test_trace_lento_navegavel_no_endpoint_admin(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/api/games/apostas/', HTTP_X_REQUEST_ID='trace-1')
+        self.assertEqual(self.client.get('/api/tracing/').status_code, 403)
+
+        self.client.force_authenticate(user=self.admin)
+        resumo = self.client.get('/api/tracing/?view=ApostaViewSet.list').data['traces']
+        self.assertEqual([t['trace_id'] for t in resumo], ['trace-1'])
+        self.assertNotIn('spans', resumo[0])
+
+        spans = self.client.get('/api/tracing/trace-1/').data['spans']
+        self.assertEqual((spans[0]['nome'], spans[0]['status']), ('requisicao', 200))
+        self.assertEqual((spans[1]['nome'], spans[1]['pai']), ('ApostaViewSet.list', 0))
+        sqls = [s for s in spans if s['nome'] == 'sql']
+        self.assertTrue(sqls)
+        self.assertTrue(all(s['pai'] == 1 and s['sql'].startswith('SELECT') for s in sqls))
+
+        self.assertEqual(self.client.get('/api/tracing/nao-existe/').status_code, 404)
+        self.assertEqual(self.client.delete('/api/tracing/').status_code, 204)
+        self.assertEqual(self.client.get('/api/tracing/?view=ApostaViewSet.list').data['traces'], [])
+
+    def test_spans_da_carteira_e_amostragem(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from accounts.services.wallet import WalletService
+        from .tracing import BUFFER, TracingMiddleware
+
+        def view(request):
+            WalletService.credit(self.user.pk, 1000, "Prêmio", tipo='PREMIO')
+            return HttpResponse()
+
+        TracingMiddleware(view)(RequestFactory().get('/x'))
+        spans = BUFFER.consolidado()[0]['spans']
+        nomes = [s['nome'] for s in spans]
+        self.assertEqual(nomes[:2], ['requisicao', 'carteira.credito'])
+        self.assertEqual(spans[1]['tipo'], 'PREMIO')
+        lock = nomes.index('lock.carteira')
+        self.assertEqual(spans[lock]['pai'], 1)
+        self.assertEqual((spans[lock + 1]['nome'], spans[lock + 1]['pai']), ('sql', lock))  # SELECT ... FOR UPDATE
+
+        BUFFER.limpar()
+        with override_settings(TRACING_AMOSTRAGEM=0.0):
+            TracingMiddleware(view)(RequestFactory().get('/x'))
+        with override_settings(TRACING_LIMIAR_MS=60_000):
+            TracingMiddleware(view)(RequestFactory().get('/x'))
+        self.assertEqual(BUFFER.consolidado(), [])
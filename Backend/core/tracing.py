@@ -0,0 +1,254 @@
+"""
+Tracing em processo: spans por requisição, sem coletor externo.
+
+`TracingMiddleware` sorteia uma fração das requisições (`TRACING_AMOSTRAGEM`);
+nas sorteadas, tudo que roda dentro de `rastrear(...)` vira um span filho do
+span atual (contextvars: vale também para tarefas asyncio do mesmo contexto):
+
+    requisicao "POST /api/games/apostas/"
+      ApostaViewSet.create
+        serializer.validacao
+        lock.sorteio
+        carteira.debito
+          sql  SELECT ... FOR UPDATE
+        comissao.afiliados
+      ...
+
+Toda query do ORM vira um span `sql` (execute_wrapper) e as chamadas à
+SkalePay, `skalepay`. Fora de um trace sorteado `rastrear` não faz nada
+(uma leitura de contextvar).
+
+Traces acima de `TRACING_LIMIAR_MS` vão para um ring buffer em memória
+(`TRACING_BUFFER` mais recentes) e para o logger `tracing` (arquivo, pelo
+pipeline de core.logs). Com `TRACING_DIR`, cada worker grava o próprio buffer
+(<dir>/<host>/tracing-<pid>.json) e o endpoint admin junta os de todos; o
+buffer de um worker que morreu é descartado.
+
+Uso:
+    with rastrear('carteira.debito', tipo='APOSTA'):
+        ...
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from . import multiprocesso
+from .contexto import request_id_atual
+from .instrumentacao import fingerprint, identificar_view
+
+logger = logging.getLogger('tracing')
+
+INTERVALO_GRAVACAO = 10.0
+PREFIXO_ARQUIVO = 'tracing'
+MAX_SPANS_PADRAO = 500
+
+
+class Trace:
+    """Spans de uma requisição, numa lista plana (o pai de cada um é um índice)."""
+
+    __slots__ = ('trace_id', 'nome', 'inicio', 'criado_em', 'spans', 'descartados', 'max_spans', 'view')
+
+    def __init__(self, trace_id: str, nome: str, max_spans: int = MAX_SPANS_PADRAO):
+        self.trace_id = trace_id
+        self.nome = nome
+        self.inicio = time.perf_counter()
+        self.criado_em = timezone.now()
+        # [nome, pai, início (s desde o trace), duração (s), atributos, erro]
+        self.spans: List[list] = []
+        self.descartados = 0
+        self.max_spans = max_spans
+        self.view: Optional[str] = None
+
+    def abrir(self, nome: str, pai: Optional[int], atributos: Dict) -> Optional[int]:
+        if len(self.spans) >= self.max_spans:
+            self.descartados += 1
+            return None
+        self.spans.append([nome, pai, time.perf_counter() - self.inicio, None, atributos, None])
+        return len(self.spans) - 1
+
+    def fechar(self, indice: int, erro: Optional[str] = None) -> None:
+        span = self.spans[indice]
+        span[3] = time.perf_counter() - self.inicio - span[2]
+        span[5] = erro
+
+    @property
+    def duracao(self) -> float:
+        return (self.spans[0][3] or 0.0) if self.spans else 0.0
+
+    def exportar(self) -> Dict:
+        spans = []
+        for nome, pai, inicio, duracao, atributos, erro in self.spans:
+            if 'sql' in atributos:
+                # Fingerprint só no fim (e só dos traces guardados): no span fica a string crua
+                atributos = {**atributos, 'sql': fingerprint(atributos['sql'])}
+            span = {
+                "nome": nome, "pai": pai, "inicio_ms": round(inicio * 1000, 3),
+                "duracao_ms": round(duracao * 1000, 3) if duracao is not None else None, **atributos,
+            }
+            if erro:
+                span["erro"] = erro
+            spans.append(span)
+        return {
+            "trace_id": self.trace_id,
+            "nome": self.nome,
+            "view": self.view,
+            "criado_em": self.criado_em.isoformat(),
+            "duracao_ms": round(self.duracao * 1000, 3),
+            "spans_descartados": self.descartados,
+            "spans": spans,
+        }
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar('tracing_trace', default=None)
+_span_atual: ContextVar[Optional[int]] = ContextVar('tracing_span', default=None)
+
+
+def trace_atual() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def rastrear(nome: str, **atributos):
+    """Span filho do span atual; sem trace sorteado, não faz nada."""
+    trace = _trace.get()
+    indice = trace.abrir(nome, _span_atual.get(), atributos) if trace is not None else None
+    if indice is None:
+        yield
+        return
+    token = _span_atual.set(indice)
+    erro = None
+    try:
+        yield
+    except BaseException as e:
+        erro = type(e).__name__
+        raise
+    finally:
+        _span_atual.reset(token)
+        trace.fechar(indice, erro)
+
+
+def _span_sql(execute, sql, params, many, context):
+    with rastrear('sql', sql=sql):
+        return execute(sql, params, many, context)
+
+
+class BufferTraces:
+    """Traces lentos mais recentes do worker atual (ring buffer), com gravação periódica."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._traces: Optional[deque] = None
+        self._gravado_em = time.monotonic()
+
+    @staticmethod
+    def diretorio() -> str:
+        return getattr(settings, 'TRACING_DIR', '') or ''
+
+    def _fila(self) -> deque:
+        if self._traces is None:
+            self._traces = deque(maxlen=getattr(settings, 'TRACING_BUFFER', 200))
+        return self._traces
+
+    def registrar(self, trace: Dict) -> None:
+        with self._lock:
+            self._fila().append(trace)
+            gravar = self.diretorio() and time.monotonic() - self._gravado_em > INTERVALO_GRAVACAO
+        if gravar:
+            self.gravar()
+
+    def gravar(self) -> None:
+        diretorio = self.diretorio()
+        if not diretorio:
+            return
+        with self._lock:
+            dados = list(self._fila())
+            self._gravado_em = time.monotonic()
+        multiprocesso.gravar(diretorio, PREFIXO_ARQUIVO, dados)
+
+    def consolidado(self) -> List[Dict]:
+        """Traces de todos os workers (arquivos) e deste processo, mais recentes primeiro."""
+        traces = []
+        diretorio = self.diretorio()
+        if diretorio:
+            for dados in multiprocesso.outros_workers(diretorio, PREFIXO_ARQUIVO):
+                traces.extend(dados)
+        with self._lock:
+            traces.extend(self._fila())
+        traces.sort(key=lambda trace: trace["criado_em"], reverse=True)
+        return traces
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._traces = None
+        diretorio = self.diretorio()
+        if diretorio:
+            multiprocesso.remover(diretorio, PREFIXO_ARQUIVO)
+
+
+BUFFER = BufferTraces()
+
+
+def finalizar(trace: Trace) -> None:
+    """Guarda o trace (buffer + log) se passou do limiar."""
+    duracao_ms = trace.duracao * 1000
+    if duracao_ms < getattr(settings, 'TRACING_LIMIAR_MS', 500):
+        return
+    dados = trace.exportar()
+    BUFFER.registrar(dados)
+    logger.warning(f"Trace lento: {trace.nome} ({duracao_ms:.0f} ms, {len(trace.spans)} spans)", extra={"trace": dados})
+
+
+class TracingMiddleware:
+    """Logo depois do ContextoRequisicaoMiddleware: o trace usa o request_id como id."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'TRACING_ATIVO', True) or random.random() >= getattr(settings, 'TRACING_AMOSTRAGEM', 0.0):
+            return self.get_response(request)
+
+        trace = Trace(
+            request_id_atual() or uuid.uuid4().hex, f"{request.method} {request.path}",
+            getattr(settings, 'TRACING_MAX_SPANS', MAX_SPANS_PADRAO),
+        )
+        token_trace = _trace.set(trace)
+        try:
+            with rastrear('requisicao', metodo=request.method, rota=request.path), ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(_span_sql))
+                raiz = _span_atual.get()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    # Span da view aberto no process_view (se a requisição chegou lá)
+                    if _span_atual.get() != raiz:
+                        trace.fechar(_span_atual.get())
+                trace.spans[0][4]['status'] = response.status_code
+        finally:
+            _trace.reset(token_trace)
+        finalizar(trace)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trace = _trace.get()
+        if trace is None:
+            return None
+        trace.view = identificar_view(view_func, request.method)[0]
+        indice = trace.abrir(trace.view, _span_atual.get(), {})
+        if indice is not None:
+            _span_atual.set(indice)
+        return None
@@ -7,6 +7,8 @@ from drf_spectacular.openapi import AutoSchema
 from rest_framework.permissions import AllowAny
 from django.conf import settings
 
+from .views import InstrumentacaoView, TracingDetalheView, TracingView, metricas_view
+
 # Zero Trust: Dynamic admin path from environment
 admin_url = getattr(settings, 'ADMIN_URL', 'admin-secret-2024')
 
@@ -29,6 +31,12 @@ urlpatterns = [
     # 2. Rotas da sua API (Accounts e Games)
     path('api/accounts/', include('accounts.urls')),
     path('api/games/', include('games.urls')),
+
+    # Observabilidade (Admin)
+    path('api/instrumentacao/', InstrumentacaoView.as_view(), name='instrumentacao'),
+    path('api/tracing/', TracingView.as_view(), name='tracing'),
+    path('api/tracing/<str:trace_id>/', TracingDetalheView.as_view(), name='tracing-detalhe'),
+    path('metrics', metricas_view, name='metricas'),
     
     # 3. DOCUMENTAÇÃO PÚBLICA (DRF-SPECTACULAR)
     # Gera o arquivo JSON que descreve sua API (acesso público)
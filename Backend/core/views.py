@@ -0,0 +1,126 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+from drf_spectacular.utils import OpenApiParameter, OpenApiTypes, extend_schema
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import metricas
+from .instrumentacao import AGREGADOR, relatorio
+from .tracing import BUFFER
+
+ORDENACOES = (
+    'tempo_db_ms', 'tempo_total_ms', 'queries_total', 'queries_media', 'queries_max',
+    'tempo_db_medio_ms', 'tempo_total_medio_ms', 'tempo_serializacao_medio_ms', 'tempo_render_medio_ms',
+    'bytes_medio', 'requisicoes', 'estouros_orcamento', 'mais_lenta_ms',
+)
+
+
+class InstrumentacaoView(APIView):
+    """
+    Estatísticas de SQL por endpoint, somadas entre os workers.
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Instrumentação de SQL por endpoint",
+        parameters=[
+            OpenApiParameter("ordenar", OpenApiTypes.STR, description=f"Campo (desc): {', '.join(ORDENACOES)}"),
+            OpenApiParameter("limite", OpenApiTypes.INT, description="Máximo de endpoints"),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    def get(self, request):
+        ordenar = request.query_params.get('ordenar', 'tempo_db_ms')
+        if ordenar not in ORDENACOES:
+            return Response({"erro": f"'ordenar' deve ser um de: {', '.join(ORDENACOES)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limite = int(request.query_params.get('limite', 50))
+        except ValueError:
+            return Response({"erro": "'limite' deve ser um inteiro."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"endpoints": relatorio(ordenar, max(1, limite))})
+
+    @extend_schema(summary="Zera a instrumentação", responses={204: None})
+    def delete(self, request):
+        AGREGADOR.limpar()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TracingView(APIView):
+    """
+    Traces lentos (acima de TRACING_LIMIAR_MS) mais recentes, de todos os workers.
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        summary="Traces lentos",
+        parameters=[
+            OpenApiParameter("min_ms", OpenApiTypes.NUMBER, description="Só traces com duração >= N ms"),
+            OpenApiParameter("view", OpenApiTypes.STR, description="Só traces desta view (ex: ApostaViewSet.create)"),
+            OpenApiParameter("limite", OpenApiTypes.INT, description="Máximo de traces"),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    def get(self, request):
+        try:
+            min_ms = float(request.query_params.get('min_ms', 0))
+            limite = int(request.query_params.get('limite', 50))
+        except ValueError:
+            return Response({"erro": "'min_ms' deve ser um número e 'limite' um inteiro."}, status=status.HTTP_400_BAD_REQUEST)
+        view = request.query_params.get('view')
+
+        traces = [
+            trace for trace in BUFFER.consolidado()
+            if trace["duracao_ms"] >= min_ms and (not view or trace["view"] == view)
+        ][:max(1, limite)]
+        # Na listagem só o resumo; os spans vêm no detalhe
+        return Response({"traces": [
+            {campo: valor for campo, valor in trace.items() if campo != 'spans'} | {"total_spans": len(trace["spans"])}
+            for trace in traces
+        ]})
+
+    @extend_schema(summary="Descarta os traces guardados", responses={204: None})
+    def delete(self, request):
+        BUFFER.limpar()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TracingDetalheView(APIView):
+    """
+    Um trace com todos os spans (lista plana; `pai` é o índice do span pai).
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(summary="Detalhe de um trace", responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT})
+    def get(self, request, trace_id):
+        trace = next((trace for trace in BUFFER.consolidado() if trace["trace_id"] == trace_id), None)
+        if trace is None:
+            return Response({"erro": "Trace não encontrado (fora do buffer ou abaixo do limiar)."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(trace)
+
+
+IPS_LOCAIS = ('127.0.0.1', '::1')
+
+
+def _scrape_autorizado(request) -> bool:
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    if not token:
+        # Atrás do nginx todo mundo chega com o IP do proxy: sem token, só o próprio host
+        return request.META.get('REMOTE_ADDR') in IPS_LOCAIS
+    recebido = request.headers.get('Authorization', '')
+    return hmac.compare_digest(recebido.encode(), f'Bearer {token}'.encode())
+
+
+@require_GET
+def metricas_view(request):
+    """
+    Exposição Prometheus (text/plain 0.0.4), somada entre os workers e contêineres.
+    Exige `Authorization: Bearer <METRICAS_TOKEN>`; sem token configurado, só scrape local.
+    """
+    if not _scrape_autorizado(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -11,16 +11,26 @@ wait_for_db() {
     echo "PostgreSQL is up - continuing..."
 }
 
+# Estado entre processos (métricas, instrumentação, tracing: core.multiprocesso).
+# O volume é compartilhado; cada contêiner apaga só o subdiretório do próprio host.
+if [ -n "$ESTADO_WORKERS_DIR" ]; then
+    echo "Clearing worker state in $ESTADO_WORKERS_DIR/$(hostname)..."
+    rm -rf "$ESTADO_WORKERS_DIR/$(hostname)"
+fi
+
 # Wait for database
 wait_for_db
 
-# Run Django migrations
-echo "Running Django migrations..."
-python manage.py migrate --noinput
+# MIGRAR=0: serviços auxiliares (webhooks, saques) deixam migrações e estáticos com o backend
+if [ "${MIGRAR:-1}" = "1" ]; then
+    # Run Django migrations
+    echo "Running Django migrations..."
+    python manage.py migrate --noinput
 
-# Collect static files
-echo "Collecting static files..."
-python manage.py collectstatic --noinput
+    # Collect static files
+    echo "Collecting static files..."
+    python manage.py collectstatic --noinput
+fi
 
 # Execute the command passed to the container
 echo "Starting application..."
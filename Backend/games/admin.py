@@ -44,6 +44,9 @@ class ParametrosDoJogoAdmin(admin.ModelAdmin):
         ('Controle Geral', {
             'fields': ('ativa_apostas', 'premio_maximo_aposta')
         }),
+        ('Gestão de Risco', {
+            'fields': ('limite_exposicao_resultado', 'limitar_valor_excedente')
+        }),
         # Mantemos campos antigos apenas se você ainda não os removeu do Model.
         # Se removeu do model ParametrosDoJogo, apague esses grupos abaixo.
     )
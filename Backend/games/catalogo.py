@@ -0,0 +1,64 @@
+"""
+Nomes do catálogo (Jogo, Modalidade, Colocação) em memória do processo.
+
+São poucas dezenas de linhas que quase nunca mudam, mas aparecem em todo item
+do histórico de apostas. Em vez de JOIN/queries por linha, o serializer consulta
+esta tabela (3 queries por carga, uma vez a cada `TTL_CATALOGO` segundos).
+
+Invalidação: os signals de save/delete desses modelos zeram a tabela no processo
+que fez a alteração; os demais processos recarregam no fim do TTL, ou antes se
+encontrarem um ID que ainda não conhecem.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Optional
+
+from .models import Colocacao, Jogo, Modalidade
+
+TTL_CATALOGO = 300
+# Intervalo mínimo entre recargas provocadas por ID desconhecido
+RECARGA_MINIMA = 1.0
+
+_MODELOS = {'jogo': Jogo, 'modalidade': Modalidade, 'colocacao': Colocacao}
+
+_lock = threading.Lock()
+_tabela: Dict[str, Dict[int, str]] = {}
+_carregado_em = 0.0
+
+
+def _carregar() -> Dict[str, Dict[int, str]]:
+    global _tabela, _carregado_em
+    with _lock:
+        _tabela = {tipo: dict(modelo.objects.values_list('pk', 'nome')) for tipo, modelo in _MODELOS.items()}
+        _carregado_em = time.monotonic()
+        return _tabela
+
+
+def _tabela_atual() -> Dict[str, Dict[int, str]]:
+    # Uma leitura só da global: um `invalidar()` entre o teste e o return devolveria {}
+    tabela, carregado_em = _tabela, _carregado_em
+    if not tabela or time.monotonic() - carregado_em > TTL_CATALOGO:
+        return _carregar()
+    return tabela
+
+
+def nome(tipo: str, pk: Optional[int]) -> Optional[str]:
+    """Nome do item `pk` do catálogo `tipo` ('jogo', 'modalidade' ou 'colocacao')."""
+    if pk is None:
+        return None
+    tabela = _tabela_atual()
+    encontrado = tabela[tipo].get(pk)
+    if encontrado is None and time.monotonic() - _carregado_em > RECARGA_MINIMA:
+        # Criado em outro processo depois da última carga
+        encontrado = _carregar()[tipo].get(pk)
+    return encontrado
+
+
+def invalidar(**kwargs) -> None:
+    """Receiver de post_save/post_delete: força recarga na próxima consulta."""
+    global _tabela
+    with _lock:
+        _tabela = {}
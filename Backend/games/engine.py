@@ -1,4 +1,5 @@
 import logging
+import time
 from decimal import Decimal
 from collections import defaultdict
 
@@ -8,6 +9,7 @@ from django.db.models import F
 from .models import Sorteio, Aposta
 from .strategies import ValidadorFactory
 from accounts.services.wallet import WalletService
+from core.metricas import APURACAO_APOSTAS, APURACAO_DURACAO
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +18,7 @@ def apurar_sorteio(sorteio_id):
     Processa todas as apostas de um sorteio com estratégia de lote (Batch)
     e agregação financeira para alta performance.
     """
+    inicio = time.perf_counter()
     try:
         # Atomicidade garante que ou tudo é apurado, ou nada muda (Rollback em erro)
         with transaction.atomic():
@@ -38,11 +41,13 @@ def apurar_sorteio(sorteio_id):
             apostas_para_atualizar = []
             premios_por_usuario = defaultdict(Decimal)
             BATCH_SIZE = 1000
+            total_apostas = ganhadoras = 0
 
             # 2. BUSCA OTIMIZADA (Iterator)
             # select_related('modalidade') evita N+1 queries ao acessar a cotação.
             # iterator() traz os dados em chunks, economizando memória RAM.
-            apostas_qs = Aposta.objects.filter(sorteio_id=sorteio.pk)\
+            # data_sorteio = chave de partição: o PostgreSQL lê só a partição do mês.
+            apostas_qs = Aposta.objects.filter(sorteio_id=sorteio.pk, data_sorteio=sorteio.data)\
                                        .select_related('modalidade')\
                                        .iterator(chunk_size=2000)
 
@@ -70,6 +75,8 @@ def apurar_sorteio(sorteio_id):
                 aposta.ganhou = ganhou
                 aposta.valor_premio = premio
                 apostas_para_atualizar.append(aposta)
+                total_apostas += 1
+                ganhadoras += ganhou
 
                 # 4. SALVAMENTO EM LOTE (Bulk Update)
                 if len(apostas_para_atualizar) >= BATCH_SIZE:
@@ -96,14 +103,25 @@ def apurar_sorteio(sorteio_id):
             sorteio.fechado = True
             sorteio.save(update_fields=['fechado'])
             
-            logger.info(f"Sorteio {sorteio_id} apurado com sucesso.")
+            duracao = time.perf_counter() - inicio
+            logger.info(
+                f"Sorteio {sorteio_id} apurado com sucesso: {total_apostas} apostas em {duracao:.2f}s "
+                f"({total_apostas / duracao if duracao else 0:.0f} apostas/s)."
+            )
+
+        # Métricas só depois do commit: um rollback não conta como apurado
+        APURACAO_APOSTAS.inc(ganhadoras, resultado='ganhou')
+        APURACAO_APOSTAS.inc(total_apostas - ganhadoras, resultado='perdeu')
+        APURACAO_DURACAO.observe(time.perf_counter() - inicio, resultado='ok')
 
         return True
 
     except Sorteio.DoesNotExist:
+        APURACAO_DURACAO.observe(time.perf_counter() - inicio, resultado='erro')
         logger.error(f"Sorteio ID {sorteio_id} não encontrado.")
         raise ValueError("Sorteio não encontrado.")
     except Exception as e:
+        APURACAO_DURACAO.observe(time.perf_counter() - inicio, resultado='erro')
         logger.exception(f"Erro crítico ao apurar sorteio {sorteio_id}: {str(e)}")
         raise ValueError(f"Erro ao apurar sorteio: {str(e)}")
 
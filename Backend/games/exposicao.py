@@ -0,0 +1,276 @@
+"""
+Índice de exposição (passivo) por sorteio aberto.
+
+Para cada resultado possível de 4 dígitos (0000-9999) guardamos quanto a banca
+pagaria se aquele número saísse, somando as apostas já aceitas. Cada resultado
+é uma linha de `ExposicaoCelula` (centavos), criada na primeira aposta que o
+cobre. Uma aposta atualiza só as k células dela (1 na milhar, até 400 no
+grupo) com `valor = valor + pagamento`, sob o mesmo lock do Sorteio usado em
+`ApostaViewSet.create`: o tempo com o lock não depende de quantos resultados
+o sorteio já tem cobertos.
+
+Cobertura por modalidade (espelha `ValidadorFactory`):
+    Milhar / Centena / Dezena -> 1 / 10 / 100 células por palpite
+    Grupo                     -> 400 células por grupo (4 dezenas x 100)
+    Milhar/Centena Invertida  -> permutações do palpite
+Modalidades que dependem de vários prêmios ao mesmo tempo (Duque/Terno de Grupo)
+e as loterias (Lotinha, Quininha, Seninha) não têm passivo por resultado único
+e ficam fora do índice.
+
+Limite por resultado (`ParametrosDoJogo.limite_exposicao_resultado`): checado
+uma única vez, em `ApostaViewSet.create`, sob o lock do Sorteio e lendo só as
+células da aposta. Não há checagem antecipada fora do lock: sem um vetor
+compartilhado entre os workers ela seria só uma query a mais por aposta.
+"""
+
+from __future__ import annotations
+
+from decimal import ROUND_FLOOR, Decimal
+from itertools import permutations
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F
+
+from .models import Aposta, ExposicaoCelula, ExposicaoSorteio, Sorteio
+from .strategies import RegraBichoExata, RegraGrupo, RegraInvertida, ValidadorFactory
+from .utils import descobrir_bicho
+
+TOTAL_RESULTADOS = 10_000
+VALOR_MINIMO_APOSTA = 100  # Mesmo min_value do CriarApostaSerializer (centavos)
+
+# Grupo (1-25) de cada resultado 0000-9999, calculado uma única vez
+GRUPO_POR_RESULTADO = np.array(
+    [descobrir_bicho(f"{d:02d}") for d in range(100)], dtype=np.int8
+)[np.arange(TOTAL_RESULTADOS) % 100]
+
+
+def vetor_vazio() -> np.ndarray:
+    return np.zeros(TOTAL_RESULTADOS, dtype=np.int64)
+
+
+def _finais(palpites: Sequence, digitos: int) -> List[int]:
+    """Últimos `digitos` de cada palpite numérico (mesma regra de `RegraBichoExata`)."""
+    finais = []
+    for palpite in palpites:
+        texto = str(palpite).strip()
+        if texto.isdigit():
+            finais.append(int(texto[-digitos:]))
+    return finais
+
+
+def _celulas_exatas(finais: Sequence[int], digitos: int) -> np.ndarray:
+    """Resultados cujo final bate com algum dos `finais` (broadcast: finais x prefixos)."""
+    if not finais:
+        return np.empty(0, dtype=np.int64)
+    passo = 10 ** digitos
+    prefixos = np.arange(TOTAL_RESULTADOS // passo, dtype=np.int64) * passo
+    return (np.asarray(finais, dtype=np.int64)[:, None] + prefixos[None, :]).ravel()
+
+
+class LimiteExposicaoExcedido(Exception):
+    """A aposta levaria o passivo de algum resultado acima do limite configurado."""
+
+    def __init__(self, resultado: int, exposicao_atual: int, limite: int):
+        self.resultado = f"{resultado:04d}"
+        self.exposicao_atual = exposicao_atual
+        self.limite = limite
+        super().__init__(
+            f"Limite de exposição atingido para o resultado {self.resultado}. Tente um valor menor ou outro palpite."
+        )
+
+
+class ExposicaoService:
+    """
+    Manutenção e consulta do índice de exposição por sorteio.
+    Valores em centavos (valor da aposta x cotação da modalidade, como na apuração).
+    """
+
+    @staticmethod
+    def celulas(modalidade, palpites: Sequence) -> np.ndarray:
+        """
+        Índices (únicos) dos resultados que premiariam uma aposta.
+        Retorna vetor vazio para modalidades fora do índice.
+        """
+        if modalidade is None:
+            return np.empty(0, dtype=np.int64)
+
+        regra = ValidadorFactory.get_strategy(modalidade)
+
+        if isinstance(regra, RegraInvertida):
+            # Assim como a apuração, a invertida considera só o primeiro palpite
+            base = str(palpites[0]).strip() if palpites else ''
+            if not base.isdigit():
+                return np.empty(0, dtype=np.int64)
+            combinacoes = {int(''.join(p)) for p in permutations(base) if len(p) == regra.q_digitos}
+            indices = _celulas_exatas(sorted(combinacoes), regra.q_digitos)
+        elif isinstance(regra, RegraBichoExata):
+            indices = _celulas_exatas(_finais(palpites, regra.q_digitos), regra.q_digitos)
+        elif isinstance(regra, RegraGrupo):
+            grupos = [int(p) for p in palpites if str(p).strip().isdigit()]
+            indices = np.flatnonzero(np.isin(GRUPO_POR_RESULTADO, grupos))
+        else:
+            return np.empty(0, dtype=np.int64)
+
+        # Uma aposta paga uma única vez, mesmo que dois palpites cubram o mesmo resultado
+        return np.unique(indices)
+
+    @staticmethod
+    def pagamento(aposta) -> int:
+        """Prêmio da aposta em centavos caso ganhe (mesma conta de `apurar_sorteio`)."""
+        if not aposta.modalidade_id:
+            return 0
+        premio = Decimal(str(aposta.valor)) * Decimal(str(aposta.modalidade.cotacao))
+        return int(premio.quantize(Decimal('1')))
+
+    @staticmethod
+    def aplicar(vetor: np.ndarray, aposta) -> int:
+        """Soma a aposta no vetor (in-place). Retorna o pagamento aplicado por célula."""
+        indices = ExposicaoService.celulas(aposta.modalidade, aposta.palpites or [])
+        pagamento = ExposicaoService.pagamento(aposta)
+        if indices.size and pagamento:
+            vetor[indices] += pagamento
+        return pagamento
+
+    @staticmethod
+    def registrar_aposta(aposta, exposicao: Optional[ExposicaoSorteio] = None) -> ExposicaoSorteio:
+        """
+        Atualiza o índice do sorteio com uma nova aposta: cria as células que
+        ainda não existem e incrementa as k células da aposta (2 statements).
+        Deve rodar dentro da transação que já travou o Sorteio (select_for_update).
+        """
+        if exposicao is None:
+            exposicao, _ = ExposicaoSorteio.objects.get_or_create(sorteio_id=aposta.sorteio_id)
+        indices = ExposicaoService.celulas(aposta.modalidade, aposta.palpites or [])
+        pagamento = ExposicaoService.pagamento(aposta)
+        if indices.size and pagamento:
+            resultados = indices.tolist()
+            ExposicaoCelula.objects.bulk_create(
+                [ExposicaoCelula(sorteio_id=aposta.sorteio_id, resultado=r) for r in resultados],
+                ignore_conflicts=True,
+            )
+            ExposicaoCelula.objects.filter(sorteio_id=aposta.sorteio_id, resultado__in=resultados).update(
+                valor=F('valor') + pagamento
+            )
+
+        exposicao.qtd_apostas += 1
+        exposicao.total_apostado += aposta.valor
+        exposicao.save(update_fields=['qtd_apostas', 'total_apostado', 'atualizado_em'])
+        return exposicao
+
+    @staticmethod
+    def pior_celula(sorteio_id: int, indices: np.ndarray):
+        """(resultado, passivo) da célula mais exposta entre `indices` (1 query, O(k))."""
+        pior = (
+            ExposicaoCelula.objects.filter(sorteio_id=sorteio_id, resultado__in=indices.tolist())
+            .order_by('-valor', 'resultado').values_list('resultado', 'valor').first()
+        )
+        return pior or (int(indices[0]), 0)
+
+    @staticmethod
+    def valor_permitido(sorteio_id: int, modalidade, palpites: Sequence, valor: int,
+                        limite: int, limitar: bool = False) -> int:
+        """
+        Confere o limite de passivo por resultado para uma aposta ainda não aceita.
+
+        Args:
+            sorteio_id: Sorteio da aposta (lê só as células que ela cobre)
+            limite: Passivo máximo por resultado em centavos (0 = desligado)
+            limitar: True reduz o valor até caber no limite; False rejeita
+
+        Returns:
+            O valor aceito (igual ao pedido, ou reduzido se `limitar`)
+
+        Raises:
+            LimiteExposicaoExcedido: Se a aposta não cabe (ou, limitada, ficaria abaixo do mínimo)
+        """
+        if not limite or modalidade is None:
+            return valor
+        indices = ExposicaoService.celulas(modalidade, palpites)
+        if not indices.size:
+            return valor
+
+        # O(k) sobre as k células da aposta: 1 para milhar, 400 no pior caso (grupo)
+        pior, exposicao_atual = ExposicaoService.pior_celula(sorteio_id, indices)
+        cotacao = Decimal(str(modalidade.cotacao))
+        if exposicao_atual + Decimal(valor) * cotacao <= limite:
+            return valor
+
+        if limitar and cotacao > 0:
+            maximo = int((Decimal(limite - exposicao_atual) / cotacao).to_integral_value(rounding=ROUND_FLOOR))
+            if maximo >= VALOR_MINIMO_APOSTA:
+                return maximo
+
+        raise LimiteExposicaoExcedido(int(pior), exposicao_atual, limite)
+
+    @staticmethod
+    def reconstruir(sorteio_id: int) -> ExposicaoSorteio:
+        """Recalcula o índice do zero a partir das apostas do sorteio (backfill / auditoria)."""
+        vetor = vetor_vazio()
+        qtd = total = 0
+        data = Sorteio.objects.filter(pk=sorteio_id).values_list('data', flat=True).first()
+        apostas = Aposta.objects.filter(sorteio_id=sorteio_id, data_sorteio=data).select_related('modalidade')
+        for aposta in apostas.iterator(chunk_size=2000):
+            ExposicaoService.aplicar(vetor, aposta)
+            qtd += 1
+            total += aposta.valor
+
+        with transaction.atomic():
+            ExposicaoCelula.objects.filter(sorteio_id=sorteio_id).delete()
+            ExposicaoCelula.objects.bulk_create(
+                [ExposicaoCelula(sorteio_id=sorteio_id, resultado=int(i), valor=int(vetor[i]))
+                 for i in np.flatnonzero(vetor)],
+                batch_size=2000,
+            )
+            exposicao, _ = ExposicaoSorteio.objects.update_or_create(
+                sorteio_id=sorteio_id, defaults={'qtd_apostas': qtd, 'total_apostado': total},
+            )
+        return exposicao
+
+    @staticmethod
+    def vetor(sorteio_id: int) -> np.ndarray:
+        """Vetor int64[10000] completo (auditoria / comparação com `reconstruir`)."""
+        vetor = vetor_vazio()
+        for resultado, valor in ExposicaoCelula.objects.filter(sorteio_id=sorteio_id).values_list('resultado', 'valor'):
+            vetor[resultado] = valor
+        return vetor
+
+    @staticmethod
+    def exposicao_resultado(sorteio_id: int, resultado: str) -> int:
+        """Passivo (centavos) caso `resultado` (ex: '1234') seja sorteado."""
+        return ExposicaoCelula.objects.filter(
+            sorteio_id=sorteio_id, resultado=int(resultado) % TOTAL_RESULTADOS
+        ).values_list('valor', flat=True).first() or 0
+
+    @staticmethod
+    def top_riscos(sorteio_id: int, n: int = 20) -> Dict:
+        """
+        Os N resultados de maior passivo, em ordem decrescente.
+
+        Returns:
+            Dict com total_apostado, qtd_apostas, pior_caso e a lista `resultados`
+        """
+        exposicao = ExposicaoSorteio.objects.filter(sorteio_id=sorteio_id).first()
+        n = max(1, min(n, TOTAL_RESULTADOS))
+        # Índice (sorteio, -valor): lê só as N primeiras células
+        maiores = list(
+            ExposicaoCelula.objects.filter(sorteio_id=sorteio_id, valor__gt=0)
+            .order_by('-valor', 'resultado').values_list('resultado', 'valor')[:n]
+        )
+
+        return {
+            "sorteio_id": sorteio_id,
+            "qtd_apostas": exposicao.qtd_apostas if exposicao else 0,
+            "total_apostado": exposicao.total_apostado if exposicao else 0,
+            "pior_caso": maiores[0][1] if maiores else 0,
+            "atualizado_em": exposicao.atualizado_em if exposicao else None,
+            "resultados": [
+                {
+                    "resultado": f"{resultado:04d}",
+                    "grupo": int(GRUPO_POR_RESULTADO[resultado]),
+                    "exposicao": valor,
+                }
+                for resultado, valor in maiores
+            ],
+        }
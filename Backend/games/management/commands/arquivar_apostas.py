@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core.particionamento import (
+    arquivar_particao, congelar_particao, eh_postgres, esta_particionada, inicio_do_mes,
+    listar_particoes, mes_da_particao, somar_meses,
+)
+from games.models import Sorteio
+
+TABELA = 'palpite_aposta'
+
+
+class Command(BaseCommand):
+    help = (
+        'Move as partições de apostas já liquidadas (todos os sorteios do mês fechados) '
+        'para o tablespace frio e as congela (VACUUM FREEZE). Continuam consultáveis.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tablespace', required=True, help='Tablespace de armazenamento frio (ex: disco com compressão)')
+        parser.add_argument('--meses-quentes', type=int, default=1, help='Meses recentes que nunca saem do disco principal')
+        parser.add_argument('--sem-freeze', action='store_true', help='Não roda VACUUM FREEZE após mover')
+        parser.add_argument('--dry-run', action='store_true', help='Só lista o que seria movido')
+
+    def handle(self, *args, **options):
+        if not eh_postgres(connection):
+            self.stdout.write("⚠️ Particionamento só existe no PostgreSQL. Nada a fazer.")
+            return
+        if options['meses_quentes'] < 1:
+            raise CommandError("--meses-quentes deve ser >= 1")
+
+        with connection.cursor() as cursor:
+            if not esta_particionada(cursor, TABELA):
+                raise CommandError(f"{TABELA} não está particionada (rode as migrations).")
+            particoes = listar_particoes(cursor, TABELA)
+
+        limite = somar_meses(inicio_do_mes(timezone.localdate()), -options['meses_quentes'] + 1)
+        self.stdout.write(f"🔄 Procurando meses liquidados anteriores a {limite:%m/%Y}...")
+
+        movidas = 0
+        for particao in particoes:
+            mes = mes_da_particao(TABELA, particao['nome'])
+            if not mes or mes >= limite or particao['tablespace'] == options['tablespace']:
+                continue
+
+            abertos = Sorteio.objects.filter(data__gte=mes, data__lt=somar_meses(mes, 1), fechado=False).count()
+            if abertos:
+                self.stdout.write(self.style.WARNING(f"   ⏭️ {particao['nome']}: {abertos} sorteio(s) ainda aberto(s)"))
+                continue
+
+            tamanho = particao['bytes'] / 1024 / 1024
+            if options['dry_run']:
+                self.stdout.write(f"   (dry-run) {particao['nome']} ({tamanho:.1f} MB)")
+                continue
+
+            # SET TABLESPACE reescreve a partição sob lock exclusivo só dela; a tabela-mãe segue livre
+            with connection.cursor() as cursor:
+                arquivar_particao(cursor, particao['nome'], tablespace=options['tablespace'])
+                if not options['sem_freeze']:
+                    congelar_particao(cursor, particao['nome'])
+            movidas += 1
+            self.stdout.write(f"   📦 {particao['nome']} -> {options['tablespace']} ({tamanho:.1f} MB)")
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {movidas} partições arquivadas."))
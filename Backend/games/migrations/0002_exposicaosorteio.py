@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExposicaoSorteio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('celulas', models.BinaryField(default=bytes)),
+                ('qtd_apostas', models.IntegerField(default=0)),
+                ('total_apostado', models.BigIntegerField(default=0, verbose_name='Total Apostado (Centavos)')),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('sorteio', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='exposicao', to='games.sorteio')),
+            ],
+            options={
+                'verbose_name': 'Exposição do Sorteio',
+                'verbose_name_plural': 'Exposição dos Sorteios',
+            },
+        ),
+    ]
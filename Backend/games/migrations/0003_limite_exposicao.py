@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0002_exposicaosorteio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parametrosdojogo',
+            name='limitar_valor_excedente',
+            field=models.BooleanField(default=False, help_text='Se marcado, apostas que estouram o limite são aceitas com o valor reduzido. Senão, são recusadas.', verbose_name='Reduzir Aposta ao Limite'),
+        ),
+        migrations.AddField(
+            model_name='parametrosdojogo',
+            name='limite_exposicao_resultado',
+            field=models.BigIntegerField(default=0, help_text='Prêmio máximo que a banca aceita pagar por um mesmo resultado (0000-9999) em um sorteio. 0 = sem limite.', verbose_name='Limite de Exposição por Resultado (Centavos)'),
+        ),
+    ]
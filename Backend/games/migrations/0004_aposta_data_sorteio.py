@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def preencher_data_sorteio(apps, schema_editor):
+    Aposta = apps.get_model('games', 'Aposta')
+    Sorteio = apps.get_model('games', 'Sorteio')
+    Aposta.objects.filter(data_sorteio__isnull=True).update(
+        data_sorteio=Subquery(Sorteio.objects.filter(pk=OuterRef('sorteio_id')).values('data')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0003_limite_exposicao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aposta',
+            name='data_sorteio',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(preencher_data_sorteio, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='aposta',
+            name='data_sorteio',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='aposta',
+            index=models.Index(fields=['criado_em'], name='palpite_apo_criado__32671b_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from core.particionamento import desfazer_particionamento, particionar_tabela
+
+
+def particionar(apps, schema_editor):
+    # No-op fora do PostgreSQL (SQLite de testes/dev segue com tabela comum)
+    particionar_tabela(schema_editor.connection, 'palpite_aposta', 'data_sorteio')
+
+
+def desparticionar(apps, schema_editor):
+    desfazer_particionamento(schema_editor.connection, 'palpite_aposta')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0004_aposta_data_sorteio'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
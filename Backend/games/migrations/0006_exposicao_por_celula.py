@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:57
+
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def blobs_para_celulas(apps, schema_editor):
+    """Explode o vetor int64[10000] comprimido de cada sorteio em linhas por resultado (só as não zeradas)."""
+    import numpy as np
+
+    ExposicaoSorteio = apps.get_model('games', 'ExposicaoSorteio')
+    ExposicaoCelula = apps.get_model('games', 'ExposicaoCelula')
+    for sorteio_id, blob in ExposicaoSorteio.objects.values_list('sorteio_id', 'celulas').iterator():
+        if not blob:
+            continue
+        vetor = np.frombuffer(zlib.decompress(bytes(blob)), dtype=np.int64)
+        ExposicaoCelula.objects.bulk_create(
+            [ExposicaoCelula(sorteio_id=sorteio_id, resultado=int(i), valor=int(vetor[i])) for i in np.flatnonzero(vetor)],
+            batch_size=2000,
+        )
+
+
+def celulas_para_blobs(apps, schema_editor):
+    import numpy as np
+
+    ExposicaoSorteio = apps.get_model('games', 'ExposicaoSorteio')
+    ExposicaoCelula = apps.get_model('games', 'ExposicaoCelula')
+    for exposicao in ExposicaoSorteio.objects.iterator():
+        vetor = np.zeros(10_000, dtype=np.int64)
+        for resultado, valor in ExposicaoCelula.objects.filter(sorteio_id=exposicao.sorteio_id).values_list('resultado', 'valor'):
+            vetor[resultado] = valor
+        exposicao.celulas = zlib.compress(vetor.tobytes(), 1)
+        exposicao.save(update_fields=['celulas'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0005_particionar_aposta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExposicaoCelula',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resultado', models.PositiveSmallIntegerField()),
+                ('valor', models.BigIntegerField(default=0, verbose_name='Passivo (Centavos)')),
+                ('sorteio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exposicao_celulas', to='games.sorteio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sorteio', '-valor'], name='exposicao_celula_top')],
+                'constraints': [models.UniqueConstraint(fields=('sorteio', 'resultado'), name='exposicao_celula_unica')],
+            },
+        ),
+        migrations.RunPython(blobs_para_celulas, celulas_para_blobs),
+        migrations.RemoveField(
+            model_name='exposicaosorteio',
+            name='celulas',
+        ),
+    ]
@@ -2,7 +2,7 @@ from decimal import Decimal
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 
 from .utils import DEFAULT_COTACAO_LOTINHA, DEFAULT_COTACAO_QUININHA, DEFAULT_COTACAO_SENINHA
 
@@ -90,6 +90,18 @@ class ParametrosDoJogo(SingletonModel):
     # valor_minimo_para_brinde = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     valor_minimo_para_brinde = models.BigIntegerField(default=0, verbose_name="Valor Mínimo para Brinde (Centavos)")
 
+    # --- Gestão de Risco (Exposição por Resultado) ---
+    limite_exposicao_resultado = models.BigIntegerField(
+        default=0,
+        verbose_name="Limite de Exposição por Resultado (Centavos)",
+        help_text="Prêmio máximo que a banca aceita pagar por um mesmo resultado (0000-9999) em um sorteio. 0 = sem limite."
+    )
+    limitar_valor_excedente = models.BooleanField(
+        default=False,
+        verbose_name="Reduzir Aposta ao Limite",
+        help_text="Se marcado, apostas que estouram o limite são aceitas com o valor reduzido. Senão, são recusadas."
+    )
+
 
 # Enum do Diagrama para Jogos
 class JogoTipo(models.TextChoices):
@@ -172,6 +184,23 @@ class Sorteio(models.Model):
 
     resultado = models.JSONField(blank=True, null=True, help_text="Resultado bruto (JSON)")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._data_original = instancia.__dict__.get('data')
+        return instancia
+
+    def save(self, *args, **kwargs):
+        # Aposta.data_sorteio é cópia desta data (chave de partição): a apuração
+        # filtra por ela, então mudar a data sem propagar deixaria apostas de fora.
+        data_original = getattr(self, '_data_original', None)
+        if self.pk is None or data_original is None or data_original == self.data:
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self.apostas.update(data_sorteio=self.data)
+        self._data_original = self.data
 
     def __str__(self):
         return f"{self.data}"
@@ -211,16 +240,69 @@ class Aposta(models.Model):
     # Manter relacionamento técnico com Sorteio para apuração
     sorteio = models.ForeignKey(Sorteio, on_delete=models.PROTECT, related_name='apostas')
 
+    # Cópia de `sorteio.data`: chave de partição mensal da tabela no PostgreSQL.
+    # Filtrar por ela junto com o sorteio faz a apuração ler só a partição do mês.
+    data_sorteio = models.DateField(editable=False)
+
     criado_em = models.DateTimeField(auto_now_add=True)
 
     # Campos de sistema não desenhados mas necessários
     ganhou = models.BooleanField(default=False)
     valor_premio = models.BigIntegerField(verbose_name="Valor do Prêmio (Centavos)")
 
+    def save(self, *args, **kwargs):
+        if self.data_sorteio is None and self.sorteio_id:
+            self.data_sorteio = self.sorteio.data
+        super().save(*args, **kwargs)
+
     class Meta:
         db_table = 'palpite_aposta' # Força o nome da tabela conforme diagrama
         indexes = [
             models.Index(fields=['usuario', 'criado_em']),
             models.Index(fields=['sorteio', 'status']),
             models.Index(fields=['status', 'ganhou']),
-        ]
\ No newline at end of file
+            # Métricas por dia: a tabela é particionada por data do sorteio, não por
+            # criação; sem este índice cada partição seria varrida inteira
+            models.Index(fields=['criado_em']),
+        ]
+
+
+class ExposicaoSorteio(models.Model):
+    """
+    Totais do índice de exposição de um sorteio aberto; o passivo por resultado
+    fica em `ExposicaoCelula`. Mantido por `games.exposicao.ExposicaoService`.
+    """
+    sorteio = models.OneToOneField(Sorteio, on_delete=models.CASCADE, related_name='exposicao')
+    qtd_apostas = models.IntegerField(default=0)
+    total_apostado = models.BigIntegerField(default=0, verbose_name="Total Apostado (Centavos)")
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Exposição do Sorteio"
+        verbose_name_plural = "Exposição dos Sorteios"
+
+    def __str__(self):
+        return f"Exposição - Sorteio {self.sorteio_id}"
+
+
+class ExposicaoCelula(models.Model):
+    """
+    Passivo da banca (centavos) se `resultado` (0-9999) sair no sorteio.
+    Só existem linhas para resultados que alguma aposta já cobriu: cada aposta
+    mexe apenas nas células dela, com incremento via F().
+    """
+    sorteio = models.ForeignKey(Sorteio, on_delete=models.CASCADE, related_name='exposicao_celulas')
+    resultado = models.PositiveSmallIntegerField()
+    valor = models.BigIntegerField(default=0, verbose_name="Passivo (Centavos)")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sorteio', 'resultado'], name='exposicao_celula_unica'),
+        ]
+        indexes = [
+            # Top-N de riscos do sorteio sem ordenar todas as células
+            models.Index(fields=['sorteio', '-valor'], name='exposicao_celula_top'),
+        ]
+
+    def __str__(self):
+        return f"Sorteio {self.sorteio_id} - {self.resultado:04d}"
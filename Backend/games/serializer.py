@@ -1,11 +1,13 @@
 import logging
 from decimal import Decimal
+from typing import Optional
 from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 
 from .models import Aposta, Sorteio, Jogo, Modalidade, Colocacao
+from . import catalogo
 
 logger = logging.getLogger(__name__)
 
@@ -212,10 +214,11 @@ class ApostaDetalheSerializer(serializers.ModelSerializer):
     Serializer Somente-Leitura para exibir detalhes da aposta no histórico.
     """
     # Campos de leitura amigáveis (Flattening)
+    # Sorteio vem no select_related da listagem; os nomes do catálogo, da tabela em memória
     nome_sorteio = serializers.CharField(source='sorteio.__str__', read_only=True)
-    nome_jogo = serializers.CharField(source='jogo.nome', read_only=True)
-    nome_modalidade = serializers.CharField(source='modalidade.nome', read_only=True)
-    nome_colocacao = serializers.CharField(source='colocacao.nome', read_only=True, allow_null=True)
+    nome_jogo = serializers.SerializerMethodField()
+    nome_modalidade = serializers.SerializerMethodField()
+    nome_colocacao = serializers.SerializerMethodField()
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     valor = serializers.SerializerMethodField(help_text="Valor da aposta em Reais (já convertido de centavos).")
     valor_premio = serializers.SerializerMethodField(help_text="Valor do prêmio em Reais (já convertido de centavos).")
@@ -237,6 +240,15 @@ class ApostaDetalheSerializer(serializers.ModelSerializer):
             'criado_em'
         ]
 
+    def get_nome_jogo(self, obj) -> Optional[str]:
+        return catalogo.nome('jogo', obj.jogo_id)
+
+    def get_nome_modalidade(self, obj) -> Optional[str]:
+        return catalogo.nome('modalidade', obj.modalidade_id)
+
+    def get_nome_colocacao(self, obj) -> Optional[str]:
+        return catalogo.nome('colocacao', obj.colocacao_id)
+
     def get_valor(self, obj):
         """Convert stored cents to Reais for display."""
         return float(obj.valor) / 100.0
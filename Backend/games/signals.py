@@ -0,0 +1,8 @@
+from django.db.models.signals import post_delete, post_save
+
+from . import catalogo
+from .models import Colocacao, Jogo, Modalidade
+
+for modelo in (Jogo, Modalidade, Colocacao):
+    post_save.connect(catalogo.invalidar, sender=modelo, dispatch_uid=f'catalogo_save_{modelo.__name__}')
+    post_delete.connect(catalogo.invalidar, sender=modelo, dispatch_uid=f'catalogo_delete_{modelo.__name__}')
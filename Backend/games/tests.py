@@ -1,3 +1,283 @@
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+from .exposicao import ExposicaoService
+from .models import Aposta, ExposicaoSorteio, Jogo, Modalidade, Sorteio
+
+
+class ExposicaoSorteioTests(TestCase):
+    def setUp(self):
+        self.jogo = Jogo.objects.create(nome="Bicho")
+        self.milhar = Modalidade.objects.create(jogo=self.jogo, nome="Milhar", cotacao=Decimal('4000'))
+        self.centena = Modalidade.objects.create(jogo=self.jogo, nome="Centena", cotacao=Decimal('600'))
+        self.grupo = Modalidade.objects.create(jogo=self.jogo, nome="Grupo", cotacao=Decimal('18'))
+        self.invertida = Modalidade.objects.create(jogo=self.jogo, nome="Milhar Invertida", cotacao=Decimal('400'))
+        self.duque = Modalidade.objects.create(jogo=self.jogo, nome="Duque de Grupo", cotacao=Decimal('18'))
+        self.sorteio = Sorteio.objects.create(data=timezone.localdate())
+        self.user = CustomUser.objects.create_user(cpf_cnpj="20000000001", password="x", nome_completo="Apostador")
+
+    def _apostar(self, modalidade, palpites, valor=100):
+        aposta = Aposta.objects.create(
+            usuario=self.user, jogo=self.jogo, modalidade=modalidade, sorteio=self.sorteio,
+            valor=valor, palpites=palpites, valor_premio=0
+        )
+        ExposicaoService.registrar_aposta(aposta)
+        return aposta
+
+    def test_celulas_por_modalidade(self):
+        self.assertEqual(ExposicaoService.celulas(self.milhar, ["1234"]).tolist(), [1234])
+        self.assertEqual(ExposicaoService.celulas(self.centena, ["234"]).size, 10)
+        # Grupo 9 (Cobra) = dezenas 33-36 em todas as 100 centenas
+        self.assertEqual(ExposicaoService.celulas(self.grupo, ["9"]).size, 400)
+        self.assertEqual(ExposicaoService.celulas(self.grupo, ["25"])[0], 0)  # 00 é Vaca
+        self.assertEqual(ExposicaoService.celulas(self.invertida, ["1123"]).size, 12)
+        self.assertEqual(ExposicaoService.celulas(self.duque, ["1", "2"]).size, 0)
+
+    def test_registro_incremental_bate_com_reconstrucao(self):
+        self._apostar(self.milhar, ["1234"], valor=100)      # 400.000 em 1234
+        self._apostar(self.centena, ["234"], valor=200)      # 120.000 em x234
+        self._apostar(self.grupo, ["9"], valor=1000)          # 18.000 em xx33..xx36 (inclui 1234)
+        self._apostar(self.milhar, ["1234", "1234"], valor=50)  # palpite repetido paga 1x
+
+        self.assertEqual(ExposicaoService.exposicao_resultado(self.sorteio.pk, "1234"), 400_000 + 120_000 + 18_000 + 200_000)
+        self.assertEqual(ExposicaoService.exposicao_resultado(self.sorteio.pk, "5234"), 120_000 + 18_000)
+        self.assertEqual(ExposicaoService.exposicao_resultado(self.sorteio.pk, "0033"), 18_000)
+
+        incremental = ExposicaoService.vetor(self.sorteio.pk)
+        ExposicaoService.reconstruir(self.sorteio.pk)
+        self.assertTrue((incremental == ExposicaoService.vetor(self.sorteio.pk)).all())
+
+        top = ExposicaoService.top_riscos(self.sorteio.pk, 3)
+        self.assertEqual(top['qtd_apostas'], 4)
+        self.assertEqual(top['resultados'][0]['resultado'], "1234")
+        self.assertEqual(top['pior_caso'], 738_000)
+
+    def test_criacao_de_aposta_atualiza_exposicao(self):
+        self.user.saldo = 10_000
+        self.user.save(update_fields=['saldo'])
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = client.post('/api/games/apostas/', {
+            "sorteio": self.sorteio.pk, "modalidade": self.milhar.pk, "valor": 500, "palpites": ["4321"],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(ExposicaoService.exposicao_resultado(self.sorteio.pk, "4321"), 2_000_000)
+
+        admin = CustomUser.objects.create_superuser(cpf_cnpj="99999999997", password="x", nome_completo="Admin")
+        client.force_authenticate(user=admin)
+        response = client.get(f'/api/games/sorteios/{self.sorteio.pk}/exposicao/?top=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['resultados'][0]['resultado'], "4321")
+        self.assertTrue(ExposicaoSorteio.objects.filter(sorteio=self.sorteio).exists())
+
+
+class LimiteExposicaoTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import ParametrosDoJogo
+
+        cache.clear()
+        jogo = Jogo.objects.create(nome="Bicho")
+        self.milhar = Modalidade.objects.create(jogo=jogo, nome="Milhar", cotacao=Decimal('4000'))
+        self.sorteio = Sorteio.objects.create(data=timezone.localdate())
+        self.user = CustomUser.objects.create_user(cpf_cnpj="20000000002", password="x", nome_completo="Apostador")
+        self.user.saldo = 100_000
+        self.user.save(update_fields=['saldo'])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        # R$ 100.000,00 de passivo máximo por resultado = R$ 25,00 em milhar (x4000)
+        self.config = ParametrosDoJogo.load()
+        self.config.limite_exposicao_resultado = 10_000_000
+        self.config.save()
+
+    def _apostar(self, valor, palpite="1234"):
+        return self.client.post('/api/games/apostas/', {
+            "sorteio": self.sorteio.pk, "modalidade": self.milhar.pk, "valor": valor, "palpites": [palpite],
+        }, format='json')
+
+    def test_rejeita_aposta_acima_do_limite(self):
+        self.assertEqual(self._apostar(2000).status_code, 201)
+        response = self._apostar(1000)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("1234", str(response.data))
+        # Outro resultado continua livre
+        self.assertEqual(self._apostar(1000, palpite="4321").status_code, 201)
+
+    def test_parametros_carregados_uma_vez_por_aposta(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self._apostar(100).status_code, 201)
+        leituras = [q for q in consultas.captured_queries if 'games_parametrosdojogo' in q['sql']]
+        self.assertEqual(len(leituras), 1)
+
+    def test_registro_nao_depende_da_densidade_do_vetor(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        grupo = Modalidade.objects.create(jogo=self.milhar.jogo, nome="Grupo", cotacao=Decimal('18'))
+        for g in range(1, 26):  # Todas as 10.000 células com passivo
+            Aposta.objects.create(usuario=self.user, modalidade=grupo, sorteio=self.sorteio,
+                                  valor=100, palpites=[str(g)], valor_premio=0)
+        ExposicaoService.reconstruir(self.sorteio.pk)
+        exposicao = ExposicaoSorteio.objects.get(sorteio=self.sorteio)
+
+        aposta = Aposta.objects.create(usuario=self.user, modalidade=self.milhar, sorteio=self.sorteio,
+                                       valor=100, palpites=["1234"], valor_premio=0)
+        with CaptureQueriesContext(connection) as consultas:
+            ExposicaoService.registrar_aposta(aposta, exposicao)
+        # Cria a célula se faltar, incrementa a célula e atualiza os totais
+        self.assertEqual(len(consultas), 3)
+        self.assertEqual(ExposicaoService.exposicao_resultado(self.sorteio.pk, "1234"), 1_800 + 400_000)
+
+    def test_limita_valor_quando_configurado(self):
+        self.config.limitar_valor_excedente = True
+        self.config.save()
+
+        self.assertEqual(self._apostar(2000).status_code, 201)
+        response = self._apostar(1000)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['valor'], 5.0)  # Reduzida para R$ 5,00
+        self.assertEqual(ExposicaoService.exposicao_resultado(self.sorteio.pk, "1234"), 10_000_000)
+
+
+class ParticaoApostaTests(TestCase):
+    def test_data_sorteio_copiada_do_sorteio(self):
+        from datetime import timedelta
+
+        jogo = Jogo.objects.create(nome="Bicho")
+        milhar = Modalidade.objects.create(jogo=jogo, nome="Milhar", cotacao=Decimal('4000'))
+        sorteio = Sorteio.objects.create(data=timezone.localdate() + timedelta(days=40))
+        user = CustomUser.objects.create_user(cpf_cnpj="20000000003", password="x", nome_completo="Apostador")
+        aposta = Aposta.objects.create(
+            usuario=user, jogo=jogo, modalidade=milhar, sorteio=sorteio, valor=100, palpites=["1234"], valor_premio=0
+        )
+        self.assertEqual(aposta.data_sorteio, sorteio.data)
+        self.assertEqual(Aposta.objects.filter(sorteio=sorteio, data_sorteio=sorteio.data).count(), 1)
+
+    def test_mudar_data_do_sorteio_leva_as_apostas_para_a_apuracao(self):
+        from datetime import timedelta
+        from games.engine import apurar_sorteio
+
+        jogo = Jogo.objects.create(nome="Bicho")
+        milhar = Modalidade.objects.create(jogo=jogo, nome="Milhar", cotacao=Decimal('4000'))
+        sorteio = Sorteio.objects.create(data=timezone.localdate())
+        user = CustomUser.objects.create_user(cpf_cnpj="20000000004", password="x", nome_completo="Apostador")
+        aposta = Aposta.objects.create(
+            usuario=user, jogo=jogo, modalidade=milhar, sorteio=sorteio, valor=100, palpites=["1234"], valor_premio=0
+        )
+
+        # Admin adia o sorteio depois das apostas feitas
+        sorteio = Sorteio.objects.get(pk=sorteio.pk)
+        sorteio.data = sorteio.data + timedelta(days=40)
+        sorteio.premio_1 = "1234"
+        sorteio.save()
+
+        aposta.refresh_from_db()
+        self.assertEqual(aposta.data_sorteio, sorteio.data)
+        self.assertTrue(apurar_sorteio(sorteio.pk))
+        aposta.refresh_from_db()
+        self.assertTrue(aposta.ganhou)
+
+    def test_arquivamento_nao_faz_nada_fora_do_postgres(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        saida = StringIO()
+        call_command('arquivar_apostas', '--tablespace', 'frio', stdout=saida)
+        self.assertIn("PostgreSQL", saida.getvalue())
+
+
+class HistoricoApostasKeysetTests(TestCase):
+    def setUp(self):
+        jogo = Jogo.objects.create(nome="Bicho")
+        milhar = Modalidade.objects.create(jogo=jogo, nome="Milhar", cotacao=Decimal('4000'))
+        sorteio = Sorteio.objects.create(data=timezone.localdate())
+        self.user = CustomUser.objects.create_user(cpf_cnpj="20000000004", password="x", nome_completo="Cambista")
+        self.ids = [
+            Aposta.objects.create(
+                usuario=self.user, jogo=jogo, modalidade=milhar, sorteio=sorteio,
+                valor=100, palpites=[f"{i:04d}"], valor_premio=0,
+            ).pk
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_paginas_seguem_o_cursor_sem_count(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        vistos = []
+        url = '/api/games/apostas/?page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['count'], 5)  # Contador, não COUNT(*)
+            self.assertFalse(any('COUNT(' in q['sql'].upper() for q in consultas.captured_queries))
+            vistos += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(vistos, sorted(self.ids, reverse=True))
+
+
+class ListagemApostasQueriesTests(TestCase):
+    def setUp(self):
+        from .models import Colocacao
+
+        jogo = Jogo.objects.create(nome="Bicho")
+        modalidades = [
+            Modalidade.objects.create(jogo=jogo, nome=nome, cotacao=Decimal('10'))
+            for nome in ("Milhar", "Centena", "Grupo")
+        ]
+        colocacao = Colocacao.objects.create(nome="1º ao 5º", cotacao=Decimal('5'), jogo=jogo, modalidade=modalidades[0])
+        self.user = CustomUser.objects.create_user(cpf_cnpj="20000000005", password="x", nome_completo="Cambista")
+        for i in range(30):
+            sorteio = Sorteio.objects.create(data=timezone.localdate())
+            Aposta.objects.create(
+                usuario=self.user, jogo=jogo, modalidade=modalidades[i % 3], sorteio=sorteio,
+                colocacao=colocacao if i % 2 else None, valor=100, palpites=["1234"], valor_premio=0,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_quantidade_de_queries_nao_depende_do_tamanho_da_pagina(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.get('/api/games/apostas/?page_size=1')  # Aquece o catálogo em memória
+
+        contagens = {}
+        for tamanho in (2, 30):
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get(f'/api/games/apostas/?page_size={tamanho}')
+            self.assertEqual(len(response.data['results']), tamanho)
+            contagens[tamanho] = len(consultas.captured_queries)
+
+        # 1 SELECT da página (com sorteio) + 1 do contador
+        self.assertEqual(contagens, {2: 2, 30: 2})
+        item = response.data['results'][-1]
+        self.assertEqual((item['nome_jogo'], item['nome_modalidade'], item['nome_colocacao']), ("Bicho", "Milhar", None))
+        self.assertEqual(response.data['results'][-2]['nome_colocacao'], "1º ao 5º")
+
+    def test_invalidacao_concorrente_nao_quebra_a_consulta(self):
+        from . import catalogo
+
+        class TabelaInvalidadaNoTeste(dict):
+            # Simula outro thread chamando invalidar() logo depois do teste de tabela vazia
+            def __bool__(self):
+                catalogo.invalidar()
+                return True
 
-# Create your tests here.
+        modalidade = Modalidade.objects.get(nome="Milhar")
+        catalogo._carregar()
+        catalogo._tabela = TabelaInvalidadaNoTeste(catalogo._tabela)
+        self.assertEqual(catalogo.nome('modalidade', modalidade.pk), "Milhar")
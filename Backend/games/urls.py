@@ -7,6 +7,7 @@ from .views import (
     SorteiosAbertosView, 
     ApostaViewSet,       
     ApuracaoAPIView,     
+    ExposicaoSorteioView,
     comprovante_view,
     QuininhaView,
     SeninhaView,
@@ -33,6 +34,7 @@ urlpatterns = [
 
     # --- APURAÇÃO (Admin) ---
     path('apurar/<int:pk>/', ApuracaoAPIView.as_view(), name='apurar-sorteio'),
+    path('sorteios/<int:pk>/exposicao/', ExposicaoSorteioView.as_view(), name='exposicao-sorteio'),
 
     # --- VISUAL (Impressão) ---
     path('comprovante/<int:pk>/', comprovante_view, name='imprimir-comprovante'),
@@ -2,18 +2,24 @@ from rest_framework import viewsets, mixins, status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from django.utils import timezone
 from django.db import transaction, DatabaseError, IntegrityError
 from decimal import Decimal, ROUND_DOWN
 import logging
 from django.shortcuts import get_object_or_404, render
 
-from .models import Sorteio, Aposta, ParametrosDoJogo
+from .models import Sorteio, Aposta, ParametrosDoJogo, ExposicaoSorteio
 
 from drf_spectacular.utils import extend_schema, OpenApiTypes
 
 # Imports de outros apps e utilitários
+from accounts.pagination import KeysetPagination
+from accounts.services.contadores import ContadorService
 from accounts.services.wallet import WalletService
+from core.metricas import APOSTAS, LOCK_ESPERA
+from core.tracing import rastrear
+from .exposicao import ExposicaoService, LimiteExposicaoExcedido
 from .utils import descobrir_bicho
 import math
 from collections import Counter
@@ -215,6 +221,25 @@ class ApuracaoAPIView(APIView):
         
         return Response({"erro": "Método de apuração não encontrado."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class ExposicaoSorteioView(APIView):
+    """
+    Passivo da banca por resultado de um sorteio (Top-N resultados de maior risco).
+    """
+    permission_classes = [permissions.IsAdminUser]
+    @extend_schema(
+        summary="Exposição do Sorteio (Top Riscos)",
+        description="Lista os resultados (0000-9999) que gerariam o maior pagamento com as apostas já aceitas. Valores em centavos.",
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    def get(self, request, pk):
+        sorteio = get_object_or_404(Sorteio, pk=pk)
+        try:
+            top = int(request.query_params.get('top', 20))
+        except ValueError:
+            return Response({"erro": "Parâmetro 'top' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(ExposicaoService.top_riscos(sorteio.pk, top))
+
 # --- VIEW VISUAL (HTML) ---
 
 def comprovante_view(request, pk):
@@ -233,19 +258,44 @@ class ApostaViewSet(mixins.CreateModelMixin,
     ViewSet que gerencia as Apostas (Cria e Lista).
     """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    # Queries por requisição (core.instrumentacao): página + contador + usuário do JWT,
+    # mais as 3 da carga a frio do catálogo (1x a cada 5 min por worker).
+    # create: 20 numa aposta com tudo quente; a primeira aposta do usuário no sorteio
+    # soma catálogo a frio (3), linha de exposição (1), perfil de risco (2) e contador (2)
+    orcamento_queries = {'list': 6, 'retrieve': 6, 'create': 28}
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Aposta.objects.none()
-            
-        return Aposta.objects.filter(usuario=self.request.user).order_by('-criado_em')
+
+        # Sorteio no mesmo SELECT; jogo/modalidade/colocação saem de `games.catalogo`
+        return Aposta.objects.filter(usuario=self.request.user).select_related('sorteio').order_by('-criado_em', '-id')
+
+    def total_keyset(self):
+        return ContadorService.total(self.request.user.pk, 'apostas')
 
     def get_serializer_class(self):
         if self.action == 'create':
             return CriarApostaSerializer
         return ApostaDetalheSerializer
 
+    # Status da resposta -> rótulo `resultado` de apostas_total
+    RESULTADOS_METRICA = {201: 'aceita', 400: 'rejeitada', 409: 'conflito', 503: 'suspensa'}
+
     def create(self, request, *args, **kwargs):
+        self._modalidade_metrica = 'desconhecida'
+        try:
+            response = self._criar_aposta(request)
+        except ValidationError:
+            # Serializer inválido (raise_exception): 400 pelo handler do DRF
+            APOSTAS.inc(modalidade=self._modalidade_metrica, resultado='rejeitada')
+            raise
+        resultado = self.RESULTADOS_METRICA.get(response.status_code, 'erro')
+        APOSTAS.inc(modalidade=self._modalidade_metrica, resultado=resultado)
+        return response
+
+    def _criar_aposta(self, request):
 
         # --- NOVO: VERIFICAÇÃO DO KILL SWITCH ---
         # Antes de qualquer coisa, checa se o sistema está ligado no Admin
@@ -259,9 +309,12 @@ class ApostaViewSet(mixins.CreateModelMixin,
 
         # Validação inicial dos dados
         serializer = self.get_serializer(data=request.data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
+        with rastrear('serializer.validacao'):
+            serializer.is_valid(raise_exception=True)
 
         dados = serializer.validated_data
+        if dados.get('modalidade'):
+            self._modalidade_metrica = dados['modalidade'].nome
         user = request.user
         valor_aposta = dados['valor']
         sorteio_alvo = dados['sorteio']
@@ -271,7 +324,7 @@ class ApostaViewSet(mixins.CreateModelMixin,
             usuario=user, 
             sorteio=sorteio_alvo, 
             valor=valor_aposta, 
-            palpite=dados['palpite'], 
+            palpites=dados['palpites'], 
             criado_em__gte=timezone.now() - timezone.timedelta(seconds=5)
         ).exists():
             return Response({"erro": "Aposta duplicada. Aguarde..."}, status=status.HTTP_400_BAD_REQUEST)
@@ -279,12 +332,24 @@ class ApostaViewSet(mixins.CreateModelMixin,
         try:
             with transaction.atomic():
                 # Lock order: Sempre Sorteio -> Usuario (evita deadlocks)
-                sorteio_travado = Sorteio.objects.select_for_update().get(pk=sorteio_alvo.pk)
+                with LOCK_ESPERA.medir(recurso='sorteio'), rastrear('lock.sorteio'):
+                    sorteio_travado = Sorteio.objects.select_for_update().get(pk=sorteio_alvo.pk)
 
                 # 3. Verifica se o sorteio ainda está aberto
                 if sorteio_travado.fechado:
                     return Response({"erro": "Sorteio fechado."}, status=status.HTTP_400_BAD_REQUEST)
 
+                # 3.1 Limite de exposição (definitivo, sob o lock: lê só as células da aposta)
+                exposicao, _ = ExposicaoSorteio.objects.get_or_create(sorteio=sorteio_travado)
+                if config.limite_exposicao_resultado:
+                    try:
+                        valor_aposta = ExposicaoService.valor_permitido(
+                            sorteio_travado.pk, dados['modalidade'], dados['palpites'], valor_aposta,
+                            config.limite_exposicao_resultado, config.limitar_valor_excedente,
+                        )
+                    except LimiteExposicaoExcedido as e:
+                        return Response({"erro": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
                 # 4. Debita o valor (ACID)
                 WalletService.debit(
                     user_id=user.pk,
@@ -310,19 +375,25 @@ class ApostaViewSet(mixins.CreateModelMixin,
                     )
 
                 # --- 7. SALVA A APOSTA ORIGINAL ---
-                aposta = serializer.save(usuario=user_travado, comissao_gerada=comissao_valor)
+                aposta = serializer.save(
+                    usuario=user_travado, comissao_gerada=comissao_valor, valor_premio=0, valor=valor_aposta,
+                    data_sorteio=sorteio_travado.data,
+                )
 
                 if aposta.comissao_gerada != comissao_valor:
                     raise ValueError("Serializer ignored 'comissao_gerada' during save.")
 
                 # --- 8. GATILHO DE AFILIADOS (Promotores/Padrinhos) ---
                 # Fica FORA do if do cambista, para valer para todo mundo
-                user_travado.processar_comissao(valor_aposta, 'APOSTA')
+                with rastrear('comissao.afiliados'):
+                    user_travado.processar_comissao(valor_aposta, 'APOSTA')
+
+                # --- 8.1 ÍNDICE DE EXPOSIÇÃO ---
+                # Ainda sob o lock do Sorteio: atualização incremental sem corrida
+                ExposicaoService.registrar_aposta(aposta, exposicao)
 
                 # --- 9. PROMOÇÃO MILHAR BRINDE ---
-                # Carrega config aqui fora para garantir que existe
-                config = ParametrosDoJogo.load()
-                
+                # `config` é o mesmo carregado no início (kill switch)
                 if config.milhar_brinde_ativa and valor_aposta >= config.valor_minimo_para_brinde:
                     import random
                     # Gera um número aleatório de 0000 a 9999
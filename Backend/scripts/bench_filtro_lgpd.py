@@ -0,0 +1,108 @@
+"""
+Micro-benchmark: custo do SensitiveDataFilter por log.
+
+Compara o filtro atual (regras pré-compiladas, puladas quando o texto não tem
+o que elas procuram) com a versão antiga (sete `re.sub` seguidos, compilando a
+cada chamada) em três tipos de mensagem:
+    1. sem candidatos (o caso comum nos loops: "Lote processado", etc.)
+    2. com números, mas sem dado sensível (ids, valores)
+    3. com dados sensíveis (CPF, e-mail, token)
+
+Também confere que as duas versões mascaram igual num corpus gerado
+(`corpus()`, o mesmo usado em core.tests).
+
+Uso:
+    python scripts/bench_filtro_lgpd.py [repeticoes]
+
+Não toca em banco: só importa o filtro.
+"""
+import logging
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logging_filters import SensitiveDataFilter
+
+
+def filtro_antigo(msg):
+    """Implementação anterior, mantida aqui só para comparação."""
+    msg = re.sub(r'\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b', '[CPF-OCULTO-LGPD]', msg)
+    msg = re.sub(r'\b(?:\d[ -]*?){13,16}\b', '[CARTAO-OCULTO-LGPD]', msg)
+    msg = re.sub(r'\b([a-zA-Z0-9._%+-]+)@([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b', r'[EMAIL-OCULTO-LGPD]@\2', msg)
+    msg = re.sub(r'\(?\d{2}\)?\s?\d{4,5}-?\d{4}\b', '[TELEFONE-OCULTO-LGPD]', msg)
+    msg = re.sub(r'(password|senha|token|secret|api_key)=.*?(&|\s|$)', r'\1=[PROTEGIDO]\2', msg, flags=re.IGNORECASE)
+    msg = re.sub(r'[a-zA-Z0-9]{32,}', '[CHAVE-OCULTA-LGPD]', msg)
+    msg = re.sub(r'(agencia|conta|agency|account)=\s*[0-9-]+', r'\1=[PROTEGIDO]', msg, flags=re.IGNORECASE)
+    return msg
+
+
+MENSAGENS = {
+    "Sem candidatos": "SkalePay Request [POST] /transfers: lote concluído, despachante aguardando novos saques",
+    "Com números": "Liquidação do sorteio 4821: 1532 apostas, 87 premiadas, total R$ 12.345,67 em 0.84s",
+    "Com dados sensíveis": "Saque de joao.silva@example.com CPF 123.456.789-01 token=abc123xyz conta=12345-6",
+}
+
+
+# Pedaços que costumam aparecer nos logs, misturados ao acaso por `corpus()`
+_PEDACOS = (
+    '123.456.789-01', '12345678901', '4111 1111 1111 1111', '4111-1111-1111-1111', '4111111111111111',
+    '(11) 99999-9999', '11999999999', '9999-9999', 'joao.silva@example.com', 'user@12345678901.com',
+    'password=', 'senha=', 'TOKEN=', 'api_key=', 'conta=', 'agencia= ', 'account=', '&', '=',
+    'abc123xyz', 'a' * 32, '0123456789abcdefABCDEF0123456789xy', 'R$ 12.345,67', 'sorteio', 'id',
+    '-', '.', '(', ')', '@', 'ok',
+)
+
+
+def corpus(tamanho=5000, semente=48):
+    """Mensagens aleatórias (reprodutíveis) com dados sensíveis colados, separados e aninhados."""
+    rng = random.Random(semente)
+    mensagens = []
+    for _ in range(tamanho):
+        partes = []
+        for _ in range(rng.randint(1, 8)):
+            if rng.random() < 0.3:
+                partes.append(''.join(rng.choice('0123456789') for _ in range(rng.randint(1, 18))))
+            else:
+                partes.append(rng.choice(_PEDACOS))
+            partes.append(rng.choice(('', ' ', ' ', '\t', '&', '-')))
+        mensagens.append(''.join(partes))
+    return mensagens
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    filtro = SensitiveDataFilter()
+
+    def novo(msg):
+        record = logging.LogRecord('bench', logging.INFO, __file__, 0, msg, (), None)
+        filtro.filter(record)
+        return record.msg
+
+    def antigo(msg):
+        # Mesmo custo de criar o LogRecord, para comparar só o filtro
+        logging.LogRecord('bench', logging.INFO, __file__, 0, msg, (), None)
+        return filtro_antigo(msg)
+
+    divergentes = [msg for msg in corpus() if novo(msg) != filtro_antigo(msg)]
+    if divergentes:
+        print(f"⚠️ {len(divergentes)} mensagens do corpus com saídas diferentes, ex.:")
+        for msg in divergentes[:5]:
+            print(f"      {msg!r}\n      novo:   {novo(msg)!r}\n      antigo: {filtro_antigo(msg)!r}")
+    else:
+        print("✅ Corpus gerado: saídas idênticas às da versão antiga")
+
+    print(f"🚀 {repeticoes} logs por cenário")
+    for rotulo, msg in MENSAGENS.items():
+        if novo(msg) != filtro_antigo(msg):
+            print(f"   ⚠️ {rotulo}: saídas diferentes\n      novo:   {novo(msg)}\n      antigo: {filtro_antigo(msg)}")
+        t_antigo = min(timeit.repeat(lambda: antigo(msg), number=repeticoes, repeat=3)) / repeticoes * 1e6
+        t_novo = min(timeit.repeat(lambda: novo(msg), number=repeticoes, repeat=3)) / repeticoes * 1e6
+        print(f"   {rotulo:<22} antigo={t_antigo:6.2f} µs   novo={t_novo:6.2f} µs   ({t_antigo / t_novo:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
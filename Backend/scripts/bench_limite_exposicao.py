@@ -0,0 +1,113 @@
+"""
+Carga: latência da criação de aposta com e sem limite de exposição.
+
+Roda N apostas pelo endpoint real (APIClient) em três cenários:
+    1. limite desligado (baseline)
+    2. limite ligado (caminho normal)
+    3. só a checagem do limite (`valor_permitido`, lê as células da aposta), isolada
+
+Uso:
+    python scripts/bench_limite_exposicao.py [qtd_apostas]
+
+ATENÇÃO: cria usuário/sorteio de teste no banco configurado. Não rode em produção.
+"""
+import os
+import sys
+import itertools
+import time
+import statistics
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+import django
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from games.exposicao import ExposicaoService
+from games.models import Jogo, Modalidade, ParametrosDoJogo, Sorteio
+
+User = get_user_model()
+
+
+def preparar():
+    print("🔄 Preparando cenário...")
+    jogo, _ = Jogo.objects.get_or_create(nome="Bicho (bench)")
+    modalidade, _ = Modalidade.objects.get_or_create(
+        jogo=jogo, nome="Milhar", defaults={"cotacao": Decimal('4000')}
+    )
+    user, _ = User.objects.get_or_create(cpf_cnpj="00000000191", defaults={
+        "username": "bench_exposicao", "nome_completo": "Bench Exposição"
+    })
+    user.saldo = 10 ** 12
+    user.save(update_fields=['saldo'])
+    sorteio = Sorteio.objects.create(data=timezone.localdate(), horario="BENCH")
+    return user, modalidade, sorteio
+
+
+def medir(rotulo, func, n):
+    tempos = []
+    for i in range(n):
+        inicio = time.perf_counter()
+        func(i)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    p50 = statistics.median(tempos)
+    p95 = tempos[int(len(tempos) * 0.95) - 1]
+    print(f"   {rotulo:<32} p50={p50:7.3f} ms   p95={p95:7.3f} ms")
+    return p50
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    user, modalidade, sorteio = preparar()
+    config = ParametrosDoJogo.load()
+    limite_original = config.limite_exposicao_resultado
+
+    client = APIClient(SERVER_NAME='localhost')
+    client.force_authenticate(user=user)
+
+    # Valor/palpite sempre diferentes para não cair no anti-spam (5s)
+    sequencia = itertools.count()
+
+    def apostar(_):
+        i = next(sequencia)
+        response = client.post('/api/games/apostas/', {
+            "sorteio": sorteio.pk, "modalidade": modalidade.pk,
+            "valor": 100 + i, "palpites": [f"{i % 10000:04d}"],
+        }, format='json')
+        if response.status_code != 201:
+            raise RuntimeError(f"Aposta recusada: {response.status_code} {getattr(response, 'data', response.content)}")
+
+    print(f"\n🚀 {n} apostas por cenário (sorteio {sorteio.pk})")
+    try:
+        config.limite_exposicao_resultado = 0
+        config.save()
+        base = medir("Limite desligado", apostar, n)
+
+        config.limite_exposicao_resultado = 10 ** 12
+        config.save()
+        com_limite = medir("Limite ligado", apostar, n)
+
+        medir(
+            "Checagem do limite isolada",
+            lambda i: ExposicaoService.valor_permitido(
+                sorteio.pk, modalidade, [f"{i % 10000:04d}"],
+                100, config.limite_exposicao_resultado,
+            ),
+            n,
+        )
+    finally:
+        config.limite_exposicao_resultado = limite_original
+        config.save()
+
+    diferenca = (com_limite - base) / base * 100 if base else 0.0
+    print(f"\n📊 Variação do p50 com limite ligado: {diferenca:+.1f}%")
+
+
+if __name__ == '__main__':
+    main()